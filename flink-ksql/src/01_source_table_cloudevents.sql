@@ -22,6 +22,9 @@
 --   - category: Event category for classification
 --   - correlation_id: ID to trace related events across systems
 --   - data: Event payload as JSON string
+--   - sample_weight: How many original events this record stands for. The
+--     backend samples info events under load; count with SUM(sample_weight)
+--     instead of COUNT(*) to keep totals unbiased (error/critical are always 1.0)
 --
 -- WATERMARK:
 -- The watermark handles out-of-order events with 10-second tolerance.
@@ -31,6 +34,10 @@
 -- DISTRIBUTION:
 -- DISTRIBUTED BY HASH(`id`) ensures even data distribution across partitions
 -- for optimal parallel processing.
+-- The distribution must match the producer's KAFKA_PARTITION_STRATEGY. To keep
+-- an incident's events on one partition (less shuffling for 05_correlated_incidents),
+-- set KAFKA_PARTITION_STRATEGY=correlation and use DISTRIBUTED BY HASH(`correlation_id`).
+-- See python-backend/scripts/benchmark_partitioning.py for the skew trade-off.
 -- ============================================================
 
 CREATE TABLE cloudevents (
@@ -45,6 +52,7 @@ CREATE TABLE cloudevents (
     `category` STRING,
     `correlation_id` STRING,
     `data` STRING,
+    `sample_weight` DOUBLE,
     -- Event time watermark (handles out-of-order events)
     WATERMARK FOR `time` AS `time` - INTERVAL '10' SECOND
 ) DISTRIBUTED BY HASH(`id`) INTO 3 BUCKETS
@@ -62,6 +70,6 @@ SELECT * FROM cloudevents LIMIT 5;
 -- Count events per source (real-time streaming query)
 SELECT 
     `source`,
-    COUNT(*) as event_count
+    CAST(ROUND(SUM(COALESCE(`sample_weight`, 1.0))) AS BIGINT) as event_count
 FROM cloudevents
 GROUP BY `source`;
@@ -14,13 +14,19 @@
 -- - Efficient for downstream processing and storage
 --
 -- AGGREGATIONS PERFORMED:
---   1. event_count: Total events in the window
+--   1. event_count: Total events in the window (weighted by sample_weight)
 --   2. unique_types: Count of distinct event types (diversity metric)
 --   3. critical_count: Events with severity = 'critical'
 --   4. error_count: Events with severity = 'error'
 --   5. warning_count: Events with severity = 'warning'
 --   6. info_count: Events with severity = 'info'
 --
+-- SAMPLE WEIGHTS:
+-- Under load the backend samples info events and rate limits noisy
+-- (source, type) pairs; each kept record carries the number of events it
+-- stands for in `sample_weight`. Counts therefore sum the weights instead
+-- of counting rows. critical/error events are never shed (weight 1.0).
+--
 -- TUMBLING WINDOW:
 -- Uses TUMBLE() function to create non-overlapping 5-minute windows.
 -- Each event belongs to exactly one window based on its event time.
@@ -57,12 +63,12 @@ SELECT
     TUMBLE_START(`time`, INTERVAL '5' MINUTES) as `window_start`,
     TUMBLE_END(`time`, INTERVAL '5' MINUTES) as `window_end`,
     `source`,
-    COUNT(*) as `event_count`,
+    CAST(ROUND(SUM(COALESCE(`sample_weight`, 1.0))) AS BIGINT) as `event_count`,
     COUNT(DISTINCT `type`) as `unique_types`,
     COUNT(*) FILTER (WHERE `severity` = 'critical') as `critical_count`,
     COUNT(*) FILTER (WHERE `severity` = 'error') as `error_count`,
-    COUNT(*) FILTER (WHERE `severity` = 'warning') as `warning_count`,
-    COUNT(*) FILTER (WHERE `severity` = 'info') as `info_count`
+    CAST(ROUND(COALESCE(SUM(COALESCE(`sample_weight`, 1.0)) FILTER (WHERE `severity` = 'warning'), 0)) AS BIGINT) as `warning_count`,
+    CAST(ROUND(COALESCE(SUM(COALESCE(`sample_weight`, 1.0)) FILTER (WHERE `severity` = 'info'), 0)) AS BIGINT) as `info_count`
 FROM cloudevents
 GROUP BY 
     TUMBLE(`time`, INTERVAL '5' MINUTES),
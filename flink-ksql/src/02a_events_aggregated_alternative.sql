@@ -23,6 +23,13 @@
 -- - event_types: Comma-separated list of unique event types in window
 -- - sample_subjects: Comma-separated list of event subjects (for debugging)
 --
+-- STATE SIZE:
+-- COUNT(DISTINCT) and LISTAGG keep every value of the window in state, so
+-- sample_subjects grows with the event rate. For constant-size figures use
+-- the backend's per-window sketches (GET /api/windows): HyperLogLog
+-- distinct counts of types, subjects and correlation_ids plus a bounded
+-- reservoir of sample subjects, mergeable across workers and windows.
+--
 -- TRADE-OFFS:
 -- + Works with low event volumes
 -- + Provides immediate output
@@ -44,12 +51,12 @@ SELECT
         (EXTRACT(HOUR FROM `$rowtime`) * 60 + FLOOR(EXTRACT(MINUTE FROM `$rowtime`) / 5) * 5) + 5,
         CAST(DATE_FORMAT(`$rowtime`, 'yyyy-MM-dd') AS DATE)
     ) AS window_end,
-    COUNT(*) AS event_count,
+    CAST(ROUND(SUM(COALESCE(sample_weight, 1.0))) AS BIGINT) AS event_count,
     COUNT(DISTINCT type) AS unique_types,
     CAST(SUM(CASE WHEN severity = 'critical' THEN 1 ELSE 0 END) AS BIGINT) AS critical_count,
     CAST(SUM(CASE WHEN severity = 'error' THEN 1 ELSE 0 END) AS BIGINT) AS error_count,
-    CAST(SUM(CASE WHEN severity = 'warning' THEN 1 ELSE 0 END) AS BIGINT) AS warning_count,
-    CAST(SUM(CASE WHEN severity = 'info' THEN 1 ELSE 0 END) AS BIGINT) AS info_count,
+    CAST(ROUND(SUM(CASE WHEN severity = 'warning' THEN COALESCE(sample_weight, 1.0) ELSE 0 END)) AS BIGINT) AS warning_count,
+    CAST(ROUND(SUM(CASE WHEN severity = 'info' THEN COALESCE(sample_weight, 1.0) ELSE 0 END)) AS BIGINT) AS info_count,
     LISTAGG(DISTINCT type, ',') AS event_types,
     LISTAGG(subject, ',') AS sample_subjects
 FROM `cloudevents-stream`
@@ -22,6 +22,11 @@
 --   3. WARNING: Some errors but not critical levels
 --   4. HEALTHY: No significant issues
 --
+-- The backend applies the same thresholds to a 5-minute window hopping
+-- every 10s (python-backend app/services/live_health.py), so status
+-- changes reach the dashboard without waiting for the tumbling window to
+-- close. Keep both in sync when changing the rules.
+--
 -- DATA FLOW:
 -- events_aggregated_5min (per-source) --> system_health_5min (global)
 --
@@ -25,6 +25,10 @@
 -- RANKING:
 -- Note: Flink streaming doesn't support ROW_NUMBER on non-time attributes.
 -- Ranking (top 5, top 10) is done at query time using ORDER BY + LIMIT.
+-- For "which subject / event type / source is erroring most right now"
+-- the backend keeps streaming top-K summaries (Space-Saving) over sliding
+-- windows: GET /api/top?dimension=subject|type|source&k=10&window=5m.
+-- The same per-window top offenders are added to the insight prompt.
 --
 -- USE CASES:
 -- - Incident response prioritization
@@ -39,6 +39,17 @@
 -- CONSUMPTION:
 -- This table is read by a Python/FastAPI service that sends the data
 -- to Gemini for natural language processing.
+--
+-- BACKEND JOIN ALTERNATIVE (SUMMARY_SOURCE=join):
+-- The regular joins below keep every row of all three inputs in state
+-- forever, emit a row per joined top_error_sources row (not just the
+-- top-1), and only match incidents whose 1-minute window_start equals the
+-- 5-minute one. With SUMMARY_SOURCE=join the backend instead consumes
+-- system_health_5min, top_error_sources_5min and correlated_incidents and
+-- joins them per 5-minute window (app/services/summary_join.py): one
+-- summary per window, the true top error source, incidents bucketed into
+-- the covering window, bounded state with a TTL. This INSERT can then be
+-- stopped.
 -- ============================================================
 
 CREATE TABLE gemini_summary (
@@ -5,17 +5,82 @@ FastAPI server for simulating events and displaying AI insights
 """
 
 import logging
+import time
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .routes import events_router, health_router, websocket_router
+from .routes import events_router, health_router, websocket_router, debug_router, analytics_router
+from .config import (
+    SPOOL_ENABLED, LOOP_MONITOR_ENABLED, INSIGHT_TOPIC_ENABLED, EVENT_TAIL_ENABLED, LIVE_HEALTH_ENABLED,
+    SHED_ENABLED,
+)
+from .services.ai_service import gemini_service
+from .services.insight_cache import insight_cache
+from .services.insight_topic import shared_insights
+from .services.event_tail import event_tail
+from .services.live_health import live_health
+from .services.scenario_scheduler import scenario_scheduler
+from .services.metrics import pipeline_metrics
+from .services.spool import event_spool
+from .services.load_shedding import load_shedder
+from .services.loop_monitor import loop_monitor
+from .services.startup import warm_up
+from .services.kafka_pool import kafka_pool
+from .routes.websocket import stop_summary_feed
+from .routes.events import publish_weight_record
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks"""
+    started = time.perf_counter()
+    timings = await warm_up()
+    ready_ms = (time.perf_counter() - started) * 1000.0
+    pipeline_metrics.set_gauge('startup_ready_ms', round(ready_ms, 1))
+    logger.info(f"Warm-up done in {ready_ms:.0f}ms ({timings})")
+    await kafka_pool.start()
+    if INSIGHT_TOPIC_ENABLED:
+        shared_insights.start()
+    if EVENT_TAIL_ENABLED:
+        event_tail.start()
+    if LIVE_HEALTH_ENABLED:
+        live_health.start()
+    if SPOOL_ENABLED:
+        event_spool.start()
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+    if SHED_ENABLED:
+        load_shedder.start(publish_weight_record)
+    yield
+    # Drain in dependency order: stop consuming, deliver the spool, then
+    # flush and close the Kafka clients
+    await stop_summary_feed()
+    await scenario_scheduler.stop()
+    if EVENT_TAIL_ENABLED:
+        await event_tail.stop()
+    if LIVE_HEALTH_ENABLED:
+        await live_health.stop()
+    if INSIGHT_TOPIC_ENABLED:
+        await shared_insights.stop()
+    if LOOP_MONITOR_ENABLED:
+        await loop_monitor.stop()
+    if SHED_ENABLED:
+        # Carried weight goes out before the spool drains
+        await load_shedder.stop(publish_weight_record)
+    if SPOOL_ENABLED:
+        await event_spool.stop()
+    await kafka_pool.drain()
+    await gemini_service.aclose()
+    insight_cache.close()
+
+
 # Create FastAPI application
-app = FastAPI(title="EventStream Intelligence Demo")
+app = FastAPI(title="EventStream Intelligence Demo", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -30,5 +95,7 @@ app.add_middleware(
 app.include_router(health_router)
 app.include_router(events_router)
 app.include_router(websocket_router)
+app.include_router(debug_router)
+app.include_router(analytics_router)
 
 logger.info("EventStream Intelligence Demo initialized")
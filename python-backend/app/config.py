@@ -4,6 +4,7 @@ Configuration and event templates for EventStream Intelligence
 """
 
 import os
+import socket
 from typing import Dict, Any
 from dotenv import load_dotenv
 
@@ -24,8 +25,75 @@ if os.getenv('KAFKA_API_KEY') and os.getenv('KAFKA_API_SECRET'):
         'sasl.password': os.getenv('KAFKA_API_SECRET'),
     })
 
+# Producer settings: idempotent delivery so broker-side retries never duplicate
+# events (requires acks=all; keeps per-partition ordering with <=5 in flight)
+KAFKA_PRODUCER_OVERRIDES: Dict[str, Any] = {
+    'enable.idempotence': True,
+    'acks': 'all',
+    'max.in.flight.requests.per.connection': 5,
+}
+
+# Message key for cloudevents-stream, which decides the partition:
+# "id" (random per event), "correlation" (correlation_id; uncorrelated events
+# unkeyed), "source", "source_subject" (hash of source + subject) or "sticky"
+# (unkeyed). Keep the Flink source table's DISTRIBUTED BY in line with it.
+KAFKA_PARTITION_STRATEGY = os.getenv('KAFKA_PARTITION_STRATEGY', 'id').lower()
+
+# Kafka client pool (created in the lifespan hook): one shared producer,
+# KAFKA_POOL_READERS readers for request handlers and one live-feed consumer.
+# The producer is health-checked with a metadata request every interval and
+# rebuilt after KAFKA_HEALTH_FAILURES failed checks or a fatal error.
+KAFKA_POOL_READERS = int(os.getenv('KAFKA_POOL_READERS', '2'))
+KAFKA_HEALTH_INTERVAL = float(os.getenv('KAFKA_HEALTH_INTERVAL', '15'))
+KAFKA_HEALTH_TIMEOUT = float(os.getenv('KAFKA_HEALTH_TIMEOUT', '5'))
+KAFKA_HEALTH_FAILURES = int(os.getenv('KAFKA_HEALTH_FAILURES', '3'))
+# How long shutdown (SIGTERM) waits for in-flight events to be acknowledged
+KAFKA_DRAIN_TIMEOUT = float(os.getenv('KAFKA_DRAIN_TIMEOUT', '20'))
+
 # Gemini Configuration
 GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
+GEMINI_MODEL = os.getenv('GEMINI_MODEL', 'gemini-2.0-flash')
+
+# LLM provider: "gemini" (REST API), "stub" (deterministic, offline) or "none"
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'gemini' if GEMINI_API_KEY else 'none').lower()
+LLM_TIMEOUT_SECONDS = float(os.getenv('LLM_TIMEOUT_SECONDS', '30'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '4'))
+LLM_MAX_CONNECTIONS = int(os.getenv('LLM_MAX_CONNECTIONS', '10'))
+LLM_STREAMING = os.getenv('LLM_STREAMING', 'true').lower() == 'true'
+
+# Batched multi-window prompts: windows waiting in the summary topic are packed
+# into one prompt until the estimated prompt + output tokens reach the budget
+GEMINI_BATCH_ENABLED = os.getenv('GEMINI_BATCH_ENABLED', 'true').lower() == 'true'
+GEMINI_BATCH_MAX_SIZE = int(os.getenv('GEMINI_BATCH_MAX_SIZE', '10'))
+GEMINI_BATCH_TOKEN_BUDGET = int(os.getenv('GEMINI_BATCH_TOKEN_BUDGET', '6000'))
+GEMINI_BATCH_OUTPUT_TOKENS = int(os.getenv('GEMINI_BATCH_OUTPUT_TOKENS', '200'))
+
+# Persistent insight cache (SQLite) so insights survive restarts
+INSIGHT_CACHE_ENABLED = os.getenv('INSIGHT_CACHE_ENABLED', 'true').lower() == 'true'
+INSIGHT_CACHE_PATH = os.getenv('INSIGHT_CACHE_PATH', 'data/insights.db')
+INSIGHT_CACHE_MAX_ENTRIES = int(os.getenv('INSIGHT_CACHE_MAX_ENTRIES', '10000'))
+INSIGHT_CACHE_MEMORY_ENTRIES = int(os.getenv('INSIGHT_CACHE_MEMORY_ENTRIES', '1000'))
+
+# Near-duplicate insight index: summaries become vectors (log2-scaled counts and
+# error rate, status/trend one-hots, hashed top source) in a NumPy matrix, with
+# similarity 1 / (1 + Euclidean distance). A summary at or above the threshold
+# of an analysed one with the same status and top source reuses its insight
+# (plus a templated delta); the most similar past incidents go into prompts.
+INSIGHT_INDEX_ENABLED = os.getenv('INSIGHT_INDEX_ENABLED', 'true').lower() == 'true'
+INSIGHT_INDEX_CAPACITY = int(os.getenv('INSIGHT_INDEX_CAPACITY', '100000'))
+INSIGHT_INDEX_THRESHOLD = float(os.getenv('INSIGHT_INDEX_THRESHOLD', '0.75'))
+INSIGHT_INDEX_PROMPT_K = int(os.getenv('INSIGHT_INDEX_PROMPT_K', '3'))
+INSIGHT_INDEX_DELTA = os.getenv('INSIGHT_INDEX_DELTA', 'true').lower() == 'true'
+
+# Shared insights: LLM insights are published (idempotent producer) to the
+# compacted GEMINI_INSIGHTS_TOPIC keyed by window_start. Every replica reads the
+# topic into a local view and checks it before calling the LLM, so a window is
+# analysed once across the fleet. The topic is created at startup if missing.
+INSIGHT_TOPIC_ENABLED = os.getenv('INSIGHT_TOPIC_ENABLED', 'true').lower() == 'true'
+INSIGHT_TOPIC_PARTITIONS = int(os.getenv('INSIGHT_TOPIC_PARTITIONS', '1'))
+INSIGHT_TOPIC_MAX_ENTRIES = int(os.getenv('INSIGHT_TOPIC_MAX_ENTRIES', '10000'))
+# Name this replica reports as the author of the insights it publishes
+REPLICA_ID = os.getenv('REPLICA_ID', socket.gethostname())
 
 # Schema Registry Configuration (for Avro deserialization)
 SCHEMA_REGISTRY_URL = os.getenv('SCHEMA_REGISTRY_URL')
@@ -42,6 +110,173 @@ if SCHEMA_REGISTRY_URL:
 # Kafka Topics (can be overridden in .env)
 CLOUDEVENTS_TOPIC = os.getenv('KAFKA_EVENTS_TOPIC', 'cloudevents-stream')
 GEMINI_SUMMARY_TOPIC = os.getenv('GEMINI_SUMMARY_TOPIC', 'gemini-summary')
+GEMINI_INSIGHTS_TOPIC = os.getenv('GEMINI_INSIGHTS_TOPIC', 'gemini-insights')
+SYSTEM_HEALTH_TOPIC = os.getenv('SYSTEM_HEALTH_TOPIC', 'system_health_5min')
+TOP_ERROR_SOURCES_TOPIC = os.getenv('TOP_ERROR_SOURCES_TOPIC', 'top_error_sources_5min')
+CORRELATED_INCIDENTS_TOPIC = os.getenv('CORRELATED_INCIDENTS_TOPIC', 'correlated_incidents')
+
+# Where summaries come from: "flink" reads the gemini_summary topic (joined in
+# Flink); "join" reads the three upstream tables above and joins them here per
+# window, emitting one summary per window JOIN_GRACE_SECONDS after its health
+# row arrives. Unjoined state is dropped after JOIN_STATE_TTL_SECONDS and at
+# most JOIN_MAX_WINDOWS windows are held (the oldest is emitted early).
+SUMMARY_SOURCE = os.getenv('SUMMARY_SOURCE', 'flink').lower()
+JOIN_WINDOW_SECONDS = float(os.getenv('JOIN_WINDOW_SECONDS', '300'))
+JOIN_GRACE_SECONDS = float(os.getenv('JOIN_GRACE_SECONDS', '15'))
+JOIN_STATE_TTL_SECONDS = float(os.getenv('JOIN_STATE_TTL_SECONDS', '1800'))
+JOIN_MAX_WINDOWS = int(os.getenv('JOIN_MAX_WINDOWS', '64'))
+
+# Partition-parallel summary feed: messages go to CONSUMER_WORKERS async workers
+# by partition (a partition always lands on the same worker, so its order holds)
+# and offsets are committed manually, up to the last contiguously processed one,
+# every CONSUMER_COMMIT_INTERVAL seconds (at-least-once; a batch whose handler
+# fails is retried with backoff). In join mode the commit also stays behind rows of windows
+# not emitted yet. A partition with CONSUMER_MAX_IN_FLIGHT unprocessed messages
+# is paused until it catches up.
+CONSUMER_WORKERS = int(os.getenv('CONSUMER_WORKERS', '4'))
+CONSUMER_COMMIT_INTERVAL = float(os.getenv('CONSUMER_COMMIT_INTERVAL', '5'))
+CONSUMER_MAX_IN_FLIGHT = int(os.getenv('CONSUMER_MAX_IN_FLIGHT', '100'))
+
+# Durable local spool: events are appended to disk and drained to Kafka in the
+# background, so ingestion does not wait on the broker. Full spool -> HTTP 429.
+SPOOL_ENABLED = os.getenv('SPOOL_ENABLED', 'false').lower() == 'true'
+SPOOL_DIR = os.getenv('SPOOL_DIR', 'data/spool')
+SPOOL_MAX_BYTES = int(os.getenv('SPOOL_MAX_BYTES', str(256 * 1024 * 1024)))
+SPOOL_SEGMENT_BYTES = int(os.getenv('SPOOL_SEGMENT_BYTES', str(16 * 1024 * 1024)))
+SPOOL_BATCH_SIZE = int(os.getenv('SPOOL_BATCH_SIZE', '500'))
+SPOOL_FSYNC = os.getenv('SPOOL_FSYNC', 'false').lower() == 'true'
+# How long scenario runs wait for spool space before giving up on an event
+SPOOL_APPEND_TIMEOUT = float(os.getenv('SPOOL_APPEND_TIMEOUT', '30'))
+
+# Scenario scheduler: runs are tracked by run_id (GET/DELETE /api/scenario/{run_id})
+# and at most SCENARIO_MAX_CONCURRENT run at once (HTTP 429 beyond). Scripted
+# events are SCENARIO_EVENT_INTERVAL seconds apart in event time. ?speed=N
+# compresses time: events carry synthetic, correctly spaced times but are sent
+# N times faster (up to SCENARIO_MAX_SPEED), so an hour of events takes seconds.
+SCENARIO_MAX_CONCURRENT = int(os.getenv('SCENARIO_MAX_CONCURRENT', '4'))
+SCENARIO_MAX_SPEED = float(os.getenv('SCENARIO_MAX_SPEED', '3600'))
+SCENARIO_EVENT_INTERVAL = float(os.getenv('SCENARIO_EVENT_INTERVAL', '2'))
+# Finished runs kept for GET /api/scenario/{run_id}
+SCENARIO_HISTORY = int(os.getenv('SCENARIO_HISTORY', '50'))
+
+# Ingestion dedup on CloudEvent (source, id): retried webhooks and forwarders
+# resending the same event within the window are dropped before Kafka
+DEDUP_ENABLED = os.getenv('DEDUP_ENABLED', 'true').lower() == 'true'
+DEDUP_WINDOW_SECONDS = float(os.getenv('DEDUP_WINDOW_SECONDS', '600'))
+DEDUP_CAPACITY = int(os.getenv('DEDUP_CAPACITY', '200000'))
+DEDUP_ERROR_RATE = float(os.getenv('DEDUP_ERROR_RATE', '0.01'))
+DEDUP_LRU_SIZE = int(os.getenv('DEDUP_LRU_SIZE', '200000'))
+
+# Load shedding in front of the producer. critical/error events are never shed;
+# info events are sampled (kept events carry sample_weight = 1/rate). Above the
+# queue-depth or event-loop-lag threshold the sample rate is tightened and events
+# are also rate limited per (source, type); the weight of refused events rides on
+# the next admitted one in the same window, or after SHED_CARRY_FLUSH_SECONDS on
+# a zero-payload weight record. Loop lag only counts with LOOP_MONITOR_ENABLED.
+SHED_ENABLED = os.getenv('SHED_ENABLED', 'true').lower() == 'true'
+SHED_INFO_SAMPLE_RATE = float(os.getenv('SHED_INFO_SAMPLE_RATE', '1.0'))
+SHED_MIN_SAMPLE_RATE = float(os.getenv('SHED_MIN_SAMPLE_RATE', '0.05'))
+SHED_BUCKET_RATE = float(os.getenv('SHED_BUCKET_RATE', '50'))
+SHED_BUCKET_BURST = float(os.getenv('SHED_BUCKET_BURST', '200'))
+SHED_QUEUE_DEPTH_THRESHOLD = int(os.getenv('SHED_QUEUE_DEPTH_THRESHOLD', '10000'))
+SHED_LOOP_LAG_MS = float(os.getenv('SHED_LOOP_LAG_MS', '200'))
+SHED_CARRY_FLUSH_SECONDS = float(os.getenv('SHED_CARRY_FLUSH_SECONDS', '2'))
+
+# Event-loop monitor: scheduling lag probe plus a watchdog thread that samples
+# the loop's stack when a callback blocks it for longer than the threshold.
+# The sampling profiler (/debug/profile) is opt-in.
+LOOP_MONITOR_ENABLED = os.getenv('LOOP_MONITOR_ENABLED', 'true').lower() == 'true'
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+LOOP_SLOW_CALLBACK_MS = float(os.getenv('LOOP_SLOW_CALLBACK_MS', '100'))
+LOOP_SLOW_CALLBACK_HISTORY = int(os.getenv('LOOP_SLOW_CALLBACK_HISTORY', '50'))
+LOOP_PROFILER_ENABLED = os.getenv('LOOP_PROFILER_ENABLED', 'false').lower() == 'true'
+LOOP_PROFILER_MAX_SECONDS = float(os.getenv('LOOP_PROFILER_MAX_SECONDS', '60'))
+LOOP_PROFILER_HZ = float(os.getenv('LOOP_PROFILER_HZ', '100'))
+
+# Startup warm-up: clients are built in parallel in the lifespan hook instead
+# of at import time. Readiness waits at most STARTUP_WARMUP_TIMEOUT seconds;
+# slower steps keep running in the background.
+STARTUP_WARMUP_TIMEOUT = float(os.getenv('STARTUP_WARMUP_TIMEOUT', '5'))
+# Fetch cluster metadata at startup so the first produce skips the handshake
+STARTUP_KAFKA_WARMUP = os.getenv('STARTUP_KAFKA_WARMUP', 'true').lower() == 'true'
+
+# Time-series rollups of produced events for /api/timeseries: per resolution a
+# fixed ring of buckets (step seconds, slots) shared by up to
+# TIMESERIES_MAX_SERIES (source, severity) series. Memory is
+# max_series x total slots x 8 bytes (about 4.6MB with the defaults).
+TIMESERIES_ENABLED = os.getenv('TIMESERIES_ENABLED', 'true').lower() == 'true'
+TIMESERIES_MAX_SERIES = int(os.getenv('TIMESERIES_MAX_SERIES', '128'))
+TIMESERIES_RESOLUTIONS: Dict[str, tuple] = {
+    '10s': (10.0, int(os.getenv('TIMESERIES_10S_SLOTS', '360'))),    # 1 hour
+    '1m': (60.0, int(os.getenv('TIMESERIES_1M_SLOTS', '1440'))),     # 24 hours
+    '5m': (300.0, int(os.getenv('TIMESERIES_5M_SLOTS', '2016'))),    # 7 days
+    '1h': (3600.0, int(os.getenv('TIMESERIES_1H_SLOTS', '720'))),    # 30 days
+}
+
+# Heavy hitters: top error/critical subjects, types and sources with
+# Space-Saving summaries per pane (bounded memory whatever the cardinality).
+# Retention must cover a summary window plus the Flink output delay for the
+# per-window top offenders to reach the insight prompt.
+HEAVY_HITTERS_ENABLED = os.getenv('HEAVY_HITTERS_ENABLED', 'true').lower() == 'true'
+HEAVY_HITTERS_CAPACITY = int(os.getenv('HEAVY_HITTERS_CAPACITY', '64'))
+HEAVY_HITTERS_PANE_SECONDS = float(os.getenv('HEAVY_HITTERS_PANE_SECONDS', '60'))
+HEAVY_HITTERS_RETENTION_SECONDS = float(os.getenv('HEAVY_HITTERS_RETENTION_SECONDS', '1800'))
+# Top offenders per dimension added to LLM prompts (0 disables)
+HEAVY_HITTERS_PROMPT_K = int(os.getenv('HEAVY_HITTERS_PROMPT_K', '3'))
+
+# Per-window sketches (HyperLogLog distinct counts of types, subjects and
+# correlation ids plus a reservoir of sample subjects), aligned with the Flink
+# 5-minute windows. Constant memory per window and source at any event rate;
+# HLL standard error is about 1.04 / sqrt(2^precision).
+SKETCH_ENABLED = os.getenv('SKETCH_ENABLED', 'true').lower() == 'true'
+SKETCH_WINDOW_SECONDS = float(os.getenv('SKETCH_WINDOW_SECONDS', '300'))
+SKETCH_RETAINED_WINDOWS = int(os.getenv('SKETCH_RETAINED_WINDOWS', '12'))
+SKETCH_HLL_PRECISION = int(os.getenv('SKETCH_HLL_PRECISION', '12'))
+SKETCH_RESERVOIR_SIZE = int(os.getenv('SKETCH_RESERVOIR_SIZE', '20'))
+
+# Live system health: the 03_system_health_5min classification over a
+# LIVE_HEALTH_WINDOW_SECONDS window hopping every LIVE_HEALTH_SLIDE_SECONDS
+# (which must divide the window), summed from one pane per slide. Re-evaluated
+# at each slide and at once on error/critical events; status changes are
+# pushed to WebSocket clients as `health_changed` frames.
+LIVE_HEALTH_ENABLED = os.getenv('LIVE_HEALTH_ENABLED', 'true').lower() == 'true'
+LIVE_HEALTH_WINDOW_SECONDS = float(os.getenv('LIVE_HEALTH_WINDOW_SECONDS', '300'))
+LIVE_HEALTH_SLIDE_SECONDS = float(os.getenv('LIVE_HEALTH_SLIDE_SECONDS', '10'))
+
+# WebSocket resume: broadcast frames carry a sequence number and the last
+# WS_REPLAY_BUFFER frames are kept. A client reconnecting with ?since=<seq>
+# gets the missed frames in one batch; if they are no longer buffered it gets
+# a snapshot of the last WS_SNAPSHOT_EVENTS events and WS_SNAPSHOT_ALERTS alerts.
+WS_REPLAY_BUFFER = int(os.getenv('WS_REPLAY_BUFFER', '1000'))
+WS_SNAPSHOT_EVENTS = int(os.getenv('WS_SNAPSHOT_EVENTS', '50'))
+WS_SNAPSHOT_ALERTS = int(os.getenv('WS_SNAPSHOT_ALERTS', '10'))
+
+# Live tail of cloudevents-stream: every partition is read from its end (no
+# consumer group, so each replica sees all producers), decoded in batches with
+# the schemaless Avro reader and broadcast as one coalesced `events_tailed`
+# frame every EVENT_TAIL_FLUSH_MS with the newest EVENT_TAIL_FRAME_EVENTS events
+# and severity counts of all. Events produced by this process are skipped (the
+# last EVENT_TAIL_LOCAL_IDS ids are remembered); they were already broadcast.
+EVENT_TAIL_ENABLED = os.getenv('EVENT_TAIL_ENABLED', 'false').lower() == 'true'
+EVENT_TAIL_BATCH_SIZE = int(os.getenv('EVENT_TAIL_BATCH_SIZE', '5000'))
+EVENT_TAIL_FLUSH_MS = float(os.getenv('EVENT_TAIL_FLUSH_MS', '250'))
+EVENT_TAIL_FRAME_EVENTS = int(os.getenv('EVENT_TAIL_FRAME_EVENTS', '50'))
+EVENT_TAIL_LOCAL_IDS = int(os.getenv('EVENT_TAIL_LOCAL_IDS', '100000'))
+
+# Pipeline latency thresholds (milliseconds) above which a stage is flagged as slow.
+# flink_output / end_to_end are measured from window_end, so they include the
+# watermark delay and Flink processing time.
+SLOW_STAGE_THRESHOLDS_MS: Dict[str, float] = {
+    'produce_ack': float(os.getenv('SLOW_PRODUCE_ACK_MS', '500')),
+    'flink_output': float(os.getenv('SLOW_FLINK_OUTPUT_MS', '60000')),
+    'deserialize': float(os.getenv('SLOW_DESERIALIZE_MS', '50')),
+    'gemini': float(os.getenv('SLOW_GEMINI_MS', '10000')),
+    'socket_send': float(os.getenv('SLOW_SOCKET_SEND_MS', '100')),
+    'end_to_end': float(os.getenv('SLOW_END_TO_END_MS', '90000')),
+}
+
+# How often (seconds) consumers compare their position with the high watermarks
+CONSUMER_LAG_CHECK_INTERVAL = float(os.getenv('CONSUMER_LAG_CHECK_INTERVAL', '15'))
 
 # Event Templates
 EVENT_TEMPLATES = {
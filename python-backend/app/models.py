@@ -1,8 +1,13 @@
 # app/models.py
 """
-Pydantic models for EventStream Intelligence
+Pydantic request/response models and the internal CloudEvent type
 """
 
+import json
+import sys
+import time as _time
+import uuid
+from datetime import datetime, timezone
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 
@@ -16,6 +21,14 @@ class EventSimulation(BaseModel):
     category: str  # cicd, infrastructure, alert, incident
     correlation_id: Optional[str] = None
     data: Optional[Dict[str, Any]] = None
+    id: Optional[str] = None  # CloudEvent id; resends with the same id are deduplicated
+
+
+class SketchMerge(BaseModel):
+    """A window sketch exported by another worker (GET /api/windows?export=true)"""
+    window_start: float  # epoch seconds
+    source: str
+    sketch: Dict[str, Any]
 
 
 class SimulationScenario(BaseModel):
@@ -46,3 +59,173 @@ class StatsResponse(BaseModel):
     gemini_available: bool
     kafka_configured: bool
     timestamp: str
+
+
+# CloudEvent attributes, in Avro schema order
+CLOUDEVENT_FIELDS = (
+    'id', 'source', 'type', 'time', 'subject', 'severity', 'category',
+    'correlation_id', 'data', 'sample_weight',
+)
+
+
+# Shared payload of simulated events without data (never mutated)
+SIMULATED_DATA: Dict[str, Any] = {"simulated": True}
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    # Low-cardinality attributes share one string object across all events
+    return sys.intern(value) if value is not None else None
+
+
+def _parse_time(value: str) -> Optional[float]:
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except (AttributeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+class CloudEvent:
+    """The one in-process representation of an event, built once at the edge.
+
+    Slotted (no per-instance dict) and with source, type, severity and
+    category interned, so a large backlog of events shares those strings.
+    `epoch` is the parsed `time`, so consumers never re-parse the ISO
+    string; for events created here the ISO string is only formatted when
+    it is serialized. Passed by reference to dedup, shedding, produce, the spool and
+    the in-memory aggregations; `get`/`[]` keep those dict-compatible.
+    """
+
+    __slots__ = tuple(f for f in CLOUDEVENT_FIELDS if f != 'time') + ('epoch', '_time')
+
+    specversion = "1.0"
+    datacontenttype = "application/json"
+
+    def __init__(
+        self,
+        id: str,
+        source: str,
+        type: str,
+        time: Optional[str] = None,
+        subject: Optional[str] = None,
+        severity: Optional[str] = None,
+        category: Optional[str] = None,
+        correlation_id: Optional[str] = None,
+        data: Any = None,
+        sample_weight: float = 1.0,
+    ):
+        self.id = id
+        self.source = _intern(source)
+        self.type = _intern(type)
+        self.subject = subject
+        self.severity = _intern(severity.lower()) if severity is not None else None
+        self.category = _intern(category)
+        self.correlation_id = correlation_id
+        self.data = data
+        self.sample_weight = sample_weight
+        self._time = time
+        self.epoch = _time.time() if time is None else _parse_time(time)
+
+    @property
+    def time(self) -> str:
+        """RFC 3339 timestamp as sent to Kafka"""
+        if self._time is None:
+            return datetime.fromtimestamp(self.epoch, tz=timezone.utc).replace(tzinfo=None).isoformat() + "Z"
+        return self._time
+
+    @classmethod
+    def create(
+        cls,
+        source: str,
+        type: str,
+        subject: Optional[str],
+        severity: str,
+        category: Optional[str] = "other",
+        correlation_id: Optional[str] = None,
+        data: Any = None,
+        id: Optional[str] = None,
+        epoch: Optional[float] = None,
+    ) -> "CloudEvent":
+        """New demo event from a short source name (e.g. "github"), timestamped now or at `epoch`"""
+        event = cls(
+            id=id or str(uuid.uuid4()),
+            source=f"https://{source}.com/demo",
+            type=type,
+            subject=subject,
+            severity=severity,
+            category=category,
+            correlation_id=correlation_id,
+            data=data,
+        )
+        if epoch is not None:
+            event.epoch = epoch
+        return event
+
+    @classmethod
+    def from_simulation(cls, event: "EventSimulation") -> "CloudEvent":
+        """Build from a validated /api/simulate request"""
+        return cls.create(
+            source=event.source,
+            type=event.event_type,
+            subject=event.subject,
+            severity=event.severity,
+            category=event.category,
+            correlation_id=event.correlation_id,
+            data=event.data or SIMULATED_DATA,
+            id=event.id,
+        )
+
+    @classmethod
+    def from_dict(cls, event: Dict[str, Any]) -> "CloudEvent":
+        """Build from a CloudEvent dict (extra attributes are ignored)"""
+        return cls(**{name: event[name] for name in CLOUDEVENT_FIELDS if name in event})
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return getattr(self, name) if name in _ATTRIBUTES else default
+
+    def __getitem__(self, name: str) -> Any:
+        if name in _ATTRIBUTES:
+            return getattr(self, name)
+        raise KeyError(name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict (WebSocket broadcast, API responses)"""
+        return {
+            "specversion": self.specversion,
+            "id": self.id,
+            "type": self.type,
+            "source": self.source,
+            "time": self.time,
+            "subject": self.subject,
+            "severity": self.severity,
+            "category": self.category,
+            "correlation_id": self.correlation_id,
+            "data": self.data,
+            "sample_weight": self.sample_weight,
+        }
+
+    def to_avro(self) -> Dict[str, Any]:
+        """Record matching schemas/cloudevent.avsc (data as a JSON string)"""
+        data = self.data
+        return {
+            "specversion": self.specversion,
+            "type": self.type,
+            "source": self.source,
+            "id": self.id,
+            "time": self.time,
+            "datacontenttype": self.datacontenttype,
+            "subject": self.subject,
+            "data": json.dumps(data) if isinstance(data, dict) else data,
+            "severity": self.severity,
+            "category": self.category,
+            "correlation_id": self.correlation_id,
+            "sample_weight": float(self.sample_weight),
+        }
+
+    def __repr__(self) -> str:
+        return f"CloudEvent(id={self.id!r}, source={self.source!r}, type={self.type!r}, severity={self.severity!r})"
+
+
+_ATTRIBUTES = frozenset(CLOUDEVENT_FIELDS) | {'epoch', 'specversion', 'datacontenttype'}
@@ -6,5 +6,7 @@ Routes package for EventStream Intelligence
 from .events import router as events_router
 from .health import router as health_router
 from .websocket import router as websocket_router
+from .debug import router as debug_router
+from .analytics import router as analytics_router
 
-__all__ = ['events_router', 'health_router', 'websocket_router']
+__all__ = ['events_router', 'health_router', 'websocket_router', 'debug_router', 'analytics_router']
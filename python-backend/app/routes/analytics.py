@@ -0,0 +1,139 @@
+# app/routes/analytics.py
+"""
+Historical analytics endpoints backed by in-memory rollups
+"""
+
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+
+from ..config import TIMESERIES_ENABLED, HEAVY_HITTERS_ENABLED, SKETCH_ENABLED, LIVE_HEALTH_ENABLED
+from ..models import SketchMerge
+from ..services.timeseries import timeseries_store, parse_duration
+from ..services.heavy_hitters import heavy_hitters, DIMENSIONS, TRACKED_SEVERITIES
+from ..services.sketches import window_sketches
+from ..services.live_health import live_health
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+
+@router.get("/api/timeseries")
+async def get_timeseries(
+    source: Optional[str] = None,
+    severity: Optional[str] = None,
+    resolution: Optional[str] = None,
+    range_: str = Query("1h", alias="range"),
+    by: str = "source",
+):
+    """Event counts per bucket for charts that survive a page reload.
+
+    Args:
+        source: Only count this CloudEvent source
+        severity: Only count this severity
+        resolution: 10s, 1m, 5m or 1h (default: finest covering the range)
+        range: How far back to go, e.g. 15m, 24h, 7d (default 1h)
+        by: One series per "source" (default) or per "severity"
+    """
+    if not TIMESERIES_ENABLED:
+        raise HTTPException(status_code=404, detail="Time-series rollups disabled (TIMESERIES_ENABLED=false)")
+    try:
+        range_seconds = parse_duration(range_)
+        return timeseries_store.query(range_seconds, resolution, source, severity, by)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/api/timeseries/series")
+async def get_timeseries_series():
+    """Tracked (source, severity) pairs and store footprint"""
+    return {**timeseries_store.stats(), "tracked": timeseries_store.series()}
+
+
+@router.get("/api/top")
+async def get_top(dimension: str = "subject", k: int = Query(10, ge=1), window: str = "5m"):
+    """Heaviest error/critical subjects, event types or sources right now.
+
+    Args:
+        dimension: subject (default), type or source
+        k: Number of entries (at most HEAVY_HITTERS_CAPACITY)
+        window: Sliding window, e.g. 1m, 5m, 30m (default 5m)
+
+    `count` may overestimate by up to count - min_count; `min_count` is a
+    guaranteed lower bound.
+    """
+    if not HEAVY_HITTERS_ENABLED:
+        raise HTTPException(status_code=404, detail="Heavy hitters disabled (HEAVY_HITTERS_ENABLED=false)")
+    if dimension not in DIMENSIONS:
+        raise HTTPException(status_code=400, detail=f"dimension must be one of {', '.join(DIMENSIONS)}")
+    if k > heavy_hitters.capacity:
+        raise HTTPException(status_code=400, detail=f"k must be <= {heavy_hitters.capacity}")
+    try:
+        window_seconds = parse_duration(window)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if window_seconds > heavy_hitters.retention_seconds:
+        raise HTTPException(
+            status_code=400, detail=f"window must be <= {heavy_hitters.retention_seconds:g}s"
+        )
+    return {
+        "dimension": dimension,
+        "k": k,
+        "window_seconds": window_seconds,
+        "severities": sorted(TRACKED_SEVERITIES),
+        "top": heavy_hitters.recent(dimension, k, window_seconds),
+    }
+
+
+def _require_sketches() -> None:
+    if not SKETCH_ENABLED:
+        raise HTTPException(status_code=404, detail="Window sketches disabled (SKETCH_ENABLED=false)")
+
+
+@router.get("/api/windows")
+async def get_windows(
+    limit: int = Query(1, ge=1),
+    source: Optional[str] = None,
+    combine: bool = False,
+    export: bool = False,
+):
+    """Approximate distinct counts and sample subjects per 5-minute window.
+
+    Args:
+        limit: Number of most recent windows (default 1)
+        source: Only this CloudEvent source (default: all sources merged)
+        combine: Merge the selected windows into one entry
+        export: Include the serialized per-source sketches for merging elsewhere
+    """
+    _require_sketches()
+    return {"sketch": window_sketches.stats(), "windows": window_sketches.windows(limit, source, export, combine)}
+
+
+@router.post("/api/windows/merge")
+async def merge_window_sketch(merge: SketchMerge):
+    """Fold a sketch exported by another worker into the matching window"""
+    _require_sketches()
+    try:
+        merged = window_sketches.merge_in(merge.window_start, merge.source, merge.sketch)
+    except (KeyError, ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid sketch: {e}")
+    if not merged:
+        raise HTTPException(status_code=410, detail="Window has already expired")
+    return {"status": "merged", "window_start": merge.window_start, "source": merge.source}
+
+
+@router.get("/api/health/live")
+async def get_live_health():
+    """System health over the last LIVE_HEALTH_WINDOW_SECONDS, updated every slide.
+
+    Same fields and thresholds as the Flink system_health_5min rows, plus
+    the most recent status changes.
+    """
+    if not LIVE_HEALTH_ENABLED:
+        raise HTTPException(status_code=404, detail="Live health disabled (LIVE_HEALTH_ENABLED=false)")
+    return {
+        **live_health.stats(),
+        "health": live_health.evaluate(),
+        "recent_transitions": list(reversed(live_health.transitions)),
+    }
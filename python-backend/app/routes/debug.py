@@ -0,0 +1,45 @@
+# app/routes/debug.py
+"""
+Runtime diagnostics: event-loop health and the sampling profiler
+"""
+
+import asyncio
+import logging
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..config import LOOP_PROFILER_ENABLED, LOOP_PROFILER_MAX_SECONDS, LOOP_PROFILER_HZ
+from ..services.loop_monitor import loop_monitor, sample_profile, format_folded
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Only one profile at a time: concurrent samplers would skew each other
+_profile_lock = asyncio.Lock()
+
+
+@router.get("/debug/loop")
+async def get_loop_health():
+    """Event-loop lag distribution and recent slow callbacks with stacks"""
+    return loop_monitor.snapshot()
+
+
+@router.get("/debug/profile", response_class=PlainTextResponse)
+async def get_profile(seconds: float = Query(10.0, gt=0)):
+    """Sample all threads for `seconds` and return folded stacks.
+
+    The output feeds straight into flamegraph.pl or speedscope. Disabled
+    unless LOOP_PROFILER_ENABLED is set.
+    """
+    if not LOOP_PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler disabled (set LOOP_PROFILER_ENABLED=true)")
+    if seconds > LOOP_PROFILER_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be <= {LOOP_PROFILER_MAX_SECONDS:g}")
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already being captured")
+
+    async with _profile_lock:
+        logger.info(f"Capturing {seconds:g}s profile at {LOOP_PROFILER_HZ:g} Hz")
+        folded = await asyncio.to_thread(sample_profile, seconds, LOOP_PROFILER_HZ)
+    return PlainTextResponse(format_folded(folded))
@@ -3,23 +3,108 @@
 Event simulation and scenario endpoints
 """
 
-import uuid
 import json
 import asyncio
 import logging
-from datetime import datetime
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 
-from ..config import EVENT_TEMPLATES, SCENARIOS
-from ..models import EventSimulation
+from ..config import (
+    EVENT_TEMPLATES, SCENARIOS, SPOOL_ENABLED, DEDUP_ENABLED, SHED_ENABLED, TIMESERIES_ENABLED,
+    HEAVY_HITTERS_ENABLED, SKETCH_ENABLED, EVENT_TAIL_ENABLED, LIVE_HEALTH_ENABLED,
+)
+from ..models import EventSimulation, CloudEvent
 from ..services.websocket_manager import manager
 from ..services.kafka_service import kafka_producer
+from ..services.spool import event_spool, SpoolFullError
+from ..services.dedup import event_deduplicator
+from ..services.load_shedding import load_shedder
+from ..services.timeseries import timeseries_store
+from ..services.heavy_hitters import heavy_hitters
+from ..services.sketches import window_sketches
+from ..services.event_tail import event_tail
+from ..services.live_health import live_health
+from ..services.scenario_scheduler import scenario_scheduler, SchedulerFullError
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+async def publish_event(cloud_event: CloudEvent, wait: bool = False) -> str:
+    """Hand an event to the spool (or straight to Kafka) and broadcast it.
+    
+    Returns "success", or without publishing "duplicate" when the
+    (source, id) pair was already accepted within the dedup window and
+    "shed" when the load shedder dropped it. Admitted events carry their
+    `sample_weight`. With the spool enabled a full spool raises
+    SpoolFullError, or with `wait` blocks until the background sender has
+    freed space.
+    """
+    # Reserve the (source, id) before any await, so concurrent copies of a
+    # retried event cannot both get through
+    if DEDUP_ENABLED and event_deduplicator.check_and_record(cloud_event.source, cloud_event.id):
+        logger.info(f"Duplicate event ignored: {cloud_event.id} from {cloud_event.source}")
+        return "duplicate"
+    
+    try:
+        if SHED_ENABLED:
+            decision = load_shedder.decide(cloud_event)
+            if not decision.admit:
+                logger.debug(f"Event shed ({decision.reason}): {cloud_event.type} from {cloud_event.source}")
+                if DEDUP_ENABLED:
+                    event_deduplicator.release(cloud_event.source, cloud_event.id)
+                return "shed"
+            cloud_event.sample_weight = decision.sample_weight
+        
+        if EVENT_TAIL_ENABLED:
+            # Broadcast below as event_sent; the topic tail must not repeat it
+            event_tail.remember_local(cloud_event.id)
+        
+        if SPOOL_ENABLED:
+            if wait:
+                await event_spool.append_wait(cloud_event)
+            else:
+                event_spool.append(cloud_event)
+        else:
+            kafka_producer.produce_event(cloud_event)
+    except BaseException:
+        # Not accepted: a client retrying after a 429/500 is not a duplicate
+        if DEDUP_ENABLED:
+            event_deduplicator.release(cloud_event.source, cloud_event.id)
+        raise
+    
+    record_rollups(cloud_event)
+    
+    # Broadcast to WebSocket clients
+    await manager.broadcast({
+        "type": "event_sent",
+        "event": cloud_event.to_dict()
+    })
+    return "success"
+
+
+def record_rollups(cloud_event: CloudEvent) -> None:
+    """Count a published event in the local (sample_weight-weighted) rollups"""
+    if TIMESERIES_ENABLED:
+        timeseries_store.record(cloud_event)
+    if HEAVY_HITTERS_ENABLED:
+        heavy_hitters.record(cloud_event)
+    if SKETCH_ENABLED:
+        window_sketches.record(cloud_event)
+    if LIVE_HEALTH_ENABLED:
+        live_health.record(cloud_event)
+
+
+def publish_weight_record(record: CloudEvent) -> None:
+    """Publish a load shedder weight record (no dedup, shedding or broadcast);
+    it is counted in the local rollups like the events it stands for"""
+    if SPOOL_ENABLED:
+        event_spool.append(record)
+    else:
+        kafka_producer.produce_event(record)
+    record_rollups(record)
+
+
 @router.get("/api/templates")
 async def get_templates():
     """Get available event templates"""
@@ -34,99 +119,95 @@ async def get_templates():
 async def simulate_event(event: EventSimulation):
     """Simulate a single event"""
     try:
-        # Create CloudEvent
-        cloud_event = {
-            "specversion": "1.0",
-            "id": str(uuid.uuid4()),
-            "type": event.event_type,
-            "source": f"https://{event.source}.com/demo",
-            "time": datetime.utcnow().isoformat() + "Z",
-            "subject": event.subject,
-            "severity": event.severity,
-            "category": event.category,
-            "correlation_id": event.correlation_id,
-            "data": event.data or {"simulated": True}
-        }
-        
-        # Send to Kafka
-        kafka_producer.produce_event(cloud_event)
+        cloud_event = CloudEvent.from_simulation(event)
         
-        # Broadcast to WebSocket clients
-        await manager.broadcast({
-            "type": "event_sent",
-            "event": cloud_event
-        })
+        status = await publish_event(cloud_event)
+        if status == "duplicate":
+            return {
+                "status": "duplicate",
+                "event_id": cloud_event.id,
+                "message": "Event already received; not sent again"
+            }
+        if status == "shed":
+            return {
+                "status": "shed",
+                "event_id": cloud_event.id,
+                "message": "Event dropped by load shedding; counted via sampled events"
+            }
         
         logger.info(f"Simulated event: {event.event_type} from {event.source}")
         
         return {
             "status": "success",
-            "event_id": cloud_event['id'],
+            "event_id": cloud_event.id,
             "message": "Event sent to Kafka topic: cloudevents-stream"
         }
     
+    except SpoolFullError as e:
+        logger.warning(f"Rejecting event, spool full: {e}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         logger.error(f"Error simulating event: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/api/scenario/{scenario_name}")
-async def run_scenario(scenario_name: str):
-    """Run a predefined scenario"""
+async def run_scenario(
+    scenario_name: str,
+    speed: float = Query(1.0, gt=0),
+):
+    """Run a predefined scenario in the background.
+    
+    Args:
+        speed: Time compression; events keep their event-time spacing but are sent speed times faster
+    """
     if scenario_name not in SCENARIOS:
         raise HTTPException(status_code=404, detail=f"Scenario '{scenario_name}' not found")
     
     scenario = SCENARIOS[scenario_name]
     
-    # Start scenario in background
-    asyncio.create_task(execute_scenario(scenario_name, scenario))
+    try:
+        run = scenario_scheduler.submit(
+            scenario_name, scenario, publish_event, speed=speed,
+        )
+    except SchedulerFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "5"})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "status": "started",
         "scenario": scenario_name,
+        "run_id": run.run_id,
         "description": scenario["description"],
-        "message": f"Scenario '{scenario['name']}' is running"
+        "message": f"Scenario '{scenario['name']}' is running",
+        "total_events": len(run.plan),
+        "speed": run.speed,
     }
 
 
-async def execute_scenario(scenario_name: str, scenario: dict):
-    """Execute scenario events"""
-    try:
-        await manager.broadcast({
-            "type": "scenario_started",
-            "scenario": scenario_name,
-            "name": scenario["name"]
-        })
-        
-        if "events" in scenario:
-            # Predefined sequence of events
-            for event in scenario["events"]:
-                cloud_event = {
-                    "specversion": "1.0",
-                    "id": str(uuid.uuid4()),
-                    "type": event["type"],
-                    "source": f"https://{event['source']}.com/demo",
-                    "time": datetime.utcnow().isoformat() + "Z",
-                    "subject": event["subject"],
-                    "severity": event["severity"],
-                    "category": event.get("category", "other"),
-                    "correlation_id": event.get("correlation_id"),
-                    "data": {"simulated": True, "scenario": scenario_name}
-                }
-                
-                kafka_producer.produce_event(cloud_event)
-                
-                await manager.broadcast({
-                    "type": "event_sent",
-                    "event": cloud_event
-                })
-                
-                await asyncio.sleep(2)  # 2 seconds between events
-        
-        await manager.broadcast({
-            "type": "scenario_completed",
-            "scenario": scenario_name
-        })
-        
-    except Exception as e:
-        logger.error(f"Error executing scenario: {e}")
+@router.get("/api/scenarios")
+async def list_scenario_runs():
+    """Running and recently finished scenario runs"""
+    return {**scenario_scheduler.stats(), "runs": scenario_scheduler.runs()}
+
+
+@router.get("/api/scenario/{run_id}")
+async def get_scenario_run(run_id: str):
+    """Progress of a scenario run"""
+    run = scenario_scheduler.get(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Scenario run '{run_id}' not found")
+    return run.to_dict()
+
+
+@router.delete("/api/scenario/{run_id}")
+async def cancel_scenario_run(run_id: str):
+    """Cancel a running scenario; events already sent stay sent"""
+    run = scenario_scheduler.cancel(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Scenario run '{run_id}' not found")
+    if run.task is not None and not run.task.done():
+        # Let the run record its cancellation before reporting it
+        await asyncio.wait([run.task], timeout=1.0)
+    return run.to_dict()
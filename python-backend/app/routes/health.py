@@ -3,15 +3,37 @@
 Health and status endpoints
 """
 
+import asyncio
 import logging
 from datetime import datetime
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from typing import List
 
-from ..config import KAFKA_CONFIG, GEMINI_SUMMARY_TOPIC
+from ..config import (
+    KAFKA_CONFIG, GEMINI_SUMMARY_TOPIC, INSIGHT_CACHE_ENABLED, INSIGHT_TOPIC_ENABLED, SPOOL_ENABLED, DEDUP_ENABLED,
+    SHED_ENABLED, TIMESERIES_ENABLED, HEAVY_HITTERS_ENABLED, SKETCH_ENABLED, SUMMARY_SOURCE,
+    EVENT_TAIL_ENABLED, LIVE_HEALTH_ENABLED,
+)
 from ..services.websocket_manager import manager
 from ..services.ai_service import gemini_service
-from ..services.kafka_service import KafkaConsumerService
+from ..services.kafka_pool import kafka_pool
+from ..services.metrics import pipeline_metrics
+from ..services.insight_pipeline import insight_pipeline
+from ..services.insight_cache import insight_cache
+from ..services.insight_topic import shared_insights
+from ..services.spool import event_spool
+from ..services.dedup import event_deduplicator
+from ..services.load_shedding import load_shedder
+from ..services.loop_monitor import loop_monitor
+from ..services.timeseries import timeseries_store
+from ..services.heavy_hitters import heavy_hitters
+from ..services.sketches import window_sketches
+from ..services.summary_join import summary_joiner
+from ..services.partition_workers import summary_workers
+from ..services.event_tail import event_tail
+from ..services.scenario_scheduler import scenario_scheduler
+from ..services.live_health import live_health
 
 logger = logging.getLogger(__name__)
 
@@ -27,13 +49,29 @@ async def root():
         "endpoints": {
             "simulate": "/api/simulate",
             "scenario": "/api/scenario/{name}",
+            "scenario_runs": "/api/scenarios",
             "templates": "/api/templates",
             "summaries": "/api/summaries",
+            "metrics": "/api/metrics",
+            "timeseries": "/api/timeseries",
+            "top": "/api/top",
+            "windows": "/api/windows",
+            "ready": "/ready",
+            "loop": "/debug/loop",
             "websocket": "/ws"
         }
     }
 
 
+@router.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once Kafka metadata is reachable, 503 otherwise or while draining"""
+    status = kafka_pool.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+
 @router.get("/api/stats")
 async def get_stats():
     """Get current statistics"""
@@ -45,6 +83,45 @@ async def get_stats():
     }
 
 
+@router.get("/api/metrics")
+async def get_metrics():
+    """Pipeline stage latency histograms, slow-stage flags and consumer lag"""
+    return {
+        **pipeline_metrics.snapshot(),
+        "insights": insight_pipeline.stats(),
+        "spool": event_spool.stats() if SPOOL_ENABLED else None,
+        "dedup": event_deduplicator.stats() if DEDUP_ENABLED else None,
+        "shedding": load_shedder.stats() if SHED_ENABLED else None,
+        "loop": loop_monitor.stats(),
+        "timeseries": timeseries_store.stats() if TIMESERIES_ENABLED else None,
+        "heavy_hitters": heavy_hitters.stats() if HEAVY_HITTERS_ENABLED else None,
+        "sketches": window_sketches.stats() if SKETCH_ENABLED else None,
+        "summary_join": summary_joiner.stats() if SUMMARY_SOURCE == 'join' else None,
+        "websocket": manager.stats(),
+        "summary_workers": summary_workers.stats(),
+        "event_tail": event_tail.stats() if EVENT_TAIL_ENABLED else None,
+        "scenarios": scenario_scheduler.stats(),
+        "live_health": live_health.stats() if LIVE_HEALTH_ENABLED else None,
+        "kafka": kafka_pool.status(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
+
+async def _read_summaries(limit: int) -> List[dict]:
+    """Latest records of the gemini_summary topic"""
+    summaries: List[dict] = []
+    async with kafka_pool.reader() as reader:
+        messages = await asyncio.to_thread(reader.read_latest, GEMINI_SUMMARY_TOPIC, limit)
+        messages.sort(key=lambda msg: msg.timestamp()[1])
+        for msg in messages[-limit:]:
+            record = reader.deserialize_message(msg)
+            if record:
+                record['_offset'] = msg.offset()
+                record['_partition'] = msg.partition()
+                summaries.append(record)
+    return summaries
+
+
 @router.get("/api/summaries")
 async def get_summaries(limit: int = 5):
     """Fetch latest Gemini summaries from Kafka topic.
@@ -55,41 +132,20 @@ async def get_summaries(limit: int = 5):
     summaries: List[dict] = []
     
     try:
-        # Create consumer that reads from beginning
-        consumer = KafkaConsumerService(
-            group_id='api-summary-reader',
-            read_from_beginning=True
-        )
-        
         logger.info(f"Fetching up to {limit} summaries from {GEMINI_SUMMARY_TOPIC}")
         
-        # Poll for messages (with timeout)
-        poll_count = 0
-        max_polls = 20  # Max ~20 seconds of polling
-        
-        while len(summaries) < limit and poll_count < max_polls:
-            msg = consumer.poll(timeout=1.0)
-            poll_count += 1
-            
-            if msg is None:
-                # If we have some messages and no more coming, break
-                if summaries and poll_count > 5:
-                    break
-                continue
-            
-            if msg.error():
-                logger.warning(f"Consumer error: {msg.error()}")
-                continue
-            
-            # Deserialize message
-            record = consumer.deserialize_message(msg)
-            if record:
-                record['_offset'] = msg.offset()
-                record['_partition'] = msg.partition()
-                summaries.append(record)
-                logger.info(f"Got summary {len(summaries)}: offset {msg.offset()}")
+        if SUMMARY_SOURCE == 'join':
+            # No gemini_summary topic: the windows this replica joined recently
+            summaries = summary_joiner.recent(limit)
+        else:
+            # Pooled reader: direct partition assignment, no group join per request
+            summaries = await _read_summaries(limit)
         
-        consumer.close()
+        # Join with insights generated earlier (survives restarts) or by other replicas
+        if INSIGHT_CACHE_ENABLED:
+            await asyncio.to_thread(insight_cache.join, summaries)
+        if INSIGHT_TOPIC_ENABLED:
+            shared_insights.join(summaries)
         
         return {
             "topic": GEMINI_SUMMARY_TOPIC,
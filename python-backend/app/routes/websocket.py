@@ -6,25 +6,60 @@ WebSocket endpoint for real-time updates
 import json
 import asyncio
 import logging
+from typing import Optional
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
+from ..config import GEMINI_BATCH_ENABLED, SUMMARY_SOURCE
 from ..services.websocket_manager import manager
 from ..services.kafka_service import KafkaConsumerService
-from ..services.ai_service import gemini_service
+from ..services.kafka_pool import kafka_pool, PoolDrainingError
+from ..services.ai_service import group_by_window
+from ..services.insight_pipeline import insight_pipeline
+from ..services.metrics import pipeline_metrics
+from ..services.summary_join import summary_joiner
+from ..services.partition_workers import summary_workers
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+# Shared summary feed: one consumer for all clients, results are broadcast
+_feed_task: Optional[asyncio.Task] = None
+
+
+def ensure_summary_feed() -> None:
+    """Start the shared summary feed unless it is already running"""
+    global _feed_task
+    if _feed_task is None or _feed_task.done():
+        _feed_task = asyncio.create_task(consume_gemini_summaries())
+
+
+async def stop_summary_feed() -> None:
+    """Stop the shared summary feed (application shutdown)"""
+    global _feed_task
+    if _feed_task is not None:
+        _feed_task.cancel()
+        try:
+            await _feed_task
+        except asyncio.CancelledError:
+            pass
+        _feed_task = None
+
+
 @router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket for real-time updates"""
-    await manager.connect(websocket)
+async def websocket_endpoint(websocket: WebSocket, since: Optional[int] = None, stream: Optional[str] = None):
+    """WebSocket for real-time updates.
+    
+    Args:
+        since: Last seq the client received; the gap is replayed (or a snapshot sent)
+        stream: Stream id from the server's hello frame the seq belongs to
+    """
+    await manager.resume(websocket, since, stream)
     
     try:
-        # Start background task to consume Gemini summaries
-        consumer_task = asyncio.create_task(consume_gemini_summaries(websocket))
+        # Summaries come from the shared feed, started by the first client
+        ensure_summary_feed()
         
         while True:
             # Keep connection alive
@@ -35,70 +70,122 @@ async def websocket_endpoint(websocket: WebSocket):
     
     except WebSocketDisconnect:
         manager.disconnect(websocket)
-        consumer_task.cancel()
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
         manager.disconnect(websocket)
 
 
-async def consume_gemini_summaries(websocket: WebSocket):
-    """Consume Gemini summaries from Kafka and send to WebSocket"""
-    consumer = None
+def partial_sender(summary: dict):
+    """Build a callback that pushes streamed insight text to all clients"""
+    async def send_partial(text: str) -> None:
+        await manager.broadcast({
+            "type": "ai_insight_partial",
+            "window_start": summary.get('window_start'),
+            "window_end": summary.get('window_end'),
+            "text": text
+        })
+    return send_partial
+
+
+def decode_summary(consumer: KafkaConsumerService, msg) -> Optional[dict]:
+    """Deserialize a summary message and make it JSON-serializable"""
+    if msg.error():
+        logger.warning(f"Consumer error: {msg.error()}")
+        return None
+    
+    # Use the consumer's deserialize method (handles Avro or JSON)
+    summary = consumer.deserialize_message(msg)
+    if summary is None:
+        logger.warning("Failed to deserialize message")
+        return None
+    
+    logger.info(f"Received summary: {summary}")
+    
+    # How long after the window closed did Flink's output reach us
+    pipeline_metrics.observe_since('flink_output', summary.get('window_end'))
+    
+    # Convert datetime objects to ISO string for JSON serialization
+    for key, value in summary.items():
+        if hasattr(value, 'isoformat'):
+            summary[key] = value.isoformat()
+    return summary
+
+
+def join_rows(consumer: KafkaConsumerService, messages: list) -> None:
+    """Feed upstream table rows to the backend join"""
+    for msg in messages:
+        # Upsert tables: primary key columns live in the key, a None value is a delete
+        row = consumer.deserialize_key(msg) or {}
+        value = consumer.deserialize_message(msg)
+        if value is not None:
+            row.update(value)
+        summary_joiner.offer(msg.topic(), row, deleted=msg.value() is None,
+                             position=(msg.partition(), msg.offset()))
+
+
+async def publish_summaries(summaries: list) -> None:
+    """Attach insights to summaries and broadcast them to all clients"""
+    if GEMINI_BATCH_ENABLED:
+        summaries = group_by_window(summaries)
+    
+    # Rule engine first; only non-trivial windows reach the LLM
+    await insight_pipeline.attach(summaries, partial_sender)
+    
+    # Send to WebSocket clients (always send, even without AI)
+    for summary in summaries:
+        await manager.broadcast({
+            "type": "ai_alert",
+            "summary": summary
+        })
+        pipeline_metrics.observe_since('end_to_end', summary.get('window_end'))
+        logger.info(f"Sent summary to WebSocket: {summary.get('health_status')}")
+
+
+async def consume_gemini_summaries():
+    """Consume Gemini summaries from Kafka and broadcast them while clients are connected.
+    
+    Messages are handled by partition-parallel workers (ordered per partition)
+    and their offsets committed once the summaries have been broadcast.
+    """
     try:
-        # Read only latest messages (set read_from_beginning=True for historical)
-        consumer = KafkaConsumerService(read_from_beginning=False)
-        logger.info("Starting to consume from gemini_summary topic (latest only)")
+        # Pooled consumer, reads only latest messages; stays subscribed
+        # between feed runs so reconnecting clients do not cause a rebalance
+        consumer = kafka_pool.live_consumer
         
-        while True:
-            msg = consumer.poll(timeout=1.0)
-            
-            if msg is None:
-                await asyncio.sleep(1)
-                continue
-            
-            if msg.error():
-                logger.warning(f"Consumer error: {msg.error()}")
-                continue
-            
-            try:
-                # Use the consumer's deserialize method (handles Avro or JSON)
-                summary = consumer.deserialize_message(msg)
-                
-                if summary is None:
-                    logger.warning("Failed to deserialize message")
-                    continue
-                
-                logger.info(f"Received summary: {summary}")
-                
-                # Convert datetime objects to ISO string for JSON serialization
-                for key, value in summary.items():
-                    if hasattr(value, 'isoformat'):
-                        summary[key] = value.isoformat()
-                
-                # Generate AI insight (optional - don't fail if quota exceeded)
-                if gemini_service.is_available:
-                    try:
-                        insight = await gemini_service.generate_insight(summary)
-                        summary['ai_insight'] = insight
-                    except Exception as ai_err:
-                        logger.warning(f"AI insight skipped: {ai_err}")
-                        summary['ai_insight'] = {"status": "skipped", "reason": "quota exceeded"}
-                
-                # Send to WebSocket (always send, even without AI)
-                await websocket.send_json({
-                    "type": "ai_alert",
-                    "summary": summary
-                })
-                logger.info(f"Sent summary to WebSocket: {summary.get('health_status')}")
-                
-                # Add delay between processing to avoid API rate limits
+        async def handle_summaries(messages: list) -> None:
+            summaries = await asyncio.to_thread(
+                lambda: [s for s in (decode_summary(consumer, m) for m in messages) if s is not None]
+            )
+            await publish_summaries(summaries)
+            # Add delay between processing to avoid API rate limits
+            if summaries:
                 await asyncio.sleep(5)
-                
-            except Exception as e:
-                logger.error(f"Error processing summary: {e}")
+        
+        async def handle_rows(messages: list) -> None:
+            await asyncio.to_thread(join_rows, consumer, messages)
+        
+        async def emit_joined() -> None:
+            # Windows are released by the join's grace timer, even on idle polls
+            summaries = summary_joiner.ready()
+            if summaries:
+                await publish_summaries(summaries)
+        
+        def keep_running() -> bool:
+            return manager.connection_count > 0
+        
+        if SUMMARY_SOURCE == 'join':
+            logger.info("Starting to consume upstream Flink tables for the backend join (latest only)")
+            # Rows only count as processed once their window is emitted
+            await summary_workers.run(consumer, handle_rows, keep_running, on_poll=emit_joined,
+                                      holds=summary_joiner.holds)
+        else:
+            logger.info("Starting to consume from gemini_summary topic (latest only)")
+            await summary_workers.run(consumer, handle_summaries, keep_running)
+        
+        logger.info("No WebSocket clients left - summary feed paused")
     
+    except PoolDrainingError:
+        logger.info("Summary feed stopped for shutdown")
     except Exception as e:
         logger.error(f"Consumer error: {e}")
-    finally:
-        if consumer:
-            consumer.close()
+        kafka_pool.reset_live_consumer()
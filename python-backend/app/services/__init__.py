@@ -6,5 +6,9 @@ Services package for EventStream Intelligence
 from .websocket_manager import ConnectionManager
 from .kafka_service import KafkaProducerService
 from .ai_service import GeminiService
+from .llm_providers import InsightProvider, GeminiHTTPProvider, StubInsightProvider
 
-__all__ = ['ConnectionManager', 'KafkaProducerService', 'GeminiService']
+__all__ = [
+    'ConnectionManager', 'KafkaProducerService', 'GeminiService',
+    'InsightProvider', 'GeminiHTTPProvider', 'StubInsightProvider',
+]
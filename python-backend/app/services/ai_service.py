@@ -4,55 +4,52 @@ Gemini AI service for generating insights
 """
 
 import asyncio
+import json
 import logging
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Callable, Awaitable, List
 
-from ..config import GEMINI_API_KEY
+from ..config import (
+    LLM_TIMEOUT_SECONDS, LLM_MAX_CONCURRENCY,
+    GEMINI_BATCH_MAX_SIZE, GEMINI_BATCH_TOKEN_BUDGET, GEMINI_BATCH_OUTPUT_TOKENS,
+)
+from .llm_providers import InsightProvider, create_provider
+from .metrics import pipeline_metrics
 
 logger = logging.getLogger(__name__)
 
-# Attempt to import Gemini
-try:
-    import google.generativeai as genai
-    GEMINI_AVAILABLE = True
-except ImportError:
-    GEMINI_AVAILABLE = False
-    genai = None
 
+def _offenders_block(summary: dict) -> str:
+    """Prompt lines for the window's top error/critical subjects, types and sources"""
+    offenders = summary.get('top_offenders')
+    if not offenders:
+        return ""
+    lines = ["", "**Top Offenders (error/critical events in this window):**"]
+    for dimension, label in (("subject", "Subjects"), ("type", "Event Types"), ("source", "Sources")):
+        entries = offenders.get(dimension)
+        if entries:
+            ranked = ", ".join(f"{e['value']} ({e['count']:g})" for e in entries)
+            lines.append(f"- {label}: {ranked}")
+    return "\n".join(lines) + "\n"
 
-class GeminiService:
-    """Service for generating AI insights using Google Gemini"""
-    
-    def __init__(self):
-        self._model = None
-        self._configured = False
-        
-        if GEMINI_AVAILABLE and GEMINI_API_KEY:
-            try:
-                genai.configure(api_key=GEMINI_API_KEY)
-                # Use gemini-2.0-flash (gemini-1.5-pro is deprecated)
-                self._model = genai.GenerativeModel('gemini-2.0-flash')
-                self._configured = True
-                logger.info("✓ Gemini configured (model: gemini-2.0-flash)")
-            except Exception as e:
-                logger.error(f"Failed to configure Gemini: {e}")
-    
-    @property
-    def is_available(self) -> bool:
-        """Check if Gemini is available and configured"""
-        return GEMINI_AVAILABLE and self._configured and self._model is not None
-    
-    async def generate_insight(self, summary: dict) -> Dict[str, Any]:
-        """Generate AI insight from a system health summary"""
-        if not self.is_available:
-            return {
-                "status": "AI not available",
-                "recommendation": "Enable Gemini API for AI insights"
-            }
-        
-        try:
-            prompt = f"""Analyze this system health summary and provide actionable insights:
+
+def _similar_block(summary: dict) -> str:
+    """Prompt lines for the most similar past incidents and how they were assessed"""
+    incidents = summary.get('similar_incidents')
+    if not incidents:
+        return ""
+    lines = ["", "**Similar Past Incidents (for context):**"]
+    for incident in incidents:
+        lines.append(
+            f"- {incident['window_start']} ({incident['health_status']}, top source "
+            f"{incident['top_error_source']}, similarity {incident['similarity']:.2f}): {incident['assessment']}"
+        )
+    return "\n".join(lines) + "\n"
+
+
+def build_prompt(summary: dict) -> str:
+    """Build the insight prompt for a single system health summary"""
+    return f"""Analyze this system health summary and provide actionable insights:
 
 **System Health Status:** {summary.get('health_status', 'unknown')}
 **Time Window:** {summary.get('window_end', 'unknown')}
@@ -72,7 +69,7 @@ class GeminiService:
 - Total Sources Monitored: {summary.get('total_sources', 0)}
 - Correlated Incidents: {summary.get('correlation_count', 0)}
 - Anomalies Detected: {summary.get('anomaly_count', 0)}
-
+{_offenders_block(summary)}{_similar_block(summary)}
 Provide a brief assessment:
 1. **Status**: One sentence summarizing the current state
 2. **Root Cause**: Which system/service is the primary issue source
@@ -80,17 +77,201 @@ Provide a brief assessment:
 4. **Recommendation**: One actionable step to resolve
 
 Keep response under 150 words."""
-            
-            response = await asyncio.to_thread(
-                self._model.generate_content, prompt
+
+
+BATCH_PROMPT_HEADER = """Analyze each of the following system health summaries (one per time window) \
+and provide actionable insights for every window.
+
+Each window lists its metrics and its top error sources, worst first.
+
+Windows:
+"""
+
+BATCH_PROMPT_FOOTER = """
+
+Respond with a single JSON object keyed by the exact "window_start" value of each window.
+Each value must be an object with the string fields:
+- "status": One sentence summarizing the current state
+- "root_cause": Which system/service is the primary issue source
+- "impact": What's affected and severity level
+- "recommendation": One actionable step to resolve
+
+Keep each window's assessment under 150 words."""
+
+INSIGHT_SECTIONS = (
+    ("status", "Status"),
+    ("root_cause", "Root Cause"),
+    ("impact", "Impact"),
+    ("recommendation", "Recommendation"),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 characters per token)"""
+    return len(text) // 4 + 1
+
+
+def group_by_window(summaries: List[dict]) -> List[dict]:
+    """Merge summary rows that share a window into one summary per window.
+
+    The Flink join emits one row per matching error source, so a window
+    can arrive several times with a different top_error_source. The merged
+    summary keeps the latest metrics, lists every error source worst first
+    in `top_error_sources` and reports the worst one as top_error_source.
+    """
+    merged: Dict[Any, dict] = {}
+    for summary in summaries:
+        key = summary.get('window_start')
+        current = merged.get(key)
+        if current is None:
+            current = merged[key] = {**summary, 'top_error_sources': {}}
+        else:
+            sources = current['top_error_sources']
+            current.update(summary)
+            current['top_error_sources'] = sources
+        source = summary.get('top_error_source')
+        if source and source != 'none':
+            count = summary.get('top_error_count') or 0
+            current['top_error_sources'][source] = max(count, current['top_error_sources'].get(source, 0))
+
+    result = []
+    for summary in merged.values():
+        ranked = sorted(summary['top_error_sources'].items(), key=lambda item: item[1], reverse=True)
+        summary['top_error_sources'] = [{"source": s, "error_count": c} for s, c in ranked]
+        if ranked:
+            summary['top_error_source'], summary['top_error_count'] = ranked[0]
+        result.append(summary)
+    return result
+
+
+def _window_block(summary: dict) -> str:
+    """Compact JSON description of one window for the batch prompt"""
+    sources = summary.get('top_error_sources')
+    if sources is None and summary.get('top_error_source') not in (None, 'none'):
+        sources = [{"source": summary['top_error_source'], "error_count": summary.get('top_error_count', 0)}]
+    return json.dumps({
+        "window_start": str(summary.get('window_start')),
+        "window_end": str(summary.get('window_end')),
+        "health_status": summary.get('health_status', 'unknown'),
+        "total_events": summary.get('total_events', 0),
+        "critical_count": summary.get('critical_count', 0),
+        "error_count": summary.get('error_count', 0),
+        "warning_count": summary.get('warning_count', 0),
+        "error_rate_percent": round(summary.get('error_rate_percent') or 0, 2),
+        "error_trend": summary.get('error_trend', 'unknown'),
+        "total_sources": summary.get('total_sources', 0),
+        "correlation_count": summary.get('correlation_count', 0),
+        "anomaly_count": summary.get('anomaly_count', 0),
+        "top_error_sources": sources or [],
+        **({"top_offenders": summary['top_offenders']} if summary.get('top_offenders') else {}),
+        **({"similar_incidents": summary['similar_incidents']} if summary.get('similar_incidents') else {}),
+    }, indent=1)
+
+
+def build_batch_prompt(summaries: List[dict]) -> str:
+    """Build one structured prompt covering several windows"""
+    return BATCH_PROMPT_HEADER + "\n".join(_window_block(s) for s in summaries) + BATCH_PROMPT_FOOTER
+
+
+def plan_batches(
+    summaries: List[dict],
+    token_budget: int = GEMINI_BATCH_TOKEN_BUDGET,
+    max_batch_size: int = GEMINI_BATCH_MAX_SIZE,
+    output_tokens: int = GEMINI_BATCH_OUTPUT_TOKENS,
+) -> List[List[dict]]:
+    """Split summaries into batches whose prompt plus expected output fits the budget"""
+    overhead = estimate_tokens(BATCH_PROMPT_HEADER + BATCH_PROMPT_FOOTER)
+    batches: List[List[dict]] = []
+    current: List[dict] = []
+    used = overhead
+    for summary in summaries:
+        cost = estimate_tokens(_window_block(summary)) + output_tokens
+        if current and (used + cost > token_budget or len(current) >= max_batch_size):
+            batches.append(current)
+            current, used = [], overhead
+        current.append(summary)
+        used += cost
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_batch_response(text: str) -> Dict[str, str]:
+    """Turn the batch JSON response into insight text keyed by window_start"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`")
+        text = text[text.index("\n") + 1:] if "\n" in text else text
+    payload = json.loads(text)
+    insights = {}
+    for window, sections in payload.items():
+        if isinstance(sections, dict):
+            insights[str(window)] = "\n".join(
+                f"{i}. **{label}**: {sections.get(key, '')}"
+                for i, (key, label) in enumerate(INSIGHT_SECTIONS, start=1)
             )
-            
-            return {
-                "status": "success",
-                "insight": response.text,
-                "timestamp": datetime.utcnow().isoformat()
-            }
-        
+        else:
+            insights[str(window)] = str(sections)
+    return insights
+
+
+class GeminiService:
+    """Service for generating AI insights through an async LLM provider.
+
+    Calls are bounded by a semaphore (LLM_MAX_CONCURRENCY) and each one
+    is cancelled after LLM_TIMEOUT_SECONDS.
+    """
+
+    def __init__(
+        self,
+        provider: Optional[InsightProvider] = None,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+    ):
+        self._provider = provider if provider is not None else create_provider()
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        if self._provider is not None:
+            logger.info(f"✓ Insight provider configured: {self._provider.name}")
+
+    @property
+    def is_available(self) -> bool:
+        """Check if an LLM provider is configured"""
+        return self._provider is not None
+
+    @property
+    def provider(self) -> Optional[InsightProvider]:
+        """The active LLM provider"""
+        return self._provider
+
+    def _unavailable(self) -> Dict[str, Any]:
+        return {
+            "status": "AI not available",
+            "recommendation": "Enable Gemini API for AI insights"
+        }
+
+    def _success(self, text: str) -> Dict[str, Any]:
+        return {
+            "status": "success",
+            "insight": text,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+
+    async def generate_insight(self, summary: dict) -> Dict[str, Any]:
+        """Generate AI insight from a system health summary"""
+        if not self.is_available:
+            return self._unavailable()
+
+        try:
+            async with self._semaphore:
+                text = await asyncio.wait_for(
+                    self._provider.generate(build_prompt(summary)), self._timeout
+                )
+            return self._success(text)
+
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini timed out after {self._timeout}s")
+            return {"status": "error", "error": f"timed out after {self._timeout}s"}
         except Exception as e:
             logger.error(f"Gemini error: {e}")
             return {
@@ -98,6 +279,86 @@ Keep response under 150 words."""
                 "error": str(e)
             }
 
+    async def stream_insight(
+        self,
+        summary: dict,
+        on_chunk: Callable[[str], Awaitable[None]],
+    ) -> Dict[str, Any]:
+        """Generate an insight, awaiting `on_chunk` with the text received so far.
+
+        Returns the same result shape as generate_insight once the stream
+        completes. The timeout covers the whole stream.
+        """
+        if not self.is_available:
+            return self._unavailable()
+
+        received = []
+
+        async def consume() -> str:
+            async for chunk in self._provider.stream(build_prompt(summary)):
+                received.append(chunk)
+                await on_chunk("".join(received))
+            return "".join(received)
+
+        try:
+            async with self._semaphore:
+                text = await asyncio.wait_for(consume(), self._timeout)
+            return self._success(text)
+
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini stream timed out after {self._timeout}s")
+            return {"status": "error", "error": f"timed out after {self._timeout}s", "partial": "".join(received)}
+        except Exception as e:
+            logger.error(f"Gemini stream error: {e}")
+            return {"status": "error", "error": str(e), "partial": "".join(received)}
+
+    async def generate_batch_insights(self, summaries: List[dict]) -> List[Dict[str, Any]]:
+        """Generate insights for several windows with as few LLM calls as possible.
+
+        Summaries are packed into token-budgeted batches that run
+        concurrently. Windows missing from a batch response fall back to
+        an individual generate_insight call. Results keep the input order.
+        """
+        if not self.is_available:
+            return [self._unavailable() for _ in summaries]
+        if len(summaries) == 1:
+            return [await self.generate_insight(summaries[0])]
+
+        results = await asyncio.gather(*(self._run_batch(batch) for batch in plan_batches(summaries)))
+        by_window: Dict[str, Dict[str, Any]] = {}
+        for result in results:
+            by_window.update(result)
+
+        insights = []
+        for summary in summaries:
+            insight = by_window.get(str(summary.get('window_start')))
+            if insight is None:
+                insight = await self.generate_insight(summary)
+            insights.append(insight)
+        return insights
+
+    async def _run_batch(self, batch: List[dict]) -> Dict[str, Dict[str, Any]]:
+        if len(batch) == 1:
+            return {str(batch[0].get('window_start')): await self.generate_insight(batch[0])}
+        try:
+            async with self._semaphore:
+                text = await asyncio.wait_for(
+                    self._provider.generate(build_batch_prompt(batch), json_output=True), self._timeout
+                )
+            pipeline_metrics.increment('llm_batch_calls')
+            pipeline_metrics.increment('llm_batched_windows', len(batch))
+            return {window: self._success(insight) for window, insight in parse_batch_response(text).items()}
+        except asyncio.TimeoutError:
+            logger.error(f"Gemini batch of {len(batch)} timed out after {self._timeout}s")
+        except Exception as e:
+            logger.error(f"Gemini batch error: {e}")
+        return {}
+
+    async def aclose(self) -> None:
+        """Close the provider's pooled connections"""
+        if self._provider is not None:
+            await self._provider.aclose()
+
 
 # Global instance
 gemini_service = GeminiService()
@@ -0,0 +1,367 @@
+# app/services/dataset_generator.py
+"""
+Deterministic synthetic CloudEvent datasets for offline pipeline and Flink sizing tests
+"""
+
+import json
+import logging
+import math
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, TextIO
+
+import numpy as np
+
+from ..config import EVENT_TEMPLATES, SCENARIOS
+
+logger = logging.getLogger(__name__)
+
+# Baseline severity mix (percent), as in the normal_operations scenario
+DEFAULT_DISTRIBUTION: Dict[str, float] = SCENARIOS["normal_operations"]["distribution"]
+# Scripted cascade every incident follows, sharing one correlation id
+INCIDENT_CASCADE: List[Dict[str, Any]] = SCENARIOS["incident"]["events"]
+
+# Traffic shape: per-minute rate 1 + amplitude * sin(...) peaking at PEAK_HOUR UTC,
+# scaled by WEEKEND_FACTOR on Saturdays and Sundays
+PEAK_HOUR = 15
+WEEKEND_FACTOR = 0.6
+
+# Incidents: the cascade spread over DURATION minutes, plus a burst of
+# error/critical events (Poisson mean BURST_MEAN) from the cascade's sources
+INCIDENT_MINUTES = (5, 30)
+INCIDENT_BURST_MEAN = 40
+
+# Records per NDJSON write / Avro block
+CHUNK_SIZE = 100_000
+
+
+class Template(NamedTuple):
+    source: str
+    type: str
+    subject: str
+    severity: str
+    category: str
+
+
+def _templates() -> List[Template]:
+    """EVENT_TEMPLATES followed by the incident cascade steps"""
+    table = [
+        Template(f"https://{source}.com/demo", t["type"], t["subject"], t["severity"], t["category"])
+        for source, templates in EVENT_TEMPLATES.items() for t in templates
+    ]
+    table += [
+        Template(f"https://{e['source']}.com/demo", e["type"], e["subject"], e["severity"], e.get("category", "incident"))
+        for e in INCIDENT_CASCADE
+    ]
+    return table
+
+
+TEMPLATES = _templates()
+CASCADE_TEMPLATES = np.arange(len(TEMPLATES) - len(INCIDENT_CASCADE), len(TEMPLATES))
+
+
+class Dataset(NamedTuple):
+    """Generated events as columns, sorted by event time"""
+    epoch_ms: np.ndarray     # int64 event time
+    template: np.ndarray     # int16 index into TEMPLATES
+    incident: np.ndarray     # int32 incident number, -1 when uncorrelated
+    seed: int
+
+    def __len__(self) -> int:
+        return len(self.epoch_ms)
+
+
+def traffic_weights(start: float, minutes: int, amplitude: float) -> np.ndarray:
+    """Relative event rate of each minute (diurnal sine, weekend dip)"""
+    minute_starts = start + 60.0 * np.arange(minutes)
+    hours = (minute_starts % 86400.0) / 3600.0
+    weights = 1.0 + amplitude * np.sin(2.0 * np.pi * (hours - PEAK_HOUR + 6.0) / 24.0)
+    # 1970-01-01 was a Thursday: day index 2 and 3 (mod 7) are Saturday and Sunday
+    weekday = (minute_starts // 86400.0).astype(np.int64) % 7
+    weights[(weekday == 2) | (weekday == 3)] *= WEEKEND_FACTOR
+    return np.maximum(weights, 0.0)
+
+
+def _templates_for(rng: np.random.Generator, severities: List[str], p: np.ndarray, count: int,
+                   pool: Optional[np.ndarray] = None) -> np.ndarray:
+    """Template indices for `count` events with severities drawn by `p`"""
+    pool = np.arange(len(TEMPLATES) - len(INCIDENT_CASCADE)) if pool is None else pool
+    by_severity = [pool[[TEMPLATES[i].severity == s for i in pool]] for s in severities]
+    drawn = rng.choice(len(severities), size=count, p=p)
+    templates = np.empty(count, dtype=np.int16)
+    for s, candidates in enumerate(by_severity):
+        mask = drawn == s
+        if not len(candidates):
+            raise ValueError(f"No template with severity {severities[s]!r}")
+        templates[mask] = candidates[rng.integers(0, len(candidates), int(mask.sum()))]
+    return templates
+
+
+def generate(
+    events: int,
+    start: float,
+    days: float = 1.0,
+    seed: int = 0,
+    distribution: Optional[Dict[str, float]] = None,
+    incidents_per_day: float = 4.0,
+    amplitude: float = 0.6,
+) -> Dataset:
+    """Generate `events` events over `days` of event time from `start` (epoch seconds).
+
+    Baseline traffic follows the diurnal/weekly shape with severities from
+    `distribution`; incidents (Poisson, `incidents_per_day`) add the
+    scripted cascade plus an error burst under one correlation id. The same
+    arguments always produce the same dataset.
+    """
+    rng = np.random.default_rng(seed)
+    minutes = max(int(math.ceil(days * 1440)), 1)
+    span = minutes * 60.0
+    weights = traffic_weights(start, minutes, amplitude)
+    p_minute = weights / weights.sum()
+
+    # Incidents first, so the baseline fills up the rest of the budget
+    incidents = int(rng.poisson(incidents_per_day * days)) if incidents_per_day > 0 else 0
+    durations = np.minimum(rng.uniform(*INCIDENT_MINUTES, size=incidents) * 60.0, span)
+    incident_starts = rng.choice(minutes, size=incidents, p=p_minute) * 60.0 + rng.random(incidents) * 60.0
+    # Incidents end inside the range
+    incident_starts = np.minimum(incident_starts, span - durations)
+    bursts = rng.poisson(INCIDENT_BURST_MEAN, size=incidents)
+    steps = len(INCIDENT_CASCADE)
+    incident_total = min(int(incidents * steps + bursts.sum()), events)
+
+    # Cascade: the scripted steps evenly over the incident
+    cascade_offsets = (np.linspace(0.0, 1.0, steps)[None, :] * durations[:, None]).ravel()
+    cascade_times = np.repeat(incident_starts, steps) + cascade_offsets
+    cascade_templates = np.tile(CASCADE_TEMPLATES, incidents).astype(np.int16)
+    cascade_ids = np.repeat(np.arange(incidents, dtype=np.int32), steps)
+    # Burst: errors from the sources involved, over the first 60% of the incident
+    burst_ids = np.repeat(np.arange(incidents, dtype=np.int32), bursts)
+    burst_times = incident_starts[burst_ids] + rng.random(len(burst_ids)) * 0.6 * durations[burst_ids]
+    involved = {TEMPLATES[i].source for i in CASCADE_TEMPLATES}
+    burst_pool = np.array([i for i, t in enumerate(TEMPLATES[:-steps]) if t.source in involved], dtype=np.int64)
+    burst_templates = _templates_for(rng, ["error", "critical"], np.array([0.7, 0.3]), len(burst_ids), burst_pool)
+
+    # Baseline: multinomial counts per minute, uniform within the minute
+    baseline = max(events - incident_total, 0)
+    per_minute = rng.multinomial(baseline, p_minute)
+    baseline_times = np.repeat(60.0 * np.arange(minutes), per_minute) + rng.random(baseline) * 60.0
+    distribution = distribution or DEFAULT_DISTRIBUTION
+    severities = [s for s in distribution if any(t.severity == s for t in TEMPLATES[:-len(INCIDENT_CASCADE)])]
+    p_severity = np.array([distribution[s] for s in severities], dtype=np.float64)
+    baseline_templates = _templates_for(rng, severities, p_severity / p_severity.sum(), baseline)
+
+    offsets = np.concatenate([baseline_times, cascade_times, burst_times])
+    templates = np.concatenate([baseline_templates, cascade_templates, burst_templates])
+    incident = np.concatenate([np.full(baseline, -1, dtype=np.int32), cascade_ids, burst_ids])
+    # More incident events than requested: drop the last incidents' events
+    offsets, templates, incident = offsets[:events], templates[:events], incident[:events]
+    order = np.argsort(np.minimum(offsets, span - 0.001), kind='stable')
+    epoch_ms = (start * 1000.0 + offsets[order] * 1000.0).astype(np.int64)
+    return Dataset(epoch_ms, templates[order], incident[order], seed)
+
+
+def _time_strings(epoch_ms: np.ndarray) -> List[str]:
+    return [t + "Z" for t in np.datetime_as_string(epoch_ms.astype('datetime64[ms]'), unit='ms').tolist()]
+
+
+def _correlation_ids(dataset: Dataset) -> List[Optional[str]]:
+    """Correlation id by incident number; the last entry (index -1) is None"""
+    incidents = int(dataset.incident.max()) + 1 if len(dataset) else 0
+    return [f"gen-{dataset.seed}-incident-{n}" for n in range(incidents)] + [None]
+
+
+def records(dataset: Dataset, chunk_size: int = CHUNK_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """The events as CloudEvent Avro records (schemas/cloudevent.avsc), in chunks"""
+    data = json.dumps({"generated": True, "seed": dataset.seed})
+    correlation_ids = _correlation_ids(dataset)
+    for begin in range(0, len(dataset), chunk_size):
+        end = min(begin + chunk_size, len(dataset))
+        times = _time_strings(dataset.epoch_ms[begin:end])
+        chunk = []
+        for offset, (template, incident) in enumerate(
+            zip(dataset.template[begin:end].tolist(), dataset.incident[begin:end].tolist())
+        ):
+            t = TEMPLATES[template]
+            chunk.append({
+                "specversion": "1.0",
+                "type": t.type,
+                "source": t.source,
+                "id": f"gen-{dataset.seed}-{begin + offset}",
+                "time": times[offset],
+                "datacontenttype": "application/json",
+                "subject": t.subject,
+                "data": data,
+                "severity": t.severity,
+                "category": t.category,
+                "correlation_id": correlation_ids[incident],
+                "sample_weight": 1.0,
+            })
+        yield chunk
+
+
+def write_ndjson(dataset: Dataset, out: TextIO, chunk_size: int = CHUNK_SIZE) -> int:
+    """Write one JSON record per line; returns the number of events written.
+
+    Lines are assembled from per-template fragments serialized once, so
+    only the id, time and correlation id are formatted per event.
+    """
+    dump = json.dumps
+    data = dump(dump({"generated": True, "seed": dataset.seed}))
+    heads = [
+        '{"specversion":"1.0","type":%s,"source":%s,"id":"' % (dump(t.type), dump(t.source))
+        for t in TEMPLATES
+    ]
+    tails = [
+        '","datacontenttype":"application/json","subject":%s,"data":%s,"severity":%s,"category":%s,'
+        '"correlation_id":' % (dump(t.subject), data, dump(t.severity), dump(t.category))
+        for t in TEMPLATES
+    ]
+    correlations = [dump(c) for c in _correlation_ids(dataset)]
+    prefix = f"gen-{dataset.seed}-"
+    for begin in range(0, len(dataset), chunk_size):
+        end = min(begin + chunk_size, len(dataset))
+        times = _time_strings(dataset.epoch_ms[begin:end])
+        lines = [
+            f'{heads[tp]}{prefix}{begin + i}","time":"{times[i]}{tails[tp]}{correlations[inc]},"sample_weight":1.0}}\n'
+            for i, (tp, inc) in enumerate(
+                zip(dataset.template[begin:end].tolist(), dataset.incident[begin:end].tolist())
+            )
+        ]
+        out.write("".join(lines))
+    return len(dataset)
+
+
+def _avro_long(n: int) -> bytes:
+    """Avro zigzag varint"""
+    n = (n << 1) ^ (n >> 63)
+    out = bytearray()
+    while n > 0x7F:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+
+def _avro_string(value: str) -> bytes:
+    data = value.encode("utf-8")
+    return _avro_long(len(data)) + data
+
+
+def write_avro(dataset: Dataset, path: str, codec: str = "deflate", chunk_size: int = CHUNK_SIZE) -> int:
+    """Write an Avro object container file with the CloudEvent schema.
+
+    Records are encoded from per-template byte fragments (one block per
+    chunk) instead of through a generic record writer; the file reads back
+    with any Avro reader. `codec` is "deflate" or "null". The sync marker
+    derives from the seed, so equal datasets give identical files.
+    """
+    from .kafka_service import SCHEMA_PATH
+
+    if codec not in ("deflate", "null"):
+        raise ValueError(f"Unsupported codec {codec!r} (deflate or null)")
+    with open(SCHEMA_PATH, "r") as f:
+        schema = json.dumps(json.load(f), separators=(",", ":"))
+    sync = np.random.default_rng([dataset.seed, 0xA5]).bytes(16)
+
+    some = b"\x02"  # union branch 1 (the non-null type)
+    data = json.dumps({"generated": True, "seed": dataset.seed})
+    heads = [_avro_string("1.0") + _avro_string(t.type) + _avro_string(t.source) for t in TEMPLATES]
+    tails = [
+        some + _avro_string("application/json") + some + _avro_string(t.subject) + some + _avro_string(data)
+        + some + _avro_string(t.severity) + some + _avro_string(t.category)
+        for t in TEMPLATES
+    ]
+    weight = struct.pack("<d", 1.0)
+    prefix = f"gen-{dataset.seed}-"
+    correlations = [b"\x00" if c is None else some + _avro_string(c) for c in _correlation_ids(dataset)]
+    lengths = [_avro_long(n) for n in range(64)]
+    time_length = lengths[len("2000-01-01T00:00:00.000Z")]
+
+    with open(path, "wb") as out:
+        out.write(b"Obj\x01")
+        out.write(_avro_long(2) + _avro_string("avro.schema") + _avro_string(schema)
+                  + _avro_string("avro.codec") + _avro_string(codec) + b"\x00")
+        out.write(sync)
+        for begin in range(0, len(dataset), chunk_size):
+            end = min(begin + chunk_size, len(dataset))
+            times = _time_strings(dataset.epoch_ms[begin:end])
+            parts = []
+            for i, (tp, inc) in enumerate(
+                zip(dataset.template[begin:end].tolist(), dataset.incident[begin:end].tolist())
+            ):
+                event_id = f"{prefix}{begin + i}".encode()
+                # ids and times are ASCII and shorter than 64 bytes: one-byte length
+                parts.append(b"".join((heads[tp], lengths[len(event_id)], event_id, time_length,
+                                       times[i].encode(), tails[tp], correlations[inc], weight)))
+            block = b"".join(parts)
+            if codec == "deflate":
+                # Raw deflate at level 1: generation speed over file size
+                compressor = zlib.compressobj(1, zlib.DEFLATED, -15)
+                block = compressor.compress(block) + compressor.flush()
+            out.write(_avro_long(end - begin) + _avro_long(len(block)) + block + sync)
+    return len(dataset)
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Records of a generated .avro or .ndjson file"""
+    if path.endswith(".avro"):
+        import fastavro
+        with open(path, "rb") as f:
+            yield from fastavro.reader(f)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def bulk_load(
+    path: str,
+    producer: Any,
+    topic: str,
+    key_function: Optional[Callable[[dict], Optional[bytes]]] = None,
+    progress_every: int = 100_000,
+) -> int:
+    """Produce every record of a generated file to `topic` as schemaless Avro.
+
+    `producer` is a confluent_kafka Producer; records are keyed like live
+    events (KAFKA_PARTITION_STRATEGY). Blocks until all are delivered.
+    """
+    from .kafka_service import event_key, serialize_avro
+
+    key_function = key_function or event_key
+    sent = errors = 0
+
+    def on_delivery(err, msg):
+        nonlocal errors
+        if err is not None:
+            errors += 1
+
+    started = time.perf_counter()
+    for record in read_records(path):
+        value = serialize_avro(record)
+        while True:
+            try:
+                producer.produce(topic=topic, key=key_function(record), value=value, on_delivery=on_delivery)
+                break
+            except BufferError:
+                # Local queue full: let librdkafka deliver some and retry
+                producer.poll(0.1)
+        producer.poll(0)
+        sent += 1
+        if progress_every and sent % progress_every == 0:
+            logger.info(f"Loaded {sent:,} events ({sent / (time.perf_counter() - started):,.0f}/s)")
+    producer.flush()
+    if errors:
+        logger.warning(f"{errors:,} of {sent:,} events were not delivered")
+    return sent - errors
+
+
+def start_of_range(days: float, now: Optional[float] = None) -> float:
+    """Default start: midnight UTC `days` days before today"""
+    now = time.time() if now is None else now
+    today = datetime.fromtimestamp(now, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today.timestamp() - math.ceil(days) * 86400.0
+
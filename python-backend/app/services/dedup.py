@@ -0,0 +1,176 @@
+# app/services/dedup.py
+"""
+Time-bounded CloudEvent deduplication on (source, id)
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional
+
+from ..config import DEDUP_WINDOW_SECONDS, DEDUP_CAPACITY, DEDUP_ERROR_RATE, DEDUP_LRU_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class RotatingBloomFilter:
+    """Bloom filter split into generations that expire as a whole.
+
+    New keys go into the newest generation; lookups check all of them.
+    Every `rotate_seconds` (or when the newest generation reaches its
+    capacity) the oldest generation is cleared and becomes the newest,
+    so a key is remembered for between (generations - 1) and
+    `generations` rotation periods.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, rotate_seconds: float, generations: int = 3):
+        self.capacity = capacity
+        self.num_bits = max(int(-capacity * math.log(error_rate) / (math.log(2) ** 2)), 8)
+        self.num_hashes = max(int(round(self.num_bits / capacity * math.log(2))), 1)
+        self.rotate_seconds = rotate_seconds
+        self._generations = [bytearray((self.num_bits + 7) // 8) for _ in range(generations)]
+        self._current = 0
+        self._inserted = 0
+        self._rotated_at = time.monotonic()
+
+    def positions(self, key: bytes) -> List[int]:
+        """Bit positions for a key.
+
+        Kirsch-Mitzenmacher double hashing over the two 32-bit halves of
+        Python's (SipHash) bytes hash. The filter lives in memory only, so
+        per-process hash randomization does not matter.
+        """
+        h = hash(key) & 0xFFFFFFFFFFFFFFFF
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        m = self.num_bits
+        return [(h1 + i * h2) % m for i in range(self.num_hashes)]
+
+    def _maybe_rotate(self) -> None:
+        now = time.monotonic()
+        if now - self._rotated_at >= self.rotate_seconds or self._inserted >= self.capacity:
+            self._current = (self._current + 1) % len(self._generations)
+            self._generations[self._current] = bytearray(len(self._generations[self._current]))
+            self._inserted = 0
+            self._rotated_at = now
+
+    def add(self, key: bytes, positions: Optional[List[int]] = None) -> None:
+        """Insert a key into the newest generation"""
+        self._maybe_rotate()
+        bits = self._generations[self._current]
+        for pos in positions or self.positions(key):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self._inserted += 1
+
+    def contains(self, key: bytes, positions: Optional[List[int]] = None) -> bool:
+        """True if the key may have been added (false positives possible)"""
+        positions = positions or self.positions(key)
+        for bits in self._generations:
+            for pos in positions:
+                if not bits[pos >> 3] & (1 << (pos & 7)):
+                    break
+            else:
+                return True
+        return False
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(len(bits) for bits in self._generations)
+
+
+class EventDeduplicator:
+    """Recently-seen (source, id) index: Bloom filter first, exact LRU to confirm.
+
+    Most events are new, so the Bloom filter answers them without touching
+    the LRU. A Bloom hit is confirmed against the exact LRU; if the key has
+    been evicted or is older than the window, the event is treated as new.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = DEDUP_WINDOW_SECONDS,
+        capacity: int = DEDUP_CAPACITY,
+        error_rate: float = DEDUP_ERROR_RATE,
+        lru_size: int = DEDUP_LRU_SIZE,
+    ):
+        self.window_seconds = window_seconds
+        self._bloom = RotatingBloomFilter(capacity, error_rate, rotate_seconds=window_seconds / 2)
+        self._recent: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lru_size = lru_size
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.hits = 0
+        self.false_positives = 0
+
+    @staticmethod
+    def _key(source: str, event_id: str) -> bytes:
+        return f"{source}\x00{event_id}".encode('utf-8')
+
+    def _is_duplicate(self, key: bytes, positions: List[int]) -> bool:
+        self.checks += 1
+        if not self._bloom.contains(key, positions):
+            return False
+        seen_at = self._recent.get(key)
+        if seen_at is not None and time.monotonic() - seen_at <= self.window_seconds:
+            self.hits += 1
+            return True
+        self.false_positives += 1
+        return False
+
+    def _record(self, key: bytes, positions: List[int]) -> None:
+        self._bloom.add(key, positions)
+        self._recent[key] = time.monotonic()
+        self._recent.move_to_end(key)
+        if len(self._recent) > self._lru_size:
+            self._recent.popitem(last=False)
+
+    def is_duplicate(self, source: str, event_id: str) -> bool:
+        """Check whether (source, id) was recorded within the window"""
+        key = self._key(source, event_id)
+        with self._lock:
+            return self._is_duplicate(key, self._bloom.positions(key))
+
+    def record(self, source: str, event_id: str) -> None:
+        """Remember (source, id) after the event has been accepted"""
+        key = self._key(source, event_id)
+        with self._lock:
+            self._record(key, self._bloom.positions(key))
+
+    def check_and_record(self, source: str, event_id: str) -> bool:
+        """Return True for duplicates; otherwise record the key and return False.
+
+        Atomic, so of two concurrent copies of an event only one gets False.
+        """
+        key = self._key(source, event_id)
+        with self._lock:
+            positions = self._bloom.positions(key)
+            if self._is_duplicate(key, positions):
+                return True
+            self._record(key, positions)
+            return False
+
+    def release(self, source: str, event_id: str) -> None:
+        """Forget a key recorded by `check_and_record` whose event was not accepted,
+        so a retry is not taken for a duplicate (the Bloom bits stay; the exact
+        LRU decides)"""
+        key = self._key(source, event_id)
+        with self._lock:
+            self._recent.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit rate and memory footprint"""
+        return {
+            "checks": self.checks,
+            "duplicates": self.hits,
+            "hit_rate": round(self.hits / self.checks, 4) if self.checks else None,
+            "bloom_false_positives": self.false_positives,
+            "bloom_bytes": self._bloom.memory_bytes,
+            "bloom_hashes": self._bloom.num_hashes,
+            "exact_entries": len(self._recent),
+            "window_seconds": self.window_seconds,
+        }
+
+
+# Global instance
+event_deduplicator = EventDeduplicator()
@@ -0,0 +1,239 @@
+# app/services/event_tail.py
+"""
+Live tail of cloudevents-stream: events from every producer, coalesced into WebSocket frames
+"""
+
+import asyncio
+import io
+import logging
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    CLOUDEVENTS_TOPIC, EVENT_TAIL_BATCH_SIZE, EVENT_TAIL_FLUSH_MS, EVENT_TAIL_FRAME_EVENTS, EVENT_TAIL_LOCAL_IDS,
+    LIVE_HEALTH_ENABLED,
+)
+from .kafka_service import KafkaConsumerService, get_parsed_schema
+from .live_health import live_health
+from .websocket_manager import ConnectionManager, manager
+
+logger = logging.getLogger(__name__)
+
+# Attributes sent to the dashboard (the data payload is left out)
+FRAME_FIELDS = ('id', 'type', 'source', 'time', 'subject', 'severity', 'category', 'correlation_id')
+SEVERITIES = ('critical', 'error', 'warning', 'info')
+
+# Wait before rebuilding the tail consumer after an error
+RETRY_SECONDS = 10.0
+
+
+def decode_batch(values: List[bytes]) -> List[Dict[str, Any]]:
+    """Decode schemaless Avro CloudEvents; values in Confluent wire format
+    (magic byte 0 and a 4-byte schema id) are read past their header.
+    """
+    import fastavro
+    reader, schema = fastavro.schemaless_reader, get_parsed_schema()
+    records = []
+    for value in values:
+        # A schemaless record starts with the specversion length (never 0)
+        start = 5 if value[:1] == b'\x00' and len(value) > 5 else 0
+        try:
+            records.append(reader(io.BytesIO(value[start:] if start else value), schema))
+        except Exception as e:
+            logger.debug(f"Undecodable event skipped: {e}")
+    return records
+
+
+class LocalIds:
+    """Ids of the most recent events produced by this process (bounded FIFO)"""
+
+    def __init__(self, capacity: int = EVENT_TAIL_LOCAL_IDS):
+        self.capacity = capacity
+        self._order: deque = deque()
+        self._ids: set = set()
+
+    def add(self, event_id: str) -> None:
+        if event_id in self._ids:
+            return
+        self._ids.add(event_id)
+        self._order.append(event_id)
+        if len(self._order) > self.capacity:
+            self._ids.discard(self._order.popleft())
+
+    def __contains__(self, event_id: str) -> bool:
+        return event_id in self._ids
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+class EventTail:
+    """Broadcasts events other producers wrote to cloudevents-stream.
+
+    The topic is read by direct assignment from the end of every
+    partition. Messages are fetched in batches of up to `batch_size` and
+    decoded in a worker thread; events this process produced (already
+    broadcast as `event_sent`) are skipped. Instead of a frame per event,
+    one `events_tailed` frame per `flush_ms` carries the newest
+    `frame_events` events and the severity counts of all of them, and they
+    count towards the live health. Without connected clients messages are
+    consumed but not decoded.
+    """
+
+    def __init__(
+        self,
+        topic: str = CLOUDEVENTS_TOPIC,
+        batch_size: int = EVENT_TAIL_BATCH_SIZE,
+        flush_ms: float = EVENT_TAIL_FLUSH_MS,
+        frame_events: int = EVENT_TAIL_FRAME_EVENTS,
+        connections: ConnectionManager = manager,
+        poll_timeout: float = 0.5,
+    ):
+        self.topic = topic
+        self.batch_size = batch_size
+        self.flush_seconds = flush_ms / 1000.0
+        self.frame_events = frame_events
+        self.connections = connections
+        self.poll_timeout = poll_timeout
+        self.local_ids = LocalIds()
+        self._recent: deque = deque(maxlen=frame_events)
+        self._counts: Dict[str, int] = {}
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        self._consumer: Optional[KafkaConsumerService] = None
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.consumed = 0
+        self.skipped_local = 0
+        self.skipped_idle = 0
+        self.decode_errors = 0
+        self.tailed = 0
+        self.frames = 0
+        self.decode_seconds = 0.0
+
+    def remember_local(self, event_id: str) -> None:
+        """Note an event produced by this process, so the tail does not broadcast it twice"""
+        self.local_ids.add(event_id)
+
+    def ingest(self, values: List[bytes]) -> int:
+        """Decode a batch of message values and add the remote events to the next frame.
+
+        Runs in a worker thread. Returns the number of events added.
+        """
+        started = time.perf_counter()
+        records = decode_batch(values)
+        self.decode_seconds += time.perf_counter() - started
+        self.decode_errors += len(values) - len(records)
+        added = 0
+        counts = self._counts
+        for record in records:
+            if record.get('id') in self.local_ids:
+                self.skipped_local += 1
+                continue
+            severity = record.get('severity') or 'info'
+            counts[severity] = counts.get(severity, 0) + 1
+            self._recent.append(record)
+            if LIVE_HEALTH_ENABLED:
+                live_health.record(record)
+            added += 1
+        self._pending += added
+        self.tailed += added
+        return added
+
+    def frame(self) -> Optional[dict]:
+        """The coalesced frame of everything ingested since the last one, or None"""
+        if not self._pending:
+            return None
+        events = [{field: record.get(field) for field in FRAME_FIELDS} for record in self._recent]
+        events.reverse()  # newest first, like the dashboard list
+        message = {
+            "type": "events_tailed",
+            "count": self._pending,
+            "severity_counts": {s: self._counts.get(s, 0) for s in SEVERITIES},
+            "events": events,
+        }
+        self._recent.clear()
+        self._counts = {}
+        self._pending = 0
+        return message
+
+    async def flush(self, force: bool = False) -> bool:
+        """Broadcast the pending frame once the flush interval has passed"""
+        if not force and time.monotonic() - self._last_flush < self.flush_seconds:
+            return False
+        self._last_flush = time.monotonic()
+        message = self.frame()
+        if message is None:
+            return False
+        await self.connections.broadcast(message)
+        self.frames += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def _follow(self) -> None:
+        while self._running:
+            try:
+                if self._consumer is None:
+                    # Direct assignment: every replica tails every partition, no group
+                    self._consumer = KafkaConsumerService(group_id='event-tail', subscribe=False)
+                    partitions = await asyncio.to_thread(self._consumer.assign_from_end, self.topic)
+                    logger.info(f"Tailing {self.topic} ({partitions} partitions)")
+                messages = await asyncio.to_thread(self._consumer.consume_batch, self.batch_size, self.poll_timeout)
+                values = [msg.value() for msg in messages if not msg.error() and msg.value()]
+                self.consumed += len(values)
+                if self.connections.connection_count == 0:
+                    self.skipped_idle += len(values)
+                elif values:
+                    await asyncio.to_thread(self.ingest, values)
+                await self.flush()
+            except Exception as e:
+                logger.warning(f"Event tail interrupted: {e}")
+                await asyncio.to_thread(self._close_consumer)
+                await asyncio.sleep(RETRY_SECONDS)
+        await asyncio.to_thread(self._close_consumer)
+
+    def _close_consumer(self) -> None:
+        consumer, self._consumer = self._consumer, None
+        if consumer is not None:
+            consumer.close()
+
+    def start(self) -> None:
+        """Start tailing in the background"""
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._follow())
+
+    async def stop(self) -> None:
+        """Stop tailing; the current poll is allowed to finish"""
+        self._running = False
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.poll_timeout + 5.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+        self._close_consumer()
+
+    def stats(self) -> Dict[str, Any]:
+        """Consumed, skipped and broadcast counts and decode throughput"""
+        decoded = self.tailed + self.skipped_local
+        return {
+            "topic": self.topic,
+            "running": self._running,
+            "consumed": self.consumed,
+            "tailed": self.tailed,
+            "skipped_local": self.skipped_local,
+            "skipped_idle": self.skipped_idle,
+            "decode_errors": self.decode_errors,
+            "frames": self.frames,
+            "local_ids": len(self.local_ids),
+            "decode_events_per_second": round(decoded / self.decode_seconds) if self.decode_seconds else None,
+        }
+
+
+# Global instance
+event_tail = EventTail()
@@ -0,0 +1,227 @@
+# app/services/heavy_hitters.py
+"""
+Streaming top-K of error/critical subjects, types and sources (Space-Saving)
+"""
+
+import logging
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from ..config import (
+    HEAVY_HITTERS_CAPACITY, HEAVY_HITTERS_PANE_SECONDS, HEAVY_HITTERS_RETENTION_SECONDS,
+)
+from .metrics import event_time, to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Event fields ranked, and the severities counted
+DIMENSIONS = ("subject", "type", "source")
+TRACKED_SEVERITIES = {"error", "critical"}
+
+# Events timestamped further ahead than this are clamped to now
+MAX_CLOCK_SKEW_SECONDS = 60.0
+
+
+class SpaceSaving:
+    """Space-Saving summary (Metwally et al.): the top items of a stream in
+    `capacity` counters.
+
+    When all counters are taken, a new item replaces the smallest counter
+    and inherits its count as `error`. Every item whose true count exceeds
+    total/capacity is guaranteed to be present, and each reported count is
+    an upper bound that is at most `error` above the true count.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, float] = {}
+        self.errors: Dict[str, float] = {}
+        self.total = 0.0
+
+    def add(self, item: str, weight: float = 1.0) -> None:
+        """Count one occurrence of `item`"""
+        self.total += weight
+        if item in self.counts:
+            self.counts[item] += weight
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = weight
+            self.errors[item] = 0.0
+            return
+        # O(capacity) scan; capacities are small enough that a linked
+        # stream-summary structure would not pay for itself
+        victim = min(self.counts, key=self.counts.__getitem__)
+        floor = self.counts.pop(victim)
+        del self.errors[victim]
+        self.counts[item] = floor + weight
+        self.errors[item] = floor
+
+    @property
+    def min_count(self) -> float:
+        """Count an item absent from a full summary may at most have"""
+        return min(self.counts.values()) if len(self.counts) >= self.capacity else 0.0
+
+    @classmethod
+    def merge(cls, summaries: Iterable["SpaceSaving"], capacity: int) -> "SpaceSaving":
+        """Combine summaries of disjoint streams, keeping the guarantees.
+
+        An item missing from a full summary may still have occurred up to
+        that summary's min_count times there, so that amount is added to
+        both its count and its error.
+        """
+        summaries = list(summaries)
+        items = set().union(*(s.counts for s in summaries)) if summaries else set()
+        merged = cls(capacity)
+        for summary in summaries:
+            floor = summary.min_count
+            merged.total += summary.total
+            for item in items:
+                merged.counts[item] = merged.counts.get(item, 0.0) + summary.counts.get(item, floor)
+                merged.errors[item] = merged.errors.get(item, 0.0) + summary.errors.get(item, floor)
+        if len(merged.counts) > capacity:
+            keep = sorted(merged.counts, key=merged.counts.__getitem__, reverse=True)[:capacity]
+            merged.counts = {item: merged.counts[item] for item in keep}
+            merged.errors = {item: merged.errors[item] for item in keep}
+        return merged
+
+    def top(self, k: int) -> List[Dict[str, Any]]:
+        """The k largest counters, with the guaranteed lower bound of each"""
+        ranked = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [
+            {
+                "value": item,
+                "count": round(count, 2),
+                "min_count": round(count - self.errors[item], 2),
+            }
+            for item, count in ranked
+        ]
+
+
+class SlidingHeavyHitters:
+    """Top error/critical subjects, types and sources over sliding windows.
+
+    Events go into one Space-Saving summary per dimension per pane of
+    `pane_seconds` (by CloudEvent time). Any window made of whole panes
+    within the retention, such as the last 5 minutes or a Flink window, is
+    answered by merging its panes. Memory is bounded by
+    dimensions x panes x capacity counters whatever the cardinality.
+    """
+
+    def __init__(
+        self,
+        capacity: int = HEAVY_HITTERS_CAPACITY,
+        pane_seconds: float = HEAVY_HITTERS_PANE_SECONDS,
+        retention_seconds: float = HEAVY_HITTERS_RETENTION_SECONDS,
+    ):
+        self.capacity = capacity
+        self.pane_seconds = pane_seconds
+        self.max_panes = max(1, int(retention_seconds // pane_seconds))
+        self._panes: Dict[int, Dict[str, SpaceSaving]] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.late = 0
+
+    @property
+    def retention_seconds(self) -> float:
+        return self.max_panes * self.pane_seconds
+
+    def record(self, event: dict, now: Optional[float] = None) -> bool:
+        """Count an error/critical event; other severities are ignored"""
+        if (event.get('severity') or '').lower() not in TRACKED_SEVERITIES:
+            return False
+        now = time.time() if now is None else now
+        timestamp = event_time(event)
+        if timestamp is None or timestamp > now + MAX_CLOCK_SKEW_SECONDS:
+            timestamp = now
+        pane = int(timestamp // self.pane_seconds)
+        weight = float(event.get('sample_weight') or 1.0)
+
+        with self._lock:
+            summaries = self._panes.get(pane)
+            if summaries is None:
+                newest = max(self._panes, default=pane)
+                if pane <= newest - self.max_panes:
+                    self.late += 1
+                    return False
+                summaries = self._panes[pane] = {dim: SpaceSaving(self.capacity) for dim in DIMENSIONS}
+                for expired in [p for p in self._panes if p <= max(newest, pane) - self.max_panes]:
+                    del self._panes[expired]
+            for dim in DIMENSIONS:
+                value = event.get(dim)
+                if value:
+                    summaries[dim].add(str(value), weight)
+            self.recorded += 1
+        return True
+
+    def top(
+        self,
+        dimension: str,
+        k: int = 10,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Top k values of `dimension` in panes starting within [start, end).
+
+        Defaults to the whole retention. Returns None when no retained pane
+        falls in the range.
+        """
+        if dimension not in DIMENSIONS:
+            raise ValueError(f"Unknown dimension '{dimension}' (use one of {', '.join(DIMENSIONS)})")
+        with self._lock:
+            selected = [
+                summaries[dimension]
+                for pane, summaries in self._panes.items()
+                if (start is None or pane * self.pane_seconds >= start)
+                and (end is None or pane * self.pane_seconds < end)
+            ]
+            if not selected:
+                return None
+            merged = SpaceSaving.merge(selected, self.capacity)
+        return merged.top(k)
+
+    def recent(self, dimension: str, k: int, seconds: float, now: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Top k over the last `seconds`, rounded out to whole panes"""
+        now = time.time() if now is None else now
+        current_pane = int(now // self.pane_seconds)
+        panes = max(1, int(-(-seconds // self.pane_seconds)))
+        start = (current_pane - panes + 1) * self.pane_seconds
+        return self.top(dimension, k, start=start) or []
+
+    def for_window(self, window_start: Any, window_end: Any, k: int) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+        """Top k of every dimension within a summary window, or None when
+        that window is no longer (or not yet) retained"""
+        start, end = to_epoch_seconds(window_start), to_epoch_seconds(window_end)
+        if start is None or end is None:
+            return None
+        with self._lock:
+            newest = max(self._panes, default=None)
+        # Part of the window may already have expired: report nothing rather than a partial ranking
+        if newest is None or start < (newest - self.max_panes + 1) * self.pane_seconds:
+            return None
+        result = {}
+        for dim in DIMENSIONS:
+            top = self.top(dim, k, start, end)
+            if top:
+                result[dim] = top
+        return result or None
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters in use and retention"""
+        with self._lock:
+            counters = sum(len(s.counts) for summaries in self._panes.values() for s in summaries.values())
+            panes = len(self._panes)
+        return {
+            "recorded": self.recorded,
+            "late": self.late,
+            "panes": panes,
+            "pane_seconds": self.pane_seconds,
+            "retention_seconds": self.retention_seconds,
+            "capacity": self.capacity,
+            "counters": counters,
+            "max_counters": len(DIMENSIONS) * self.max_panes * self.capacity,
+        }
+
+
+# Global instance
+heavy_hitters = SlidingHeavyHitters()
@@ -0,0 +1,209 @@
+# app/services/insight_cache.py
+"""
+Persistent SQLite-backed insight cache keyed by summary fingerprint
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Dict, Any, List
+
+from ..config import INSIGHT_CACHE_PATH, INSIGHT_CACHE_MAX_ENTRIES, INSIGHT_CACHE_MEMORY_ENTRIES
+from .metrics import pipeline_metrics, to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Summary fields that determine the insight. Windows are re-analysed
+# only when one of these changes (e.g. an upsert with new counts).
+FINGERPRINT_FIELDS = (
+    'health_status', 'total_events', 'total_sources', 'critical_count',
+    'error_count', 'warning_count', 'top_error_source', 'top_error_count',
+    'correlation_count', 'anomaly_count', 'error_trend',
+)
+
+# Cache hits buffered in memory before their last_access is written back
+ACCESS_FLUSH_BATCH = 100
+
+
+def summary_fingerprint(summary: dict) -> str:
+    """Stable key for a summary, independent of how its timestamps are encoded"""
+    key = {field: summary.get(field) for field in FINGERPRINT_FIELDS}
+    for field in ('window_start', 'window_end'):
+        value = summary.get(field)
+        epoch = to_epoch_seconds(value)
+        key[field] = epoch if epoch is not None else value
+    key['error_rate_percent'] = round(summary.get('error_rate_percent') or 0.0, 2)
+    canonical = json.dumps(key, sort_keys=True, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class InsightCache:
+    """Disk-backed insight store with an in-memory LRU in front of it.
+
+    Entries are evicted least-recently-used first once the table holds
+    more than `max_entries` rows. `warm()` preloads the most recently used
+    entries into memory at startup. A hit only touches the database on a
+    memory miss; last_access updates are buffered and written in batches
+    of `access_flush_batch` (and before evicting or closing).
+    """
+
+    def __init__(
+        self,
+        path: str = INSIGHT_CACHE_PATH,
+        max_entries: int = INSIGHT_CACHE_MAX_ENTRIES,
+        memory_entries: int = INSIGHT_CACHE_MEMORY_ENTRIES,
+        access_flush_batch: int = ACCESS_FLUSH_BATCH,
+    ):
+        self._path = path
+        self._max_entries = max_entries
+        self._memory_entries = memory_entries
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._access_flush_batch = access_flush_batch
+        self._accessed: Dict[str, float] = {}  # fingerprint -> last_access not yet written
+        self._conn: Optional[sqlite3.Connection] = None
+        self._count = 0
+        self._lock = threading.Lock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Lazy initialization of the SQLite database"""
+        if self._conn is None:
+            if self._path != ':memory:':
+                Path(self._path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self._path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS insights ("
+                " fingerprint TEXT PRIMARY KEY,"
+                " window_start TEXT,"
+                " insight TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_insights_access ON insights(last_access)")
+            self._count = self._conn.execute("SELECT COUNT(*) FROM insights").fetchone()[0]
+            logger.info(f"Insight cache opened at {self._path} ({self._count} entries)")
+        return self._conn
+
+    def __len__(self) -> int:
+        with self._lock:
+            self.conn  # opening the database loads the row count
+            return self._count
+
+    def _remember(self, fingerprint: str, insight: Dict[str, Any]) -> None:
+        self._memory[fingerprint] = insight
+        self._memory.move_to_end(fingerprint)
+        while len(self._memory) > self._memory_entries:
+            self._memory.popitem(last=False)
+
+    def _flush_access(self) -> None:
+        if not self._accessed:
+            return
+        self.conn.executemany(
+            "UPDATE insights SET last_access = ? WHERE fingerprint = ?",
+            [(at, fingerprint) for fingerprint, at in self._accessed.items()]
+        )
+        self.conn.commit()
+        self._accessed.clear()
+
+    def flush(self) -> None:
+        """Write buffered last_access times to the database"""
+        with self._lock:
+            self._flush_access()
+
+    def warm(self) -> int:
+        """Load the most recently used entries into memory; returns the count loaded"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT fingerprint, insight FROM insights ORDER BY last_access DESC LIMIT ?",
+                (self._memory_entries,)
+            ).fetchall()
+            for fingerprint, insight in reversed(rows):
+                self._remember(fingerprint, json.loads(insight))
+        logger.info(f"Insight cache warmed with {len(rows)} entries")
+        return len(rows)
+
+    def get(self, summary: dict) -> Optional[Dict[str, Any]]:
+        """Return the cached insight for a summary, if any"""
+        fingerprint = summary_fingerprint(summary)
+        with self._lock:
+            insight = self._memory.get(fingerprint)
+            if insight is None:
+                row = self.conn.execute(
+                    "SELECT insight FROM insights WHERE fingerprint = ?", (fingerprint,)
+                ).fetchone()
+                if row is not None:
+                    insight = json.loads(row[0])
+            if insight is None:
+                pipeline_metrics.increment('insight_cache_misses')
+                return None
+            self._remember(fingerprint, insight)
+            self._accessed[fingerprint] = time.time()
+            if len(self._accessed) >= self._access_flush_batch:
+                self._flush_access()
+        pipeline_metrics.increment('insight_cache_hits')
+        return {**insight, "cached": True}
+
+    def put(self, summary: dict, insight: Dict[str, Any]) -> None:
+        """Store a successful insight, evicting least recently used entries over the limit"""
+        if insight.get('status') != 'success':
+            return
+        fingerprint = summary_fingerprint(summary)
+        insight = {k: v for k, v in insight.items() if k not in ('cached', 'shared')}
+        now = time.time()
+        with self._lock:
+            exists = self.conn.execute(
+                "SELECT 1 FROM insights WHERE fingerprint = ?", (fingerprint,)
+            ).fetchone() is not None
+            self.conn.execute(
+                "INSERT OR REPLACE INTO insights (fingerprint, window_start, insight, created_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (fingerprint, str(summary.get('window_start')), json.dumps(insight), now, now)
+            )
+            if not exists:
+                self._count += 1
+            if self._count > self._max_entries:
+                self._flush_access()
+                excess = self._count - self._max_entries
+                evicted = [row[0] for row in self.conn.execute(
+                    "SELECT fingerprint FROM insights ORDER BY last_access ASC LIMIT ?", (excess,)
+                )]
+                self.conn.executemany("DELETE FROM insights WHERE fingerprint = ?", [(f,) for f in evicted])
+                for fp in evicted:
+                    self._memory.pop(fp, None)
+                self._count -= len(evicted)
+                pipeline_metrics.increment('insight_cache_evictions', len(evicted))
+            self.conn.commit()
+            self._remember(fingerprint, insight)
+
+    def join(self, summaries: List[dict]) -> List[dict]:
+        """Attach cached insights to summaries that do not have one yet"""
+        for summary in summaries:
+            if 'ai_insight' not in summary:
+                insight = self.get(summary)
+                if insight is not None:
+                    summary['ai_insight'] = insight
+        return summaries
+
+    def close(self) -> None:
+        """Close the database connection"""
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._flush_access()
+                except sqlite3.Error as e:
+                    logger.warning(f"Insight cache access times not saved: {e}")
+                self._conn.close()
+                self._conn = None
+            self._memory.clear()
+            self._accessed.clear()
+
+
+# Global instance
+insight_cache = InsightCache()
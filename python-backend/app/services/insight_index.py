@@ -0,0 +1,266 @@
+# app/services/insight_index.py
+"""
+Near-duplicate insight reuse with a NumPy nearest-neighbour index over past summaries
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import (
+    INSIGHT_INDEX_CAPACITY, INSIGHT_INDEX_THRESHOLD, INSIGHT_INDEX_PROMPT_K, INSIGHT_INDEX_DELTA,
+)
+
+logger = logging.getLogger(__name__)
+
+# Summary counts embedded as log2(1 + x): a doubling moves a feature by ~1
+COUNT_FEATURES = (
+    'total_events', 'total_sources', 'critical_count', 'error_count', 'warning_count',
+    'top_error_count', 'correlation_count', 'anomaly_count', 'error_rate_percent',
+)
+# error_trend values of 06_error_rate_trends.sql
+ERROR_TRENDS = ('STABLE', 'NEW_ERRORS', 'SPIKE', 'INCREASING', 'DECREASING', 'IMPROVING')
+# Weight of a categorical one-hot: a trend, status or top source mismatch
+# alone puts two summaries 2.8 apart (similarity ~0.26)
+CATEGORY_WEIGHT = 2.0
+CATEGORY_PENALTY = 2.0 * CATEGORY_WEIGHT ** 2  # squared distance of one mismatch
+
+# Row layout: features, then -|v|^2 / 2 so one product yields the distance
+# ranking, padded to 16 float32 (64 bytes) per row
+FEATURES = len(COUNT_FEATURES) + len(ERROR_TRENDS)
+NORM_COLUMN = FEATURES
+WIDTH = 16
+
+# Past incidents below this similarity are not worth a prompt line
+MIN_CONTEXT_SIMILARITY = 0.25
+
+# Fields compared in the templated delta of a reused insight
+DELTA_FIELDS = (
+    ('total_events', 'events', '{:g}'),
+    ('critical_count', 'critical', '{:g}'),
+    ('error_count', 'errors', '{:g}'),
+    ('warning_count', 'warnings', '{:g}'),
+    ('error_rate_percent', 'error rate', '{:.2f}%'),
+    ('top_error_count', 'errors from top source', '{:g}'),
+)
+
+
+def summary_vector(summary: dict) -> np.ndarray:
+    """Embed a summary's numeric features and error trend (the norm column is left at 0)"""
+    vector = np.zeros(WIDTH, dtype=np.float32)
+    counts = [float(summary.get(field) or 0.0) for field in COUNT_FEATURES]
+    vector[:len(COUNT_FEATURES)] = np.log2(1.0 + np.maximum(counts, 0.0))
+    trend = summary.get('error_trend')
+    if trend in ERROR_TRENDS:
+        vector[len(COUNT_FEATURES) + ERROR_TRENDS.index(trend)] = CATEGORY_WEIGHT
+    return vector
+
+
+def partition_key(summary: dict) -> Tuple[str, str]:
+    """Summaries are only reused within the same health status and top error source"""
+    return (str(summary.get('health_status') or 'UNKNOWN'), str(summary.get('top_error_source') or 'none'))
+
+
+def describe_delta(previous: Dict[str, Any], summary: dict) -> str:
+    """One sentence listing how the metrics moved since the reused window"""
+    changes = []
+    for field, label, fmt in DELTA_FIELDS:
+        before, after = previous.get(field) or 0, summary.get(field) or 0
+        if before != after:
+            changes.append(f"{label} {fmt.format(before)} -> {fmt.format(after)}")
+    return ", ".join(changes) if changes else "no metric changes"
+
+
+class _Partition:
+    """Rows of one (health_status, top_error_source), in a growable float32 matrix"""
+
+    def __init__(self):
+        self.rows = np.zeros((16, WIDTH), dtype=np.float32)
+        self.entries: List[Dict[str, Any]] = []
+        self.ids: List[int] = []
+        self.positions: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def add(self, entry_id: int, vector: np.ndarray, entry: Dict[str, Any]) -> None:
+        size = len(self.entries)
+        if size == len(self.rows):
+            grown = np.zeros((size * 2, WIDTH), dtype=np.float32)
+            grown[:size] = self.rows
+            self.rows = grown
+        self.rows[size] = vector
+        self.rows[size, NORM_COLUMN] = -0.5 * float(vector @ vector)
+        self.entries.append(entry)
+        self.ids.append(entry_id)
+        self.positions[entry_id] = size
+
+    def remove(self, entry_id: int) -> None:
+        """Drop a row by moving the last row into its place"""
+        row, last = self.positions.pop(entry_id), len(self.entries) - 1
+        if row != last:
+            self.rows[row] = self.rows[last]
+            self.entries[row] = self.entries[last]
+            self.ids[row] = self.ids[last]
+            self.positions[self.ids[row]] = row
+        self.entries.pop()
+        self.ids.pop()
+
+    def closest(self, query: np.ndarray, query_norm: float, k: int) -> List[Tuple[float, Dict[str, Any]]]:
+        """The k nearest rows as (squared distance, entry)"""
+        # query carries 1 in the norm column: score = v.q - |v|^2/2 = (|q|^2 - |v-q|^2) / 2
+        scores = self.rows[:len(self.entries)] @ query
+        if k == 1:
+            rows = [int(np.argmax(scores))]
+        elif k < len(scores):
+            rows = np.argpartition(-scores, k - 1)[:k]
+        else:
+            rows = range(len(scores))
+        return [(max(query_norm - 2.0 * float(scores[r]), 0.0), self.entries[r]) for r in rows]
+
+
+class InsightIndex:
+    """Analysed summaries as vectors for near-duplicate reuse and prompt context.
+
+    Similarity is 1 / (1 + Euclidean distance) over log-scaled counts and
+    one-hot categories. Rows are partitioned by health status and top error
+    source: a reuse lookup scans only its partition with one matrix-vector
+    product, and a similar-incident search adds the fixed distance between
+    partitions. Once `capacity` entries are held, the oldest is dropped.
+    """
+
+    def __init__(
+        self,
+        capacity: int = INSIGHT_INDEX_CAPACITY,
+        threshold: float = INSIGHT_INDEX_THRESHOLD,
+        delta: bool = INSIGHT_INDEX_DELTA,
+    ):
+        self.capacity = capacity
+        self.threshold = threshold
+        self.delta = delta
+        self._partitions: Dict[Tuple[str, str], _Partition] = {}
+        self._order: deque = deque()  # (partition key, entry id), oldest first
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._latencies_ms: deque = deque(maxlen=1000)
+        self.lookups = 0
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def add(self, summary: dict, insight: Dict[str, Any]) -> None:
+        """Index an analysed summary with its insight"""
+        key = partition_key(summary)
+        vector = summary_vector(summary)
+        entry = {
+            "window_start": str(summary.get('window_start')),
+            "health_status": summary.get('health_status'),
+            "top_error_source": summary.get('top_error_source'),
+            "metrics": {field: summary.get(field) for field, _, _ in DELTA_FIELDS},
+            "insight": {k: v for k, v in insight.items() if k not in ('cached', 'shared', 'replica')},
+        }
+        with self._lock:
+            while len(self._order) >= self.capacity:
+                old_key, old_id = self._order.popleft()
+                partition = self._partitions[old_key]
+                partition.remove(old_id)
+                if not partition:
+                    del self._partitions[old_key]
+            partition = self._partitions.get(key)
+            if partition is None:
+                partition = self._partitions[key] = _Partition()
+            partition.add(self._next_id, vector, entry)
+            self._order.append((key, self._next_id))
+            self._next_id += 1
+
+    @staticmethod
+    def _query(summary: dict) -> Tuple[np.ndarray, float]:
+        vector = summary_vector(summary)
+        norm = float(vector @ vector)
+        vector[NORM_COLUMN] = 1.0
+        return vector, norm
+
+    def nearest(self, summary: dict, k: int = 1) -> List[Tuple[float, Dict[str, Any]]]:
+        """The k most similar indexed summaries across partitions as (similarity, entry), best first"""
+        if k <= 0:
+            return []
+        key = partition_key(summary)
+        query, norm = self._query(summary)
+        candidates = []
+        with self._lock:
+            for other, partition in self._partitions.items():
+                penalty = CATEGORY_PENALTY * ((other[0] != key[0]) + (other[1] != key[1]))
+                candidates.extend((d + penalty, entry) for d, entry in partition.closest(query, norm, k))
+        candidates.sort(key=lambda item: item[0])
+        return [(1.0 / (1.0 + math.sqrt(d)), entry) for d, entry in candidates[:k]]
+
+    def lookup(self, summary: dict) -> Optional[Dict[str, Any]]:
+        """Reuse the insight of a near-duplicate summary, or None"""
+        start = time.perf_counter()
+        query, norm = self._query(summary)
+        with self._lock:
+            partition = self._partitions.get(partition_key(summary))
+            match = partition.closest(query, norm, 1)[0] if partition else None
+        self._latencies_ms.append((time.perf_counter() - start) * 1000.0)
+        self.lookups += 1
+        if match is None:
+            return None
+        distance, entry = match
+        similarity = 1.0 / (1.0 + math.sqrt(distance))
+        if similarity < self.threshold:
+            return None
+        self.hits += 1
+        insight = {
+            **entry['insight'],
+            "reused_from": entry['window_start'],
+            "similarity": round(similarity, 3),
+        }
+        if self.delta and insight.get('insight'):
+            delta = describe_delta(entry['metrics'], summary)
+            insight['delta'] = delta
+            insight['insight'] = (
+                f"{insight['insight']}\n\n_Reused from the analysis of window {entry['window_start']} "
+                f"(similarity {similarity:.2f}); since then: {delta}._"
+            )
+        return insight
+
+    def similar_incidents(self, summary: dict, k: int = INSIGHT_INDEX_PROMPT_K) -> List[Dict[str, Any]]:
+        """Compact descriptions of the k most similar past incidents, for prompts"""
+        incidents = []
+        for similarity, entry in self.nearest(summary, k):
+            if similarity < MIN_CONTEXT_SIMILARITY:
+                break
+            text = (entry['insight'].get('insight') or '').strip().splitlines()
+            incidents.append({
+                "window_start": entry['window_start'],
+                "health_status": entry['health_status'],
+                "top_error_source": entry['top_error_source'],
+                "similarity": round(similarity, 2),
+                "assessment": text[0][:200] if text else "",
+            })
+        return incidents
+
+    def stats(self) -> Dict[str, Any]:
+        """Size, hit rate and recent lookup latency"""
+        latencies = np.fromiter(self._latencies_ms, dtype=np.float64)
+        return {
+            "entries": len(self._order),
+            "partitions": len(self._partitions),
+            "capacity": self.capacity,
+            "threshold": self.threshold,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else None,
+            "lookup_ms_p50": round(float(np.percentile(latencies, 50)), 4) if latencies.size else None,
+            "lookup_ms_p99": round(float(np.percentile(latencies, 99)), 4) if latencies.size else None,
+        }
+
+
+# Global instance
+insight_index = InsightIndex()
@@ -0,0 +1,168 @@
+# app/services/insight_pipeline.py
+"""
+Insight pipeline: local fast path first, LLM only for windows that need it
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional
+
+from ..config import (
+    LLM_STREAMING, INSIGHT_CACHE_ENABLED, INSIGHT_TOPIC_ENABLED, INSIGHT_INDEX_ENABLED, INSIGHT_INDEX_PROMPT_K,
+    HEAVY_HITTERS_ENABLED, HEAVY_HITTERS_PROMPT_K,
+)
+from .ai_service import GeminiService, gemini_service
+from .insight_cache import InsightCache, insight_cache
+from .insight_rules import RuleBasedInsightEngine, insight_rules
+from .insight_index import InsightIndex, insight_index
+from .insight_topic import SharedInsights, shared_insights
+from .heavy_hitters import SlidingHeavyHitters, heavy_hitters
+from .metrics import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# Builds the streaming callback for a summary (see routes.websocket.partial_sender)
+PartialSenderFactory = Callable[[dict], Callable[[str], Awaitable[None]]]
+
+
+class InsightPipeline:
+    """Resolves an `ai_insight` for each summary, cheapest source first"""
+
+    def __init__(
+        self,
+        llm: GeminiService = gemini_service,
+        rules: RuleBasedInsightEngine = insight_rules,
+        cache: Optional[InsightCache] = None,
+        hitters: Optional[SlidingHeavyHitters] = None,
+        shared: Optional[SharedInsights] = None,
+        index: Optional[InsightIndex] = None,
+    ):
+        self.llm = llm
+        self.rules = rules
+        self.cache = cache
+        self.hitters = hitters
+        self.shared = shared
+        self.index = index
+
+    async def attach(
+        self,
+        summaries: List[dict],
+        partial_sender: Optional[PartialSenderFactory] = None,
+    ) -> None:
+        """Set summary['ai_insight'] in place.
+
+        Windows already in the persistent cache, or analysed by any replica
+        (shared insights topic), are reused. Routine windows
+        are answered by the rule engine, near-duplicates of an analysed window
+        by the vector index. The rest go to the LLM: a single
+        window is streamed through `partial_sender` when streaming is
+        enabled, several windows share batched prompts. Escalated windows
+        get no insight when no LLM is configured. Escalated windows still
+        held by the heavy-hitter tracker get their top offending subjects,
+        types and sources as `top_offenders`, and the most similar past
+        incidents as `similar_incidents`, for the prompt. LLM insights are
+        indexed and published to the shared insights topic.
+        """
+        escalated = []
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self._cached, summaries)
+        else:
+            cached = [None] * len(summaries)
+        for summary, insight in zip(summaries, cached):
+            if insight is None and self.shared is not None:
+                insight = self.shared.get(summary)
+                if insight is not None:
+                    self._store(summary, insight)
+            if insight is None:
+                insight = self.rules.evaluate(summary)
+                if insight is None and self.index is not None:
+                    insight = self.index.lookup(summary)
+                if insight is not None:
+                    self._store(summary, insight)
+            if insight is None:
+                escalated.append(summary)
+            else:
+                summary['ai_insight'] = insight
+
+        if not escalated or not self.llm.is_available:
+            return
+        self.rules.record_escalated(len(escalated))
+        self._add_top_offenders(escalated)
+        self._add_similar_incidents(escalated)
+
+        try:
+            with pipeline_metrics.time_stage('gemini'):
+                if len(escalated) > 1:
+                    insights = await self.llm.generate_batch_insights(escalated)
+                elif LLM_STREAMING and partial_sender is not None:
+                    insights = [await self.llm.stream_insight(escalated[0], partial_sender(escalated[0]))]
+                else:
+                    insights = [await self.llm.generate_insight(escalated[0])]
+            for summary, insight in zip(escalated, insights):
+                summary['ai_insight'] = insight
+                self._store(summary, insight)
+                if self.index is not None and insight.get('status') == 'success':
+                    self.index.add(summary, insight)
+                if self.shared is not None:
+                    self.shared.publish(summary, insight)
+        except Exception as ai_err:
+            # Optional - don't fail if quota exceeded
+            logger.warning(f"AI insight skipped: {ai_err}")
+            for summary in escalated:
+                summary['ai_insight'] = {"status": "skipped", "reason": "quota exceeded"}
+
+    def _add_top_offenders(self, summaries: List[dict]) -> None:
+        if self.hitters is None or HEAVY_HITTERS_PROMPT_K <= 0:
+            return
+        for summary in summaries:
+            offenders = self.hitters.for_window(
+                summary.get('window_start'), summary.get('window_end'), HEAVY_HITTERS_PROMPT_K
+            )
+            if offenders:
+                summary['top_offenders'] = offenders
+
+    def _add_similar_incidents(self, summaries: List[dict]) -> None:
+        if self.index is None or INSIGHT_INDEX_PROMPT_K <= 0:
+            return
+        for summary in summaries:
+            incidents = self.index.similar_incidents(summary, INSIGHT_INDEX_PROMPT_K)
+            if incidents:
+                summary['similar_incidents'] = incidents
+
+    def _cached(self, summaries: List[dict]) -> List[Optional[dict]]:
+        # Runs in a worker thread: a cache miss reads SQLite
+        insights = []
+        for summary in summaries:
+            try:
+                insights.append(self.cache.get(summary))
+            except Exception as e:
+                logger.warning(f"Insight cache read failed: {e}")
+                insights.append(None)
+        return insights
+
+    def _store(self, summary: dict, insight: dict) -> None:
+        if self.cache is None:
+            return
+        try:
+            self.cache.put(summary, insight)
+        except Exception as e:
+            logger.warning(f"Insight cache write failed: {e}")
+
+    def stats(self) -> dict:
+        """Fast-path and escalation statistics"""
+        return {
+            "rules": self.rules.stats(),
+            "cache_enabled": self.cache is not None,
+            "shared": self.shared.stats() if self.shared is not None else None,
+            "index": self.index.stats() if self.index is not None else None,
+            "llm_available": self.llm.is_available,
+        }
+
+
+# Global instance
+insight_pipeline = InsightPipeline(
+    cache=insight_cache if INSIGHT_CACHE_ENABLED else None,
+    hitters=heavy_hitters if HEAVY_HITTERS_ENABLED else None,
+    shared=shared_insights if INSIGHT_TOPIC_ENABLED else None,
+    index=insight_index if INSIGHT_INDEX_ENABLED else None,
+)
@@ -0,0 +1,192 @@
+# app/services/insight_rules.py
+"""
+Deterministic rule-based insights for routine health windows
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, Any
+
+from .metrics import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# Statuses that always need the LLM
+ESCALATE_STATUSES = {"CRITICAL", "DEGRADED"}
+
+# Trends that mean the window is changing and deserves a closer look
+ANOMALOUS_TRENDS = {"SPIKE", "INCREASING", "WORSENING"}
+
+# Known failure patterns per source (see EVENT_TEMPLATES), used when a single
+# source accounts for the errors in a window
+KNOWN_SOURCE_PATTERNS: Dict[str, Dict[str, str]] = {
+    "jenkins": {
+        "root_cause": "CI/CD pipeline failures reported by Jenkins",
+        "impact": "Builds or deployments are blocked; production is not directly affected",
+        "recommendation": "Check the latest failed build log and re-run once the failing step is fixed",
+    },
+    "github": {
+        "root_cause": "Repository or pull request automation errors from GitHub",
+        "impact": "Code delivery may be delayed; runtime services unaffected",
+        "recommendation": "Review failing checks on the most recent pushes and pull requests",
+    },
+    "kubernetes": {
+        "root_cause": "Pod or deployment errors reported by Kubernetes",
+        "impact": "Reduced capacity for the affected workload",
+        "recommendation": "Inspect pod events and resource limits for the failing deployment",
+    },
+    "datadog": {
+        "root_cause": "Monitoring alerts raised by Datadog",
+        "impact": "A monitored service is reporting errors",
+        "recommendation": "Open the triggering Datadog monitor and check the affected service's dashboards",
+    },
+    "pagerduty": {
+        "root_cause": "Incident activity reported by PagerDuty",
+        "impact": "An on-call incident is open for the affected service",
+        "recommendation": "Confirm the incident is acknowledged and follow its runbook",
+    },
+}
+
+
+def _source_name(source: Optional[str]) -> str:
+    """Map a CloudEvent source URL (https://jenkins.com/demo) to a short name"""
+    if not source:
+        return ""
+    name = source.split("://", 1)[-1].split("/", 1)[0]
+    return name.split(".", 1)[0].lower()
+
+
+def _format(status: str, root_cause: str, impact: str, recommendation: str) -> str:
+    return (
+        f"1. **Status**: {status}\n"
+        f"2. **Root Cause**: {root_cause}\n"
+        f"3. **Impact**: {impact}\n"
+        f"4. **Recommendation**: {recommendation}"
+    )
+
+
+class RuleBasedInsightEngine:
+    """Answers routine windows locally and escalates the rest to the LLM.
+
+    Handled locally:
+    - HEALTHY windows without errors or anomalies
+    - WARNING windows whose errors come from a single known source
+    - correlated incidents confined to a single known source
+
+    CRITICAL/DEGRADED windows and anomalous combinations (anomalies,
+    spiking trends, several erroring sources, inconsistent counts) return
+    None ("declined"); the caller tries its other local paths and reports
+    the windows it really sends to the LLM with `record_escalated`.
+    """
+
+    def __init__(self):
+        self.evaluated = 0
+        self.fast_path = 0
+        self.declined = 0
+        self.escalated = 0
+        self.rule_seconds = 0.0
+
+    def escalation_reason(self, summary: dict) -> Optional[str]:
+        """Why this window needs the LLM, or None if it is routine"""
+        status = str(summary.get('health_status') or 'unknown').upper()
+        if status in ESCALATE_STATUSES:
+            return f"status {status}"
+        if (summary.get('critical_count') or 0) > 0:
+            return "critical events"
+        if (summary.get('anomaly_count') or 0) > 0:
+            return "anomalies detected"
+        if str(summary.get('error_trend') or '').upper() in ANOMALOUS_TRENDS:
+            return f"error trend {summary.get('error_trend')}"
+        if status == 'HEALTHY' and (summary.get('error_count') or 0) > 0:
+            return "errors in a HEALTHY window"
+        sources = summary.get('top_error_sources')
+        if sources is not None and len(sources) > 1:
+            return "multiple error sources"
+        if status not in ('HEALTHY', 'WARNING'):
+            return f"unknown status {status}"
+        top_source = summary.get('top_error_source')
+        if status == 'WARNING' and _source_name(top_source) not in KNOWN_SOURCE_PATTERNS:
+            return f"unknown error source {top_source}"
+        return None
+
+    def _render(self, summary: dict) -> str:
+        status = str(summary.get('health_status')).upper()
+        total = summary.get('total_events') or 0
+        sources = summary.get('total_sources') or 0
+        if status == 'HEALTHY':
+            warnings = summary.get('warning_count') or 0
+            return _format(
+                f"System is healthy: {total} events from {sources} sources with no errors"
+                f" ({warnings} warnings).",
+                "None - no error or critical events in this window.",
+                "No user-facing impact.",
+                "No action needed; continue monitoring.",
+            )
+
+        source = summary.get('top_error_source')
+        pattern = KNOWN_SOURCE_PATTERNS[_source_name(source)]
+        errors = summary.get('error_count') or 0
+        rate = summary.get('error_rate_percent') or 0
+        correlated = summary.get('correlation_count') or 0
+        status_line = f"Minor issues: {errors} errors out of {total} events ({rate:.2f}%), all from {source}."
+        if correlated:
+            status_line += f" {correlated} correlated incident(s) confined to this source."
+        return _format(
+            status_line,
+            f"{pattern['root_cause']} ({source}, {summary.get('top_error_count', errors)} errors).",
+            f"{pattern['impact']}. Severity: low.",
+            pattern['recommendation'] + ".",
+        )
+
+    def evaluate(self, summary: dict) -> Optional[Dict[str, Any]]:
+        """Return a local insight for routine windows, or None to escalate"""
+        start = time.perf_counter()
+        reason = self.escalation_reason(summary)
+        insight = None
+        if reason is None:
+            insight = {
+                "status": "success",
+                "insight": self._render(summary),
+                "engine": "rules",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        elapsed = time.perf_counter() - start
+
+        self.evaluated += 1
+        self.rule_seconds += elapsed
+        if insight is None:
+            self.declined += 1
+            logger.debug(f"Window {summary.get('window_start')} not routine: {reason}")
+        else:
+            self.fast_path += 1
+            pipeline_metrics.increment('insights_rule_based')
+        return insight
+
+    def record_escalated(self, count: int = 1) -> None:
+        """Count windows actually sent to the LLM"""
+        self.escalated += count
+        pipeline_metrics.increment('insights_escalated', count)
+
+    def stats(self) -> Dict[str, Any]:
+        """Escalation rate and estimated LLM latency saved by the fast path"""
+        gemini = pipeline_metrics.stages.get('gemini')
+        llm_mean_ms = gemini.total_ms / gemini.count if gemini and gemini.count else None
+        rule_mean_us = self.rule_seconds / self.evaluated * 1e6 if self.evaluated else None
+        saved_seconds = None
+        if llm_mean_ms is not None:
+            saved_seconds = round(self.fast_path * llm_mean_ms / 1000.0 - self.rule_seconds, 3)
+        return {
+            "evaluated": self.evaluated,
+            "fast_path": self.fast_path,
+            "declined": self.declined,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalated / self.evaluated, 4) if self.evaluated else None,
+            "rule_mean_us": round(rule_mean_us, 2) if rule_mean_us is not None else None,
+            "llm_mean_ms": round(llm_mean_ms, 2) if llm_mean_ms is not None else None,
+            "estimated_seconds_saved": saved_seconds,
+        }
+
+
+# Global instance
+insight_rules = RuleBasedInsightEngine()
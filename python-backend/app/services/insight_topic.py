@@ -0,0 +1,250 @@
+# app/services/insight_topic.py
+"""
+Fleet-wide insight sharing through a compacted Kafka topic
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from ..config import (
+    GEMINI_INSIGHTS_TOPIC, INSIGHT_TOPIC_PARTITIONS, INSIGHT_TOPIC_MAX_ENTRIES, REPLICA_ID,
+)
+from .insight_cache import summary_fingerprint
+from .kafka_service import KafkaConsumerService, KafkaProducerService, kafka_producer
+from .metrics import pipeline_metrics, to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Settings of the topic when it is created here
+TOPIC_CONFIG = {
+    'cleanup.policy': 'compact',
+    # Let the cleaner compact recent segments within minutes
+    'min.compaction.lag.ms': '60000',
+    'segment.ms': '3600000',
+}
+
+# Wait before rebuilding the view consumer after an error
+RETRY_SECONDS = 10.0
+
+
+def window_key(window_start: Any) -> Optional[str]:
+    """Topic key of a window: its start as a UTC ISO timestamp, however it was encoded"""
+    epoch = to_epoch_seconds(window_start)
+    if epoch is None:
+        return str(window_start) if window_start else None
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class SharedInsights:
+    """Materialized view of the compacted insights topic.
+
+    Each record is keyed by window_start and holds the insight with the
+    fingerprint of the summary it was generated for, so a window that is
+    re-emitted with different counts is analysed again. The view is built
+    by reading the topic from the beginning, then follows new records.
+    Published insights enter the view at once (read-your-writes).
+    """
+
+    def __init__(
+        self,
+        topic: str = GEMINI_INSIGHTS_TOPIC,
+        max_entries: int = INSIGHT_TOPIC_MAX_ENTRIES,
+        producer: KafkaProducerService = kafka_producer,
+        replica: str = REPLICA_ID,
+        poll_timeout: float = 1.0,
+    ):
+        self.topic = topic
+        self.max_entries = max_entries
+        self.producer = producer
+        self.replica = replica
+        self.poll_timeout = poll_timeout
+        self._view: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._consumer: Optional[KafkaConsumerService] = None
+        self._end_offsets: Dict[int, int] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._running = False
+        self.caught_up = False
+        self.hits = 0
+        self.misses = 0
+        self.published = 0
+        self.publish_errors = 0
+        self.applied = 0
+
+    # ------------------------------------------------------------------
+    # View
+    # ------------------------------------------------------------------
+
+    def _remember(self, key: str, record: Dict[str, Any]) -> None:
+        with self._lock:
+            self._view[key] = record
+            self._view.move_to_end(key)
+            while len(self._view) > self.max_entries:
+                self._view.popitem(last=False)
+
+    def apply(self, key: Optional[bytes], value: Optional[bytes]) -> None:
+        """Fold one topic record into the view; a None value (tombstone) removes the window"""
+        if key is None:
+            return
+        window = key.decode('utf-8')
+        if value is None:
+            with self._lock:
+                self._view.pop(window, None)
+            return
+        try:
+            record = json.loads(value.decode('utf-8'))
+        except ValueError as e:
+            logger.warning(f"Skipping malformed insight record for {window}: {e}")
+            return
+        if not isinstance(record, dict) or 'fingerprint' not in record or 'insight' not in record:
+            logger.warning(f"Skipping incomplete insight record for {window}")
+            return
+        self._remember(window, record)
+        self.applied += 1
+
+    def get(self, summary: dict) -> Optional[Dict[str, Any]]:
+        """The shared insight for this exact summary, if any replica produced one"""
+        key = window_key(summary.get('window_start'))
+        with self._lock:
+            record = self._view.get(key) if key is not None else None
+        if record is None or record['fingerprint'] != summary_fingerprint(summary):
+            self.misses += 1
+            return None
+        self.hits += 1
+        pipeline_metrics.increment('shared_insight_hits')
+        return {**record['insight'], "shared": True, "replica": record.get('replica')}
+
+    def join(self, summaries: List[dict]) -> List[dict]:
+        """Attach shared insights to summaries that do not have one yet"""
+        for summary in summaries:
+            if 'ai_insight' not in summary:
+                insight = self.get(summary)
+                if insight is not None:
+                    summary['ai_insight'] = insight
+        return summaries
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def _on_delivery(self, err, msg) -> None:
+        if err is not None:
+            self.publish_errors += 1
+            logger.warning(f"Insight for {msg.key()} not published: {err}")
+
+    def publish(self, summary: dict, insight: Dict[str, Any]) -> bool:
+        """Publish a successful LLM insight for a window; returns whether it was queued"""
+        if insight.get('status') != 'success' or insight.get('engine') == 'rules':
+            return False
+        key = window_key(summary.get('window_start'))
+        if key is None:
+            return False
+        record = {
+            "window_start": key,
+            "window_end": window_key(summary.get('window_end')),
+            "fingerprint": summary_fingerprint(summary),
+            "insight": {k: v for k, v in insight.items() if k not in ('cached', 'shared', 'replica')},
+            "replica": self.replica,
+            "published_at": time.time(),
+        }
+        self._remember(key, record)
+        try:
+            self.producer.produce_record(
+                self.topic, key.encode('utf-8'), json.dumps(record).encode('utf-8'), self._on_delivery
+            )
+        except Exception as e:
+            self.publish_errors += 1
+            logger.warning(f"Insight for {key} not published: {e}")
+            return False
+        self.published += 1
+        return True
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def ensure_topic(self) -> bool:
+        """Create the compacted topic if it does not exist (startup warm-up step)"""
+        return self.producer.ensure_topic(self.topic, INSIGHT_TOPIC_PARTITIONS, TOPIC_CONFIG)
+
+    def _track_progress(self, positions: Dict[int, int]) -> None:
+        # By position, not the last message: compacted-away offsets and
+        # transaction markers at the end of a partition are never delivered
+        for partition, position in positions.items():
+            if position >= self._end_offsets.get(partition, position + 1):
+                del self._end_offsets[partition]
+        if not self._end_offsets and not self.caught_up:
+            self.caught_up = True
+            logger.info(f"Shared insight view caught up ({len(self._view)} windows)")
+
+    async def _follow(self) -> None:
+        while self._running:
+            try:
+                if self._consumer is None:
+                    # Direct assignment: every replica reads every partition, no group
+                    self._consumer = KafkaConsumerService(group_id='insight-view', subscribe=False)
+                    self._end_offsets = await asyncio.to_thread(self._consumer.assign_from_beginning, self.topic)
+                    self.caught_up = not self._end_offsets
+                messages = await asyncio.to_thread(self._consumer.consume_batch, 500, self.poll_timeout)
+                for msg in messages:
+                    if msg.error():
+                        logger.warning(f"Insight topic error: {msg.error()}")
+                        continue
+                    self.apply(msg.key(), msg.value())
+                if self._end_offsets:
+                    self._track_progress(await asyncio.to_thread(
+                        self._consumer.positions, self.topic, list(self._end_offsets)
+                    ))
+            except Exception as e:
+                logger.warning(f"Shared insight view interrupted: {e}")
+                await asyncio.to_thread(self._close_consumer)
+                await asyncio.sleep(RETRY_SECONDS)
+        await asyncio.to_thread(self._close_consumer)
+
+    def _close_consumer(self) -> None:
+        consumer, self._consumer = self._consumer, None
+        if consumer is not None:
+            consumer.close()
+
+    def start(self) -> None:
+        """Start following the topic in the background"""
+        if self._task is None or self._task.done():
+            self._running = True
+            self._task = asyncio.create_task(self._follow())
+
+    async def stop(self) -> None:
+        """Stop following; the current poll is allowed to finish"""
+        self._running = False
+        if self._task is not None:
+            try:
+                await asyncio.wait_for(self._task, timeout=self.poll_timeout + 5.0)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                pass
+            self._task = None
+        self._close_consumer()
+
+    def stats(self) -> Dict[str, Any]:
+        """View size, hit rate and publishing counts"""
+        lookups = self.hits + self.misses
+        return {
+            "topic": self.topic,
+            "replica": self.replica,
+            "windows": len(self._view),
+            "caught_up": self.caught_up,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "applied": self.applied,
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+        }
+
+
+# Global instance
+shared_insights = SharedInsights()
@@ -0,0 +1,254 @@
+# app/services/kafka_pool.py
+"""
+Application-wide Kafka client pool managed by the FastAPI lifespan
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from confluent_kafka import KafkaException
+
+from ..config import (
+    CLOUDEVENTS_TOPIC, KAFKA_POOL_READERS, KAFKA_HEALTH_INTERVAL, KAFKA_HEALTH_TIMEOUT,
+    KAFKA_HEALTH_FAILURES, KAFKA_DRAIN_TIMEOUT, SUMMARY_SOURCE,
+)
+from .kafka_service import KafkaConsumerService, KafkaProducerService, kafka_producer
+from .summary_join import summary_joiner
+
+logger = logging.getLogger(__name__)
+
+
+class PoolDrainingError(Exception):
+    """Raised when a client is requested while the pool is shutting down"""
+
+
+class KafkaClientPool:
+    """Fixed set of long-lived Kafka clients shared by all requests.
+
+    - one producer (librdkafka producers are thread-safe and batch best
+      when shared), health-checked with a metadata request and rebuilt
+      after a fatal error or repeated failed checks
+    - `reader_count` manually-assigned readers leased to request handlers,
+      so no request pays for a group join or rebalance
+    - one subscribed consumer for the live summary feed
+
+    `ready` is True once broker metadata has been fetched and lists the
+    events topic, and turns False again when checks fail or when
+    draining. `drain()` flushes in-flight events and closes everything.
+    """
+
+    def __init__(
+        self,
+        producer: KafkaProducerService = kafka_producer,
+        reader_count: int = KAFKA_POOL_READERS,
+        health_interval: float = KAFKA_HEALTH_INTERVAL,
+        health_timeout: float = KAFKA_HEALTH_TIMEOUT,
+        max_failures: int = KAFKA_HEALTH_FAILURES,
+    ):
+        self.producer = producer
+        self.reader_count = reader_count
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.max_failures = max_failures
+        self.ready = False
+        self.draining = False
+        self.failures = 0
+        self.reconnects = 0
+        self.last_check: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._all_readers: List[KafkaConsumerService] = []
+        self._live_consumer: Optional[KafkaConsumerService] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._previous_sigterm = None
+
+    # ------------------------------------------------------------------
+    # Health and readiness
+    # ------------------------------------------------------------------
+
+    async def check_health(self) -> bool:
+        """Fetch broker metadata and rebuild the producer when it is broken"""
+        if self.draining:
+            return False
+        if self.producer.fatal_error is not None:
+            await self._reconnect(f"fatal error: {self.producer.fatal_error}")
+        try:
+            topics = await asyncio.to_thread(self.producer.cluster_topics, self.health_timeout)
+            if CLOUDEVENTS_TOPIC not in topics:
+                raise RuntimeError(f"topic {CLOUDEVENTS_TOPIC} not found")
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            if self.ready:
+                logger.warning(f"Kafka health check failed ({self.failures}x): {e}")
+            self.ready = False
+            if self.failures >= self.max_failures:
+                await self._reconnect(f"{self.failures} failed health checks")
+            return False
+        finally:
+            self.last_check = time.time()
+
+        if not self.ready:
+            logger.info("Kafka reachable - ready for traffic")
+        self.ready, self.failures, self.last_error = True, 0, None
+        return True
+
+    async def _reconnect(self, reason: str) -> None:
+        logger.warning(f"Recreating Kafka producer ({reason})")
+        self.reconnects += 1
+        self.failures = 0
+        await asyncio.to_thread(self.producer.reconnect, self.health_timeout)
+
+    async def _health_loop(self) -> None:
+        while True:
+            await self.check_health()
+            await asyncio.sleep(self.health_interval)
+
+    # ------------------------------------------------------------------
+    # Leasing
+    # ------------------------------------------------------------------
+
+    def _ensure_readers(self) -> asyncio.Queue:
+        if self._readers is None:
+            self._readers = asyncio.Queue()
+            for _ in range(self.reader_count):
+                reader = KafkaConsumerService(group_id='api-summary-reader', subscribe=False)
+                self._all_readers.append(reader)
+                self._readers.put_nowait(reader)
+        return self._readers
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[KafkaConsumerService]:
+        """Lease a reader; waits when all are busy. A reader that raised a
+        KafkaException is closed and replaced, so the next lease reconnects;
+        other errors in the caller's body leave it in the pool."""
+        if self.draining:
+            raise PoolDrainingError("Kafka client pool is shutting down")
+        readers = self._ensure_readers()
+        reader = await readers.get()
+        try:
+            yield reader
+        except KafkaException:
+            await asyncio.to_thread(reader.close)
+            self._all_readers.remove(reader)
+            reader = KafkaConsumerService(group_id='api-summary-reader', subscribe=False)
+            self._all_readers.append(reader)
+            raise
+        finally:
+            readers.put_nowait(reader)
+
+    @property
+    def live_consumer(self) -> KafkaConsumerService:
+        """The subscribed consumer behind the live summary feed"""
+        if self.draining:
+            raise PoolDrainingError("Kafka client pool is shutting down")
+        if self._live_consumer is None:
+            if SUMMARY_SOURCE == 'join':
+                # Backend join: read the upstream Flink tables instead of gemini_summary
+                self._live_consumer = KafkaConsumerService(
+                    read_from_beginning=False, topics=sorted(summary_joiner.topics), manual_commit=True
+                )
+            else:
+                self._live_consumer = KafkaConsumerService(read_from_beginning=False, manual_commit=True)
+        return self._live_consumer
+
+    def reset_live_consumer(self) -> None:
+        """Drop the live consumer after an error; the next access reconnects"""
+        consumer, self._live_consumer = self._live_consumer, None
+        if consumer is not None:
+            consumer.close()
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    def _on_sigterm(self, signum, frame) -> None:
+        # Fail readiness at once so the load balancer stops routing here
+        # while the server finishes in-flight requests and shuts down
+        self.ready = False
+        self.draining = True
+        logger.info("SIGTERM received - draining Kafka clients")
+        if callable(self._previous_sigterm):
+            self._previous_sigterm(signum, frame)
+        elif self._previous_sigterm == signal.SIG_DFL:
+            # No server handler to chain to: fall back to the default action
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    def _install_signal_handler(self) -> None:
+        try:
+            self._previous_sigterm = signal.getsignal(signal.SIGTERM)
+            signal.signal(signal.SIGTERM, self._on_sigterm)
+        except ValueError:
+            # Not on the main thread (e.g. test clients); nothing to chain
+            self._previous_sigterm = None
+
+    async def start(self) -> None:
+        """Start health checks and chain a SIGTERM handler"""
+        self.draining = False
+        self._ensure_readers()
+        self._install_signal_handler()
+        if self._health_task is None:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def drain(self, timeout: float = KAFKA_DRAIN_TIMEOUT) -> int:
+        """Stop taking work, flush in-flight events and close every client.
+
+        Returns the number of events that could not be delivered in time.
+        """
+        self.draining = True
+        self.ready = False
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+        remaining = await asyncio.to_thread(self.producer.close, timeout)
+        if remaining:
+            logger.error(f"Shutdown with {remaining} events not acknowledged by Kafka")
+        else:
+            logger.info("Kafka producer drained")
+
+        consumers = list(self._all_readers)
+        if self._live_consumer is not None:
+            consumers.append(self._live_consumer)
+        for consumer in consumers:
+            await asyncio.to_thread(consumer.close)
+        self._all_readers.clear()
+        self._readers = None
+        self._live_consumer = None
+
+        if self._previous_sigterm is not None:
+            try:
+                signal.signal(signal.SIGTERM, self._previous_sigterm)
+            except ValueError:
+                pass
+            self._previous_sigterm = None
+        return remaining
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness and connection health"""
+        return {
+            "ready": self.ready,
+            "draining": self.draining,
+            "consecutive_failures": self.failures,
+            "reconnects": self.reconnects,
+            "last_check": self.last_check,
+            "last_error": self.last_error,
+            "producer_queue": self.producer.queue_depth(),
+            "readers": self.reader_count,
+            "readers_idle": self._readers.qsize() if self._readers is not None else self.reader_count,
+            "live_consumer": self._live_consumer is not None,
+        }
+
+
+# Global instance
+kafka_pool = KafkaClientPool()
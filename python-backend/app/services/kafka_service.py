@@ -5,42 +5,86 @@ Kafka producer and consumer services with Avro serialization
 
 import io
 import json
+import time
 import logging
+from functools import lru_cache
 from pathlib import Path
-from typing import Optional, Dict, Any
-from confluent_kafka import Producer, Consumer
-import fastavro
+from typing import Optional, Callable, Dict, Any, Iterable, List, Tuple, Union
+from confluent_kafka import Producer, Consumer, TopicPartition, OFFSET_BEGINNING, OFFSET_END
 
-from ..config import KAFKA_CONFIG, CLOUDEVENTS_TOPIC, GEMINI_SUMMARY_TOPIC
+from ..config import (
+    KAFKA_CONFIG, KAFKA_PRODUCER_OVERRIDES, CLOUDEVENTS_TOPIC, GEMINI_SUMMARY_TOPIC, CONSUMER_LAG_CHECK_INTERVAL,
+    SCHEMA_REGISTRY_URL, SCHEMA_REGISTRY_CONFIG,
+)
+from ..models import CloudEvent
+from .metrics import pipeline_metrics
+from .partitioning import get_key_function
 
 logger = logging.getLogger(__name__)
 
-# Load Avro schema
 SCHEMA_PATH = Path(__file__).parent.parent / "schemas" / "cloudevent.avsc"
-with open(SCHEMA_PATH, "r") as f:
-    CLOUDEVENT_SCHEMA = json.load(f)
-PARSED_SCHEMA = fastavro.parse_schema(CLOUDEVENT_SCHEMA)
+
+# Message key function for the configured KAFKA_PARTITION_STRATEGY
+event_key = get_key_function()
+
+
+@lru_cache(maxsize=1)
+def get_parsed_schema():
+    """Parsed CloudEvent Avro schema, loaded on first use"""
+    import fastavro
+    with open(SCHEMA_PATH, "r") as f:
+        return fastavro.parse_schema(json.load(f))
+
+
+@lru_cache(maxsize=1)
+def get_avro_deserializer():
+    """Shared Schema Registry Avro deserializer, or None when not configured.
+    
+    The Schema Registry SDK is only imported the first time a consumer
+    needs it, and every consumer reuses the same client and schema cache.
+    """
+    if not (SCHEMA_REGISTRY_URL and SCHEMA_REGISTRY_CONFIG):
+        logger.warning("Schema Registry not configured - will try JSON fallback")
+        return None
+    try:
+        from confluent_kafka.schema_registry import SchemaRegistryClient
+        from confluent_kafka.schema_registry.avro import AvroDeserializer
+        
+        logger.info(f"Schema Registry URL: {SCHEMA_REGISTRY_URL}")
+        deserializer = AvroDeserializer(SchemaRegistryClient(SCHEMA_REGISTRY_CONFIG))
+        logger.info("✓ Schema Registry configured - Avro deserialization enabled")
+        return deserializer
+    except ImportError as e:
+        logger.warning(f"Schema Registry/Avro not available (install confluent-kafka[avro]): {e}")
+    except Exception as e:
+        logger.error(f"Schema Registry setup failed: {e}", exc_info=True)
+    return None
 
 
 def serialize_avro(record: Dict[str, Any]) -> bytes:
     """Serialize a record to Avro binary format"""
+    import fastavro
     buffer = io.BytesIO()
-    fastavro.schemaless_writer(buffer, PARSED_SCHEMA, record)
+    fastavro.schemaless_writer(buffer, get_parsed_schema(), record)
     return buffer.getvalue()
 
 
 def deserialize_avro(data: bytes) -> Dict[str, Any]:
     """Deserialize Avro binary data to a record"""
+    import fastavro
     buffer = io.BytesIO(data)
-    return fastavro.schemaless_reader(buffer, PARSED_SCHEMA)
+    return fastavro.schemaless_reader(buffer, get_parsed_schema())
 
 
-def prepare_cloudevent(event: dict) -> dict:
-    """Prepare a CloudEvent dict for Avro serialization.
+def prepare_cloudevent(event: Union[CloudEvent, dict]) -> dict:
+    """Prepare a CloudEvent (or CloudEvent dict) for Avro serialization.
     
     Converts the 'data' field to JSON string if it's a dict,
     and ensures all fields match the Avro schema.
     """
+    if isinstance(event, CloudEvent):
+        return event.to_avro()
+    
     # Convert data dict to JSON string for Avro
     data_value = event.get('data')
     if isinstance(data_value, dict):
@@ -58,74 +102,134 @@ def prepare_cloudevent(event: dict) -> dict:
         "severity": event.get("severity"),
         "category": event.get("category"),
         "correlation_id": event.get("correlation_id"),
+        "sample_weight": float(event.get("sample_weight", 1.0)),
     }
 
 
+def encode_event(event: Union[CloudEvent, dict]) -> Tuple[Optional[bytes], bytes]:
+    """Return the (key, Avro value) bytes a CloudEvent is produced with"""
+    return event_key(event), serialize_avro(prepare_cloudevent(event))
+
+
 class KafkaProducerService:
     """Kafka producer service for sending events with Avro serialization"""
     
     def __init__(self):
         self._producer: Optional[Producer] = None
+        self._fatal_error = None
     
     @property
     def producer(self) -> Producer:
         """Lazy initialization of Kafka producer"""
         if self._producer is None:
-            self._producer = Producer(KAFKA_CONFIG)
-            logger.info("Kafka producer initialized (Avro serialization enabled)")
+            self._producer = Producer({
+                **KAFKA_CONFIG, **KAFKA_PRODUCER_OVERRIDES, 'error_cb': self._on_error
+            })
+            logger.info("Kafka producer initialized (Avro serialization, idempotent)")
         return self._producer
     
-    def produce_event(self, event: dict, topic: str = CLOUDEVENTS_TOPIC) -> None:
-        """Send an event to Kafka topic using Avro serialization"""
+    def _on_error(self, err) -> None:
+        # Transient errors (broker down, timeouts) are retried by librdkafka;
+        # a fatal error (e.g. idempotence sequence lost) needs a new producer
+        if err.fatal():
+            self._fatal_error = err
+            logger.error(f"Fatal Kafka producer error: {err}")
+        else:
+            logger.debug(f"Kafka producer error: {err}")
+    
+    @property
+    def fatal_error(self):
+        """The fatal error that invalidated the producer, if any"""
+        return self._fatal_error
+    
+    def cluster_topics(self, timeout: float) -> set:
+        """Fetch broker metadata; raises KafkaException when the cluster is unreachable"""
+        return set(self.producer.list_topics(timeout=timeout).topics)
+    
+    def reconnect(self, timeout: float = 5.0) -> None:
+        """Replace the producer, flushing what the old one still holds"""
+        old, self._producer, self._fatal_error = self._producer, None, None
+        if old is not None:
+            remaining = old.flush(timeout)
+            if remaining:
+                logger.warning(f"Kafka producer replaced with {remaining} undelivered messages")
+        logger.info("Kafka producer reconnecting")
+    
+    def queue_depth(self) -> int:
+        """Messages waiting in the producer queue (0 before first use)"""
+        return len(self._producer) if self._producer is not None else 0
+    
+    def produce_event(self, event: Union[CloudEvent, dict], topic: str = CLOUDEVENTS_TOPIC) -> None:
+        """Queue an event for the Kafka topic using Avro serialization.
+
+        Does not wait for the broker: delivery is reported to the callback
+        (served by poll) and what is still queued is flushed by `close`.
+        """
         # Prepare and serialize the event
-        prepared_event = prepare_cloudevent(event)
-        avro_bytes = serialize_avro(prepared_event)
+        key, avro_bytes = encode_event(event)
+        produced_at = time.perf_counter()
         
-        self.producer.produce(
-            topic=topic,
-            key=event.get('id', '').encode('utf-8'),
-            value=avro_bytes
-        )
-        self.producer.flush()
+        def on_delivery(err, msg):
+            if err is not None:
+                pipeline_metrics.increment('produce_errors')
+                logger.error(f"Delivery failed for {event.get('id')}: {err}")
+                return
+            pipeline_metrics.observe('produce_ack', time.perf_counter() - produced_at)
+        
+        try:
+            self.producer.produce(topic=topic, key=key, value=avro_bytes, on_delivery=on_delivery)
+        except BufferError:
+            # Local queue full: serve delivery reports briefly, then try once more
+            self.producer.poll(0.5)
+            self.producer.produce(topic=topic, key=key, value=avro_bytes, on_delivery=on_delivery)
+        self.producer.poll(0)
         logger.debug(f"Event sent to {topic} (Avro): {event.get('id')}")
     
-    def close(self) -> None:
-        """Close the producer connection"""
+    def produce_record(self, topic: str, key: bytes, value: Optional[bytes], on_delivery=None) -> None:
+        """Queue a keyed record without waiting for delivery (None value = tombstone)"""
+        self.producer.produce(topic=topic, key=key, value=value, on_delivery=on_delivery)
+        self.producer.poll(0)
+    
+    def ensure_topic(self, topic: str, partitions: int, config: Dict[str, str], timeout: float = 10.0) -> bool:
+        """Create a topic unless it exists; returns True when it was created"""
+        if topic in self.cluster_topics(timeout):
+            return False
+        from confluent_kafka.admin import AdminClient, NewTopic
+        admin = AdminClient(KAFKA_CONFIG)
+        # replication_factor=-1: the cluster's default replication
+        new_topic = NewTopic(topic, num_partitions=partitions, replication_factor=-1, config=config)
+        admin.create_topics([new_topic], request_timeout=timeout)[topic].result(timeout)
+        logger.info(f"Created topic {topic} ({config})")
+        return True
+    
+    def close(self, timeout: Optional[float] = None) -> int:
+        """Flush and close the producer; returns messages still undelivered"""
+        remaining = 0
         if self._producer:
-            self._producer.flush()
+            remaining = self._producer.flush() if timeout is None else self._producer.flush(timeout)
             self._producer = None
+        return remaining
 
 
 class KafkaConsumerService:
     """Kafka consumer service for receiving Avro messages from Flink tables"""
     
-    def __init__(self, group_id: str = 'demo-app-consumer', read_from_beginning: bool = False):
+    def __init__(self, group_id: str = 'demo-app-consumer', read_from_beginning: bool = False,
+                 subscribe: bool = True, topics: Optional[List[str]] = None, manual_commit: bool = False):
         self._consumer = None
-        self._deserializer = None
+        self._topics = topics or [GEMINI_SUMMARY_TOPIC]
         self._group_id = group_id
-        self._use_avro = False
         self._read_from_beginning = read_from_beginning
-        
-        # Try to set up Avro deserializer if Schema Registry is configured
-        try:
-            from ..config import SCHEMA_REGISTRY_URL, SCHEMA_REGISTRY_CONFIG
-            logger.info(f"Schema Registry URL: {SCHEMA_REGISTRY_URL}")
-            logger.info(f"Schema Registry Config keys: {list(SCHEMA_REGISTRY_CONFIG.keys()) if SCHEMA_REGISTRY_CONFIG else 'None'}")
-            
-            if SCHEMA_REGISTRY_URL and SCHEMA_REGISTRY_CONFIG:
-                from confluent_kafka.schema_registry import SchemaRegistryClient
-                from confluent_kafka.schema_registry.avro import AvroDeserializer
-                
-                sr_client = SchemaRegistryClient(SCHEMA_REGISTRY_CONFIG)
-                self._deserializer = AvroDeserializer(sr_client)
-                self._use_avro = True
-                logger.info("✓ Schema Registry configured - Avro deserialization enabled")
-            else:
-                logger.warning("Schema Registry not configured - will try JSON fallback")
-        except ImportError as e:
-            logger.warning(f"Schema Registry/Avro not available (install confluent-kafka[avro]): {e}")
-        except Exception as e:
-            logger.error(f"Schema Registry setup failed: {e}", exc_info=True)
+        self._subscribe = subscribe
+        self._manual_commit = manual_commit
+        self._last_lag_check = 0.0
+        # Called with the revoked TopicPartitions before a rebalance takes them away
+        self.on_revoke: Optional[Callable[[list], None]] = None
+    
+    @property
+    def _deserializer(self):
+        """Schema Registry deserializer, built on first use"""
+        return get_avro_deserializer()
     
     @property
     def consumer(self) -> Consumer:
@@ -142,41 +246,188 @@ class KafkaConsumerService:
                 'group.id': group_id,
                 'auto.offset.reset': 'earliest' if self._read_from_beginning else 'latest',
             })
+            if not self._subscribe:
+                # Reader: assigns partitions itself and never commits
+                consumer_config['enable.auto.commit'] = False
+            elif self._manual_commit:
+                # Offsets are committed with commit_offsets once processed
+                consumer_config['enable.auto.commit'] = False
             self._consumer = Consumer(consumer_config)
-            self._consumer.subscribe([GEMINI_SUMMARY_TOPIC])
-            offset_mode = 'earliest' if self._read_from_beginning else 'latest'
-            logger.info(f"Kafka consumer initialized for {GEMINI_SUMMARY_TOPIC} (offset: {offset_mode})")
+            if self._subscribe:
+                self._consumer.subscribe(self._topics, on_revoke=self._revoked)
+                offset_mode = 'earliest' if self._read_from_beginning else 'latest'
+                logger.info(f"Kafka consumer initialized for {', '.join(self._topics)} (offset: {offset_mode})")
+            else:
+                logger.info("Kafka reader initialized (manual assignment)")
         return self._consumer
     
+    def read_latest(self, topic: str = GEMINI_SUMMARY_TOPIC, limit: int = 5, timeout: float = 10.0) -> list:
+        """Fetch the newest `limit` messages of each partition by direct assignment.
+        
+        No group join or rebalance is involved, so a pooled reader can serve
+        request after request. Blocking; run it in a worker thread.
+        """
+        metadata = self.consumer.list_topics(topic, timeout=timeout).topics[topic]
+        if metadata.error is not None:
+            raise RuntimeError(f"Topic {topic} unavailable: {metadata.error}")
+        
+        assignments, end_offsets = [], {}
+        for partition in metadata.partitions:
+            low, high = self.consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=timeout)
+            if high > low:
+                assignments.append(TopicPartition(topic, partition, max(low, high - limit)))
+                end_offsets[partition] = high
+        if not assignments:
+            return []
+        
+        messages = []
+        deadline = time.monotonic() + timeout
+        self.consumer.assign(assignments)
+        try:
+            while end_offsets and time.monotonic() < deadline:
+                for msg in self.consumer.consume(num_messages=limit * len(assignments), timeout=0.5):
+                    if msg.error():
+                        logger.warning(f"Consumer error: {msg.error()}")
+                        continue
+                    messages.append(msg)
+                # Done once the position reaches the end: the last offsets
+                # may be transaction markers (exactly-once Flink output) or
+                # compacted away, and those are never delivered
+                for partition, position in self.positions(topic, end_offsets).items():
+                    if position >= end_offsets[partition]:
+                        del end_offsets[partition]
+        finally:
+            self.consumer.unassign()
+        return messages
+    
+    def positions(self, topic: str, partitions: Iterable[int]) -> Dict[int, int]:
+        """Next offset to read of each assigned partition (negative before the first fetch)"""
+        assigned = [TopicPartition(topic, partition) for partition in partitions]
+        return {tp.partition: tp.offset for tp in self.consumer.position(assigned)} if assigned else {}
+    
+    def assign_from_beginning(self, topic: str, timeout: float = 10.0) -> Dict[int, int]:
+        """Assign every partition of `topic` from its first offset.
+        
+        Returns the end offset of each non-empty partition, i.e. how far
+        to read to have seen everything the topic held at this point.
+        """
+        metadata = self.consumer.list_topics(topic, timeout=timeout).topics[topic]
+        if metadata.error is not None:
+            raise RuntimeError(f"Topic {topic} unavailable: {metadata.error}")
+        
+        assignments, end_offsets = [], {}
+        for partition in metadata.partitions:
+            low, high = self.consumer.get_watermark_offsets(TopicPartition(topic, partition), timeout=timeout)
+            assignments.append(TopicPartition(topic, partition, OFFSET_BEGINNING))
+            if high > low:
+                end_offsets[partition] = high
+        self.consumer.assign(assignments)
+        return end_offsets
+    
+    def assign_from_end(self, topic: str, timeout: float = 10.0) -> int:
+        """Assign every partition of `topic` at its end, to read only new messages.
+        
+        Returns the number of partitions assigned.
+        """
+        metadata = self.consumer.list_topics(topic, timeout=timeout).topics[topic]
+        if metadata.error is not None:
+            raise RuntimeError(f"Topic {topic} unavailable: {metadata.error}")
+        self.consumer.assign([TopicPartition(topic, partition, OFFSET_END) for partition in metadata.partitions])
+        return len(metadata.partitions)
+    
+    def _revoked(self, consumer, partitions) -> None:
+        if self.on_revoke is not None:
+            self.on_revoke(partitions)
+    
+    def commit_offsets(self, offsets: Dict[Tuple[str, int], int], asynchronous: bool = True) -> None:
+        """Commit the next offset to read for each (topic, partition)"""
+        if offsets:
+            self.consumer.commit(
+                offsets=[TopicPartition(topic, partition, offset) for (topic, partition), offset in offsets.items()],
+                asynchronous=asynchronous,
+            )
+    
+    def pause(self, partitions: List[Tuple[str, int]]) -> None:
+        """Stop fetching from these (topic, partition)s"""
+        self.consumer.pause([TopicPartition(topic, partition) for topic, partition in partitions])
+    
+    def resume(self, partitions: List[Tuple[str, int]]) -> None:
+        """Fetch from paused (topic, partition)s again"""
+        self.consumer.resume([TopicPartition(topic, partition) for topic, partition in partitions])
+    
     def poll(self, timeout: float = 1.0):
         """Poll for new messages"""
         return self.consumer.poll(timeout=timeout)
     
+    def consume_batch(self, max_messages: int, timeout: float = 0.0) -> list:
+        """Return up to max_messages already-fetched messages without blocking"""
+        if max_messages <= 0:
+            return []
+        return self.consumer.consume(num_messages=max_messages, timeout=timeout)
+    
     def deserialize_message(self, msg) -> Optional[dict]:
         """Deserialize a Kafka message, handling both Avro and JSON"""
         if msg is None or msg.error():
             return None
         
+        with pipeline_metrics.time_stage('deserialize'):
+            return self._deserialize_value(msg)
+    
+    def deserialize_key(self, msg) -> Optional[dict]:
+        """Deserialize the key of an upsert table message (its primary key columns)"""
+        if msg is None or msg.error() or msg.key() is None:
+            return None
+        return self._deserialize(msg.key(), msg.topic(), 'KEY')
+    
+    def _deserialize_value(self, msg) -> Optional[dict]:
         raw_value = msg.value()
         if raw_value is None:
             return None
-        
+        return self._deserialize(raw_value, msg.topic(), 'VALUE')
+    
+    def _deserialize(self, raw: bytes, topic: str, field: str) -> Optional[dict]:
         # Try Avro deserialization first if configured
-        if self._use_avro and self._deserializer:
+        if self._deserializer is not None:
             try:
                 from confluent_kafka.serialization import SerializationContext, MessageField
-                ctx = SerializationContext(msg.topic(), MessageField.VALUE)
-                return self._deserializer(raw_value, ctx)
+                ctx = SerializationContext(topic, getattr(MessageField, field))
+                return self._deserializer(raw, ctx)
             except Exception as e:
                 logger.debug(f"Avro deserialization failed, trying JSON: {e}")
         
         # Fall back to JSON
         try:
-            return json.loads(raw_value.decode('utf-8'))
+            return json.loads(raw.decode('utf-8'))
         except Exception as e:
             logger.error(f"Failed to deserialize message: {e}")
             return None
     
+    def report_lag(self, force: bool = False) -> Dict[int, int]:
+        """Record per-partition lag against the high watermarks.
+        
+        Throttled to CONSUMER_LAG_CHECK_INTERVAL because each watermark
+        lookup is a broker round-trip. Returns the lag per partition.
+        """
+        now = time.monotonic()
+        if not force and now - self._last_lag_check < CONSUMER_LAG_CHECK_INTERVAL:
+            return {}
+        self._last_lag_check = now
+        
+        lags: Dict[int, int] = {}
+        try:
+            partitions = self.consumer.assignment()
+            if not partitions:
+                return lags
+            for tp in self.consumer.position(partitions):
+                low, high = self.consumer.get_watermark_offsets(tp, timeout=1.0)
+                # A negative offset means nothing consumed yet on this partition
+                position = tp.offset if tp.offset >= 0 else (low if self._read_from_beginning else high)
+                lags[tp.partition] = max(high - position, 0)
+                pipeline_metrics.record_consumer_lag(tp.topic, tp.partition, lags[tp.partition])
+        except Exception as e:
+            logger.warning(f"Consumer lag check failed: {e}")
+        return lags
+    
     def close(self) -> None:
         """Close the consumer connection"""
         if self._consumer:
@@ -0,0 +1,238 @@
+# app/services/live_health.py
+"""
+System health over hopping windows (pane-based), pushed to WebSocket clients on every status change
+"""
+
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..config import LIVE_HEALTH_WINDOW_SECONDS, LIVE_HEALTH_SLIDE_SECONDS
+from .metrics import event_time
+from .websocket_manager import ConnectionManager, manager
+
+logger = logging.getLogger(__name__)
+
+# Pane columns: weighted event count, then critical and error counts (never
+# sampled, so unweighted) and the weighted warning count, as in Flink
+EVENTS, CRITICAL, ERRORS, WARNINGS = range(4)
+
+# 03_system_health_5min.sql: DEGRADED above this (critical + errors) / events
+DEGRADED_ERROR_RATE = 0.1
+
+# Severities that can worsen the status and trigger an immediate evaluation
+ESCALATING_SEVERITIES = {"critical", "error"}
+
+# Status changes kept for /api/health/live
+TRANSITION_HISTORY = 20
+
+
+def classify(events: float, critical: float, errors: float) -> str:
+    """health_status as computed by 03_system_health_5min.sql"""
+    if critical > 0:
+        return "CRITICAL"
+    if events > 0 and (critical + errors) / events > DEGRADED_ERROR_RATE:
+        return "DEGRADED"
+    if errors > 0:
+        return "WARNING"
+    return "HEALTHY"
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class HoppingHealth:
+    """The system_health_5min classification over a window that hops every slide.
+
+    Events are counted into panes of `slide_seconds` (by CloudEvent time)
+    in a ring of window / slide slots; a window is the sum of its panes, so
+    each evaluation costs O(panes) however many events it covers. The
+    window is re-evaluated at every pane boundary and, when an error or
+    critical event arrives, right away; a changed status is broadcast as a
+    `health_changed` frame.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = LIVE_HEALTH_WINDOW_SECONDS,
+        slide_seconds: float = LIVE_HEALTH_SLIDE_SECONDS,
+        connections: ConnectionManager = manager,
+    ):
+        panes = window_seconds / slide_seconds
+        if panes < 1 or abs(panes - round(panes)) > 1e-9:
+            raise ValueError("window_seconds must be a multiple of slide_seconds")
+        self.window_seconds = window_seconds
+        self.slide_seconds = slide_seconds
+        self.panes = int(round(panes))
+        self.connections = connections
+        self._counts = np.zeros((self.panes, 4), dtype=np.float64)
+        self._pane_ids = np.full(self.panes, -1, dtype=np.int64)
+        self._sources: List[Dict[str, int]] = [{} for _ in range(self.panes)]
+        self._lock = threading.Lock()
+        self.status = "HEALTHY"
+        self.current: Optional[Dict[str, Any]] = None
+        self.transitions: deque = deque(maxlen=TRANSITION_HISTORY)
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self.recorded = 0
+        self.late = 0
+        self.evaluations = 0
+
+    def record(self, event: Any, now: Optional[float] = None) -> bool:
+        """Count an event (CloudEvent or record dict) in its pane; False if it
+        is older than the window. Safe to call from worker threads."""
+        now = time.time() if now is None else now
+        timestamp = event_time(event)
+        if timestamp is None or timestamp > now:
+            timestamp = now
+        pane = int(timestamp // self.slide_seconds)
+        if pane <= int(now // self.slide_seconds) - self.panes:
+            self.late += 1
+            return False
+        slot = pane % self.panes
+        severity = (event.get('severity') or '').lower()
+        weight = float(event.get('sample_weight') or 1.0)
+
+        with self._lock:
+            if self._pane_ids[slot] != pane:
+                if self._pane_ids[slot] > pane:
+                    self.late += 1
+                    return False
+                # The slot's previous pane has left the window
+                self._pane_ids[slot] = pane
+                self._counts[slot] = 0.0
+                self._sources[slot] = {}
+            row = self._counts[slot]
+            row[EVENTS] += weight
+            if severity == 'critical':
+                row[CRITICAL] += 1
+            elif severity == 'error':
+                row[ERRORS] += 1
+            elif severity == 'warning':
+                row[WARNINGS] += weight
+            source = event.get('source')
+            if source:
+                sources = self._sources[slot]
+                sources[source] = sources.get(source, 0) + 1
+            self.recorded += 1
+
+        if severity in ESCALATING_SEVERITIES and self.status != "CRITICAL":
+            self._request_evaluation()
+        return True
+
+    def _request_evaluation(self) -> None:
+        if self._wake is None or self._loop is None:
+            return
+        if threading.get_ident() == self._loop_thread_id:
+            self._wake.set()
+        else:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def evaluate(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """Health of the window ending with the pane containing `now`, as a
+        system_health_5min row"""
+        now = time.time() if now is None else now
+        current = int(now // self.slide_seconds)
+        with self._lock:
+            valid = (self._pane_ids > current - self.panes) & (self._pane_ids <= current)
+            events, critical, errors, warnings = self._counts[valid].sum(axis=0).tolist()
+            sources = set().union(*(self._sources[slot] for slot in np.flatnonzero(valid)))
+        return {
+            "window_start": _iso((current - self.panes + 1) * self.slide_seconds),
+            "window_end": _iso((current + 1) * self.slide_seconds),
+            "total_events": int(round(events)),
+            "total_sources": len(sources),
+            "total_critical": int(critical),
+            "total_errors": int(errors),
+            "total_warnings": int(round(warnings)),
+            "error_rate_percent": round((critical + errors) / events * 100.0, 2) if events > 0 else 0.0,
+            "health_status": classify(events, critical, errors),
+        }
+
+    async def check(self, trigger: str = "slide", now: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Evaluate the window; broadcast and return the `health_changed`
+        frame if the status changed"""
+        health = self.evaluate(now)
+        self.current = health
+        self.evaluations += 1
+        previous, self.status = self.status, health["health_status"]
+        if previous == self.status:
+            return None
+        message = {"type": "health_changed", "previous": previous, "trigger": trigger, "health": health}
+        self.transitions.append({
+            "at": _iso(time.time() if now is None else now),
+            "previous": previous,
+            "status": self.status,
+            "trigger": trigger,
+        })
+        logger.info(f"System health {previous} -> {self.status} ({trigger})")
+        await self.connections.broadcast(message)
+        return message
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    async def _run(self) -> None:
+        while True:
+            now = time.time()
+            # Just past the next pane boundary, so the new pane is the current one
+            until_boundary = (int(now // self.slide_seconds) + 1) * self.slide_seconds - now + 0.001
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=until_boundary)
+                trigger = "event"
+            except asyncio.TimeoutError:
+                trigger = "slide"
+            self._wake.clear()
+            try:
+                await self.check(trigger)
+            except Exception as e:
+                logger.error(f"Health evaluation failed: {e}")
+
+    def start(self) -> None:
+        """Start evaluating on the running loop"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Live health started ({self.window_seconds:g}s window, {self.slide_seconds:g}s slide)")
+
+    async def stop(self) -> None:
+        """Stop evaluating"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._wake = None
+        self._loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Status, pane layout and counts"""
+        return {
+            "status": self.status,
+            "window_seconds": self.window_seconds,
+            "slide_seconds": self.slide_seconds,
+            "panes": self.panes,
+            "recorded": self.recorded,
+            "late": self.late,
+            "evaluations": self.evaluations,
+            "transitions": len(self.transitions),
+        }
+
+
+# Global instance
+live_health = HoppingHealth()
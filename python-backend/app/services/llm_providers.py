@@ -0,0 +1,206 @@
+# app/services/llm_providers.py
+"""
+Async LLM providers used by the insight service
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+from abc import ABC, abstractmethod
+from typing import TYPE_CHECKING, AsyncIterator, Optional
+
+from ..config import (
+    GEMINI_API_KEY, GEMINI_MODEL, LLM_PROVIDER, LLM_MAX_CONNECTIONS, LLM_TIMEOUT_SECONDS
+)
+
+if TYPE_CHECKING:
+    import httpx
+
+logger = logging.getLogger(__name__)
+
+
+class InsightProvider(ABC):
+    """Base class for async text-generation backends"""
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str, json_output: bool = False) -> str:
+        """Return the full completion for a prompt.
+
+        With `json_output` the provider is asked to return a JSON document.
+        """
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        """Yield the completion in chunks as they are produced.
+
+        Providers without native streaming return the whole completion
+        as a single chunk.
+        """
+        yield await self.generate(prompt)
+
+    async def aclose(self) -> None:
+        """Release any pooled connections"""
+
+    def warm(self) -> None:
+        """Build clients ahead of the first request (called at startup)"""
+
+
+def _extract_text(payload: dict) -> str:
+    """Pull the generated text out of a Gemini generateContent response"""
+    parts = []
+    for candidate in payload.get("candidates") or []:
+        for part in (candidate.get("content") or {}).get("parts") or []:
+            if part.get("text"):
+                parts.append(part["text"])
+    return "".join(parts)
+
+
+class GeminiHTTPProvider(InsightProvider):
+    """Gemini REST API over a pooled, keep-alive httpx client"""
+
+    name = "gemini"
+    BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = GEMINI_MODEL,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+    ):
+        self._api_key = api_key
+        self._model = model
+        self._timeout = timeout
+        self._max_connections = max_connections
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        """Lazy initialization of the shared HTTP connection pool"""
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                base_url=self.BASE_URL,
+                headers={"x-goog-api-key": self._api_key},
+                timeout=httpx.Timeout(self._timeout, connect=5.0),
+                limits=httpx.Limits(
+                    max_connections=self._max_connections,
+                    max_keepalive_connections=self._max_connections,
+                ),
+            )
+            logger.info(f"✓ Gemini HTTP client initialized (model: {self._model})")
+        return self._client
+
+    @staticmethod
+    def _body(prompt: str, json_output: bool = False) -> dict:
+        body = {"contents": [{"role": "user", "parts": [{"text": prompt}]}]}
+        if json_output:
+            body["generationConfig"] = {"responseMimeType": "application/json"}
+        return body
+
+    async def generate(self, prompt: str, json_output: bool = False) -> str:
+        response = await self.client.post(
+            f"/models/{self._model}:generateContent", json=self._body(prompt, json_output)
+        )
+        response.raise_for_status()
+        return _extract_text(response.json())
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        async with self.client.stream(
+            "POST",
+            f"/models/{self._model}:streamGenerateContent",
+            params={"alt": "sse"},
+            json=self._body(prompt),
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                text = _extract_text(json.loads(line[5:]))
+                if text:
+                    yield text
+
+    def warm(self) -> None:
+        self.client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class StubInsightProvider(InsightProvider):
+    """Deterministic offline provider for tests and load testing.
+
+    The same prompt always yields the same text. `latency` simulates the
+    LLM round-trip and is spread evenly over the streamed chunks.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency: float = 0.0, chunk_words: int = 4):
+        self._latency = latency
+        self._chunk_words = max(chunk_words, 1)
+        self.calls = 0
+
+    @staticmethod
+    def _render(prompt: str) -> str:
+        digest = hashlib.sha1(prompt.encode("utf-8")).hexdigest()[:8]
+        status = re.search(r"System Health Status:\*\*\s*(\S+)", prompt)
+        source = re.search(r"Top Problem Source:\*\*\s*([^\n]+)", prompt)
+        status_text = status.group(1) if status else "unknown"
+        source_text = source.group(1).strip() if source else "None identified"
+        return (
+            f"1. **Status**: System is {status_text} (stub analysis {digest}).\n"
+            f"2. **Root Cause**: {source_text}.\n"
+            f"3. **Impact**: Simulated impact assessment.\n"
+            f"4. **Recommendation**: Review recent events from {source_text}."
+        )
+
+    @staticmethod
+    def _render_batch(prompt: str) -> str:
+        windows = re.findall(r'"window_start":\s*"([^"]*)"', prompt)
+        return json.dumps({
+            window: {
+                "status": f"Window {window} analysed (stub).",
+                "root_cause": "Stub root cause.",
+                "impact": "Simulated impact assessment.",
+                "recommendation": "Review recent events.",
+            }
+            for window in windows
+        })
+
+    async def generate(self, prompt: str, json_output: bool = False) -> str:
+        self.calls += 1
+        if self._latency:
+            await asyncio.sleep(self._latency)
+        return self._render_batch(prompt) if json_output else self._render(prompt)
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        self.calls += 1
+        words = self._render(prompt).split(" ")
+        chunks = [
+            " ".join(words[i:i + self._chunk_words]) + (" " if i + self._chunk_words < len(words) else "")
+            for i in range(0, len(words), self._chunk_words)
+        ]
+        for chunk in chunks:
+            if self._latency:
+                await asyncio.sleep(self._latency / len(chunks))
+            yield chunk
+
+
+def create_provider(name: Optional[str] = LLM_PROVIDER) -> Optional[InsightProvider]:
+    """Build the configured provider, or None when AI is disabled"""
+    if name == "stub":
+        return StubInsightProvider()
+    if name == "gemini":
+        if not GEMINI_API_KEY:
+            logger.warning("LLM_PROVIDER=gemini but GEMINI_API_KEY is not set - AI disabled")
+            return None
+        return GeminiHTTPProvider(GEMINI_API_KEY)
+    if name not in (None, "", "none"):
+        logger.error(f"Unknown LLM_PROVIDER '{name}' - AI disabled")
+    return None
@@ -0,0 +1,290 @@
+# app/services/load_shedding.py
+"""
+Adaptive load shedding for low-severity event floods
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from ..config import (
+    SHED_INFO_SAMPLE_RATE, SHED_MIN_SAMPLE_RATE, SHED_BUCKET_RATE, SHED_BUCKET_BURST,
+    SHED_QUEUE_DEPTH_THRESHOLD, SHED_LOOP_LAG_MS, SHED_CARRY_FLUSH_SECONDS, SPOOL_ENABLED,
+)
+from ..models import CloudEvent
+from .kafka_service import kafka_producer
+from .metrics import event_time, pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# Severities that are always published, whatever the load
+PROTECTED_SEVERITIES = {"critical", "error"}
+
+# How often (seconds) the pressure level is recomputed
+PRESSURE_CHECK_INTERVAL = 0.5
+
+# Flink's 5-minute tumbling windows (TUMBLE(..., INTERVAL '5' MINUTES) in the
+# SQL): carried weight never moves to another window
+FLINK_WINDOW_SECONDS = 300
+
+# (source, type, window) the weight of rate-limited events is carried for
+CarryKey = Tuple[str, str, int]
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `burst` banked"""
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def take(self, now: float, rate_scale: float = 1.0) -> bool:
+        """Consume one token if available; refill is slowed by rate_scale < 1"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate * rate_scale)
+        self.updated = now
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return True
+        return False
+
+
+class Carried:
+    """Weight of rate-limited events not yet attached to a published event"""
+
+    __slots__ = ("weight", "severity", "category", "epoch", "since")
+
+    def __init__(self, severity: Optional[str], category: Optional[str], epoch: float, since: float):
+        self.weight = 0.0
+        self.severity = severity
+        self.category = category
+        self.epoch = epoch  # event time of the latest refused event
+        self.since = since  # monotonic time of the first
+
+
+class ShedDecision(NamedTuple):
+    admit: bool
+    sample_weight: float
+    reason: Optional[str] = None
+
+
+def _producer_queue_depth() -> int:
+    """Messages waiting in the producer (and in the spool when it is enabled)"""
+    depth = kafka_producer.queue_depth()
+    if SPOOL_ENABLED:
+        from .spool import event_spool
+        depth += event_spool.pending_records
+    return depth
+
+
+def _publish_all(records: List[CloudEvent], publish: Callable[[CloudEvent], None]) -> None:
+    for record in records:
+        try:
+            publish(record)
+        except Exception as e:
+            logger.warning(f"Carried weight {record.sample_weight:g} of {record.type} lost: {e}")
+
+
+class LoadShedder:
+    """Decides per event whether to publish it, and with what sample weight.
+
+    - critical/error events are always admitted with weight 1.
+    - info events are sampled with probability `info_sample_rate`; kept events
+      carry weight 1/p so weighted counts in Flink stay unbiased.
+    - under pressure, i.e. when the producer queue or event-loop lag is
+      above its threshold, the sample rate is divided by the pressure ratio
+      and every event also passes a token bucket per (source, type) whose
+      refill is divided likewise. Without pressure nothing is rate limited.
+    - the weight of events refused by a bucket is added to the next
+      admitted event of the same (source, type) in the same Flink window;
+      what is still carried after `carry_flush_seconds` is published by
+      `flush_carried` as a zero-payload record with that weight, stamped
+      with the window's last refused event time. Weighted totals per
+      window are preserved either way.
+
+    Loop lag is the event_loop_lag_ms gauge set by the loop monitor: with
+    LOOP_MONITOR_ENABLED=false it is never set and only the queue depth
+    counts towards pressure.
+    """
+
+    def __init__(
+        self,
+        info_sample_rate: float = SHED_INFO_SAMPLE_RATE,
+        min_sample_rate: float = SHED_MIN_SAMPLE_RATE,
+        bucket_rate: float = SHED_BUCKET_RATE,
+        bucket_burst: float = SHED_BUCKET_BURST,
+        queue_depth_threshold: int = SHED_QUEUE_DEPTH_THRESHOLD,
+        loop_lag_threshold_ms: float = SHED_LOOP_LAG_MS,
+        queue_depth: Callable[[], int] = _producer_queue_depth,
+        rng: Optional[random.Random] = None,
+        carry_flush_seconds: float = SHED_CARRY_FLUSH_SECONDS,
+    ):
+        self.info_sample_rate = info_sample_rate
+        self.min_sample_rate = min_sample_rate
+        self.bucket_rate = bucket_rate
+        self.bucket_burst = bucket_burst
+        self.queue_depth_threshold = queue_depth_threshold
+        self.loop_lag_threshold_ms = loop_lag_threshold_ms
+        self._queue_depth = queue_depth
+        self._rng = rng or random.Random()
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.carry_flush_seconds = carry_flush_seconds
+        self._carried: Dict[CarryKey, Carried] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._lock = threading.Lock()
+        self._pressure = 1.0
+        self._pressure_checked = 0.0
+        self.admitted = 0
+        self.shed: Dict[str, int] = {"sampled": 0, "rate_limited": 0}
+        self.weight_records = 0
+
+    @property
+    def pressure(self) -> float:
+        """Current overload ratio (1.0 = within thresholds)"""
+        return self._pressure
+
+    def _update_pressure(self, now: float) -> None:
+        if now - self._pressure_checked < PRESSURE_CHECK_INTERVAL:
+            return
+        self._pressure_checked = now
+        try:
+            depth = self._queue_depth()
+        except Exception as e:
+            logger.debug(f"Queue depth unavailable: {e}")
+            depth = 0
+        lag_ms = pipeline_metrics.gauges.get('event_loop_lag_ms', 0.0)
+        pressure = max(
+            1.0,
+            depth / self.queue_depth_threshold if self.queue_depth_threshold else 1.0,
+            lag_ms / self.loop_lag_threshold_ms if self.loop_lag_threshold_ms else 1.0,
+        )
+        if (pressure > 1.0) != (self._pressure > 1.0):
+            if pressure > 1.0:
+                logger.warning(f"Load shedding tightened: pressure {pressure:.2f} "
+                               f"(queue depth {depth}, loop lag {lag_ms:.0f}ms)")
+            else:
+                logger.info("Load shedding relaxed: producer queue and loop lag back under thresholds")
+        self._pressure = pressure
+        pipeline_metrics.set_gauge('shed_pressure', round(pressure, 3))
+
+    @property
+    def effective_sample_rate(self) -> float:
+        """Info sample rate after adaptive tightening"""
+        return max(self.info_sample_rate / self._pressure, self.min_sample_rate)
+
+    def decide(self, event: dict, now: Optional[float] = None) -> ShedDecision:
+        """Admit or shed an event"""
+        severity = (event.get('severity') or '').lower()
+        if severity in PROTECTED_SEVERITIES:
+            with self._lock:
+                self.admitted += 1
+            return ShedDecision(True, 1.0)
+
+        now = time.monotonic() if now is None else now
+        key = (event.get('source') or '', event.get('type') or '')
+        with self._lock:
+            self._update_pressure(now)
+            weight = 1.0
+            if severity == 'info':
+                rate = self.effective_sample_rate
+                if rate < 1.0:
+                    if self._rng.random() >= rate:
+                        self.shed["sampled"] += 1
+                        return ShedDecision(False, 0.0, "sampled")
+                    weight = 1.0 / rate
+
+            if self._pressure <= 1.0 and not self._carried:
+                self.admitted += 1
+                return ShedDecision(True, weight)
+
+            epoch = event_time(event) or time.time()
+            carry_key = (key[0], key[1], int(epoch // FLINK_WINDOW_SECONDS))
+            if self._pressure > 1.0:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    bucket = self._buckets[key] = TokenBucket(self.bucket_rate, self.bucket_burst, now)
+                if not bucket.take(now, 1.0 / self._pressure):
+                    carried = self._carried.get(carry_key)
+                    if carried is None:
+                        carried = self._carried[carry_key] = Carried(severity, event.get('category'), epoch, now)
+                    carried.weight += weight
+                    carried.epoch = max(carried.epoch, epoch)
+                    self.shed["rate_limited"] += 1
+                    return ShedDecision(False, 0.0, "rate_limited")
+
+            carried = self._carried.pop(carry_key, None)
+            if carried is not None:
+                weight += carried.weight
+            self.admitted += 1
+            return ShedDecision(True, weight)
+
+    def flush_carried(self, now: Optional[float] = None, force: bool = False) -> List[CloudEvent]:
+        """Zero-payload records for weight carried longer than `carry_flush_seconds`
+        (all of it with `force`), so it is counted in its own window"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            due = [
+                (key, carried) for key, carried in self._carried.items()
+                if force or now - carried.since >= self.carry_flush_seconds
+            ]
+            for key, _ in due:
+                del self._carried[key]
+        records = []
+        for (source, event_type, _), carried in due:
+            record = CloudEvent(
+                id=str(uuid.uuid4()),
+                source=source,
+                type=event_type,
+                severity=carried.severity,
+                category=carried.category,
+                sample_weight=carried.weight,
+            )
+            record.epoch = carried.epoch
+            records.append(record)
+        self.weight_records += len(records)
+        return records
+
+    async def _flush_loop(self, publish: Callable[[CloudEvent], None]) -> None:
+        while True:
+            await asyncio.sleep(self.carry_flush_seconds / 2)
+            _publish_all(self.flush_carried(), publish)
+
+    def start(self, publish: Callable[[CloudEvent], None]) -> None:
+        """Publish carried weight in the background with `publish` (bypassing shedding)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop(publish))
+
+    async def stop(self, publish: Optional[Callable[[CloudEvent], None]] = None) -> None:
+        """Stop the flush task; with `publish`, hand over everything still carried"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if publish is not None:
+            _publish_all(self.flush_carried(force=True), publish)
+
+    def stats(self) -> Dict[str, object]:
+        """Admitted and shed counts and the current tightening level"""
+        shed = sum(self.shed.values())
+        total = self.admitted + shed
+        return {
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+            "shed_rate": round(shed / total, 4) if total else None,
+            "pressure": round(self._pressure, 3),
+            "info_sample_rate": round(self.effective_sample_rate, 4),
+            "carried_weight": round(sum(c.weight for c in self._carried.values()), 2),
+            "weight_records": self.weight_records,
+        }
+
+
+# Global instance
+load_shedder = LoadShedder()
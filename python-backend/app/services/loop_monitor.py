@@ -0,0 +1,180 @@
+# app/services/loop_monitor.py
+"""
+Event-loop health: scheduling lag, slow-callback stacks and a sampling profiler
+"""
+
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from ..config import LOOP_MONITOR_INTERVAL, LOOP_SLOW_CALLBACK_MS, LOOP_SLOW_CALLBACK_HISTORY
+from .metrics import LatencyHistogram, pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# Innermost frames kept per slow-callback stack
+STACK_DEPTH = 30
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', code.co_filename)
+    return f"{module}:{code.co_name}"
+
+
+def fold_stack(frame) -> str:
+    """Collapse a frame chain into `outer;...;inner` (flamegraph folded format)"""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class LoopMonitor:
+    """Measures how late the event loop runs a periodic probe.
+
+    A probe coroutine sleeps for `interval` and records how much later than
+    that it woke up (the scheduling lag). A watchdog thread notices when the
+    probe is overdue by more than `slow_threshold_ms` and samples the loop
+    thread's stack while it is still blocked, so each slow callback is
+    recorded together with the code that was running.
+    """
+
+    def __init__(
+        self,
+        interval: float = LOOP_MONITOR_INTERVAL,
+        slow_threshold_ms: float = LOOP_SLOW_CALLBACK_MS,
+        history: int = LOOP_SLOW_CALLBACK_HISTORY,
+    ):
+        self.interval = interval
+        self.slow_threshold_ms = slow_threshold_ms
+        self.lag = LatencyHistogram()
+        self.slow_callbacks: Deque[Dict[str, Any]] = deque(maxlen=history)
+        self.slow_count = 0
+        self._heartbeat = time.perf_counter()
+        self._loop_thread_id: Optional[int] = None
+        self._pending: Optional[Tuple[float, List[str]]] = None  # (heartbeat, stack)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def _probe(self) -> None:
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            woke = time.perf_counter()
+            beat, self._heartbeat = self._heartbeat, woke
+            lag_ms = max((woke - start - self.interval) * 1000.0, 0.0)
+            self.lag.observe(lag_ms)
+            pipeline_metrics.set_gauge('event_loop_lag_ms', round(lag_ms, 2))
+            if lag_ms >= self.slow_threshold_ms:
+                self._record_slow(lag_ms, beat)
+
+    def _record_slow(self, lag_ms: float, beat: float) -> None:
+        # Only use a stack the watchdog sampled during this stall
+        pending, self._pending = self._pending, None
+        stack = pending[1] if pending is not None and pending[0] == beat else None
+        self.slow_count += 1
+        self.slow_callbacks.append({
+            "timestamp": datetime.utcnow().isoformat(),
+            "duration_ms": round(lag_ms, 1),
+            "stack": stack or [],
+        })
+        pipeline_metrics.increment('loop_slow_callbacks')
+        where = stack[-1] if stack else "unknown"
+        logger.warning(f"Event loop blocked for {lag_ms:.0f}ms (at {where})")
+
+    def _watch(self) -> None:
+        poll = max(min(self.slow_threshold_ms / 4000.0, 0.05), 0.005)
+        while not self._stopped.wait(poll):
+            beat = self._heartbeat
+            overdue_ms = (time.perf_counter() - beat - self.interval) * 1000.0
+            if overdue_ms < self.slow_threshold_ms or (self._pending is not None and self._pending[0] == beat):
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is not None:
+                self._pending = (beat, [
+                    f"{entry.filename}:{entry.lineno} in {entry.name}"
+                    for entry in traceback.extract_stack(frame)[-STACK_DEPTH:]
+                ])
+
+    def start(self) -> None:
+        """Start the probe on the running loop and the watchdog thread"""
+        if self._task is not None:
+            return
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.perf_counter()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"Event loop monitor started (interval {self.interval * 1000:.0f}ms, "
+                    f"slow callback threshold {self.slow_threshold_ms:.0f}ms)")
+
+    async def stop(self) -> None:
+        """Stop the probe and the watchdog"""
+        self._stopped.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1.0)
+            self._watchdog = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag distribution and slow-callback count"""
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000.0,
+            "slow_threshold_ms": self.slow_threshold_ms,
+            "lag_ms": self.lag.snapshot(),
+            "slow_callbacks": self.slow_count,
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Stats plus the most recent slow callbacks with their stacks"""
+        return {**self.stats(), "recent_slow_callbacks": list(self.slow_callbacks)}
+
+
+def sample_profile(seconds: float, hz: float = 100.0) -> Counter:
+    """Sample every thread's stack at `hz` for `seconds`.
+
+    Returns folded stacks (`thread;outer;...;inner` -> sample count), the
+    input format of flamegraph.pl and speedscope. Blocks the calling
+    thread, so run it with asyncio.to_thread.
+    """
+    own_id = threading.get_ident()
+    period = 1.0 / hz
+    folded: Counter = Counter()
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own_id:
+                folded[f"{names.get(thread_id, thread_id)};{fold_stack(frame)}"] += 1
+        time.sleep(period)
+    return folded
+
+
+def format_folded(folded: Counter) -> str:
+    """Render folded stacks one per line: `stack count`"""
+    return "".join(f"{stack} {count}\n" for stack, count in folded.most_common())
+
+
+# Global instance
+loop_monitor = LoopMonitor()
@@ -0,0 +1,205 @@
+# app/services/metrics.py
+"""
+Pipeline latency histograms, counters and consumer lag tracking
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, Tuple
+
+from ..config import SLOW_STAGE_THRESHOLDS_MS
+from ..models import CloudEvent
+
+logger = logging.getLogger(__name__)
+
+# Bucket upper bounds in milliseconds. The upper end covers the Flink
+# window close + watermark delay, which is measured in minutes.
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (
+    1, 2, 5, 10, 25, 50, 100, 250, 500,
+    1_000, 2_500, 5_000, 10_000, 30_000, 60_000,
+    120_000, 300_000, 600_000, 1_800_000,
+)
+
+
+def to_epoch_seconds(value: Any) -> Optional[float]:
+    """Convert a window timestamp (datetime, ISO string or epoch millis) to epoch seconds"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value.timestamp()
+    if isinstance(value, (int, float)):
+        # Flink/Avro timestamps arrive as epoch millis when not decoded
+        return value / 1000.0 if value > 1e11 else float(value)
+    if isinstance(value, str):
+        try:
+            return to_epoch_seconds(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            return None
+    return None
+
+
+def event_time(event: Any) -> Optional[float]:
+    """Epoch seconds of an event: pre-parsed for a CloudEvent, parsed for a dict"""
+    if isinstance(event, CloudEvent):
+        return event.epoch
+    return to_epoch_seconds(event.get('time'))
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram with values in milliseconds"""
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last bucket is +Inf
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms: Optional[float] = None
+
+    def observe(self, value_ms: float) -> None:
+        """Record a single observation"""
+        self.counts[bisect.bisect_left(self.buckets, value_ms)] += 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.max_ms = max(self.max_ms, value_ms)
+        self.last_ms = value_ms
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Estimate a percentile (0-100) as the upper bound of its bucket"""
+        if self.count == 0:
+            return None
+        rank = q / 100.0 * self.count
+        cumulative = 0
+        for index, bucket_count in enumerate(self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank and bucket_count:
+                if index < len(self.buckets):
+                    return float(min(self.buckets[index], self.max_ms))
+                return self.max_ms
+        return self.max_ms
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of the histogram"""
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total_ms / self.count, 3) if self.count else None,
+            "max_ms": round(self.max_ms, 3),
+            "last_ms": round(self.last_ms, 3) if self.last_ms is not None else None,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "buckets": {
+                **{f"le_{int(b)}": c for b, c in zip(self.buckets, self.counts)},
+                "le_inf": self.counts[-1],
+            },
+        }
+
+
+class PipelineMetrics:
+    """Collects per-stage latencies, counters, gauges and consumer lag"""
+
+    def __init__(self, slow_thresholds_ms: Optional[Dict[str, float]] = None):
+        self.slow_thresholds_ms = dict(
+            SLOW_STAGE_THRESHOLDS_MS if slow_thresholds_ms is None else slow_thresholds_ms
+        )
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Clear all recorded metrics"""
+        with self._lock:
+            self.stages: Dict[str, LatencyHistogram] = {}
+            self.slow_counts: Dict[str, int] = {}
+            self.counters: Dict[str, int] = {}
+            self.gauges: Dict[str, float] = {}
+            self.consumer_lag: Dict[str, Dict[int, int]] = {}
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record a stage latency and flag it if it exceeds the stage threshold"""
+        value_ms = max(seconds, 0.0) * 1000.0
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram()
+            histogram.observe(value_ms)
+            threshold = self.slow_thresholds_ms.get(stage)
+            is_slow = threshold is not None and value_ms > threshold
+            if is_slow:
+                self.slow_counts[stage] = self.slow_counts.get(stage, 0) + 1
+        if is_slow:
+            logger.warning(f"Slow pipeline stage '{stage}': {value_ms:.1f}ms (threshold {threshold:.0f}ms)")
+
+    @contextmanager
+    def time_stage(self, stage: str):
+        """Context manager that records the wall time of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def observe_since(self, stage: str, timestamp: Any, now: Optional[float] = None) -> Optional[float]:
+        """Record the delay between a window timestamp and now"""
+        start = to_epoch_seconds(timestamp)
+        if start is None:
+            return None
+        delay = (now if now is not None else time.time()) - start
+        self.observe(stage, delay)
+        return delay
+
+    def increment(self, name: str, value: int = 1) -> None:
+        """Increase a named counter"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a named gauge to its current value"""
+        with self._lock:
+            self.gauges[name] = value
+
+    def record_consumer_lag(self, topic: str, partition: int, lag: int) -> None:
+        """Record the lag of a consumer partition against its high watermark"""
+        with self._lock:
+            self.consumer_lag.setdefault(topic, {})[partition] = lag
+
+    def slow_stages(self) -> Dict[str, Dict[str, Any]]:
+        """Stages whose p95 latency is above their configured threshold"""
+        flagged = {}
+        for stage, histogram in self.stages.items():
+            threshold = self.slow_thresholds_ms.get(stage)
+            p95 = histogram.percentile(95)
+            if threshold is not None and p95 is not None and p95 > threshold:
+                flagged[stage] = {
+                    "p95_ms": p95,
+                    "threshold_ms": threshold,
+                    "slow_count": self.slow_counts.get(stage, 0),
+                }
+        return flagged
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return a JSON-serializable view of all metrics"""
+        with self._lock:
+            return {
+                "stages": {name: h.snapshot() for name, h in self.stages.items()},
+                "slow_stages": self.slow_stages(),
+                "thresholds_ms": dict(self.slow_thresholds_ms),
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "consumer_lag": {
+                    topic: {
+                        "partitions": {str(p): lag for p, lag in partitions.items()},
+                        "total": sum(partitions.values()),
+                    }
+                    for topic, partitions in self.consumer_lag.items()
+                },
+            }
+
+
+# Global instance
+pipeline_metrics = PipelineMetrics()
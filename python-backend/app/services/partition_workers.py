@@ -0,0 +1,318 @@
+# app/services/partition_workers.py
+"""
+Partition-parallel consumer runtime with ordered, contiguous offset commits
+"""
+
+import asyncio
+import logging
+import threading
+import time
+import zlib
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from ..config import (
+    CONSUMER_WORKERS, CONSUMER_COMMIT_INTERVAL, CONSUMER_MAX_IN_FLIGHT, GEMINI_BATCH_ENABLED, GEMINI_BATCH_MAX_SIZE,
+)
+from .kafka_service import KafkaConsumerService
+
+logger = logging.getLogger(__name__)
+
+PartitionKey = Tuple[str, int]
+
+# How long stopping waits for queued messages to be processed before committing
+DRAIN_TIMEOUT = 10.0
+
+# Backoff (seconds) between attempts at a batch whose handler failed, doubling up to the max
+RETRY_BACKOFF = 0.5
+RETRY_BACKOFF_MAX = 30.0
+
+
+class OffsetTracker:
+    """Dispatched and processed offsets per partition.
+
+    The commit position of a partition only advances over a contiguous run
+    of processed offsets, so a message is never committed before the ones
+    ahead of it. Revoking a partition bumps its generation: completions of
+    messages dispatched before the revoke are ignored.
+    """
+
+    def __init__(self):
+        self._pending: Dict[PartitionKey, deque] = {}   # dispatched offsets, oldest first
+        self._done: Dict[PartitionKey, Set[int]] = {}
+        self._position: Dict[PartitionKey, int] = {}     # next offset to commit
+        self._committed: Dict[PartitionKey, int] = {}
+        self._generation: Dict[PartitionKey, int] = {}
+        self._lock = threading.Lock()
+
+    def dispatched(self, key: PartitionKey, offset: int) -> int:
+        """Record a message handed to a worker; returns the generation to complete it with"""
+        with self._lock:
+            self._pending.setdefault(key, deque()).append(offset)
+            self._done.setdefault(key, set())
+            return self._generation.get(key, 0)
+
+    def completed(self, key: PartitionKey, offset: int, generation: int) -> None:
+        """Mark a message processed and advance the partition's commit position"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is None or generation != self._generation.get(key, 0):
+                return
+            done = self._done[key]
+            done.add(offset)
+            while pending and pending[0] in done:
+                done.discard(pending[0])
+                self._position[key] = pending.popleft() + 1
+
+    def is_current(self, key: PartitionKey, generation: int) -> bool:
+        """Whether a message dispatched with `generation` still belongs to this consumer"""
+        with self._lock:
+            return key in self._pending and generation == self._generation.get(key, 0)
+
+    def in_flight(self, key: PartitionKey) -> int:
+        with self._lock:
+            pending = self._pending.get(key)
+            return len(pending) if pending else 0
+
+    def committable(
+        self,
+        keys: Optional[List[PartitionKey]] = None,
+        holds: Optional[Dict[PartitionKey, int]] = None,
+    ) -> Dict[PartitionKey, int]:
+        """Commit positions that moved since the last commit, capped by `holds`"""
+        holds = holds or {}
+        with self._lock:
+            positions = {
+                key: min(position, holds.get(key, position)) for key, position in self._position.items()
+                if keys is None or key in keys
+            }
+            return {key: position for key, position in positions.items() if self._committed.get(key) != position}
+
+    def mark_committed(self, offsets: Dict[PartitionKey, int]) -> None:
+        with self._lock:
+            self._committed.update(offsets)
+
+    def revoke(self, keys: List[PartitionKey]) -> None:
+        """Forget partitions taken away by a rebalance"""
+        with self._lock:
+            for key in keys:
+                self._pending.pop(key, None)
+                self._done.pop(key, None)
+                self._position.pop(key, None)
+                self._committed.pop(key, None)
+                self._generation[key] = self._generation.get(key, 0) + 1
+
+    def partitions(self) -> Dict[str, int]:
+        """In-flight messages per partition"""
+        with self._lock:
+            return {f"{topic}[{partition}]": len(pending) for (topic, partition), pending in self._pending.items()}
+
+
+class PartitionedConsumer:
+    """Runs a subscribed consumer with one async worker per partition slot.
+
+    A partition is always dispatched to the same worker, so its messages are
+    handled in offset order while other partitions proceed concurrently. A
+    worker hands the handler everything queued for it (up to `batch_size`)
+    in one call. Offsets are committed manually once processed, and no
+    further than the `holds` passed to `run` allow (for handlers that keep
+    messages in memory past their return).
+
+    A batch whose handler raises is retried with exponential backoff (from
+    `retry_backoff` up to RETRY_BACKOFF_MAX seconds) and its offsets only
+    advance once it succeeds, so delivery is at-least-once; while it is
+    retried its partitions back up and get paused. A batch still failing
+    at shutdown is left uncommitted and redelivered on the next run.
+    """
+
+    def __init__(
+        self,
+        workers: int = CONSUMER_WORKERS,
+        commit_interval: float = CONSUMER_COMMIT_INTERVAL,
+        max_in_flight: int = CONSUMER_MAX_IN_FLIGHT,
+        batch_size: int = GEMINI_BATCH_MAX_SIZE if GEMINI_BATCH_ENABLED else 1,
+        poll_timeout: float = 1.0,
+        retry_backoff: float = RETRY_BACKOFF,
+    ):
+        self.workers = max(1, workers)
+        self.commit_interval = commit_interval
+        self.max_in_flight = max(1, max_in_flight)
+        self.batch_size = max(1, batch_size)
+        self.poll_timeout = poll_timeout
+        self.retry_backoff = retry_backoff
+        self.tracker = OffsetTracker()
+        self._consumer: Optional[KafkaConsumerService] = None
+        self._holds: Optional[Callable[[], Dict[PartitionKey, int]]] = None
+        self._queues: List[asyncio.Queue] = []
+        self._paused: Set[PartitionKey] = set()
+        self._last_commit = 0.0
+        self.running = False
+        self.dispatched = 0
+        self.processed = 0
+        self.failed = 0
+        self.retries = 0
+        self.commits = 0
+        self.commit_errors = 0
+        self.pauses = 0
+
+    def worker_of(self, key: PartitionKey) -> int:
+        """Worker slot of a partition: consecutive partitions of a topic get distinct workers"""
+        return (zlib.crc32(key[0].encode('utf-8')) + key[1]) % self.workers
+
+    # ------------------------------------------------------------------
+    # Workers
+    # ------------------------------------------------------------------
+
+    async def _work(self, queue: asyncio.Queue, handler: Callable[[list], Awaitable[Any]]) -> None:
+        while True:
+            items = [await queue.get()]
+            while len(items) < self.batch_size and not queue.empty():
+                items.append(queue.get_nowait())
+            try:
+                if await self._process(items, handler):
+                    for msg, key, generation in items:
+                        self.tracker.completed(key, msg.offset(), generation)
+            finally:
+                for _ in items:
+                    queue.task_done()
+
+    async def _process(self, items: list, handler: Callable[[list], Awaitable[Any]]) -> bool:
+        """Run the handler until it succeeds; False if the batch was given up
+        (its partitions were revoked)"""
+        backoff = self.retry_backoff
+        while True:
+            try:
+                await handler([msg for msg, _, _ in items])
+                self.processed += len(items)
+                return True
+            except Exception as e:
+                self.failed += len(items)
+                logger.error(f"Error processing {len(items)} message(s), retrying in {backoff:g}s: {e}")
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, RETRY_BACKOFF_MAX)
+            items = [item for item in items if self.tracker.is_current(item[1], item[2])]
+            if not items:
+                return False
+            self.retries += 1
+
+    def _dispatch(self, msg) -> None:
+        key = (msg.topic(), msg.partition())
+        generation = self.tracker.dispatched(key, msg.offset())
+        self._queues[self.worker_of(key)].put_nowait((msg, key, generation))
+        self.dispatched += 1
+        if key not in self._paused and self.tracker.in_flight(key) >= self.max_in_flight:
+            # Backpressure on this partition only; the others keep flowing
+            self._consumer.pause([key])
+            self._paused.add(key)
+            self.pauses += 1
+
+    def _resume_caught_up(self) -> None:
+        ready = [key for key in self._paused if self.tracker.in_flight(key) <= self.max_in_flight // 2]
+        if ready:
+            self._consumer.resume(ready)
+            self._paused.difference_update(ready)
+
+    # ------------------------------------------------------------------
+    # Commits
+    # ------------------------------------------------------------------
+
+    def commit(self, keys: Optional[List[PartitionKey]] = None, asynchronous: bool = True) -> None:
+        """Commit processed offsets (all partitions, or only `keys`)"""
+        offsets = self.tracker.committable(keys, self._holds() if self._holds is not None else None)
+        if not offsets or self._consumer is None:
+            return
+        try:
+            self._consumer.commit_offsets(offsets, asynchronous=asynchronous)
+            self.tracker.mark_committed(offsets)
+            self.commits += 1
+        except Exception as e:
+            self.commit_errors += 1
+            logger.warning(f"Offset commit failed: {e}")
+
+    def _on_revoke(self, partitions: list) -> None:
+        # Runs inside consume() on the poll thread, before the partitions go
+        keys = [(tp.topic, tp.partition) for tp in partitions]
+        self.commit(keys, asynchronous=False)
+        self.tracker.revoke(keys)
+        self._paused.difference_update(keys)
+
+    # ------------------------------------------------------------------
+    # Run loop
+    # ------------------------------------------------------------------
+
+    async def run(
+        self,
+        consumer: KafkaConsumerService,
+        handler: Callable[[list], Awaitable[Any]],
+        keep_running: Callable[[], bool],
+        on_poll: Optional[Callable[[], Awaitable[Any]]] = None,
+        holds: Optional[Callable[[], Dict[PartitionKey, int]]] = None,
+    ) -> None:
+        """Consume and dispatch until `keep_running()` is false, then drain and commit.
+
+        `on_poll` runs after every poll, also when nothing arrived. `holds`
+        returns the highest offset each partition may be committed to.
+        """
+        self._consumer = consumer
+        self._holds = holds
+        consumer.on_revoke = self._on_revoke
+        self._queues = [asyncio.Queue() for _ in range(self.workers)]
+        tasks = [asyncio.create_task(self._work(queue, handler)) for queue in self._queues]
+        self.running = True
+        try:
+            while keep_running():
+                messages = await asyncio.to_thread(
+                    consumer.consume_batch, self.workers * self.batch_size, self.poll_timeout
+                )
+                # Watermark lookups block, so keep them off the loop
+                await asyncio.to_thread(consumer.report_lag)
+                for msg in messages:
+                    if msg.error():
+                        logger.warning(f"Consumer error: {msg.error()}")
+                        continue
+                    self._dispatch(msg)
+                if on_poll is not None:
+                    await on_poll()
+                self._resume_caught_up()
+                if time.monotonic() - self._last_commit >= self.commit_interval:
+                    self.commit()
+                    self._last_commit = time.monotonic()
+            # Finish what was already dispatched so its offsets can be committed
+            try:
+                await asyncio.wait_for(asyncio.gather(*(q.join() for q in self._queues)), DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Consumer workers did not drain in time; uncommitted messages will be redelivered")
+        finally:
+            self.running = False
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.commit(asynchronous=False)
+            if self._paused:
+                try:
+                    consumer.resume(list(self._paused))
+                except Exception as e:
+                    logger.warning(f"Resuming paused partitions failed: {e}")
+                self._paused.clear()
+            consumer.on_revoke = None
+            self._holds = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Worker throughput, commit counts and in-flight messages per partition"""
+        return {
+            "running": self.running,
+            "workers": self.workers,
+            "dispatched": self.dispatched,
+            "processed": self.processed,
+            "failed": self.failed,
+            "retries": self.retries,
+            "commits": self.commits,
+            "commit_errors": self.commit_errors,
+            "pauses": self.pauses,
+            "paused": sorted(f"{topic}[{partition}]" for topic, partition in self._paused),
+            "in_flight": self.tracker.partitions(),
+        }
+
+
+# Global instance
+summary_workers = PartitionedConsumer()
@@ -0,0 +1,73 @@
+# app/services/partitioning.py
+"""
+Kafka message key selection for the cloudevents-stream producer
+"""
+
+import hashlib
+import logging
+import zlib
+from typing import Callable, Dict, Optional
+
+from ..config import KAFKA_PARTITION_STRATEGY
+
+logger = logging.getLogger(__name__)
+
+
+def _by_id(event: dict) -> Optional[bytes]:
+    return (event.get('id') or '').encode('utf-8') or None
+
+
+def _by_correlation(event: dict) -> Optional[bytes]:
+    # Uncorrelated events have nothing to co-locate with: no key lets the
+    # producer's sticky partitioner batch them onto any partition
+    correlation_id = event.get('correlation_id')
+    return correlation_id.encode('utf-8') if correlation_id else None
+
+
+def _by_source(event: dict) -> Optional[bytes]:
+    return (event.get('source') or '').encode('utf-8') or None
+
+
+def _by_source_subject(event: dict) -> Optional[bytes]:
+    # Short fixed-size digest so long subjects do not bloat every record key
+    name = f"{event.get('source') or ''}\x00{event.get('subject') or ''}"
+    return hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+
+
+def _sticky(event: dict) -> Optional[bytes]:
+    return None
+
+
+# Strategy name -> key function. A None key leaves placement to the
+# producer's sticky partitioner (one partition per batch, rotating).
+PARTITION_STRATEGIES: Dict[str, Callable[[dict], Optional[bytes]]] = {
+    "id": _by_id,
+    "correlation": _by_correlation,
+    "source": _by_source,
+    "source_subject": _by_source_subject,
+    "sticky": _sticky,
+}
+
+
+def get_key_function(strategy: str = KAFKA_PARTITION_STRATEGY) -> Callable[[dict], Optional[bytes]]:
+    """Key function for a strategy name, falling back to per-event ids"""
+    key_function = PARTITION_STRATEGIES.get(strategy)
+    if key_function is None:
+        logger.error(f"Unknown KAFKA_PARTITION_STRATEGY '{strategy}' - keying by event id")
+        return _by_id
+    return key_function
+
+
+def partition_key(event: dict, strategy: str = KAFKA_PARTITION_STRATEGY) -> Optional[bytes]:
+    """Message key for an event under the given strategy"""
+    return get_key_function(strategy)(event)
+
+
+def partition_for(key: Optional[bytes], num_partitions: int) -> Optional[int]:
+    """Partition a keyed message lands on with librdkafka's default
+    `consistent_random` partitioner (CRC32 of the key). None for unkeyed
+    messages, whose partition is chosen by the sticky partitioner.
+    """
+    if not key:
+        return None
+    return zlib.crc32(key) % num_partitions
@@ -0,0 +1,232 @@
+# app/services/scenario_scheduler.py
+"""
+Managed scenario runs: registry, concurrency cap, cancellation and time compression
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from ..config import (
+    SCENARIO_MAX_CONCURRENT, SCENARIO_MAX_SPEED, SCENARIO_EVENT_INTERVAL, SCENARIO_HISTORY,
+)
+from ..models import CloudEvent
+from .websocket_manager import ConnectionManager, manager
+
+logger = logging.getLogger(__name__)
+
+# (event time offset in seconds, event spec with source/type/subject/severity/...)
+PlannedEvent = Tuple[float, Dict[str, Any]]
+
+# Yield to the event loop at least this often when a compressed run never sleeps
+YIELD_EVERY = 100
+
+
+class SchedulerFullError(Exception):
+    """Raised when SCENARIO_MAX_CONCURRENT runs are already in progress"""
+
+
+def plan_events(scenario: dict, interval: float = SCENARIO_EVENT_INTERVAL) -> List[PlannedEvent]:
+    """The events of a run with their event-time offsets, `interval` seconds
+    apart. Scenarios without scripted events (e.g. normal_operations) have none."""
+    return [(i * interval, event) for i, event in enumerate(scenario.get("events", []))]
+
+
+class ScenarioRun:
+    """One scenario execution and its progress"""
+
+    def __init__(self, scenario_name: str, scenario: dict, plan: List[PlannedEvent], speed: float):
+        self.run_id = uuid.uuid4().hex[:12]
+        self.scenario_name = scenario_name
+        self.name = scenario.get("name", scenario_name)
+        self.plan = plan
+        self.speed = speed
+        self.status = "running"
+        self.sent = 0
+        self.skipped = 0  # duplicates and shed events
+        self.failed = 0
+        self.started_at = time.time()
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def event_span(self) -> float:
+        """Seconds of event time the run covers"""
+        return self.plan[-1][0] if self.plan else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        finished = self.finished_at or time.time()
+        return {
+            "run_id": self.run_id,
+            "scenario": self.scenario_name,
+            "name": self.name,
+            "status": self.status,
+            "speed": self.speed,
+            "total_events": len(self.plan),
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "event_span_seconds": self.event_span,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "elapsed_seconds": round(finished - self.started_at, 3),
+        }
+
+
+class ScenarioScheduler:
+    """Starts, tracks and cancels scenario runs.
+
+    At most `max_concurrent` runs are active; finished runs stay
+    inspectable until `history` newer ones have finished. A run with speed
+    N sends event k at real time offset/N after its start, but stamps it
+    with the full-speed offset. The synthetic timeline is anchored so its
+    last event is stamped with the real time it is sent at: no event lies
+    in the future, and a run at speed 1 is stamped in real time.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = SCENARIO_MAX_CONCURRENT,
+        max_speed: float = SCENARIO_MAX_SPEED,
+        history: int = SCENARIO_HISTORY,
+        connections: ConnectionManager = manager,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_speed = max_speed
+        self.history = history
+        self.connections = connections
+        self._runs: "OrderedDict[str, ScenarioRun]" = OrderedDict()
+        self.started = 0
+        self.rejected = 0
+
+    @property
+    def active(self) -> List[ScenarioRun]:
+        return [run for run in self._runs.values() if run.status == "running"]
+
+    def submit(
+        self,
+        scenario_name: str,
+        scenario: dict,
+        publish: Callable[..., Awaitable[str]],
+        speed: float = 1.0,
+    ) -> ScenarioRun:
+        """Start a run in the background; raises SchedulerFullError at the concurrency cap"""
+        if len(self.active) >= self.max_concurrent:
+            self.rejected += 1
+            raise SchedulerFullError(f"{self.max_concurrent} scenarios already running")
+        if not 0 < speed <= self.max_speed:
+            raise ValueError(f"speed must be in (0, {self.max_speed:g}]")
+        run = ScenarioRun(scenario_name, scenario, plan_events(scenario), speed)
+        self._runs[run.run_id] = run
+        run.task = asyncio.create_task(self._execute(run, publish))
+        self.started += 1
+        return run
+
+    def get(self, run_id: str) -> Optional[ScenarioRun]:
+        return self._runs.get(run_id)
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """All tracked runs, newest first"""
+        return [run.to_dict() for run in reversed(self._runs.values())]
+
+    def cancel(self, run_id: str) -> Optional[ScenarioRun]:
+        """Cancel a running run (no-op for a finished one); None when unknown"""
+        run = self._runs.get(run_id)
+        if run is not None and run.status == "running" and run.task is not None:
+            run.task.cancel()
+        return run
+
+    async def _send(self, run: ScenarioRun, offset: float, spec: Dict[str, Any], epoch0: float,
+                    data: Dict[str, Any], publish: Callable[..., Awaitable[str]]) -> None:
+        cloud_event = CloudEvent.create(
+            source=spec["source"],
+            type=spec["type"],
+            subject=spec.get("subject"),
+            severity=spec["severity"],
+            category=spec.get("category", "other"),
+            correlation_id=spec.get("correlation_id"),
+            data=data,
+            epoch=epoch0 + offset,
+        )
+        try:
+            # Wait for spool space rather than dropping the event
+            status = await publish(cloud_event, wait=True)
+        except Exception as e:
+            run.failed += 1
+            logger.error(f"Scenario {run.scenario_name}: event {cloud_event.id} not sent: {e}")
+            return
+        if status == "success":
+            run.sent += 1
+        else:
+            run.skipped += 1
+
+    async def _execute(self, run: ScenarioRun, publish: Callable[..., Awaitable[str]]) -> None:
+        # All events of a run share one payload
+        data = {"simulated": True, "scenario": run.scenario_name, "run_id": run.run_id}
+        try:
+            await self.connections.broadcast({
+                "type": "scenario_started",
+                "scenario": run.scenario_name,
+                "name": run.name,
+                "run_id": run.run_id,
+                "speed": run.speed,
+            })
+            epoch0 = time.time() - run.event_span * (1.0 - 1.0 / run.speed)
+            started = time.monotonic()
+            for i, (offset, spec) in enumerate(run.plan):
+                delay = started + offset / run.speed - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                elif i % YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+                await self._send(run, offset, spec, epoch0, data, publish)
+            run.status = "completed"
+        except asyncio.CancelledError:
+            run.status = "cancelled"
+            logger.info(f"Scenario run {run.run_id} cancelled after {run.sent} events")
+            raise
+        except Exception as e:
+            run.status = "failed"
+            logger.error(f"Error executing scenario: {e}")
+        finally:
+            run.finished_at = time.time()
+            self._prune()
+            await self.connections.broadcast({
+                "type": "scenario_completed",
+                "scenario": run.scenario_name,
+                "run_id": run.run_id,
+                "status": run.status,
+                "failed_events": run.failed,
+            })
+
+    def _prune(self) -> None:
+        finished = [run_id for run_id, run in self._runs.items() if run.status != "running"]
+        for run_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._runs[run_id]
+
+    async def stop(self) -> None:
+        """Cancel all running runs (application shutdown)"""
+        tasks = [run.task for run in self.active if run.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Run counts by state"""
+        statuses: Dict[str, int] = {}
+        for run in self._runs.values():
+            statuses[run.status] = statuses.get(run.status, 0) + 1
+        return {
+            "active": statuses.get("running", 0),
+            "max_concurrent": self.max_concurrent,
+            "started": self.started,
+            "rejected": self.rejected,
+            "tracked": statuses,
+        }
+
+
+# Global instance
+scenario_scheduler = ScenarioScheduler()
@@ -0,0 +1,331 @@
+# app/services/sketches.py
+"""
+Mergeable per-window sketches: HyperLogLog distinct counts and subject reservoirs
+"""
+
+import base64
+import hashlib
+import heapq
+import logging
+import math
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from ..config import (
+    SKETCH_WINDOW_SECONDS, SKETCH_RETAINED_WINDOWS, SKETCH_HLL_PRECISION, SKETCH_RESERVOIR_SIZE,
+)
+from .metrics import event_time
+
+logger = logging.getLogger(__name__)
+
+# Event fields with a distinct count per window
+DISTINCT_FIELDS = ("type", "subject", "correlation_id")
+
+# Events timestamped further ahead than this are clamped to now
+MAX_CLOCK_SKEW_SECONDS = 60.0
+
+
+def hash64(value: str) -> int:
+    """Stable 64-bit hash, identical in every process so sketches merge across workers"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HyperLogLog:
+    """HyperLogLog distinct counter (Flajolet et al.) with 2^precision registers.
+
+    Standard error is about 1.04 / sqrt(2^precision) (1.6% at precision 12)
+    in 2^precision bytes, however many values are added. Two sketches with
+    the same precision merge by taking the register-wise maximum, which
+    gives exactly the sketch of the combined stream.
+    """
+
+    def __init__(self, precision: int = SKETCH_HLL_PRECISION, registers: Optional[bytes] = None):
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.m = 1 << precision
+        self._shift = 64 - precision
+        self._mask = (1 << self._shift) - 1
+        self.registers = bytearray(registers) if registers is not None else bytearray(self.m)
+        if len(self.registers) != self.m:
+            raise ValueError(f"expected {self.m} registers, got {len(self.registers)}")
+
+    def add(self, value: str) -> None:
+        """Add a value (hashed with hash64)"""
+        self.add_hash(hash64(value))
+
+    def add_hash(self, h: int) -> None:
+        index = h >> self._shift
+        rank = self._shift - (h & self._mask).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """Fold another sketch of the same precision into this one"""
+        if other.precision != self.precision:
+            raise ValueError("cannot merge HyperLogLog sketches of different precision")
+        mine = np.frombuffer(self.registers, dtype=np.uint8)
+        np.maximum(mine, np.frombuffer(other.registers, dtype=np.uint8), out=mine)
+        return self
+
+    def count(self) -> int:
+        """Estimated number of distinct values"""
+        registers = np.frombuffer(self.registers, dtype=np.uint8)
+        m = self.m
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        estimate = alpha * m * m / float(np.sum(np.ldexp(1.0, -registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting over empty registers
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+    def to_bytes(self) -> bytes:
+        return bytes([self.precision]) + bytes(self.registers)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "HyperLogLog":
+        return cls(data[0], data[1:])
+
+
+class Reservoir:
+    """Uniform sample of at most `size` values from a stream (Algorithm R).
+
+    `seen` counts every offered value. Merging weights each item by the
+    number of values it stands for (seen / len(items)) and draws without
+    replacement (Efraimidis-Spirakis keys), so the merged sample is again
+    close to uniform over both streams.
+    """
+
+    def __init__(self, size: int = SKETCH_RESERVOIR_SIZE, rng: Optional[random.Random] = None):
+        self.size = size
+        self.items: List[str] = []
+        self.seen = 0
+        self._rng = rng or random.Random()
+
+    def add(self, value: str) -> None:
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(value)
+            return
+        slot = self._rng.randrange(self.seen)
+        if slot < self.size:
+            self.items[slot] = value
+
+    def merge(self, other: "Reservoir") -> "Reservoir":
+        """Fold another reservoir into this one"""
+        # A reservoir never holds more items than it has seen; empty ones add nothing
+        weighted = [
+            (item, max(r.seen, len(r.items)) / len(r.items))
+            for r in (self, other) if r.items for item in r.items
+        ]
+        keyed = [(self._rng.random() ** (1.0 / weight), item) for item, weight in weighted]
+        self.items = [item for _, item in heapq.nlargest(self.size, keyed)]
+        self.seen += other.seen
+        return self
+
+
+class WindowSketch:
+    """Constant-size summary of one source's events in one window"""
+
+    def __init__(self, precision: int = SKETCH_HLL_PRECISION, reservoir_size: int = SKETCH_RESERVOIR_SIZE):
+        self.events = 0.0
+        self.distinct = {field: HyperLogLog(precision) for field in DISTINCT_FIELDS}
+        self.subjects = Reservoir(reservoir_size)
+
+    def add(self, event: dict, weight: float = 1.0) -> None:
+        self.events += weight
+        for field in DISTINCT_FIELDS:
+            value = event.get(field)
+            if value:
+                self.distinct[field].add(str(value))
+        if event.get('subject'):
+            self.subjects.add(str(event['subject']))
+
+    def merge(self, other: "WindowSketch") -> "WindowSketch":
+        self.events += other.events
+        for field in DISTINCT_FIELDS:
+            self.distinct[field].merge(other.distinct[field])
+        self.subjects.merge(other.subjects)
+        return self
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "events": round(self.events, 2),
+            "unique_types": self.distinct["type"].count(),
+            "unique_subjects": self.distinct["subject"].count(),
+            "unique_correlations": self.distinct["correlation_id"].count(),
+            "sample_subjects": sorted(set(self.subjects.items)),
+        }
+
+    def export(self) -> Dict[str, Any]:
+        """Serialized form another worker can merge with `WindowSketch.load`"""
+        return {
+            "events": self.events,
+            "distinct": {f: base64.b64encode(h.to_bytes()).decode('ascii') for f, h in self.distinct.items()},
+            "subjects": {"items": list(self.subjects.items), "seen": self.subjects.seen},
+        }
+
+    @classmethod
+    def load(
+        cls,
+        data: Dict[str, Any],
+        precision: int = SKETCH_HLL_PRECISION,
+        reservoir_size: int = SKETCH_RESERVOIR_SIZE,
+    ) -> "WindowSketch":
+        """Inverse of `export`; raises ValueError unless the sketch has exactly
+        DISTINCT_FIELDS at `precision`, so it merges with local ones, and a
+        consistent subject reservoir (string items, seen >= len(items))"""
+        if set(data["distinct"]) != set(DISTINCT_FIELDS):
+            raise ValueError(f"distinct must have exactly the fields {', '.join(DISTINCT_FIELDS)}")
+        sketch = cls(precision, reservoir_size)
+        sketch.events = float(data["events"])
+        sketch.distinct = {f: HyperLogLog.from_bytes(base64.b64decode(raw)) for f, raw in data["distinct"].items()}
+        for field, hll in sketch.distinct.items():
+            if hll.precision != precision:
+                raise ValueError(f"{field}: HLL precision {hll.precision}, expected {precision}")
+        items = list(data["subjects"]["items"])
+        seen = int(data["subjects"]["seen"])
+        if not all(isinstance(item, str) for item in items):
+            raise ValueError("subjects.items must be strings")
+        if seen < len(items):
+            raise ValueError(f"subjects.seen ({seen}) is less than the {len(items)} items sampled")
+        sketch.subjects.items = items[:reservoir_size]
+        sketch.subjects.seen = seen
+        return sketch
+
+
+class WindowSketchStore:
+    """Per-source sketches for tumbling windows aligned with the Flink windows.
+
+    Each of the last `retained_windows` windows holds one WindowSketch per
+    source. Window and system-wide figures are obtained by merging, so
+    memory per window is sources x (3 HLLs + reservoir) at any event rate.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = SKETCH_WINDOW_SECONDS,
+        retained_windows: int = SKETCH_RETAINED_WINDOWS,
+        precision: int = SKETCH_HLL_PRECISION,
+        reservoir_size: int = SKETCH_RESERVOIR_SIZE,
+    ):
+        self.window_seconds = window_seconds
+        self.retained_windows = retained_windows
+        self.precision = precision
+        self.reservoir_size = reservoir_size
+        self._windows: Dict[int, Dict[str, WindowSketch]] = {}
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.late = 0
+
+    def _window(self, window: int) -> Optional[Dict[str, WindowSketch]]:
+        """Sketches of a window, created on first use; None once it has expired"""
+        sources = self._windows.get(window)
+        if sources is None:
+            newest = max(self._windows, default=window)
+            if window <= newest - self.retained_windows:
+                return None
+            sources = self._windows[window] = {}
+            for expired in [w for w in self._windows if w <= max(newest, window) - self.retained_windows]:
+                del self._windows[expired]
+        return sources
+
+    def record(self, event: dict, now: Optional[float] = None) -> bool:
+        """Add a produced event to its window's sketch"""
+        now = time.time() if now is None else now
+        timestamp = event_time(event)
+        if timestamp is None or timestamp > now + MAX_CLOCK_SKEW_SECONDS:
+            timestamp = now
+        source = event.get('source') or 'unknown'
+        with self._lock:
+            sources = self._window(int(timestamp // self.window_seconds))
+            if sources is None:
+                self.late += 1
+                return False
+            sketch = sources.get(source)
+            if sketch is None:
+                sketch = sources[source] = WindowSketch(self.precision, self.reservoir_size)
+            sketch.add(event, float(event.get('sample_weight') or 1.0))
+            self.recorded += 1
+        return True
+
+    def merge_in(self, window_start: float, source: str, data: Dict[str, Any]) -> bool:
+        """Merge a sketch exported by another worker into a window.
+
+        The sketch is validated (ValueError) before anything is stored.
+        """
+        incoming = WindowSketch.load(data, self.precision, self.reservoir_size)
+        with self._lock:
+            sources = self._window(int(window_start // self.window_seconds))
+            if sources is None:
+                return False
+            if source in sources:
+                sources[source].merge(incoming)
+            else:
+                sources[source] = incoming
+        return True
+
+    def windows(
+        self,
+        limit: int = 1,
+        source: Optional[str] = None,
+        export: bool = False,
+        combine: bool = False,
+    ) -> List[Dict[str, Any]]:
+        """The newest `limit` windows, newest first: one merged summary across
+        sources (or for `source`), plus per-source sketches when `export`.
+        With `combine` the selected windows are merged into a single entry."""
+        with self._lock:
+            selected = sorted(self._windows.items(), reverse=True)[:limit]
+            if combine and selected:
+                spanned = {}
+                for _, sources in selected:
+                    for name, sketch in sources.items():
+                        if name in spanned:
+                            spanned[name].merge(sketch)
+                        else:
+                            spanned[name] = WindowSketch(self.precision, self.reservoir_size).merge(sketch)
+                first, last = selected[-1][0], selected[0][0]
+                selected = [(first, spanned)]
+            results = []
+            for window, sources in selected:
+                parts = {s: k for s, k in sources.items() if source is None or s == source}
+                if not parts:
+                    continue
+                merged = WindowSketch(self.precision, self.reservoir_size)
+                for sketch in parts.values():
+                    merged.merge(sketch)
+                result = {
+                    "window_start": window * self.window_seconds,
+                    "window_end": ((last if combine else window) + 1) * self.window_seconds,
+                    "sources": len(parts),
+                    **merged.summary(),
+                }
+                if export:
+                    result["sketches"] = {s: k.export() for s, k in parts.items()}
+                results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Windows held and fixed per-sketch size"""
+        with self._lock:
+            sketches = sum(len(sources) for sources in self._windows.values())
+        return {
+            "recorded": self.recorded,
+            "late": self.late,
+            "windows": len(self._windows),
+            "sketches": sketches,
+            "window_seconds": self.window_seconds,
+            "hll_precision": self.precision,
+            "hll_standard_error": round(1.04 / math.sqrt(1 << self.precision), 4),
+            "bytes_per_sketch": len(DISTINCT_FIELDS) * (1 << self.precision),
+        }
+
+
+# Global instance
+window_sketches = WindowSketchStore()
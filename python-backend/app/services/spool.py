@@ -0,0 +1,374 @@
+# app/services/spool.py
+"""
+Durable local write-ahead spool between ingestion and Kafka
+"""
+
+import asyncio
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple, Union
+
+from ..config import (
+    CLOUDEVENTS_TOPIC, SPOOL_DIR, SPOOL_MAX_BYTES, SPOOL_SEGMENT_BYTES,
+    SPOOL_BATCH_SIZE, SPOOL_FSYNC, SPOOL_APPEND_TIMEOUT,
+)
+from ..models import CloudEvent
+from .kafka_service import KafkaProducerService, encode_event, kafka_producer
+from .metrics import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+# crc32, topic length, key length, value length
+RECORD_HEADER = struct.Struct('>IHHI')
+SEGMENT_PATTERN = "spool-{:012d}.log"
+CURSOR_FILE = "cursor.json"
+
+
+class SpoolFullError(Exception):
+    """Raised when the spool has reached its size limit"""
+
+
+class SpoolRecord(NamedTuple):
+    topic: str
+    key: Optional[bytes]
+    value: bytes
+    position: Tuple[int, int]  # (segment, offset) just after this record
+
+
+class EventSpool:
+    """Segmented append-only spool drained to Kafka by a background sender.
+
+    `append` writes the serialized event to the active segment and returns
+    as soon as it is on disk, so ingestion never waits on the broker. The
+    sender reads records in file order, produces them, and only advances
+    the persisted cursor once every record up to that point is acked.
+    Failed deliveries are retried from the first unacked record with
+    exponential backoff (at-least-once). A batch stops producing at its
+    first failed delivery, and records acked after it are remembered and
+    not sent again on the retry; the idempotent producer keeps per-key
+    order for what is already in flight.
+    """
+
+    def __init__(
+        self,
+        directory: str = SPOOL_DIR,
+        max_bytes: int = SPOOL_MAX_BYTES,
+        segment_bytes: int = SPOOL_SEGMENT_BYTES,
+        batch_size: int = SPOOL_BATCH_SIZE,
+        fsync: bool = SPOOL_FSYNC,
+        producer_service: KafkaProducerService = kafka_producer,
+    ):
+        self._dir = Path(directory)
+        self._max_bytes = max_bytes
+        self._segment_bytes = segment_bytes
+        self._batch_size = batch_size
+        self._fsync = fsync
+        self._producer_service = producer_service
+        self._lock = threading.Lock()
+        self._opened = False
+        self._segments: Dict[int, int] = {}  # segment -> size in bytes
+        self._writer = None
+        self._write_segment = 0
+        self._cursor: Tuple[int, int] = (0, 0)
+        self._reader = None
+        self._reader_segment: Optional[int] = None
+        self._pending_records = 0
+        self._acked_ahead: Set[Tuple[int, int]] = set()  # acked past the first unacked record
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+
+    # ------------------------------------------------------------------
+    # Storage
+    # ------------------------------------------------------------------
+
+    def _segment_path(self, segment: int) -> Path:
+        return self._dir / SEGMENT_PATTERN.format(segment)
+
+    def open(self) -> None:
+        """Load existing segments and the delivery cursor from disk"""
+        with self._lock:
+            if self._opened:
+                return
+            self._dir.mkdir(parents=True, exist_ok=True)
+            for path in self._dir.glob("spool-*.log"):
+                self._segments[int(path.stem.split("-")[1])] = path.stat().st_size
+
+            cursor_path = self._dir / CURSOR_FILE
+            if cursor_path.exists():
+                cursor = json.loads(cursor_path.read_text())
+                self._cursor = (cursor["segment"], cursor["offset"])
+            elif self._segments:
+                self._cursor = (min(self._segments), 0)
+
+            # Never append after a possibly torn tail: start a fresh segment
+            self._write_segment = max(self._segments, default=self._cursor[0] - 1) + 1
+            self._open_writer()
+            self._pending_records = self._count_pending()
+            self._opened = True
+            if self._pending_records:
+                logger.info(f"Spool recovered {self._pending_records} undelivered events from {self._dir}")
+
+    def _open_writer(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._writer = open(self._segment_path(self._write_segment), "ab")
+        self._segments.setdefault(self._write_segment, 0)
+
+    def _count_pending(self) -> int:
+        count = 0
+        position = self._cursor
+        while True:
+            record, position = self._read_record(position)
+            if record is None:
+                return count
+            count += 1
+
+    @property
+    def pending_bytes(self) -> int:
+        """Bytes written but not yet delivered"""
+        segment, offset = self._cursor
+        return sum(size for seg, size in self._segments.items() if seg >= segment) - offset
+
+    @property
+    def pending_records(self) -> int:
+        """Events waiting to be delivered"""
+        return self._pending_records
+
+    def append(self, event: Union[CloudEvent, dict], topic: str = CLOUDEVENTS_TOPIC) -> None:
+        """Durably append an event; raises SpoolFullError when over the size limit"""
+        if not self._opened:
+            self.open()
+        key, value = encode_event(event)
+        topic_bytes = topic.encode("utf-8")
+        key_bytes = key or b""
+        body = topic_bytes + key_bytes + value
+        record = RECORD_HEADER.pack(zlib.crc32(body), len(topic_bytes), len(key_bytes), len(value)) + body
+
+        with self._lock:
+            if self.pending_bytes + len(record) > self._max_bytes:
+                pipeline_metrics.increment('spool_rejected')
+                raise SpoolFullError(
+                    f"Spool is full ({self.pending_bytes} of {self._max_bytes} bytes pending)"
+                )
+            self._writer.write(record)
+            self._writer.flush()
+            if self._fsync:
+                os.fsync(self._writer.fileno())
+            self._segments[self._write_segment] += len(record)
+            self._pending_records += 1
+            if self._segments[self._write_segment] >= self._segment_bytes:
+                self._write_segment += 1
+                self._open_writer()
+
+        pipeline_metrics.increment('spool_appended')
+        pipeline_metrics.set_gauge('spool_pending_bytes', self.pending_bytes)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def append_wait(self, event: Union[CloudEvent, dict], timeout: float = SPOOL_APPEND_TIMEOUT) -> None:
+        """Append, waiting for the sender to free space instead of failing immediately"""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.append(event)
+            except SpoolFullError:
+                if time.monotonic() >= deadline:
+                    raise
+                await asyncio.sleep(0.1)
+
+    def _read_record(self, position: Tuple[int, int]) -> Tuple[Optional[SpoolRecord], Tuple[int, int]]:
+        """Read the record at `position`, moving on to later segments when one is exhausted"""
+        segment, offset = position
+        while True:
+            if segment not in self._segments:
+                later = [s for s in self._segments if s > segment]
+                if not later:
+                    return None, (segment, offset)
+                segment, offset = min(later), 0
+            if self._reader_segment != segment:
+                if self._reader is not None:
+                    self._reader.close()
+                self._reader = open(self._segment_path(segment), "rb")
+                self._reader_segment = segment
+
+            self._reader.seek(offset)
+            header = self._reader.read(RECORD_HEADER.size)
+            if len(header) == RECORD_HEADER.size:
+                crc, topic_len, key_len, value_len = RECORD_HEADER.unpack(header)
+                body = self._reader.read(topic_len + key_len + value_len)
+                if len(body) == topic_len + key_len + value_len and zlib.crc32(body) == crc:
+                    next_position = (segment, offset + RECORD_HEADER.size + len(body))
+                    record = SpoolRecord(
+                        topic=body[:topic_len].decode("utf-8"),
+                        key=body[topic_len:topic_len + key_len] or None,
+                        value=body[topic_len + key_len:],
+                        position=next_position,
+                    )
+                    return record, next_position
+
+            # End of segment (or a torn tail from a crash)
+            if segment == self._write_segment:
+                return None, (segment, offset)
+            if offset < self._segments[segment]:
+                logger.warning(f"Skipping corrupt spool tail in segment {segment} at offset {offset}")
+            segment, offset = segment + 1, 0
+
+    def read_batch(self) -> List[SpoolRecord]:
+        """Read up to batch_size undelivered records from the cursor"""
+        with self._lock:
+            records = []
+            position = self._cursor
+            while len(records) < self._batch_size:
+                record, position = self._read_record(position)
+                if record is None:
+                    break
+                records.append(record)
+            return records
+
+    def commit(self, position: Tuple[int, int], delivered: int) -> None:
+        """Persist the cursor after `delivered` records and drop finished segments"""
+        with self._lock:
+            self._cursor = position
+            self._pending_records = max(self._pending_records - delivered, 0)
+            self._acked_ahead = {p for p in self._acked_ahead if p > position}
+            tmp_path = self._dir / (CURSOR_FILE + ".tmp")
+            tmp_path.write_text(json.dumps({"segment": position[0], "offset": position[1]}))
+            os.replace(tmp_path, self._dir / CURSOR_FILE)
+            for segment in [s for s in self._segments if s < position[0]]:
+                if self._reader_segment == segment:
+                    self._reader.close()
+                    self._reader, self._reader_segment = None, None
+                self._segment_path(segment).unlink(missing_ok=True)
+                del self._segments[segment]
+        pipeline_metrics.increment('spool_delivered', delivered)
+        pipeline_metrics.set_gauge('spool_pending_bytes', self.pending_bytes)
+
+    # ------------------------------------------------------------------
+    # Background sender
+    # ------------------------------------------------------------------
+
+    def _deliver(self, records: List[SpoolRecord], timeout: float = 10.0) -> int:
+        """Produce records and wait for acks; returns how many leading records were acked.
+
+        Producing stops at the first failed delivery, so nothing queued behind
+        it overtakes the retry. Records acked beyond the first unacked one are
+        skipped by later calls instead of being produced twice.
+        """
+        producer = self._producer_service.producer
+        acked = [record.position in self._acked_ahead for record in records]
+        failed = False
+        produced_at = time.perf_counter()
+
+        def callback(index: int):
+            def on_delivery(err, msg):
+                nonlocal failed
+                if err is None:
+                    acked[index] = True
+                    pipeline_metrics.observe('produce_ack', time.perf_counter() - produced_at)
+                else:
+                    failed = True
+                    logger.warning(f"Spool delivery failed: {err}")
+            return on_delivery
+
+        for index, record in enumerate(records):
+            if acked[index]:
+                continue
+            if failed:
+                break
+            try:
+                producer.produce(
+                    topic=record.topic, key=record.key, value=record.value, on_delivery=callback(index)
+                )
+                producer.poll(0)
+            except BufferError:
+                producer.poll(0.5)
+                break
+            except Exception as e:
+                logger.warning(f"Spool produce failed: {e}")
+                break
+        producer.flush(timeout)
+
+        delivered = 0
+        while delivered < len(records) and acked[delivered]:
+            delivered += 1
+        self._acked_ahead.update(r.position for r, ok in zip(records[delivered:], acked[delivered:]) if ok)
+        return delivered
+
+    async def run(self) -> None:
+        """Drain the spool to Kafka until stopped"""
+        self.open()
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        backoff = 0.5
+        while True:
+            self._wakeup.clear()
+            records = self.read_batch()
+            if not records:
+                if self._stopping:
+                    return
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            delivered = await asyncio.to_thread(self._deliver, records)
+            if delivered:
+                self.commit(records[delivered - 1].position, delivered)
+            if delivered < len(records):
+                if self._stopping:
+                    return
+                pipeline_metrics.increment('spool_retries')
+                logger.warning(f"Kafka unavailable, retrying spool in {backoff:.1f}s "
+                               f"({self._pending_records} events pending)")
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+            else:
+                backoff = 0.5
+
+    def start(self) -> None:
+        """Start the background sender on the running loop"""
+        self.open()
+        self._stopping = False
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self.run())
+        logger.info(f"Spool sender started ({self._dir}, {self._pending_records} pending)")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Try to drain what is pending, then stop the sender and close files"""
+        if self._task is not None:
+            self._stopping = True
+            self._wakeup.set()
+            try:
+                await asyncio.wait_for(self._task, timeout)
+            except asyncio.TimeoutError:
+                self._task.cancel()
+                logger.warning(f"Spool stopped with {self._pending_records} events pending (kept on disk)")
+            self._task = None
+        with self._lock:
+            for handle in (self._writer, self._reader):
+                if handle is not None:
+                    handle.close()
+            self._writer, self._reader, self._reader_segment = None, None, None
+            self._segments.clear()
+            self._opened = False
+
+    def stats(self) -> Dict[str, int]:
+        """Current spool occupancy"""
+        return {
+            "pending_records": self._pending_records,
+            "pending_bytes": self.pending_bytes,
+            "max_bytes": self._max_bytes,
+            "segments": len(self._segments),
+        }
+
+
+# Global instance
+event_spool = EventSpool()
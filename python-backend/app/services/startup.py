@@ -0,0 +1,79 @@
+# app/services/startup.py
+"""
+Parallel client warm-up run from the FastAPI lifespan hook
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Tuple
+
+from ..config import (
+    INSIGHT_CACHE_ENABLED, INSIGHT_TOPIC_ENABLED, STARTUP_KAFKA_WARMUP, STARTUP_WARMUP_TIMEOUT, CLOUDEVENTS_TOPIC
+)
+from .ai_service import gemini_service
+from .insight_cache import insight_cache
+from .insight_topic import shared_insights
+from .kafka_service import kafka_producer, get_parsed_schema, get_avro_deserializer
+from .metrics import pipeline_metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _warm_kafka_producer() -> None:
+    # Building the producer is cheap; the metadata request opens the broker
+    # connections (TLS + SASL) that the first produce would otherwise pay for
+    kafka_producer.producer.list_topics(CLOUDEVENTS_TOPIC, timeout=STARTUP_WARMUP_TIMEOUT)
+
+
+def _warm_llm() -> None:
+    if gemini_service.provider is not None:
+        gemini_service.provider.warm()
+
+
+def warmup_steps() -> List[Tuple[str, Callable[[], object]]]:
+    """Blocking initialisation steps that are independent of each other"""
+    steps = [
+        ("avro_schema", get_parsed_schema),
+        ("schema_registry", get_avro_deserializer),
+        ("llm_client", _warm_llm),
+    ]
+    if INSIGHT_CACHE_ENABLED:
+        steps.append(("insight_cache", insight_cache.warm))
+    if STARTUP_KAFKA_WARMUP:
+        steps.append(("kafka_producer", _warm_kafka_producer))
+    if INSIGHT_TOPIC_ENABLED:
+        steps.append(("insight_topic", shared_insights.ensure_topic))
+    return steps
+
+
+async def warm_up(timeout: float = STARTUP_WARMUP_TIMEOUT) -> Dict[str, float]:
+    """Run every warm-up step in a worker thread concurrently.
+    
+    Returns the duration of each completed step in milliseconds. Steps
+    still running after `timeout` are left to finish in the background
+    and failures are logged, so a slow or unreachable dependency never
+    blocks startup.
+    """
+    timings: Dict[str, float] = {}
+    
+    def timed(name: str, step: Callable[[], object]) -> None:
+        start = time.perf_counter()
+        try:
+            step()
+        except Exception as e:
+            logger.warning(f"Startup warm-up '{name}' failed: {e}")
+            return
+        timings[name] = round((time.perf_counter() - start) * 1000.0, 1)
+        pipeline_metrics.set_gauge(f'startup_{name}_ms', timings[name])
+    
+    tasks = {
+        asyncio.create_task(asyncio.to_thread(timed, name, step)): name
+        for name, step in warmup_steps()
+    }
+    if not tasks:
+        return timings
+    _, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        logger.warning(f"Startup continuing while still warming: {sorted(tasks[t] for t in pending)}")
+    return timings
@@ -0,0 +1,264 @@
+# app/services/summary_join.py
+"""
+Window-keyed join of the Flink health, top error source and incident tables
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import (
+    SYSTEM_HEALTH_TOPIC, TOP_ERROR_SOURCES_TOPIC, CORRELATED_INCIDENTS_TOPIC,
+    JOIN_WINDOW_SECONDS, JOIN_GRACE_SECONDS, JOIN_STATE_TTL_SECONDS, JOIN_MAX_WINDOWS,
+)
+from .metrics import pipeline_metrics, to_epoch_seconds
+
+logger = logging.getLogger(__name__)
+
+# Emitted summaries kept for /api/summaries
+RECENT_SUMMARIES = 50
+
+PartitionKey = Tuple[str, int]
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, timezone.utc).isoformat()
+
+
+class _Window:
+    """Rows received so far for one window"""
+
+    __slots__ = ('health', 'health_at', 'sources', 'incidents', 'updated', 'offsets')
+
+    def __init__(self, now: float):
+        self.health: Optional[dict] = None
+        self.health_at = 0.0
+        self.sources: Dict[str, int] = {}    # source -> total errors
+        self.incidents: Dict[str, int] = {}  # correlation_id -> event count
+        self.updated = now
+        self.offsets: Dict[PartitionKey, int] = {}  # lowest offset that fed the window
+
+
+class SummaryJoiner:
+    """Joins system_health_5min, top_error_sources_5min and correlated_incidents
+    into one gemini_summary-shaped record per window.
+
+    Rows are grouped by the window containing their window_start, so the
+    1-minute incident buckets fall into their 5-minute window (an interval
+    join). Upsert rows replace earlier versions of the same key and
+    tombstones remove them. A window is emitted once, `grace_seconds` after
+    its health row arrived; rows arriving after that are counted as late.
+    Windows without a health row are dropped after `ttl_seconds`, and at
+    most `max_windows` windows are held, the oldest being emitted early.
+
+    Rows offered with their Kafka position hold that partition's commit at
+    the lowest offset feeding a window still in memory (`holds`); emitting
+    or expiring the window releases it, so a restart replays every row of
+    the windows that were not emitted yet.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = JOIN_WINDOW_SECONDS,
+        grace_seconds: float = JOIN_GRACE_SECONDS,
+        ttl_seconds: float = JOIN_STATE_TTL_SECONDS,
+        max_windows: int = JOIN_MAX_WINDOWS,
+    ):
+        self.window_seconds = window_seconds
+        self.grace_seconds = grace_seconds
+        self.ttl_seconds = ttl_seconds
+        self.max_windows = max_windows
+        self.topics = {
+            SYSTEM_HEALTH_TOPIC: self._offer_health,
+            TOP_ERROR_SOURCES_TOPIC: self._offer_source,
+            CORRELATED_INCIDENTS_TOPIC: self._offer_incident,
+        }
+        self._windows: Dict[float, _Window] = {}
+        self._emitted: Dict[float, float] = {}  # window -> emitted at, kept for the TTL
+        self._recent: deque = deque(maxlen=RECENT_SUMMARIES)
+        self._holds: Dict[PartitionKey, int] = {}
+        self._lock = threading.Lock()
+        self.rows = 0
+        self.late = 0
+        self.emitted = 0
+        self.expired = 0
+        self.forced = 0
+
+    def _window_of(self, record: dict) -> Optional[float]:
+        start = to_epoch_seconds(record.get('window_start'))
+        if start is None:
+            return None
+        return (start // self.window_seconds) * self.window_seconds
+
+    def offer(
+        self,
+        topic: str,
+        record: Optional[dict],
+        deleted: bool = False,
+        now: Optional[float] = None,
+        position: Optional[Tuple[int, int]] = None,
+    ) -> bool:
+        """Add a row (primary key and value columns) from one of the joined topics.
+
+        `deleted` marks a tombstone, for which `record` holds only the key.
+        `position` is the row's (partition, offset) in `topic`.
+        Returns False when the row was ignored (unknown topic, no window or late).
+        """
+        handler = self.topics.get(topic)
+        if handler is None or not record:
+            return False
+        window = self._window_of(record)
+        if window is None:
+            return False
+        now = time.time() if now is None else now
+        with self._lock:
+            if window in self._emitted:
+                self.late += 1
+                return False
+            state = self._windows.get(window)
+            if state is None:
+                state = self._windows[window] = _Window(now)
+            handler(state, record, deleted, now)
+            state.updated = now
+            if position is not None:
+                key, offset = (topic, position[0]), position[1]
+                if offset < state.offsets.get(key, offset + 1):
+                    state.offsets[key] = offset
+                if offset < self._holds.get(key, offset + 1):
+                    self._holds[key] = offset
+            self.rows += 1
+        return True
+
+    def _offer_health(self, state: _Window, record: dict, deleted: bool, now: float) -> None:
+        if deleted:
+            state.health = None
+            return
+        if state.health is None:
+            state.health_at = now
+        state.health = record
+
+    def _offer_source(self, state: _Window, record: dict, deleted: bool, now: float) -> None:
+        source = record.get('source')
+        if not source:
+            return
+        if deleted:
+            state.sources.pop(source, None)
+            return
+        total = record.get('total_errors')
+        if total is None:
+            total = (record.get('error_count') or 0) + (record.get('critical_count') or 0)
+        state.sources[source] = int(total)
+
+    def _offer_incident(self, state: _Window, record: dict, deleted: bool, now: float) -> None:
+        correlation_id = record.get('correlation_id')
+        if not correlation_id:
+            return
+        if deleted:
+            state.incidents.pop(correlation_id, None)
+        else:
+            state.incidents[correlation_id] = int(record.get('event_count') or 0)
+
+    def _summary(self, window: float, state: _Window) -> dict:
+        health = state.health
+        ranked = sorted(state.sources.items(), key=lambda item: (-item[1], item[0]))
+        window_end = to_epoch_seconds(health.get('window_end')) or window + self.window_seconds
+        return {
+            "window_start": _iso(window),
+            "window_end": _iso(window_end),
+            "total_events": int(health.get('total_events') or 0),
+            "total_sources": int(health.get('total_sources') or 0),
+            "critical_count": int(health.get('total_critical') or 0),
+            "error_count": int(health.get('total_errors') or 0),
+            "warning_count": int(health.get('total_warnings') or 0),
+            "health_status": health.get('health_status'),
+            "error_rate_percent": float(health.get('error_rate_percent') or 0.0),
+            "top_error_source": ranked[0][0] if ranked else 'none',
+            "top_error_count": ranked[0][1] if ranked else 0,
+            "top_error_sources": [{"source": s, "error_count": c} for s, c in ranked],
+            "correlation_count": len(state.incidents),
+            "anomaly_count": 0,
+            "error_trend": 'STABLE',
+        }
+
+    def _release(self, window: float) -> _Window:
+        """Remove a window and recompute the commit holds of the partitions that fed it"""
+        state = self._windows.pop(window)
+        for key in state.offsets:
+            offsets = [s.offsets[key] for s in self._windows.values() if key in s.offsets]
+            if offsets:
+                self._holds[key] = min(offsets)
+            else:
+                self._holds.pop(key, None)
+        return state
+
+    def _emit(self, window: float, now: float) -> dict:
+        summary = self._summary(window, self._release(window))
+        self._emitted[window] = now
+        self._recent.append(summary)
+        self.emitted += 1
+        return summary
+
+    def holds(self) -> Dict[PartitionKey, int]:
+        """Highest committable offset per (topic, partition): the lowest offset
+        of a row in a window not emitted yet"""
+        with self._lock:
+            return dict(self._holds)
+
+    def ready(self, now: Optional[float] = None) -> List[dict]:
+        """Summaries of windows whose grace period has passed, oldest first; expires stale state"""
+        now = time.time() if now is None else now
+        summaries = []
+        with self._lock:
+            for window in sorted(self._windows):
+                state = self._windows[window]
+                if state.health is not None and now - state.health_at >= self.grace_seconds:
+                    summaries.append(self._emit(window, now))
+                elif state.health is None and now - state.updated >= self.ttl_seconds:
+                    self._release(window)
+                    self.expired += 1
+            # Bounded state: the oldest windows go out early (or are dropped without health)
+            while len(self._windows) > self.max_windows:
+                window = min(self._windows)
+                if self._windows[window].health is not None:
+                    summaries.append(self._emit(window, now))
+                    self.forced += 1
+                else:
+                    self._release(window)
+                    self.expired += 1
+            for window in [w for w, at in self._emitted.items() if now - at >= self.ttl_seconds]:
+                del self._emitted[window]
+        for summary in summaries:
+            pipeline_metrics.observe_since('flink_output', summary['window_end'], now)
+        return summaries
+
+    def recent(self, limit: int) -> List[dict]:
+        """The last `limit` emitted summaries, oldest first"""
+        with self._lock:
+            return [dict(summary) for summary in list(self._recent)[-limit:]] if limit > 0 else []
+
+    def stats(self) -> Dict[str, Any]:
+        """Join state size and row/emission counts"""
+        with self._lock:
+            pending = len(self._windows)
+            tracked = len(self._emitted)
+            holds = dict(self._holds)
+        return {
+            "topics": sorted(self.topics),
+            "pending_windows": pending,
+            "commit_holds": {f"{topic}[{partition}]": offset for (topic, partition), offset in holds.items()},
+            "emitted_windows_tracked": tracked,
+            "rows": self.rows,
+            "emitted": self.emitted,
+            "late_rows": self.late,
+            "expired_windows": self.expired,
+            "forced_emits": self.forced,
+            "grace_seconds": self.grace_seconds,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+
+# Global instance
+summary_joiner = SummaryJoiner()
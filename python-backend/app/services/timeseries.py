@@ -0,0 +1,226 @@
+# app/services/timeseries.py
+"""
+In-memory time-series rollups of produced events for dashboard history
+"""
+
+import logging
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from ..config import TIMESERIES_RESOLUTIONS, TIMESERIES_MAX_SERIES
+from .metrics import event_time
+
+logger = logging.getLogger(__name__)
+
+# Events timestamped further ahead than this are clamped to now
+MAX_CLOCK_SKEW_SECONDS = 60.0
+
+_DURATION = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*$")
+_UNIT_SECONDS = {"": 1, "s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_duration(value: str) -> float:
+    """Parse "90", "10s", "5m", "24h" or "7d" into seconds"""
+    match = _DURATION.match(value.lower())
+    if not match:
+        raise ValueError(f"Invalid duration '{value}' (use e.g. 10s, 5m, 24h, 7d)")
+    return float(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+
+def format_duration(seconds: float) -> str:
+    """Inverse of parse_duration for whole units: 3600 -> "1h" """
+    for unit in ("d", "h", "m"):
+        if seconds % _UNIT_SECONDS[unit] == 0:
+            return f"{int(seconds // _UNIT_SECONDS[unit])}{unit}"
+    return f"{seconds:g}s"
+
+
+class RingSeries:
+    """Counts for every series at one resolution, in a fixed ring of slots.
+
+    `counts[row, slot]` holds the (sample-weighted) event count of series
+    `row` for the bucket currently stored in `slot`; `buckets[slot]` records
+    which bucket that is (epoch seconds // step). A slot is zeroed for all
+    series at once when a newer bucket claims it, so memory stays at
+    max_series x slots whatever the event rate.
+    """
+
+    def __init__(self, step: float, slots: int, max_series: int):
+        self.step = step
+        self.slots = slots
+        self.counts = np.zeros((max_series, slots), dtype=np.float64)
+        self.buckets = np.full(slots, -1, dtype=np.int64)
+
+    def add(self, row: int, timestamp: float, weight: float) -> bool:
+        """Add `weight` to the bucket containing `timestamp`; False if it has aged out"""
+        bucket = int(timestamp // self.step)
+        slot = bucket % self.slots
+        current = self.buckets[slot]
+        if current != bucket:
+            if current > bucket:
+                return False
+            self.counts[:, slot] = 0.0
+            self.buckets[slot] = bucket
+        self.counts[row, slot] += weight
+        return True
+
+    def window(self, rows: np.ndarray, start_bucket: int, points: int) -> np.ndarray:
+        """Counts of `rows` for `points` consecutive buckets from start_bucket"""
+        wanted = np.arange(start_bucket, start_bucket + points, dtype=np.int64)
+        slots = wanted % self.slots
+        valid = self.buckets[slots] == wanted
+        return self.counts[np.ix_(rows, slots)] * valid
+
+    @property
+    def span(self) -> float:
+        return self.step * self.slots
+
+
+class TimeSeriesStore:
+    """Per (source, severity) event counts at several resolutions.
+
+    Every produced event is added to one slot of each resolution's ring, so
+    recording costs a handful of array writes. Range queries slice the
+    rings with index arrays and sum the selected series with NumPy, so a
+    24h chart of every source is a single gather over a few thousand cells.
+    """
+
+    def __init__(
+        self,
+        resolutions: Dict[str, Tuple[float, int]] = TIMESERIES_RESOLUTIONS,
+        max_series: int = TIMESERIES_MAX_SERIES,
+    ):
+        self.max_series = max_series
+        self.rings: Dict[str, RingSeries] = {
+            name: RingSeries(step, slots, max_series)
+            for name, (step, slots) in sorted(resolutions.items(), key=lambda item: item[1][0])
+        }
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self._sources = np.empty(max_series, dtype=object)
+        self._severities = np.empty(max_series, dtype=object)
+        self._lock = threading.Lock()
+        self.recorded = 0
+        self.dropped = 0
+
+    def _row(self, source: str, severity: str) -> Optional[int]:
+        key = (source, severity)
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._rows) >= self.max_series:
+                return None
+            row = self._rows[key] = len(self._rows)
+            self._sources[row] = source
+            self._severities[row] = severity
+        return row
+
+    def record(self, event: dict, now: Optional[float] = None) -> bool:
+        """Count a produced event at its CloudEvent time (weighted by sample_weight).
+
+        Returns False when the event was not counted: the store is full or
+        the event is older than every ring.
+        """
+        now = time.time() if now is None else now
+        timestamp = event_time(event)
+        if timestamp is None or timestamp > now + MAX_CLOCK_SKEW_SECONDS:
+            timestamp = now
+        weight = float(event.get('sample_weight') or 1.0)
+        with self._lock:
+            row = self._row(event.get('source') or 'unknown', (event.get('severity') or 'unknown').lower())
+            if row is None:
+                self.dropped += 1
+                if self.dropped == 1:
+                    logger.warning(f"Time-series store full ({self.max_series} series); new series are not tracked")
+                return False
+            # Older than the finest rings is fine as long as a coarser one keeps it
+            counted = [ring.add(row, timestamp, weight) for ring in self.rings.values()]
+            if not any(counted):
+                return False
+            self.recorded += 1
+        return True
+
+    def pick_resolution(self, range_seconds: float) -> str:
+        """Finest resolution whose ring still covers the whole range"""
+        for name, ring in self.rings.items():
+            if ring.span >= range_seconds:
+                return name
+        return next(reversed(self.rings))
+
+    def query(
+        self,
+        range_seconds: float,
+        resolution: Optional[str] = None,
+        source: Optional[str] = None,
+        severity: Optional[str] = None,
+        by: str = "source",
+        now: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Counts per bucket over the last `range_seconds`, one series per
+        source (or per severity with by="severity"), optionally filtered"""
+        if resolution is None:
+            resolution = self.pick_resolution(range_seconds)
+        ring = self.rings.get(resolution)
+        if ring is None:
+            raise ValueError(f"Unknown resolution '{resolution}' (available: {', '.join(self.rings)})")
+        if by not in ("source", "severity"):
+            raise ValueError("by must be 'source' or 'severity'")
+
+        now = time.time() if now is None else now
+        points = max(1, min(int(np.ceil(range_seconds / ring.step)), ring.slots))
+        end_bucket = int(now // ring.step)
+        start_bucket = end_bucket - points + 1
+
+        with self._lock:
+            used = len(self._rows)
+            sources = self._sources[:used]
+            severities = self._severities[:used]
+            mask = np.ones(used, dtype=bool)
+            if source:
+                mask &= sources == source
+            if severity:
+                mask &= severities == severity.lower()
+            rows = np.flatnonzero(mask)
+            values = ring.window(rows, start_bucket, points)
+
+        labels = (sources if by == "source" else severities)[rows]
+        names, group = np.unique(labels.astype(str), return_inverse=True) if rows.size else ([], rows)
+        # Sum series into groups with a one-hot matrix product (much faster than np.add.at)
+        onehot = np.zeros((len(names), rows.size))
+        onehot[group, np.arange(rows.size)] = 1.0
+        totals = onehot @ values
+
+        return {
+            "resolution": resolution,
+            "step_seconds": ring.step,
+            "start": start_bucket * ring.step,
+            "end": (end_bucket + 1) * ring.step,
+            "timestamps": (np.arange(start_bucket, end_bucket + 1) * ring.step).tolist(),
+            "by": by,
+            "series": {name: np.round(totals[i], 3).tolist() for i, name in enumerate(names)},
+            "total": round(float(totals.sum()), 3),
+        }
+
+    def series(self) -> List[Dict[str, str]]:
+        """Tracked (source, severity) pairs"""
+        return [{"source": source, "severity": severity} for source, severity in self._rows]
+
+    def stats(self) -> Dict[str, Any]:
+        """Series count, memory footprint and resolutions"""
+        return {
+            "series": len(self._rows),
+            "max_series": self.max_series,
+            "recorded": self.recorded,
+            "dropped": self.dropped,
+            "memory_bytes": sum(r.counts.nbytes + r.buckets.nbytes for r in self.rings.values()),
+            "resolutions": {
+                name: {"step_seconds": ring.step, "span": format_duration(ring.span)}
+                for name, ring in self.rings.items()
+            },
+        }
+
+
+# Global instance
+timeseries_store = TimeSeriesStore()
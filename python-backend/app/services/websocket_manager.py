@@ -3,18 +3,64 @@
 WebSocket connection manager for real-time updates
 """
 
-from typing import List
-from fastapi import WebSocket
+import json
 import logging
+import uuid
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+from fastapi import WebSocket
+
+from ..config import WS_REPLAY_BUFFER, WS_SNAPSHOT_EVENTS, WS_SNAPSHOT_ALERTS
+from .metrics import pipeline_metrics
 
 logger = logging.getLogger(__name__)
 
+# Message types that are not sequenced or kept for replay (superseded by
+# the final message they lead up to)
+TRANSIENT_TYPES = {"ai_insight_partial"}
+
+# Frames that carry events (one each, or a coalesced batch from the topic tail)
+EVENT_TYPES = {"event_sent", "events_tailed"}
+
+
+class Frame(NamedTuple):
+    seq: int
+    type: str
+    text: str
+
+
+def encode(message: dict) -> str:
+    """Serialize a message the way Starlette's send_json does"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
 
 class ConnectionManager:
-    """Manages WebSocket connections for broadcasting events"""
-    
-    def __init__(self):
+    """Manages WebSocket connections for broadcasting events.
+
+    Every broadcast message except transient ones gets `seq`, a number
+    increasing by one per message, and is serialized once for all clients.
+    The last `buffer_size` frames are kept so a client reconnecting with
+    the last seq it saw (and the `stream` id of this server process) gets
+    the gap in a single `replay` frame, or a `snapshot` frame of recent
+    events and alerts (plus the latest scenario and health frames) when
+    the gap is no longer buffered.
+    """
+
+    def __init__(
+        self,
+        buffer_size: int = WS_REPLAY_BUFFER,
+        snapshot_events: int = WS_SNAPSHOT_EVENTS,
+        snapshot_alerts: int = WS_SNAPSHOT_ALERTS,
+    ):
         self.active_connections: List[WebSocket] = []
+        self.stream_id = uuid.uuid4().hex[:12]
+        self.seq = 0
+        self.frames: Deque[Frame] = deque(maxlen=buffer_size)
+        self.snapshot_events = snapshot_events
+        self.snapshot_alerts = snapshot_alerts
+        self._snapshot: Optional[Tuple[int, str]] = None  # (seq, frame) cache
+        self.replays = 0
+        self.snapshots = 0
 
     async def connect(self, websocket: WebSocket):
         """Accept and register a new WebSocket connection"""
@@ -22,22 +68,102 @@ class ConnectionManager:
         self.active_connections.append(websocket)
         logger.info(f"Client connected. Total: {len(self.active_connections)}")
 
+    async def resume(self, websocket: WebSocket, since: Optional[int] = None, stream: Optional[str] = None):
+        """Accept a connection and bring it up to date before it joins broadcasts.
+
+        Sends a `hello` frame with the current position; then, when `since`
+        is given, the missed frames (`replay`) or a `snapshot`. Frames
+        broadcast while any of those are being sent (the hello included)
+        are caught up before the socket is registered, so nothing is lost
+        or duplicated.
+        """
+        await websocket.accept()
+        hello_seq = self.seq
+        await websocket.send_text(encode({"type": "hello", "stream": self.stream_id, "seq": hello_seq}))
+        if since is None:
+            since = hello_seq
+        elif stream == self.stream_id and self.replayable(since):
+            self.replays += 1
+        else:
+            since = None
+        if since is None or not self.replayable(since):
+            # Unknown stream (server restarted) or gap older than the buffer
+            self.snapshots += 1
+            seq, text = self.snapshot()
+            await websocket.send_text(text)
+            since = seq
+        while since < self.seq:
+            seq, text = self.replay_frame(since)
+            await websocket.send_text(text)
+            since = seq
+        # No await between the last check above and registering
+        self.active_connections.append(websocket)
+        logger.info(f"Client connected. Total: {len(self.active_connections)}")
+
     def disconnect(self, websocket: WebSocket):
         """Remove a WebSocket connection"""
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
         logger.info(f"Client disconnected. Total: {len(self.active_connections)}")
 
+    def replayable(self, since: int) -> bool:
+        """Whether every frame after `since` is still buffered"""
+        if since > self.seq:
+            return False
+        oldest = self.frames[0].seq if self.frames else self.seq + 1
+        return since + 1 >= oldest
+
+    def replay_frame(self, since: int) -> Tuple[int, str]:
+        """One batched frame of all buffered frames after `since`"""
+        # Frames are consecutive, so the start index follows from the seq
+        start = max(since + 1 - self.frames[0].seq, 0) if self.frames else 0
+        texts = [self.frames[i].text for i in range(start, len(self.frames))]
+        header = encode({"type": "replay", "stream": self.stream_id, "since": since, "seq": self.seq})
+        return self.seq, header[:-1] + ',"frames":[' + ",".join(texts) + "]}"
+
+    def snapshot(self) -> Tuple[int, str]:
+        """Recent events and alerts as one frame; the client resets its state first.
+
+        Cached per seq, so a reconnect storm builds it once.
+        """
+        if self._snapshot is not None and self._snapshot[0] == self.seq:
+            return self._snapshot
+        events, alerts, scenario, health = [], [], [], []
+        for frame in reversed(self.frames):
+            if frame.type in EVENT_TYPES:
+                if len(events) < self.snapshot_events:
+                    events.append(frame)
+            elif frame.type == "ai_alert":
+                if len(alerts) < self.snapshot_alerts:
+                    alerts.append(frame)
+            elif frame.type.startswith("scenario_") and not scenario:
+                scenario.append(frame)  # latest scenario state
+            elif frame.type == "health_changed" and not health:
+                health.append(frame)  # latest live health status
+        texts = [f.text for f in sorted(events + alerts + scenario + health)]
+        header = encode({"type": "snapshot", "stream": self.stream_id, "seq": self.seq})
+        self._snapshot = (self.seq, header[:-1] + ',"frames":[' + ",".join(texts) + "]}")
+        return self._snapshot
+
     async def broadcast(self, message: dict):
         """Broadcast message to all connected clients"""
+        if message.get("type") not in TRANSIENT_TYPES:
+            self.seq += 1
+            message["seq"] = self.seq
+            text = encode(message)
+            self.frames.append(Frame(self.seq, message.get("type", ""), text))
+        else:
+            text = encode(message)
+
         disconnected = []
-        for connection in self.active_connections:
+        for connection in list(self.active_connections):
             try:
-                await connection.send_json(message)
+                with pipeline_metrics.time_stage('socket_send'):
+                    await connection.send_text(text)
             except Exception as e:
                 logger.error(f"Error broadcasting: {e}")
                 disconnected.append(connection)
-        
+
         # Remove disconnected clients
         for conn in disconnected:
             if conn in self.active_connections:
@@ -48,6 +174,18 @@ class ConnectionManager:
         """Return the number of active connections"""
         return len(self.active_connections)
 
+    def stats(self) -> dict:
+        """Sequence position, buffer fill and resume counts"""
+        return {
+            "connections": len(self.active_connections),
+            "stream": self.stream_id,
+            "seq": self.seq,
+            "buffered": len(self.frames),
+            "oldest_seq": self.frames[0].seq if self.frames else None,
+            "replays": self.replays,
+            "snapshots": self.snapshots,
+        }
+
 
 # Global instance
 manager = ConnectionManager()
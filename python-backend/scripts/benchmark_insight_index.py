@@ -0,0 +1,99 @@
+#!/usr/bin/env python
+"""
+Benchmark the near-duplicate insight index: lookup latency and reuse rate
+Run: python scripts/benchmark_insight_index.py [entries]
+"""
+
+import sys
+import time
+import random
+import statistics
+
+# Add parent dir to path for imports
+sys.path.insert(0, '.')
+
+from app.services.insight_index import InsightIndex
+
+SOURCES = [f"https://{name}.com/demo" for name in ("github", "datadog", "kubernetes", "jenkins", "pagerduty")]
+STATUSES = ["HEALTHY", "WARNING", "DEGRADED", "CRITICAL"]
+
+
+def random_summary(rng: random.Random, i: int) -> dict:
+    """A synthetic gemini_summary row"""
+    total = rng.randint(50, 5000)
+    errors = rng.randint(0, total // 5)
+    return {
+        "window_start": f"w{i}",
+        "total_events": total,
+        "total_sources": rng.randint(1, 5),
+        "critical_count": rng.randint(0, errors // 4 + 1),
+        "error_count": errors,
+        "warning_count": rng.randint(0, total // 10),
+        "error_rate_percent": errors * 100.0 / total,
+        "health_status": rng.choice(STATUSES),
+        "top_error_source": rng.choice(SOURCES),
+        "top_error_count": errors // 2,
+        "correlation_count": rng.randint(0, 3),
+        "anomaly_count": 0,
+        "error_trend": "STABLE",
+    }
+
+
+def drift(rng: random.Random, summary: dict, spread: float) -> dict:
+    """The next window of the same incident: counts moved by up to +/- spread"""
+    moved = dict(summary)
+    for field in ("total_events", "error_count", "warning_count", "top_error_count"):
+        moved[field] = max(0, round(summary[field] * (1 + rng.uniform(-spread, spread))))
+    moved["error_rate_percent"] = moved["error_count"] * 100.0 / max(moved["total_events"], 1)
+    return moved
+
+
+def main():
+    entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    rng = random.Random(42)
+    index = InsightIndex(capacity=entries)
+
+    print(f"=" * 60)
+    print(f"Insight index benchmark: {entries:,} indexed summaries")
+    print(f"=" * 60)
+
+    summaries = [random_summary(rng, i) for i in range(entries)]
+    start = time.perf_counter()
+    for summary in summaries:
+        index.add(summary, {"status": "success", "insight": f"Assessment of {summary['window_start']}"})
+    print(f"Index build: {(time.perf_counter() - start) / entries * 1e6:.1f} us/entry")
+
+    samples = []
+    for _ in range(1000):
+        query = drift(rng, rng.choice(summaries), 0.1)
+        t0 = time.perf_counter()
+        index.lookup(query)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    print(f"Lookup (near-duplicates):  p50 {statistics.median(samples):.3f} ms   "
+          f"p99 {samples[int(len(samples) * 0.99)]:.3f} ms")
+    print(f"Reused: {index.hits} of {index.lookups} windows drifting +/-10%")
+
+    samples = []
+    for _ in range(200):
+        query = drift(rng, rng.choice(summaries), 0.3)
+        t0 = time.perf_counter()
+        index.similar_incidents(query, 3)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    print(f"Similar incidents (k=3, all partitions): p50 {statistics.median(samples):.3f} ms")
+
+    # Worst case: one long incident, every entry in the same partition
+    single = InsightIndex(capacity=entries)
+    for summary in summaries:
+        single.add({**summary, "health_status": "CRITICAL", "top_error_source": SOURCES[0]},
+                   {"status": "success", "insight": "x"})
+    for _ in range(1000):
+        query = drift(rng, rng.choice(summaries), 0.6)
+        single.lookup({**query, "health_status": "CRITICAL", "top_error_source": SOURCES[0]})
+    stats = single.stats()
+    print(f"Single partition lookup:   p50 {stats['lookup_ms_p50']:.3f} ms   p99 {stats['lookup_ms_p99']:.3f} ms")
+    print(f"Reused: {single.hits} of {single.lookups} windows drifting +/-60%")
+
+
+if __name__ == "__main__":
+    main()
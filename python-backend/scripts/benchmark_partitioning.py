@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+"""
+Compare producer partitioning strategies on a synthetic event stream
+Run: python scripts/benchmark_partitioning.py [events] [partitions]
+
+For each strategy it reports partition skew (max / mean load) and the
+cost of the downstream per-source and per-correlation_id aggregations:
+how many partitions each group is spread over, how many records have
+to be shuffled to the group's owning partition, and the time to merge
+the per-partition partial aggregates.
+"""
+
+import sys
+import time
+import uuid
+import random
+import statistics
+from collections import Counter, defaultdict
+
+# Add parent dir to path for imports
+sys.path.insert(0, '.')
+
+from app.config import EVENT_TEMPLATES
+from app.services.partitioning import PARTITION_STRATEGIES, partition_key, partition_for
+
+STICKY_BATCH = 50        # records per producer batch for unkeyed messages
+WINDOWS = 20             # Flink tumbling windows the stream is spread over
+CORRELATED_PERCENT = 30  # events that belong to an incident
+HOT_INCIDENT_PERCENT = 5 # events from one long-running incident (hot key)
+
+
+def generate_events(total: int, rng: random.Random) -> list:
+    """Mixed stream: background noise plus correlated incident bursts"""
+    templates = [(name, t) for name, items in EVENT_TEMPLATES.items() for t in items]
+    incidents = [f"incident-{i}" for i in range(200)]
+    events = []
+    for i in range(total):
+        source, template = rng.choice(templates)
+        roll = rng.random() * 100
+        if roll < HOT_INCIDENT_PERCENT:
+            correlation_id = "incident-hot"
+        elif roll < CORRELATED_PERCENT:
+            correlation_id = rng.choice(incidents)
+        else:
+            correlation_id = None
+        events.append({
+            "id": str(uuid.uuid4()),
+            "source": f"https://{source}.com/demo",
+            "subject": template["subject"],
+            "severity": template["severity"],
+            "correlation_id": correlation_id,
+            "window": i * WINDOWS // total,
+        })
+    return events
+
+
+def assign(events: list, strategy: str, partitions: int, rng: random.Random) -> list:
+    """Partition per event; unkeyed records go to a partition per sticky batch"""
+    assigned = []
+    sticky_partition, sticky_left = 0, 0
+    for event in events:
+        partition = partition_for(partition_key(event, strategy), partitions)
+        if partition is None:
+            if sticky_left == 0:
+                sticky_partition, sticky_left = rng.randrange(partitions), STICKY_BATCH
+            partition, sticky_left = sticky_partition, sticky_left - 1
+        assigned.append(partition)
+    return assigned
+
+
+def aggregation_cost(events: list, assigned: list, group_field: str, partitions: int) -> dict:
+    """Fan-out, shuffle volume and merge time of a GROUP BY (window, group_field)"""
+    partials = defaultdict(Counter)  # (window, group) -> partition -> count
+    shuffled = grouped = 0
+    for event, partition in zip(events, assigned):
+        group = event[group_field]
+        if group is None:
+            continue
+        grouped += 1
+        partials[(event["window"], group)][partition] += 1
+        if partition != partition_for(group.encode('utf-8'), partitions):
+            shuffled += 1
+
+    start = time.perf_counter()
+    for _ in range(20):
+        merged = {key: sum(by_partition.values()) for key, by_partition in partials.items()}
+    merge_us = (time.perf_counter() - start) / 20 * 1e6
+
+    fan_out = [len(by_partition) for by_partition in partials.values()]
+    return {
+        "groups": len(merged),
+        "fan_out": statistics.mean(fan_out) if fan_out else 0.0,
+        "partials": sum(fan_out),
+        "shuffled": shuffled / grouped if grouped else 0.0,
+        "merge_us": merge_us,
+    }
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    partitions = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    rng = random.Random(42)
+    events = generate_events(total, rng)
+
+    print(f"=" * 96)
+    print(f"Partitioning benchmark: {total:,} events, {partitions} partitions, "
+          f"{CORRELATED_PERCENT}% correlated ({HOT_INCIDENT_PERCENT}% in one hot incident)")
+    print(f"=" * 96)
+    print(f"{'strategy':<15}{'skew':>7}{'cv':>7} | {'source':^30} | {'correlation_id':^30}")
+    print(f"{'':<15}{'':>7}{'':>7} | {'fan-out':>9}{'shuffled':>10}{'merge µs':>11} "
+          f"| {'fan-out':>9}{'shuffled':>10}{'merge µs':>11}")
+    print(f"-" * 96)
+
+    for strategy in PARTITION_STRATEGIES:
+        assigned = assign(events, strategy, partitions, random.Random(7))
+        load = Counter(assigned)
+        counts = [load.get(p, 0) for p in range(partitions)]
+        mean = statistics.mean(counts)
+        skew = max(counts) / mean
+        cv = statistics.pstdev(counts) / mean
+        by_source = aggregation_cost(events, assigned, "source", partitions)
+        by_correlation = aggregation_cost(events, assigned, "correlation_id", partitions)
+        print(f"{strategy:<15}{skew:>7.2f}{cv:>7.2f} | "
+              f"{by_source['fan_out']:>9.2f}{by_source['shuffled']:>10.1%}{by_source['merge_us']:>11.0f} | "
+              f"{by_correlation['fan_out']:>9.2f}{by_correlation['shuffled']:>10.1%}{by_correlation['merge_us']:>11.0f}")
+
+    print()
+    print("skew: busiest partition / mean load (1.00 = perfectly even); cv: stddev / mean")
+    print("fan-out: partitions a (window, group) is spread over; shuffled: records not already")
+    print("on the group's owning partition; merge µs: time to combine the per-partition partials")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+"""
+Measure cold-start time: importing the app and running the lifespan warm-up
+Run: python scripts/benchmark_startup.py [runs] [--offline]
+
+Each run is a fresh interpreter. Import time is measured here (and per
+package with -X importtime) rather than inside the app; it includes reading
+.env, since load_dotenv runs when app.config is imported. `--offline` skips
+the Kafka metadata warm-up and uses a throwaway insight cache, for machines
+without a broker.
+"""
+
+import os
+import sys
+import json
+import statistics
+import subprocess
+import tempfile
+
+PROBE = r"""
+import asyncio, json, logging, time
+logging.disable(logging.CRITICAL)
+started = time.perf_counter()
+import app as application
+imported = time.perf_counter()
+
+async def main():
+    async with application.app.router.lifespan_context(application.app):
+        ready = time.perf_counter()
+        gauges = application.pipeline_metrics.gauges
+    steps = {k[8:-3]: v for k, v in gauges.items() if k.startswith('startup_')}
+    return ready, {k: v for k, v in steps.items() if k != 'ready'}
+
+ready, steps = asyncio.run(main())
+print(json.dumps({
+    "import_ms": (imported - started) * 1000.0,
+    "ready_ms": (ready - started) * 1000.0,
+    "steps": steps,
+}))
+"""
+
+
+def run_probe(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, limit: int = 10) -> list:
+    """Top-level packages by cumulative import time (python -X importtime)"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"], env=env, capture_output=True, text=True
+    ).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        root = name.split(".")[0]
+        if root not in totals and name == root:
+            totals[root] = int(cumulative) / 1000.0
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    runs = int(args[0]) if args else 5
+    env = {**os.environ, "PYTHONPATH": os.getcwd()}
+    if "--offline" in sys.argv:
+        env["STARTUP_KAFKA_WARMUP"] = "false"
+        env["INSIGHT_CACHE_PATH"] = os.path.join(tempfile.mkdtemp(), "insights.db")
+
+    results = [run_probe(env) for _ in range(runs)]
+    import_ms = [r["import_ms"] for r in results]
+    ready_ms = [r["ready_ms"] for r in results]
+
+    print(f"=" * 60)
+    print(f"Startup benchmark: {runs} cold starts")
+    print(f"=" * 60)
+    print(f"Import app:   median {statistics.median(import_ms):7.1f} ms   (min {min(import_ms):.1f})")
+    print(f"Ready:        median {statistics.median(ready_ms):7.1f} ms   (min {min(ready_ms):.1f})")
+    print()
+    print("Warm-up steps (last run, run in parallel):")
+    for step, ms in sorted(results[-1]["steps"].items(), key=lambda item: -item[1]):
+        print(f"  {step:<20} {ms:8.1f} ms")
+    print()
+    print("Slowest top-level imports (cumulative):")
+    for name, ms in slowest_imports(env):
+        print(f"  {name:<20} {ms:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,12 @@
 # tests/test_models.py
 """
-Tests for Pydantic models
+Tests for Pydantic models and the CloudEvent type
 """
 
 import pytest
 from pydantic import ValidationError
 
-from app.models import EventSimulation, SimulationScenario, EventResponse, StatsResponse
+from app.models import EventSimulation, SimulationScenario, EventResponse, StatsResponse, CloudEvent
 
 
 class TestEventSimulation:
@@ -103,3 +103,47 @@ class TestStatsResponse:
         )
         assert response.websocket_connections == 5
         assert response.gemini_available is True
+
+
+class TestCloudEvent:
+    """Tests for the compact CloudEvent type"""
+    
+    def test_from_simulation_interns_and_normalizes(self):
+        """Test edge conversion interns low-cardinality fields and lower-cases severity"""
+        request = EventSimulation(
+            source="github", event_type="com.github.push", severity="INFO",
+            subject="Push to main", category="cicd", id="evt-1"
+        )
+        first, second = CloudEvent.from_simulation(request), CloudEvent.from_simulation(request)
+        
+        assert first.id == "evt-1"
+        assert first.source == "https://github.com/demo"
+        assert first.severity == "info"
+        assert first.source is second.source
+        assert first.severity is second.severity
+        assert first.data == {"simulated": True}
+        assert not hasattr(first, "__dict__")
+    
+    def test_time_is_formatted_on_demand(self):
+        """Test epoch is set at creation and time renders as RFC 3339 UTC"""
+        event = CloudEvent.create("jenkins", "com.jenkins.build.failure", "Build failed", "error")
+        assert event.time.endswith("Z")
+        
+        parsed = CloudEvent(id="x", source="s", type="t", time="2024-01-01T00:00:00Z")
+        assert parsed.epoch == 1704067200.0
+        assert parsed.time == "2024-01-01T00:00:00Z"
+    
+    def test_dict_compatible_access(self):
+        """Test get/[] mirror the old event dicts and to_avro matches the schema fields"""
+        event = CloudEvent(id="x", source="s", type="t", severity="error", data={"k": 1})
+        
+        assert event["severity"] == "error"
+        assert event.get("specversion") == "1.0"
+        assert event.get("unknown", "default") == "default"
+        with pytest.raises(KeyError):
+            event["unknown"]
+        
+        record = event.to_avro()
+        assert record["data"] == '{"k": 1}'
+        assert record["sample_weight"] == 1.0
+        assert CloudEvent.from_dict(event.to_dict()).to_avro() == record
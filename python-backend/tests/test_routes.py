@@ -35,6 +35,29 @@ class TestHealthRoutes:
         assert "kafka_configured" in data
         assert "timestamp" in data
         assert isinstance(data["websocket_connections"], int)
+    
+    def test_metrics_endpoint(self, test_client):
+        """Test GET /api/metrics returns stage histograms and consumer lag"""
+        response = test_client.get("/api/metrics")
+        assert response.status_code == 200
+        data = response.json()
+        
+        assert "stages" in data
+        assert "slow_stages" in data
+        assert "consumer_lag" in data
+        assert "thresholds_ms" in data
+
+
+    def test_readiness_follows_kafka_pool(self, test_client):
+        """Test GET /ready is 503 until Kafka metadata is reachable"""
+        from app.services.kafka_pool import kafka_pool
+        
+        with patch.object(kafka_pool, 'ready', False):
+            response = test_client.get("/ready")
+            assert response.status_code == 503
+            assert response.json()["ready"] is False
+        with patch.object(kafka_pool, 'ready', True):
+            assert test_client.get("/ready").status_code == 200
 
 
 class TestEventRoutes:
@@ -74,6 +97,46 @@ class TestEventRoutes:
         assert "event_id" in data
         assert "message" in data
     
+    @patch('app.routes.events.kafka_producer')
+    def test_simulate_event_duplicate_id(self, mock_kafka, test_client, sample_event_data):
+        """Test resending a CloudEvent id is acknowledged but produced once"""
+        event = {**sample_event_data, "id": "retry-test-id"}
+        
+        first = test_client.post("/api/simulate", json=event)
+        second = test_client.post("/api/simulate", json=event)
+        
+        assert first.json()["status"] == "success"
+        assert second.status_code == 200
+        assert second.json()["status"] == "duplicate"
+        assert mock_kafka.produce_event.call_count == 1
+    
+    @patch('app.routes.events.kafka_producer')
+    @patch('app.routes.events.load_shedder')
+    def test_simulate_event_shed(self, mock_shedder, mock_kafka, test_client, sample_event_data):
+        """Test a shed event is acknowledged but not produced"""
+        from app.services.load_shedding import ShedDecision
+        mock_shedder.decide.return_value = ShedDecision(False, 0.0, "sampled")
+        
+        response = test_client.post("/api/simulate", json=sample_event_data)
+        assert response.status_code == 200
+        assert response.json()["status"] == "shed"
+        mock_kafka.produce_event.assert_not_called()
+    
+    @patch('app.routes.events.SPOOL_ENABLED', True)
+    @patch('app.routes.events.event_spool')
+    def test_simulate_event_spool_full(self, mock_spool, test_client, sample_event_data):
+        """Test POST /api/simulate returns 429 when the spool is full"""
+        from app.services.spool import SpoolFullError
+        mock_spool.append.side_effect = SpoolFullError("full")
+        
+        response = test_client.post("/api/simulate", json=sample_event_data)
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+        
+        # The rejected id was released, so the client's retry goes through
+        mock_spool.append.side_effect = None
+        assert test_client.post("/api/simulate", json=sample_event_data).json()["status"] == "success"
+    
     def test_simulate_event_invalid_data(self, test_client):
         """Test POST /api/simulate with invalid data returns 422"""
         invalid_data = {
@@ -94,12 +157,144 @@ class TestEventRoutes:
         
         assert data["status"] == "started"
         assert data["scenario"] == "incident"
+        assert data["run_id"]
         assert "description" in data
         assert "message" in data
     
+    def test_scenario_run_lookup_and_cancel_unknown(self, test_client):
+        """Test GET/DELETE /api/scenario/{run_id} return 404 for unknown runs"""
+        assert test_client.get("/api/scenario/nope").status_code == 404
+        assert test_client.delete("/api/scenario/nope").status_code == 404
+        
+        response = test_client.get("/api/scenarios")
+        assert response.status_code == 200
+        assert "runs" in response.json()
+    
+    def test_run_scenario_rejects_invalid_speed(self, test_client):
+        """Test POST /api/scenario/{name} validates the compression factor"""
+        assert test_client.post("/api/scenario/incident", params={"speed": 0}).status_code == 422
+        assert test_client.post("/api/scenario/incident", params={"speed": 10 ** 9}).status_code == 400
+    
     def test_run_scenario_not_found(self, test_client):
         """Test POST /api/scenario/{name} with invalid scenario returns 404"""
         response = test_client.post("/api/scenario/nonexistent")
         assert response.status_code == 404
         data = response.json()
         assert "not found" in data["detail"]
+
+
+class TestAnalyticsRoutes:
+    """Tests for historical analytics endpoints"""
+    
+    def test_timeseries_includes_produced_events(self, test_client, sample_event_data):
+        """Test events accepted by /api/simulate show up in /api/timeseries"""
+        with patch('app.routes.events.kafka_producer'):
+            assert test_client.post("/api/simulate", json=sample_event_data).status_code == 200
+        
+        response = test_client.get("/api/timeseries", params={"range": "5m", "source": "https://github.com/demo"})
+        assert response.status_code == 200
+        data = response.json()
+        assert data["resolution"] == "10s"
+        assert len(data["timestamps"]) == 30
+        assert sum(data["series"]["https://github.com/demo"]) >= 1
+    
+    def test_top_ranks_error_subjects(self, test_client, sample_event_data):
+        """Test /api/top ranks error/critical subjects from produced events"""
+        failing = {**sample_event_data, "severity": "critical", "subject": "Replica lag over 30s"}
+        with patch('app.routes.events.kafka_producer'):
+            for _ in range(2):
+                assert test_client.post("/api/simulate", json=failing).status_code == 200
+        
+        response = test_client.get("/api/top", params={"dimension": "subject", "k": 3, "window": "1m"})
+        assert response.status_code == 200
+        top = response.json()["top"]
+        assert top[0]["value"] == "Replica lag over 30s"
+        assert top[0]["count"] >= 2
+        assert test_client.get("/api/top", params={"dimension": "region"}).status_code == 400
+    
+    def test_windows_report_distinct_counts(self, test_client, sample_event_data):
+        """Test /api/windows summarizes produced events and exports mergeable sketches"""
+        with patch('app.routes.events.kafka_producer'):
+            assert test_client.post("/api/simulate", json=sample_event_data).status_code == 200
+        
+        response = test_client.get("/api/windows", params={"source": "https://github.com/demo", "export": True})
+        assert response.status_code == 200
+        window = response.json()["windows"][0]
+        assert window["unique_types"] >= 1
+        assert "Test push event" in window["sample_subjects"]
+        
+        merge = {
+            "window_start": window["window_start"],
+            "source": "https://github.com/demo",
+            "sketch": window["sketches"]["https://github.com/demo"],
+        }
+        assert test_client.post("/api/windows/merge", json=merge).status_code == 200
+        assert test_client.post("/api/windows/merge", json={**merge, "sketch": {}}).status_code == 400
+    
+    def test_live_health_reflects_critical_event(self, test_client, sample_event_data):
+        """Test /api/health/live classifies the current hopping window"""
+        critical = {**sample_event_data, "severity": "critical", "subject": "payment-service crashed"}
+        with patch('app.routes.events.kafka_producer'):
+            assert test_client.post("/api/simulate", json=critical).status_code == 200
+        
+        response = test_client.get("/api/health/live")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["panes"] == data["window_seconds"] / data["slide_seconds"]
+        assert data["health"]["health_status"] == "CRITICAL"
+        assert data["health"]["total_critical"] >= 1
+    
+    def test_windows_merge_rejects_incompatible_sketches(self, test_client, sample_event_data):
+        """Test a sketch of another precision or field set is refused before it is stored"""
+        import base64
+        from app.services.sketches import HyperLogLog
+        
+        with patch('app.routes.events.kafka_producer'):
+            assert test_client.post("/api/simulate", json=sample_event_data).status_code == 200
+        window = test_client.get("/api/windows", params={"export": True}).json()["windows"][0]
+        sketch = window["sketches"]["https://github.com/demo"]
+        coarse = base64.b64encode(HyperLogLog(10).to_bytes()).decode('ascii')
+        
+        for bad in (
+            {**sketch, "distinct": {f: coarse for f in sketch["distinct"]}},
+            {**sketch, "distinct": {f: v for f, v in sketch["distinct"].items() if f != "subject"}},
+            {**sketch, "subjects": {"items": ["a"], "seen": 0}},
+            {**sketch, "subjects": {"items": [1, 2], "seen": 5}},
+        ):
+            merge = {"window_start": window["window_start"], "source": "https://new.example/demo", "sketch": bad}
+            assert test_client.post("/api/windows/merge", json=merge).status_code == 400
+        assert test_client.get("/api/windows").status_code == 200
+        assert "https://new.example/demo" not in test_client.get("/api/windows", params={"export": True}).json()["windows"][0]["sketches"]
+    
+    def test_timeseries_rejects_bad_parameters(self, test_client):
+        """Test invalid ranges and resolutions return 400"""
+        assert test_client.get("/api/timeseries", params={"range": "soon"}).status_code == 400
+        assert test_client.get("/api/timeseries", params={"resolution": "2m"}).status_code == 400
+
+
+class TestDebugRoutes:
+    """Tests for runtime diagnostics endpoints"""
+    
+    def test_loop_health(self, test_client):
+        """Test GET /debug/loop returns lag stats and slow callbacks"""
+        response = test_client.get("/debug/loop")
+        assert response.status_code == 200
+        data = response.json()
+        assert "lag_ms" in data
+        assert "recent_slow_callbacks" in data
+    
+    def test_profile_disabled_by_default(self, test_client):
+        """Test GET /debug/profile is unavailable unless enabled"""
+        response = test_client.get("/debug/profile?seconds=1")
+        assert response.status_code == 404
+    
+    @patch('app.routes.debug.LOOP_PROFILER_ENABLED', True)
+    def test_profile_returns_folded_stacks(self, test_client):
+        """Test GET /debug/profile returns flamegraph-ready text"""
+        response = test_client.get("/debug/profile?seconds=0.05")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        assert response.text.strip()
+        
+        too_long = test_client.get("/debug/profile?seconds=3600")
+        assert too_long.status_code == 400
@@ -3,6 +3,7 @@
 Tests for service layer
 """
 
+import json
 import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 
@@ -43,18 +44,19 @@ class TestConnectionManager:
         message = {"type": "test", "data": "hello"}
         await connection_manager.broadcast(message)
         
-        mock_websocket.send_json.assert_called_once_with(message)
+        mock_websocket.send_text.assert_called_once()
+        assert json.loads(mock_websocket.send_text.call_args[0][0]) == {**message, "seq": 1}
     
     @pytest.mark.asyncio
     async def test_broadcast_multiple_clients(self, connection_manager):
         """Test broadcasting to multiple clients"""
         mock_ws1 = AsyncMock()
         mock_ws1.accept = AsyncMock()
-        mock_ws1.send_json = AsyncMock()
+        mock_ws1.send_text = AsyncMock()
         
         mock_ws2 = AsyncMock()
         mock_ws2.accept = AsyncMock()
-        mock_ws2.send_json = AsyncMock()
+        mock_ws2.send_text = AsyncMock()
         
         await connection_manager.connect(mock_ws1)
         await connection_manager.connect(mock_ws2)
@@ -62,20 +64,147 @@ class TestConnectionManager:
         message = {"type": "broadcast", "data": "hello all"}
         await connection_manager.broadcast(message)
         
-        mock_ws1.send_json.assert_called_once_with(message)
-        mock_ws2.send_json.assert_called_once_with(message)
+        # Serialized once, same frame for every client
+        frame = mock_ws1.send_text.call_args[0][0]
+        mock_ws2.send_text.assert_called_once_with(frame)
+        assert json.loads(frame) == {**message, "seq": 1}
     
     @pytest.mark.asyncio
     async def test_broadcast_removes_failed_connections(self, connection_manager, mock_websocket):
         """Test that failed connections are removed during broadcast"""
         await connection_manager.connect(mock_websocket)
-        mock_websocket.send_json.side_effect = Exception("Connection closed")
+        mock_websocket.send_text.side_effect = Exception("Connection closed")
         
         message = {"type": "test"}
         await connection_manager.broadcast(message)
         
         # Connection should be removed after failure
         assert connection_manager.connection_count == 0
+    
+    @pytest.mark.asyncio
+    async def test_partial_insights_are_not_sequenced(self, connection_manager):
+        """Test streamed insight text is neither numbered nor buffered"""
+        await connection_manager.broadcast({"type": "event_sent"})
+        await connection_manager.broadcast({"type": "ai_insight_partial", "text": "..."})
+        
+        assert connection_manager.seq == 1
+        assert len(connection_manager.frames) == 1
+
+
+class TestWebSocketResume:
+    """Tests for sequenced frames, replay and snapshots on reconnect"""
+    
+    @staticmethod
+    def sent(ws):
+        return [json.loads(call[0][0]) for call in ws.send_text.call_args_list]
+    
+    @pytest.mark.asyncio
+    async def test_fresh_connection_gets_hello(self, connection_manager, mock_websocket):
+        """Test a client without since only gets the current position"""
+        await connection_manager.broadcast({"type": "event_sent", "n": 1})
+        await connection_manager.resume(mock_websocket)
+        
+        assert self.sent(mock_websocket) == [
+            {"type": "hello", "stream": connection_manager.stream_id, "seq": 1}
+        ]
+        assert connection_manager.connection_count == 1
+    
+    @pytest.mark.asyncio
+    async def test_gap_is_replayed_in_one_frame(self, connection_manager, mock_websocket):
+        """Test reconnecting with since gets exactly the missed frames, batched"""
+        for n in range(5):
+            await connection_manager.broadcast({"type": "event_sent", "n": n})
+        await connection_manager.resume(mock_websocket, since=2, stream=connection_manager.stream_id)
+        
+        hello, replay = self.sent(mock_websocket)
+        assert replay["type"] == "replay"
+        assert (replay["since"], replay["seq"]) == (2, 5)
+        assert [f["seq"] for f in replay["frames"]] == [3, 4, 5]
+        assert connection_manager.replays == 1
+    
+    @pytest.mark.asyncio
+    async def test_up_to_date_client_gets_no_replay(self, connection_manager, mock_websocket):
+        """Test a client that missed nothing gets only the hello"""
+        await connection_manager.broadcast({"type": "event_sent"})
+        await connection_manager.resume(mock_websocket, since=1, stream=connection_manager.stream_id)
+        
+        assert [m["type"] for m in self.sent(mock_websocket)] == ["hello"]
+    
+    @pytest.mark.asyncio
+    async def test_old_gap_gets_snapshot(self, mock_websocket):
+        """Test a gap older than the buffer falls back to a snapshot of events and alerts"""
+        from app.services.websocket_manager import ConnectionManager
+        manager = ConnectionManager(buffer_size=10, snapshot_events=3, snapshot_alerts=1)
+        for n in range(20):
+            await manager.broadcast({"type": "ai_alert" if n % 5 == 0 else "event_sent", "n": n})
+        await manager.resume(mock_websocket, since=2, stream=manager.stream_id)
+        
+        hello, snapshot = self.sent(mock_websocket)
+        assert snapshot["type"] == "snapshot"
+        assert snapshot["seq"] == 20
+        assert [(f["type"], f["n"]) for f in snapshot["frames"]] == [
+            ("ai_alert", 15), ("event_sent", 17), ("event_sent", 18), ("event_sent", 19)
+        ]
+        assert manager.snapshots == 1
+
+    @pytest.mark.asyncio
+    async def test_snapshot_keeps_latest_health(self, mock_websocket):
+        """Test a snapshot carries the latest health_changed frame however old"""
+        from app.services.websocket_manager import ConnectionManager
+        manager = ConnectionManager(buffer_size=10, snapshot_events=2, snapshot_alerts=1)
+        await manager.broadcast({"type": "health_changed", "n": 0})
+        await manager.broadcast({"type": "health_changed", "n": 1})
+        for n in range(2, 8):
+            await manager.broadcast({"type": "event_sent", "n": n})
+        await manager.resume(mock_websocket, since=0, stream="previous")
+
+        _, snapshot = self.sent(mock_websocket)
+        assert [(f["type"], f["n"]) for f in snapshot["frames"]] == [
+            ("health_changed", 1), ("event_sent", 6), ("event_sent", 7)
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unknown_stream_gets_snapshot(self, connection_manager, mock_websocket):
+        """Test a seq from before a server restart is not replayed against the new stream"""
+        await connection_manager.broadcast({"type": "event_sent"})
+        await connection_manager.resume(mock_websocket, since=0, stream="previous")
+        
+        assert [m["type"] for m in self.sent(mock_websocket)] == ["hello", "snapshot"]
+    
+    @pytest.mark.asyncio
+    async def test_frames_during_catch_up_are_not_lost(self, connection_manager, mock_websocket):
+        """Test frames broadcast while a replay is being sent follow in another replay"""
+        for n in range(3):
+            await connection_manager.broadcast({"type": "event_sent", "n": n})
+        
+        async def send_text(text):
+            # Another event is broadcast while the first replay is in flight
+            if '"type":"replay"' in text and connection_manager.seq == 3:
+                await connection_manager.broadcast({"type": "event_sent", "n": 3})
+        mock_websocket.send_text.side_effect = send_text
+        
+        await connection_manager.resume(mock_websocket, since=1, stream=connection_manager.stream_id)
+        
+        replays = [m for m in self.sent(mock_websocket) if m["type"] == "replay"]
+        assert [f["seq"] for r in replays for f in r["frames"]] == [2, 3, 4]
+        assert mock_websocket in connection_manager.active_connections
+    
+    @pytest.mark.asyncio
+    async def test_frames_during_hello_are_not_lost(self, connection_manager, mock_websocket):
+        """Test a fresh client gets frames broadcast while its hello was being sent"""
+        await connection_manager.broadcast({"type": "event_sent", "n": 0})
+        
+        async def send_text(text):
+            if '"type":"hello"' in text:
+                await connection_manager.broadcast({"type": "event_sent", "n": 1})
+        mock_websocket.send_text.side_effect = send_text
+        
+        await connection_manager.resume(mock_websocket)
+        
+        hello, replay = self.sent(mock_websocket)
+        assert hello["seq"] == 1
+        assert replay["type"] == "replay" and [f["n"] for f in replay["frames"]] == [1]
+        assert connection_manager.replays == 0 and connection_manager.snapshots == 0
 
 
 class TestGeminiService:
@@ -83,8 +212,8 @@ class TestGeminiService:
     
     @pytest.mark.asyncio
     async def test_generate_insight_not_available(self, sample_summary_data):
-        """Test insight generation when Gemini is not available"""
-        with patch('app.services.ai_service.GEMINI_AVAILABLE', False):
+        """Test insight generation when no LLM provider is configured"""
+        with patch('app.services.ai_service.create_provider', return_value=None):
             from app.services.ai_service import GeminiService
             service = GeminiService()
             
@@ -95,30 +224,119 @@ class TestGeminiService:
     
     @pytest.mark.asyncio
     async def test_generate_insight_success(self, sample_summary_data):
-        """Test successful insight generation with mocked Gemini"""
-        with patch('app.services.ai_service.GEMINI_AVAILABLE', True):
-            with patch('app.services.ai_service.GEMINI_API_KEY', 'test-key'):
-                with patch('app.services.ai_service.genai') as mock_genai:
-                    from app.services.ai_service import GeminiService
-                    
-                    # Create a mock response
-                    mock_response = MagicMock()
-                    mock_response.text = "System is healthy. No concerns. Keep monitoring."
-                    
-                    mock_model = MagicMock()
-                    mock_model.generate_content.return_value = mock_response
-                    mock_genai.GenerativeModel.return_value = mock_model
-                    
-                    service = GeminiService()
-                    # Manually set configured state since we're mocking
-                    service._configured = True
-                    service._model = mock_model
-                    
-                    result = await service.generate_insight(sample_summary_data)
-                    
-                    assert result["status"] == "success"
-                    assert "insight" in result
-                    assert "timestamp" in result
+        """Test successful insight generation with the stub provider"""
+        from app.services.ai_service import GeminiService
+        from app.services.llm_providers import StubInsightProvider
+        
+        service = GeminiService(provider=StubInsightProvider())
+        
+        result = await service.generate_insight(sample_summary_data)
+        
+        assert result["status"] == "success"
+        assert "insight" in result
+        assert "timestamp" in result
+        assert "healthy" in result["insight"]
+    
+    @pytest.mark.asyncio
+    async def test_generate_insight_timeout(self, sample_summary_data):
+        """Test slow provider calls are cancelled after the timeout"""
+        from app.services.ai_service import GeminiService
+        from app.services.llm_providers import StubInsightProvider
+        
+        service = GeminiService(provider=StubInsightProvider(latency=1.0), timeout=0.01)
+        
+        result = await service.generate_insight(sample_summary_data)
+        
+        assert result["status"] == "error"
+        assert "timed out" in result["error"]
+    
+    @pytest.mark.asyncio
+    async def test_stream_insight_pushes_partials(self, sample_summary_data):
+        """Test streamed chunks are forwarded as growing partial text"""
+        from app.services.ai_service import GeminiService, build_prompt
+        from app.services.llm_providers import StubInsightProvider
+        
+        provider = StubInsightProvider(chunk_words=3)
+        service = GeminiService(provider=provider)
+        partials = []
+        
+        async def on_chunk(text):
+            partials.append(text)
+        
+        result = await service.stream_insight(sample_summary_data, on_chunk)
+        
+        assert result["status"] == "success"
+        assert len(partials) > 1
+        assert partials[-1] == result["insight"]
+        assert result["insight"] == await provider.generate(build_prompt(sample_summary_data))
+    
+    @pytest.mark.asyncio
+    async def test_batch_insights_single_call(self, sample_summary_data):
+        """Test several windows share one LLM call and are split back"""
+        from app.services.ai_service import GeminiService
+        from app.services.llm_providers import StubInsightProvider
+        
+        provider = StubInsightProvider()
+        service = GeminiService(provider=provider)
+        summaries = [
+            {**sample_summary_data, "window_start": f"2024-01-01T00:{m:02d}:00"}
+            for m in (0, 5, 10)
+        ]
+        
+        results = await service.generate_batch_insights(summaries)
+        
+        assert provider.calls == 1
+        assert [r["status"] for r in results] == ["success"] * 3
+        assert "2024-01-01T00:05:00" in results[1]["insight"]
+        assert "**Root Cause**" in results[0]["insight"]
+    
+    def test_plan_batches_respects_token_budget(self, sample_summary_data):
+        """Test batches are cut when the estimated tokens exceed the budget"""
+        from app.services.ai_service import plan_batches
+        
+        summaries = [{**sample_summary_data, "window_start": str(i)} for i in range(10)]
+        
+        assert len(plan_batches(summaries, token_budget=100_000, max_batch_size=4)) == 3
+        small = plan_batches(summaries, token_budget=1200, max_batch_size=10)
+        assert len(small) > 1
+        assert sum(len(b) for b in small) == 10
+    
+    def test_group_by_window_merges_error_sources(self):
+        """Test duplicate join rows collapse into one summary with ranked sources"""
+        from app.services.ai_service import group_by_window
+        
+        rows = [
+            {"window_start": "w1", "top_error_source": "jenkins", "top_error_count": 2},
+            {"window_start": "w1", "top_error_source": "kubernetes", "top_error_count": 5},
+            {"window_start": "w2", "top_error_source": "none", "top_error_count": 0},
+        ]
+        
+        merged = group_by_window(rows)
+        
+        assert len(merged) == 2
+        assert merged[0]["top_error_source"] == "kubernetes"
+        assert [s["source"] for s in merged[0]["top_error_sources"]] == ["kubernetes", "jenkins"]
+        assert merged[1]["top_error_sources"] == []
+    
+    @pytest.mark.asyncio
+    async def test_gemini_http_provider_parses_response(self):
+        """Test the REST provider extracts text from generateContent responses"""
+        import httpx
+        from app.services.llm_providers import GeminiHTTPProvider
+        
+        def handler(request):
+            assert request.url.path.endswith(":generateContent")
+            return httpx.Response(200, json={
+                "candidates": [{"content": {"parts": [{"text": "All good."}]}}]
+            })
+        
+        provider = GeminiHTTPProvider(api_key="test-key")
+        provider._client = httpx.AsyncClient(
+            base_url=provider.BASE_URL, transport=httpx.MockTransport(handler)
+        )
+        
+        assert await provider.generate("prompt") == "All good."
+        await provider.aclose()
 
 
 class TestKafkaProducerService:
@@ -148,4 +366,1770 @@ class TestKafkaProducerService:
             service.produce_event(event)
             
             mock_producer_instance.produce.assert_called_once()
-            mock_producer_instance.flush.assert_called_once()
+            mock_producer_instance.poll.assert_called_once_with(0)
+            mock_producer_instance.flush.assert_not_called()
+
+
+class TestPipelineMetrics:
+    """Tests for pipeline latency metrics"""
+    
+    def test_histogram_percentiles(self):
+        """Test percentile estimates come from bucket upper bounds"""
+        from app.services.metrics import LatencyHistogram
+        
+        histogram = LatencyHistogram()
+        for value in [3, 4, 4, 8, 400]:
+            histogram.observe(value)
+        
+        assert histogram.count == 5
+        assert histogram.percentile(50) == 5
+        assert histogram.percentile(99) == 400
+        assert histogram.snapshot()["max_ms"] == 400
+    
+    def test_slow_stage_flagged(self):
+        """Test stages above their threshold are flagged as slow"""
+        from app.services.metrics import PipelineMetrics
+        
+        metrics = PipelineMetrics(slow_thresholds_ms={"gemini": 100, "deserialize": 50})
+        metrics.observe("gemini", 2.0)
+        metrics.observe("deserialize", 0.001)
+        
+        snapshot = metrics.snapshot()
+        assert "gemini" in snapshot["slow_stages"]
+        assert snapshot["slow_stages"]["gemini"]["slow_count"] == 1
+        assert "deserialize" not in snapshot["slow_stages"]
+    
+    def test_observe_since_window_end(self):
+        """Test delay is measured from ISO, datetime and epoch-millis timestamps"""
+        from datetime import datetime, timezone
+        from app.services.metrics import PipelineMetrics
+        
+        metrics = PipelineMetrics(slow_thresholds_ms={})
+        now = datetime(2024, 1, 1, 0, 5, 30, tzinfo=timezone.utc).timestamp()
+        
+        assert metrics.observe_since("flink_output", "2024-01-01T00:05:00Z", now=now) == 30
+        assert metrics.observe_since("flink_output", datetime(2024, 1, 1, 0, 5), now=now) == 30
+        assert metrics.observe_since("flink_output", 1704067500000, now=now) == 30
+        assert metrics.observe_since("flink_output", None, now=now) is None
+        assert metrics.stages["flink_output"].count == 3
+    
+    def test_consumer_lag(self):
+        """Test consumer lag is computed against the high watermark"""
+        from confluent_kafka import TopicPartition
+        from app.services.kafka_service import KafkaConsumerService
+        from app.services.metrics import pipeline_metrics
+        
+        mock_consumer = MagicMock()
+        mock_consumer.assignment.return_value = [TopicPartition("summary", 0)]
+        mock_consumer.position.return_value = [TopicPartition("summary", 0, 40)]
+        mock_consumer.get_watermark_offsets.return_value = (0, 100)
+        
+        service = KafkaConsumerService()
+        service._consumer = mock_consumer
+        
+        assert service.report_lag(force=True) == {0: 60}
+        assert pipeline_metrics.snapshot()["consumer_lag"]["summary"]["total"] == 60
+
+
+class TestRuleBasedInsightEngine:
+    """Tests for the rule-based insight fast path"""
+    
+    def test_healthy_window_handled_locally(self):
+        """Test HEALTHY windows without errors never reach the LLM"""
+        from app.services.insight_rules import RuleBasedInsightEngine
+        
+        engine = RuleBasedInsightEngine()
+        insight = engine.evaluate({
+            "health_status": "HEALTHY", "total_events": 40, "total_sources": 3,
+            "error_count": 0, "critical_count": 0, "warning_count": 2,
+        })
+        
+        assert insight["engine"] == "rules"
+        for section in ("**Status**", "**Root Cause**", "**Impact**", "**Recommendation**"):
+            assert section in insight["insight"]
+        assert engine.stats()["escalation_rate"] == 0
+    
+    def test_single_known_source_handled_locally(self):
+        """Test WARNING windows with one known error source are handled locally"""
+        from app.services.insight_rules import RuleBasedInsightEngine
+        
+        insight = RuleBasedInsightEngine().evaluate({
+            "health_status": "WARNING", "total_events": 50, "error_count": 2,
+            "error_rate_percent": 4.0, "top_error_source": "https://jenkins.com/demo",
+            "top_error_count": 2, "correlation_count": 1,
+        })
+        
+        assert insight is not None
+        assert "jenkins" in insight["insight"]
+    
+    @pytest.mark.parametrize("summary", [
+        {"health_status": "CRITICAL", "critical_count": 3},
+        {"health_status": "DEGRADED", "error_count": 20},
+        {"health_status": "WARNING", "error_count": 1, "top_error_source": "https://jenkins.com/demo", "anomaly_count": 1},
+        {"health_status": "WARNING", "error_count": 1, "top_error_source": "https://unknown.example/x"},
+        {"health_status": "WARNING", "error_count": 3, "top_error_sources": [{"source": "a"}, {"source": "b"}]},
+    ])
+    def test_non_trivial_windows_escalate(self, summary):
+        """Test CRITICAL/DEGRADED and anomalous windows escalate"""
+        from app.services.insight_rules import RuleBasedInsightEngine
+        
+        engine = RuleBasedInsightEngine()
+        assert engine.evaluate(summary) is None
+        assert engine.stats()["declined"] == 1
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_escalates_only_non_trivial(self):
+        """Test the pipeline calls the LLM only for escalated windows"""
+        from app.services.ai_service import GeminiService
+        from app.services.insight_pipeline import InsightPipeline
+        from app.services.insight_rules import RuleBasedInsightEngine
+        from app.services.llm_providers import StubInsightProvider
+        
+        provider = StubInsightProvider()
+        pipeline = InsightPipeline(GeminiService(provider=provider), RuleBasedInsightEngine())
+        summaries = [
+            {"window_start": "w1", "health_status": "HEALTHY", "error_count": 0},
+            {"window_start": "w2", "health_status": "CRITICAL", "critical_count": 2},
+        ]
+        
+        await pipeline.attach(summaries)
+        
+        assert provider.calls == 1
+        assert summaries[0]["ai_insight"]["engine"] == "rules"
+        assert "engine" not in summaries[1]["ai_insight"]
+        assert pipeline.stats()["rules"]["fast_path"] == 1
+
+
+class TestInsightCache:
+    """Tests for the persistent insight cache"""
+    
+    def test_fingerprint_ignores_timestamp_encoding(self):
+        """Test datetime and ISO string windows share a fingerprint"""
+        from datetime import datetime
+        from app.services.insight_cache import summary_fingerprint
+        
+        base = {"health_status": "HEALTHY", "total_events": 10}
+        as_datetime = {**base, "window_start": datetime(2024, 1, 1), "window_end": datetime(2024, 1, 1, 0, 5)}
+        as_string = {**base, "window_start": "2024-01-01T00:00:00", "window_end": "2024-01-01T00:05:00"}
+        
+        assert summary_fingerprint(as_datetime) == summary_fingerprint(as_string)
+        assert summary_fingerprint(as_string) != summary_fingerprint({**as_string, "total_events": 11})
+    
+    def test_survives_restart(self, tmp_path):
+        """Test insights are reloaded from disk by a new cache instance"""
+        from app.services.insight_cache import InsightCache
+        
+        path = str(tmp_path / "insights.db")
+        summary = {"window_start": "2024-01-01T00:00:00", "health_status": "CRITICAL"}
+        
+        cache = InsightCache(path=path)
+        cache.put(summary, {"status": "success", "insight": "Pod crashed"})
+        cache.put({"window_start": "x"}, {"status": "error", "error": "quota"})
+        cache.close()
+        
+        restarted = InsightCache(path=path)
+        assert restarted.warm() == 1
+        assert restarted.get(summary)["insight"] == "Pod crashed"
+        assert restarted.get(summary)["cached"] is True
+        
+        joined = restarted.join([dict(summary), {"window_start": "other"}])
+        assert joined[0]["ai_insight"]["insight"] == "Pod crashed"
+        assert "ai_insight" not in joined[1]
+    
+    def test_size_bounded_eviction(self, tmp_path):
+        """Test least recently used entries are evicted past max_entries"""
+        from app.services.insight_cache import InsightCache
+        
+        cache = InsightCache(path=str(tmp_path / "insights.db"), max_entries=3, memory_entries=2)
+        summaries = [{"window_start": f"w{i}"} for i in range(5)]
+        for summary in summaries:
+            cache.put(summary, {"status": "success", "insight": summary["window_start"]})
+        
+        assert len(cache) == 3
+        assert cache.get(summaries[0]) is None
+        assert cache.get(summaries[4])["insight"] == "w4"
+    
+    def test_hits_write_last_access_in_batches(self, tmp_path):
+        """Test memory hits do not touch SQLite until a batch of access times is due"""
+        from app.services.insight_cache import InsightCache
+        
+        cache = InsightCache(path=str(tmp_path / "insights.db"), access_flush_batch=3)
+        summaries = [{"window_start": f"w{i}"} for i in range(3)]
+        for summary in summaries:
+            cache.put(summary, {"status": "success", "insight": summary["window_start"]})
+        written = dict(cache.conn.execute("SELECT window_start, last_access FROM insights"))
+        
+        cache.get(summaries[0])
+        cache.get(summaries[1])
+        assert dict(cache.conn.execute("SELECT window_start, last_access FROM insights")) == written
+        cache.get(summaries[2])
+        updated = dict(cache.conn.execute("SELECT window_start, last_access FROM insights"))
+        assert all(updated[w] > written[w] for w in written)
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_falls_back_when_cache_fails(self):
+        """Test a cache read error sends the window down the rules/LLM path"""
+        import sqlite3
+        from app.services.ai_service import GeminiService
+        from app.services.insight_pipeline import InsightPipeline
+        from app.services.insight_rules import RuleBasedInsightEngine
+        from app.services.llm_providers import StubInsightProvider
+        
+        cache = MagicMock()
+        cache.get.side_effect = sqlite3.OperationalError("database is locked")
+        provider = StubInsightProvider()
+        pipeline = InsightPipeline(GeminiService(provider=provider), RuleBasedInsightEngine(), cache=cache)
+        summaries = [
+            {"window_start": "w1", "health_status": "HEALTHY", "error_count": 0},
+            {"window_start": "w2", "health_status": "CRITICAL", "critical_count": 2},
+        ]
+        
+        await pipeline.attach(summaries)
+        
+        assert summaries[0]["ai_insight"]["engine"] == "rules"
+        assert summaries[1]["ai_insight"]["status"] == "success" and provider.calls == 1
+
+
+class TestSharedInsights:
+    """Tests for insights shared through the compacted insights topic"""
+    
+    SUMMARY = {"window_start": "2024-01-01T00:00:00", "window_end": "2024-01-01T00:05:00",
+               "health_status": "CRITICAL", "critical_count": 3}
+    
+    def _shared(self, replica="replica-a"):
+        from app.services.insight_topic import SharedInsights
+        return SharedInsights(topic="gemini-insights", producer=MagicMock(), replica=replica)
+    
+    def test_publish_keys_by_window_start(self):
+        """Test LLM insights are produced keyed by window_start and readable at once"""
+        shared = self._shared()
+        
+        assert shared.publish(self.SUMMARY, {"status": "success", "insight": "DB down", "cached": True}) is True
+        assert shared.publish(self.SUMMARY, {"status": "success", "insight": "ok", "engine": "rules"}) is False
+        assert shared.publish(self.SUMMARY, {"status": "error", "error": "quota"}) is False
+        
+        topic, key, value, _ = shared.producer.produce_record.call_args[0]
+        record = json.loads(value)
+        assert (topic, key) == ("gemini-insights", b"2024-01-01T00:00:00+00:00")
+        assert record["insight"] == {"status": "success", "insight": "DB down"}
+        assert record["replica"] == "replica-a"
+        assert shared.get(self.SUMMARY)["insight"] == "DB down"
+    
+    def test_view_follows_topic_records(self):
+        """Test records from other replicas are matched by window and fingerprint"""
+        from datetime import datetime
+        from app.services.insight_cache import summary_fingerprint
+        
+        producer = self._shared()
+        producer.publish(self.SUMMARY, {"status": "success", "insight": "DB down"})
+        key, value = producer.producer.produce_record.call_args[0][1:3]
+        
+        shared = self._shared(replica="replica-b")
+        shared.apply(key, value)
+        shared.apply(b"2024-01-01T00:05:00+00:00", b"not json")
+        
+        # Same window, differently encoded timestamps
+        as_datetime = {**self.SUMMARY, "window_start": datetime(2024, 1, 1), "window_end": datetime(2024, 1, 1, 0, 5)}
+        insight = shared.get(as_datetime)
+        assert insight["insight"] == "DB down"
+        assert insight["shared"] is True and insight["replica"] == "replica-a"
+        # Window re-emitted with new counts: analysed again
+        assert shared.get({**self.SUMMARY, "critical_count": 4}) is None
+        
+        shared.apply(key, None)
+        assert shared.get(self.SUMMARY) is None
+        assert shared.stats()["hits"] == 1 and shared.stats()["windows"] == 0
+    
+    def test_caught_up_by_position_past_compacted_tail(self):
+        """Test the view is caught up once positions reach the end offsets, delivered or not"""
+        shared = self._shared()
+        shared._end_offsets = {0: 10, 1: 4}
+        shared._track_progress({0: 10, 1: 3})
+        assert shared._end_offsets == {1: 4} and not shared.caught_up
+        shared._track_progress({1: 4})
+        assert shared.caught_up
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_reuses_shared_insight_and_publishes_new_ones(self):
+        """Test the LLM is skipped for windows another replica analysed, and new insights are published"""
+        from app.services.ai_service import GeminiService
+        from app.services.insight_pipeline import InsightPipeline
+        from app.services.insight_rules import RuleBasedInsightEngine
+        from app.services.llm_providers import StubInsightProvider
+        
+        provider = StubInsightProvider()
+        other = self._shared(replica="replica-a")
+        other.publish(self.SUMMARY, {"status": "success", "insight": "DB down"})
+        shared = self._shared(replica="replica-b")
+        shared.apply(*other.producer.produce_record.call_args[0][1:3])
+        
+        pipeline = InsightPipeline(GeminiService(provider=provider), RuleBasedInsightEngine(), shared=shared)
+        known = dict(self.SUMMARY)
+        await pipeline.attach([known])
+        assert provider.calls == 0
+        assert known["ai_insight"]["insight"] == "DB down"
+        
+        new = {**self.SUMMARY, "window_start": "2024-01-01T00:05:00", "window_end": "2024-01-01T00:10:00"}
+        await pipeline.attach([new])
+        assert provider.calls == 1
+        shared.producer.produce_record.assert_called_once()
+        assert shared.get(new) is not None
+
+
+class TestInsightIndex:
+    """Tests for near-duplicate insight reuse"""
+    
+    SUMMARY = {"window_start": "w1", "health_status": "CRITICAL", "top_error_source": "https://k8s.com/demo",
+               "total_events": 1000, "total_sources": 4, "critical_count": 20, "error_count": 120,
+               "warning_count": 40, "error_rate_percent": 14.0, "top_error_count": 90, "error_trend": "STABLE"}
+    
+    def test_near_duplicate_reuses_insight_with_delta(self):
+        """Test a slightly different window reuses the insight; other states do not"""
+        from app.services.insight_index import InsightIndex
+        
+        index = InsightIndex(threshold=0.75)
+        index.add(self.SUMMARY, {"status": "success", "insight": "Pods crash-looping"})
+        
+        insight = index.lookup({**self.SUMMARY, "window_start": "w2", "error_count": 130})
+        assert insight["reused_from"] == "w1"
+        assert insight["delta"] == "errors 120 -> 130"
+        assert insight["insight"].startswith("Pods crash-looping")
+        
+        assert index.lookup({**self.SUMMARY, "error_count": 600}) is None
+        assert index.lookup({**self.SUMMARY, "health_status": "WARNING"}) is None
+        assert index.lookup({**self.SUMMARY, "top_error_source": "https://github.com/demo"}) is None
+        assert index.stats()["hits"] == 1 and index.stats()["lookups"] == 4
+    
+    def test_every_flink_trend_is_embedded(self):
+        """Test each error_trend of 06_error_rate_trends.sql, NEW_ERRORS included, gets its own one-hot"""
+        import numpy as np
+        from app.services.insight_index import CATEGORY_WEIGHT, COUNT_FEATURES, NORM_COLUMN, summary_vector
+        
+        trends = ('STABLE', 'NEW_ERRORS', 'SPIKE', 'INCREASING', 'DECREASING', 'IMPROVING')
+        columns = set()
+        for trend in trends:
+            onehot = summary_vector({**self.SUMMARY, "error_trend": trend})[len(COUNT_FEATURES):NORM_COLUMN]
+            assert np.count_nonzero(onehot) == 1 and onehot.max() == CATEGORY_WEIGHT
+            columns.add(int(np.argmax(onehot)))
+        assert len(columns) == len(trends)
+    
+    def test_capacity_drops_oldest(self):
+        """Test the oldest entries are evicted across partitions"""
+        from app.services.insight_index import InsightIndex
+        
+        index = InsightIndex(capacity=3)
+        for i, status in enumerate(["CRITICAL", "WARNING", "CRITICAL", "DEGRADED", "DEGRADED"]):
+            index.add({**self.SUMMARY, "window_start": f"w{i}", "health_status": status},
+                      {"status": "success", "insight": f"i{i}"})
+        
+        assert len(index) == 3
+        assert index.stats()["partitions"] == 2
+        assert index.lookup({**self.SUMMARY, "health_status": "WARNING"}) is None
+        assert index.lookup(self.SUMMARY)["reused_from"] == "w2"
+    
+    def test_similar_incidents_rank_across_partitions(self):
+        """Test the closest past incidents are found even with another status, and reach the prompt"""
+        from app.services.ai_service import build_prompt
+        from app.services.insight_index import InsightIndex
+        
+        index = InsightIndex()
+        index.add(self.SUMMARY, {"status": "success", "insight": "1. **Status**: Pods crash-looping\n2. more"})
+        index.add({**self.SUMMARY, "window_start": "w0", "health_status": "HEALTHY", "top_error_source": "none",
+                   "error_count": 0, "critical_count": 0, "top_error_count": 0, "error_rate_percent": 0},
+                  {"status": "success", "insight": "All good"})
+        
+        summary = {**self.SUMMARY, "window_start": "w9", "health_status": "DEGRADED", "error_count": 150}
+        incidents = index.similar_incidents(summary, 2)
+        assert [i["window_start"] for i in incidents] == ["w1"]
+        assert incidents[0]["assessment"] == "1. **Status**: Pods crash-looping"
+        
+        prompt = build_prompt({**summary, "similar_incidents": incidents})
+        assert "Similar Past Incidents" in prompt and "Pods crash-looping" in prompt
+    
+    @pytest.mark.asyncio
+    async def test_pipeline_indexes_llm_insights_and_reuses_them(self):
+        """Test an LLM insight is indexed and the next near-identical window skips the LLM"""
+        from app.services.ai_service import GeminiService
+        from app.services.insight_index import InsightIndex
+        from app.services.insight_pipeline import InsightPipeline
+        from app.services.insight_rules import RuleBasedInsightEngine
+        from app.services.llm_providers import StubInsightProvider
+        
+        provider = StubInsightProvider()
+        pipeline = InsightPipeline(GeminiService(provider=provider), RuleBasedInsightEngine(), index=InsightIndex())
+        
+        first, second = dict(self.SUMMARY), {**self.SUMMARY, "window_start": "w2", "error_count": 125}
+        await pipeline.attach([first])
+        await pipeline.attach([second])
+        
+        assert provider.calls == 1
+        assert second["ai_insight"]["reused_from"] == "w1"
+        assert pipeline.stats()["index"]["hits"] == 1
+        # Only the window that reached the LLM counts as escalated
+        rules = pipeline.stats()["rules"]
+        assert rules["declined"] == 2 and rules["escalated"] == 1 and rules["escalation_rate"] == 0.5
+
+
+class TestSummaryJoiner:
+    """Tests for the backend join of the Flink output tables"""
+    
+    HEALTH = {"window_start": "2024-01-01T00:05:00+00:00", "window_end": "2024-01-01T00:10:00+00:00",
+              "total_events": 500, "total_sources": 3, "total_critical": 5, "total_errors": 40,
+              "total_warnings": 12, "error_rate_percent": 9.0, "health_status": "DEGRADED"}
+    
+    def make_joiner(self, **kwargs):
+        from app.services.summary_join import SummaryJoiner
+        from app.config import SYSTEM_HEALTH_TOPIC, TOP_ERROR_SOURCES_TOPIC, CORRELATED_INCIDENTS_TOPIC
+        
+        joiner = SummaryJoiner(**{"window_seconds": 300, "grace_seconds": 10, "ttl_seconds": 600, **kwargs})
+        return joiner, SYSTEM_HEALTH_TOPIC, TOP_ERROR_SOURCES_TOPIC, CORRELATED_INCIDENTS_TOPIC
+    
+    def test_one_summary_per_window_with_top_source(self):
+        """Test upserts collapse into a single summary carrying the top-1 source after the grace period"""
+        joiner, health, sources, incidents = self.make_joiner()
+        start = self.HEALTH["window_start"]
+        
+        joiner.offer(sources, {"window_start": start, "source": "a", "total_errors": 10}, now=100)
+        joiner.offer(sources, {"window_start": start, "source": "b", "total_errors": 20}, now=100)
+        joiner.offer(sources, {"window_start": start, "source": "a", "total_errors": 30}, now=101)
+        joiner.offer(health, dict(self.HEALTH), now=102)
+        joiner.offer(health, {**self.HEALTH, "total_errors": 45}, now=105)
+        
+        assert joiner.ready(now=110) == []
+        summaries = joiner.ready(now=112)
+        assert len(summaries) == 1
+        summary = summaries[0]
+        assert summary["top_error_source"] == "a" and summary["top_error_count"] == 30
+        assert summary["error_count"] == 45 and summary["critical_count"] == 5
+        assert summary["window_start"] == start
+        assert joiner.ready(now=200) == []
+        
+        # A row for an emitted window is late, not a second summary
+        assert not joiner.offer(sources, {"window_start": start, "source": "c", "total_errors": 99}, now=201)
+        assert joiner.stats()["late_rows"] == 1 and joiner.recent(5) == [summary]
+    
+    def test_incidents_bucketed_into_window(self):
+        """Test 1-minute incident rows count towards their 5-minute window; tombstones remove them"""
+        joiner, health, sources, incidents = self.make_joiner()
+        
+        for minute, cid in [(5, "c1"), (7, "c2"), (9, "c2"), (10, "c3")]:
+            joiner.offer(incidents, {"window_start": f"2024-01-01T00:{minute:02d}:00+00:00",
+                                     "correlation_id": cid, "event_count": 3}, now=100)
+        joiner.offer(incidents, {"window_start": "2024-01-01T00:06:00+00:00", "correlation_id": "c1"},
+                     deleted=True, now=100)
+        joiner.offer(health, dict(self.HEALTH), now=100)
+        
+        summary, = joiner.ready(now=120)
+        assert summary["correlation_count"] == 1
+        assert summary["top_error_source"] == "none" and summary["top_error_count"] == 0
+    
+    def test_state_is_bounded(self):
+        """Test windows without health expire after the TTL and the oldest is emitted at max_windows"""
+        joiner, health, sources, incidents = self.make_joiner(max_windows=2)
+        
+        joiner.offer(sources, {"window_start": "2024-01-01T00:00:00Z", "source": "a", "total_errors": 1}, now=0)
+        assert joiner.ready(now=700) == []
+        assert joiner.stats()["expired_windows"] == 1 and joiner.stats()["pending_windows"] == 0
+        
+        for minute in (5, 10, 15):
+            joiner.offer(health, {**self.HEALTH, "window_start": f"2024-01-01T00:{minute:02d}:00Z"}, now=800)
+        summary, = joiner.ready(now=801)
+        assert summary["window_start"] == "2024-01-01T00:05:00+00:00"
+        assert joiner.stats()["forced_emits"] == 1 and joiner.stats()["pending_windows"] == 2
+    
+    def test_commit_held_until_window_emitted(self):
+        """Test a partition's commit stays at the lowest offset of rows in unemitted windows"""
+        joiner, health, sources, incidents = self.make_joiner()
+        later = {**self.HEALTH, "window_start": "2024-01-01T00:10:00+00:00"}
+        
+        joiner.offer(health, dict(self.HEALTH), now=100, position=(0, 7))
+        joiner.offer(sources, {"window_start": self.HEALTH["window_start"], "source": "a", "total_errors": 1},
+                     now=100, position=(2, 40))
+        joiner.offer(health, later, now=105, position=(0, 8))
+        assert joiner.holds() == {(health, 0): 7, (sources, 2): 40}
+        
+        summary, = joiner.ready(now=111)
+        assert summary["window_start"] == self.HEALTH["window_start"]
+        assert joiner.holds() == {(health, 0): 8}
+        
+        joiner.ready(now=116)
+        assert joiner.holds() == {}
+
+
+class TestPartitionedConsumer:
+    """Tests for the partition-parallel consumer runtime"""
+    
+    @staticmethod
+    def make_message(partition, offset, topic="t"):
+        msg = MagicMock()
+        msg.error.return_value = None
+        msg.topic.return_value = topic
+        msg.partition.return_value = partition
+        msg.offset.return_value = offset
+        return msg
+    
+    def test_commit_position_only_advances_contiguously(self):
+        """Test an offset is committable only once every earlier one is processed"""
+        from app.services.partition_workers import OffsetTracker
+        
+        tracker = OffsetTracker()
+        generations = {offset: tracker.dispatched(("t", 0), offset) for offset in (5, 6, 7)}
+        tracker.completed(("t", 0), 7, generations[7])
+        assert tracker.committable() == {}
+        tracker.completed(("t", 0), 5, generations[5])
+        assert tracker.committable() == {("t", 0): 6}
+        tracker.completed(("t", 0), 6, generations[6])
+        assert tracker.committable() == {("t", 0): 8}
+        tracker.mark_committed({("t", 0): 8})
+        assert tracker.committable() == {}
+        
+        # Completions from before a revoke are ignored
+        stale = tracker.dispatched(("t", 0), 8)
+        tracker.revoke([("t", 0)])
+        fresh = tracker.dispatched(("t", 0), 8)
+        tracker.completed(("t", 0), 8, stale)
+        assert tracker.committable() == {}
+        tracker.completed(("t", 0), 8, fresh)
+        assert tracker.committable() == {("t", 0): 9}
+        
+        # A hold caps the position until it is lifted
+        tracker.mark_committed({("t", 0): 9})
+        generation = tracker.dispatched(("t", 0), 9)
+        tracker.completed(("t", 0), 9, generation)
+        assert tracker.committable(holds={("t", 0): 9}) == {}
+        assert tracker.committable(holds={}) == {("t", 0): 10}
+    
+    @pytest.mark.asyncio
+    async def test_slow_partition_does_not_stall_others(self):
+        """Test partitions run concurrently, in order per partition, and are committed after processing"""
+        import asyncio
+        from app.services.partition_workers import PartitionedConsumer
+        
+        runtime = PartitionedConsumer(workers=2, commit_interval=0, batch_size=1, poll_timeout=0)
+        assert runtime.worker_of(("t", 0)) != runtime.worker_of(("t", 1))
+        
+        batches = [[self.make_message(0, 0), self.make_message(1, 0), self.make_message(0, 1),
+                    self.make_message(1, 1)]]
+        consumer = MagicMock()
+        consumer.consume_batch.side_effect = lambda *args: batches.pop(0) if batches else []
+        
+        release = asyncio.Event()
+        handled = []
+        
+        async def handler(messages):
+            for msg in messages:
+                if (msg.partition(), msg.offset()) == (0, 0):
+                    await release.wait()
+                handled.append((msg.partition(), msg.offset()))
+        
+        polls = 0
+        
+        def keep_running():
+            nonlocal polls
+            polls += 1
+            if polls == 5:
+                # Partition 1 finished while partition 0 is still blocked
+                assert handled == [(1, 0), (1, 1)]
+                committed = {}
+                for call in consumer.commit_offsets.call_args_list:
+                    committed.update(call.args[0])
+                assert committed == {("t", 1): 2}
+                release.set()
+            return polls < 8
+        
+        await runtime.run(consumer, handler, keep_running)
+        
+        assert handled.index((0, 0)) < handled.index((0, 1))
+        committed = {}
+        for call in consumer.commit_offsets.call_args_list:
+            committed.update(call.args[0])
+        assert committed == {("t", 0): 2, ("t", 1): 2}
+        assert runtime.stats()["processed"] == 4
+    
+    @pytest.mark.asyncio
+    async def test_failed_batch_retried_before_commit(self):
+        """Test a batch whose handler raises is not committed until a retry succeeds"""
+        from app.services.partition_workers import PartitionedConsumer
+        
+        runtime = PartitionedConsumer(workers=1, commit_interval=0, batch_size=1, poll_timeout=0, retry_backoff=0)
+        batches = [[self.make_message(0, 0)]]
+        consumer = MagicMock()
+        consumer.consume_batch.side_effect = lambda *args: batches.pop(0) if batches else []
+        
+        attempts = []
+        
+        async def handler(messages):
+            attempts.append(messages[0].offset())
+            if len(attempts) == 1:
+                committed = [call.args[0] for call in consumer.commit_offsets.call_args_list]
+                assert committed == []
+                raise RuntimeError("broker hiccup")
+        
+        polls = 0
+        
+        def keep_running():
+            nonlocal polls
+            polls += 1
+            return polls < 5
+        
+        await runtime.run(consumer, handler, keep_running)
+        
+        assert attempts == [0, 0]
+        committed = {}
+        for call in consumer.commit_offsets.call_args_list:
+            committed.update(call.args[0])
+        assert committed == {("t", 0): 1}
+        assert runtime.stats()["failed"] == 1 and runtime.stats()["retries"] == 1
+        consumer.report_lag.assert_called()
+    
+    @pytest.mark.asyncio
+    async def test_backpressure_pauses_one_partition(self):
+        """Test a partition over its in-flight limit is paused and resumed once drained"""
+        import asyncio
+        from app.services.partition_workers import PartitionedConsumer
+        
+        runtime = PartitionedConsumer(workers=2, max_in_flight=2, batch_size=1, poll_timeout=0)
+        batches = [[self.make_message(0, offset) for offset in range(3)] + [self.make_message(1, 0)]]
+        consumer = MagicMock()
+        consumer.consume_batch.side_effect = lambda *args: batches.pop(0) if batches else []
+        
+        polls = 0
+        
+        def keep_running():
+            nonlocal polls
+            polls += 1
+            return polls < 10
+        
+        async def handler(messages):
+            await asyncio.sleep(0)
+        
+        await runtime.run(consumer, handler, keep_running)
+        
+        consumer.pause.assert_called_once_with([("t", 0)])
+        consumer.resume.assert_called_once_with([("t", 0)])
+        assert runtime.stats()["paused"] == []
+
+
+class TestEventTail:
+    """Tests for the live tail of cloudevents-stream"""
+    
+    @staticmethod
+    def encoded(event_id, severity="error"):
+        from app.models import CloudEvent
+        from app.services.kafka_service import serialize_avro
+        
+        event = CloudEvent.create(source="github", type="deploy.failed", subject="api", severity=severity,
+                                  id=event_id, data={"big": "payload"})
+        return serialize_avro(event.to_avro())
+    
+    def test_decodes_batches_and_skips_local_events(self):
+        """Test schemaless and wire-format values decode, local ids are skipped and garbage is counted"""
+        import struct
+        from app.services.event_tail import EventTail
+        
+        tail = EventTail(frame_events=2, connections=MagicMock())
+        tail.remember_local("local-1")
+        values = [
+            self.encoded("remote-1"),
+            b"\x00" + struct.pack(">I", 7) + self.encoded("remote-2", "critical"),
+            self.encoded("local-1"),
+            self.encoded("remote-3", "warning"),
+            b"\xff\xff",
+        ]
+        
+        assert tail.ingest(values) == 3
+        stats = tail.stats()
+        assert stats["skipped_local"] == 1 and stats["decode_errors"] == 1
+        
+        frame = tail.frame()
+        assert frame["type"] == "events_tailed" and frame["count"] == 3
+        assert frame["severity_counts"] == {"critical": 1, "error": 1, "warning": 1, "info": 0}
+        # Newest first, bounded, and without the data payload
+        assert [e["id"] for e in frame["events"]] == ["remote-3", "remote-2"]
+        assert "data" not in frame["events"][0]
+        assert tail.frame() is None
+    
+    def test_local_ids_are_bounded(self):
+        """Test only the most recent local ids are remembered"""
+        from app.services.event_tail import LocalIds
+        
+        ids = LocalIds(capacity=2)
+        for event_id in ("a", "b", "c"):
+            ids.add(event_id)
+        assert "a" not in ids and "b" in ids and "c" in ids and len(ids) == 2
+    
+    @pytest.mark.asyncio
+    async def test_flush_coalesces_into_one_broadcast(self, connection_manager, mock_websocket):
+        """Test events ingested within the flush interval go out as one sequenced frame"""
+        from app.services.event_tail import EventTail
+        
+        await connection_manager.resume(mock_websocket)
+        tail = EventTail(flush_ms=0, connections=connection_manager)
+        tail.ingest([self.encoded(f"r{i}") for i in range(100)])
+        
+        assert await tail.flush() is True
+        assert await tail.flush() is False
+        frame = json.loads(mock_websocket.send_text.call_args_list[-1][0][0])
+        assert frame["type"] == "events_tailed" and frame["count"] == 100 and frame["seq"] == 1
+        # Snapshots of reconnecting clients include tailed events
+        assert '"events_tailed"' in connection_manager.snapshot()[1]
+
+
+class TestScenarioScheduler:
+    """Tests for managed scenario runs"""
+    
+    @staticmethod
+    def recorder():
+        events = []
+        
+        async def publish(event, wait=False):
+            events.append(event)
+            return "success"
+        return events, publish
+    
+    @pytest.mark.asyncio
+    async def test_compressed_run_keeps_event_time_spacing(self):
+        """Test a compressed run finishes at once with events stamped at the full-speed spacing"""
+        import time
+        from app.config import SCENARIOS
+        from app.services.scenario_scheduler import ScenarioScheduler
+        
+        events, publish = self.recorder()
+        scheduler = ScenarioScheduler(connections=AsyncMock())
+        run = scheduler.submit("incident", SCENARIOS["incident"], publish, speed=1000)
+        await run.task
+        
+        assert run.status == "completed" and run.sent == 6
+        assert run.finished_at - run.started_at < 1.0
+        gaps = [b.epoch - a.epoch for a, b in zip(events, events[1:])]
+        assert gaps == pytest.approx([2.0] * 5)
+        # The timeline ends now: nothing is stamped in the future
+        assert events[-1].epoch <= time.time()
+        assert events[-1].epoch == pytest.approx(time.time(), abs=1.0)
+        assert all(e.correlation_id == "incident-001" for e in events)
+    
+    @pytest.mark.asyncio
+    async def test_concurrency_cap_and_cancel(self):
+        """Test runs beyond the cap are rejected and a cancelled run frees its slot"""
+        import asyncio
+        from app.config import SCENARIOS
+        from app.services.scenario_scheduler import ScenarioScheduler, SchedulerFullError
+        
+        events, publish = self.recorder()
+        connections = AsyncMock()
+        scheduler = ScenarioScheduler(max_concurrent=1, connections=connections)
+        run = scheduler.submit("incident", SCENARIOS["incident"], publish)
+        await asyncio.sleep(0.05)
+        
+        with pytest.raises(SchedulerFullError):
+            scheduler.submit("deployment", SCENARIOS["deployment"], publish)
+        
+        assert scheduler.cancel(run.run_id) is run
+        await asyncio.gather(run.task, return_exceptions=True)
+        assert run.task.cancelled()
+        assert run.status == "cancelled" and run.sent == 1
+        completed = connections.broadcast.call_args_list[-1][0][0]
+        assert completed["type"] == "scenario_completed" and completed["status"] == "cancelled"
+        
+        second = scheduler.submit("deployment", SCENARIOS["deployment"], publish, speed=1000)
+        await second.task
+        assert [r["run_id"] for r in scheduler.runs()] == [second.run_id, run.run_id]
+        assert scheduler.stats()["rejected"] == 1
+    
+    def test_distribution_scenarios_send_no_events(self):
+        """Test scenarios without scripted events plan nothing, as before the scheduler"""
+        from app.config import SCENARIOS
+        from app.services.scenario_scheduler import plan_events
+        
+        assert plan_events(SCENARIOS["normal_operations"]) == []
+        assert [offset for offset, _ in plan_events(SCENARIOS["deployment"], interval=2)][:3] == [0, 2, 4]
+
+
+class TestLiveHealth:
+    """Tests for pane-based hopping-window health"""
+
+    NOW = 1_000_000.0  # a pane boundary for 10s slides
+
+    @staticmethod
+    def event(severity, epoch, source="https://github.com/demo", weight=1.0):
+        return {"severity": severity, "source": source, "time": epoch, "sample_weight": weight}
+
+    def test_classification_matches_flink_thresholds(self):
+        """Test the CRITICAL/DEGRADED/WARNING/HEALTHY rules of system_health_5min"""
+        from app.services.live_health import classify
+
+        assert classify(100, 1, 0) == "CRITICAL"
+        assert classify(100, 0, 11) == "DEGRADED"
+        assert classify(100, 0, 10) == "WARNING"
+        assert classify(100, 0, 0) == "HEALTHY"
+        assert classify(0, 0, 0) == "HEALTHY"
+
+    def test_window_hops_pane_by_pane(self):
+        """Test the window sums its panes and drops the oldest as it slides"""
+        from app.services.live_health import HoppingHealth
+
+        health = HoppingHealth(window_seconds=60, slide_seconds=10, connections=AsyncMock())
+        now = self.NOW + 59
+        for i in range(60):
+            assert health.record(self.event("info", self.NOW + i), now=now)
+        assert health.record(self.event("warning", self.NOW + 5, weight=4.0), now=now)
+        assert health.record(self.event("error", self.NOW + 55, source="https://datadog.com/demo"), now=now)
+        assert not health.record(self.event("error", self.NOW - 1), now=now)  # before the window
+
+        window = health.evaluate(now)
+        assert window["total_events"] == 65
+        assert window["total_warnings"] == 4 and window["total_errors"] == 1
+        assert window["total_sources"] == 2
+        assert window["health_status"] == "WARNING"
+        assert health.late == 1
+
+        # One slide later the first pane (10 infos and the warning) has left
+        slid = health.evaluate(now + 10)
+        assert slid["total_events"] == 51 and slid["total_warnings"] == 0
+        assert slid["window_end"] == "1970-01-12T13:47:50+00:00"
+
+    @pytest.mark.asyncio
+    async def test_transitions_are_broadcast_once(self):
+        """Test a status change is broadcast with its trigger, an unchanged status is not"""
+        from app.services.live_health import HoppingHealth
+
+        connections = AsyncMock()
+        health = HoppingHealth(window_seconds=60, slide_seconds=10, connections=connections)
+        now = self.NOW + 30
+        for i in range(9):
+            health.record(self.event("info", self.NOW + i), now=now)
+        assert await health.check(now=now) is None
+
+        health.record(self.event("critical", now - 1, source="https://kubernetes.com/demo"), now=now)
+        message = await health.check("event", now=now)
+        assert message["previous"] == "HEALTHY" and message["trigger"] == "event"
+        assert message["health"]["health_status"] == "CRITICAL"
+        connections.broadcast.assert_awaited_once_with(message)
+        assert await health.check(now=now + 5) is None
+
+        # The critical event's pane expires: back to healthy on the slide
+        message = await health.check(now=now + 60)
+        assert (message["previous"], message["health"]["health_status"]) == ("CRITICAL", "HEALTHY")
+        assert [t["status"] for t in health.transitions] == ["CRITICAL", "HEALTHY"]
+
+    @pytest.mark.asyncio
+    async def test_error_event_wakes_evaluation(self):
+        """Test an error event is evaluated without waiting for the next slide"""
+        import asyncio
+        import time
+        from app.services.live_health import HoppingHealth
+
+        connections = AsyncMock()
+        health = HoppingHealth(window_seconds=3600, slide_seconds=600, connections=connections)
+        health.start()
+        try:
+            health.record(self.event("critical", time.time()))
+            for _ in range(50):
+                if connections.broadcast.await_count:
+                    break
+                await asyncio.sleep(0.01)
+        finally:
+            await health.stop()
+
+        message = connections.broadcast.call_args[0][0]
+        assert message["type"] == "health_changed" and message["trigger"] == "event"
+        assert health.status == "CRITICAL"
+
+
+class TestDatasetGenerator:
+    """Tests for the offline synthetic dataset generator"""
+
+    START = 1_760_313_600.0  # 2025-10-13 00:00 UTC, a Monday
+
+    def test_same_seed_same_dataset(self):
+        """Test generation is deterministic, sorted, in range and exactly sized"""
+        import numpy as np
+        from app.services.dataset_generator import generate
+
+        first = generate(50_000, self.START, days=2, seed=3)
+        second = generate(50_000, self.START, days=2, seed=3)
+        other = generate(50_000, self.START, days=2, seed=4)
+
+        assert len(first) == 50_000
+        for a, b in zip(first[:3], second[:3]):
+            assert np.array_equal(a, b)
+        assert not np.array_equal(first.epoch_ms, other.epoch_ms)
+        assert np.all(np.diff(first.epoch_ms) >= 0)
+        assert first.epoch_ms[0] >= self.START * 1000
+        assert first.epoch_ms[-1] < (self.START + 2 * 86400) * 1000
+
+    def test_traffic_shape_and_incident_cascades(self):
+        """Test the diurnal peak, weekend dip and correlated incident events"""
+        import numpy as np
+        from app.services.dataset_generator import generate, TEMPLATES, PEAK_HOUR
+
+        dataset = generate(200_000, self.START, days=7, seed=1, incidents_per_day=3)
+        hours = (dataset.epoch_ms // 3_600_000) % 24
+        assert np.sum(hours == PEAK_HOUR) > 2 * np.sum(hours == (PEAK_HOUR + 12) % 24)
+        days = (dataset.epoch_ms - int(self.START * 1000)) // 86_400_000
+        assert np.sum(days == 5) < 0.8 * np.sum(days == 2)  # Saturday vs Wednesday
+
+        incidents = dataset.incident[dataset.incident >= 0]
+        assert len(np.unique(incidents)) > 5
+        correlated = dataset.template[dataset.incident == incidents[0]]
+        types = [TEMPLATES[t].type for t in correlated]
+        assert "io.k8s.pod.crash" in types and "com.pagerduty.incident.resolved" in types
+        severities = [TEMPLATES[t].severity for t in dataset.template[dataset.incident < 0]]
+        assert 0.75 < severities.count("info") / len(severities) < 0.85
+
+    def test_ndjson_and_avro_round_trip(self, tmp_path):
+        """Test both writers produce the same schema-valid records"""
+        from app.services.dataset_generator import generate, records, write_ndjson, write_avro, read_records
+
+        dataset = generate(2_500, self.START, days=1, seed=9, incidents_per_day=20)
+        expected = [record for chunk in records(dataset, chunk_size=1_000) for record in chunk]
+
+        ndjson_path, avro_path = tmp_path / "events.ndjson", tmp_path / "events.avro"
+        with open(ndjson_path, "w") as out:
+            assert write_ndjson(dataset, out, chunk_size=1_000) == 2_500
+        assert write_avro(dataset, str(avro_path), chunk_size=1_000) == 2_500
+
+        assert list(read_records(str(ndjson_path))) == expected
+        assert list(read_records(str(avro_path))) == expected
+        assert expected[0]["id"] == "gen-9-0"
+        assert any(r["correlation_id"] and r["correlation_id"].startswith("gen-9-incident-") for r in expected)
+        # Identical datasets give byte-identical files
+        copy_path = tmp_path / "copy.avro"
+        write_avro(dataset, str(copy_path), chunk_size=1_000)
+        assert copy_path.read_bytes() == avro_path.read_bytes()
+
+    def test_bulk_load_retries_full_queue(self, tmp_path):
+        """Test bulk load produces every record as Avro, polling when the queue is full"""
+        from app.services.dataset_generator import generate, write_avro, bulk_load
+        from app.services.kafka_service import deserialize_avro
+
+        path = str(tmp_path / "events.avro")
+        write_avro(generate(100, self.START, days=1, seed=2), path)
+        producer = MagicMock()
+        producer.produce.side_effect = [BufferError()] + [None] * 100
+
+        assert bulk_load(path, producer, "cloudevents-stream", key_function=lambda r: r["id"].encode()) == 100
+        assert producer.produce.call_count == 101
+        producer.poll.assert_any_call(0.1)
+        producer.flush.assert_called_once()
+        last = producer.produce.call_args.kwargs
+        assert last["topic"] == "cloudevents-stream" and last["key"] == b"gen-2-99"
+        assert deserialize_avro(last["value"])["id"] == "gen-2-99"
+
+
+class TestEventSpool:
+    """Tests for the durable local spool"""
+    
+    @staticmethod
+    def make_event(i):
+        return {
+            "id": f"evt-{i}", "type": "test.event", "source": "https://test.com/demo",
+            "time": "2024-01-01T00:00:00Z", "severity": "info", "category": "test",
+        }
+    
+    def test_append_and_deliver_in_order(self, tmp_path):
+        """Test appended events are produced in order and the cursor advances"""
+        from app.services.spool import EventSpool
+        
+        producer_service = MagicMock()
+        producer = producer_service.producer
+        producer.produce.side_effect = lambda **kw: kw["on_delivery"](None, None)
+        
+        spool = EventSpool(directory=str(tmp_path), segment_bytes=200, producer_service=producer_service)
+        for i in range(5):
+            spool.append(self.make_event(i))
+        assert spool.pending_records == 5
+        
+        records = spool.read_batch()
+        delivered = spool._deliver(records)
+        spool.commit(records[delivered - 1].position, delivered)
+        
+        keys = [call.kwargs["key"] for call in producer.produce.call_args_list]
+        assert keys == [f"evt-{i}".encode() for i in range(5)]
+        assert spool.pending_records == 0
+        assert spool.read_batch() == []
+    
+    def test_undelivered_events_survive_restart(self, tmp_path):
+        """Test only acked events are removed; the rest are recovered from disk"""
+        from app.services.spool import EventSpool
+        
+        producer_service = MagicMock()
+        acks = iter([None, None, "broker down"])
+        producer_service.producer.produce.side_effect = lambda **kw: kw["on_delivery"](next(acks, "down"), None)
+        
+        spool = EventSpool(directory=str(tmp_path), producer_service=producer_service)
+        for i in range(4):
+            spool.append(self.make_event(i))
+        records = spool.read_batch()
+        delivered = spool._deliver(records)
+        assert delivered == 2
+        spool.commit(records[delivered - 1].position, delivered)
+        
+        restarted = EventSpool(directory=str(tmp_path), producer_service=MagicMock())
+        restarted.open()
+        assert restarted.pending_records == 2
+        assert [r.key for r in restarted.read_batch()] == [b"evt-2", b"evt-3"]
+    
+    def test_partial_failure_is_not_resent_or_reordered(self, tmp_path):
+        """Test a failed record is retried alone: records acked after it are not produced twice"""
+        from app.services.spool import EventSpool
+        
+        producer_service = MagicMock()
+        producer = producer_service.producer
+        pending, outcomes = [], iter([None, "timed out", None, None])
+        producer.produce.side_effect = lambda **kw: pending.append(kw["on_delivery"])
+        
+        def flush(timeout=None):
+            while pending:
+                pending.pop(0)(next(outcomes, None), None)
+        producer.flush.side_effect = flush
+        
+        spool = EventSpool(directory=str(tmp_path), producer_service=producer_service)
+        for i in range(4):
+            spool.append(self.make_event(i))
+        records = spool.read_batch()
+        assert spool._deliver(records) == 1
+        spool.commit(records[0].position, 1)
+        
+        # Producing stops once a failure is reported
+        failing = iter(["down"])
+        producer.produce.side_effect = lambda **kw: kw["on_delivery"](next(failing, None), None)
+        producer.produce.reset_mock()
+        spool.append(self.make_event(4))
+        assert spool._deliver(spool.read_batch()) == 0
+        assert [c.kwargs["key"] for c in producer.produce.call_args_list] == [b"evt-1"]
+        
+        producer.produce.reset_mock()
+        records = spool.read_batch()
+        assert spool._deliver(records) == 4
+        assert [c.kwargs["key"] for c in producer.produce.call_args_list] == [b"evt-1", b"evt-4"]
+    
+    def test_full_spool_rejects(self, tmp_path):
+        """Test appends fail with SpoolFullError past the size limit"""
+        from app.services.spool import EventSpool, SpoolFullError
+        
+        spool = EventSpool(directory=str(tmp_path), max_bytes=300, producer_service=MagicMock())
+        with pytest.raises(SpoolFullError):
+            for i in range(10):
+                spool.append(self.make_event(i))
+        assert 0 < spool.pending_records < 10
+
+
+class TestEventDeduplicator:
+    """Tests for CloudEvent id deduplication"""
+    
+    def test_detects_resent_ids_per_source(self):
+        """Test the same id is a duplicate only for the same source"""
+        from app.services.dedup import EventDeduplicator
+        
+        dedup = EventDeduplicator(capacity=1000, lru_size=1000)
+        
+        assert dedup.check_and_record("https://github.com/demo", "evt-1") is False
+        assert dedup.check_and_record("https://github.com/demo", "evt-1") is True
+        assert dedup.check_and_record("https://jenkins.com/demo", "evt-1") is False
+        assert dedup.stats()["hit_rate"] == round(1 / 3, 4)
+        
+        # A released key (event not accepted) may be sent again
+        dedup.release("https://github.com/demo", "evt-1")
+        assert dedup.check_and_record("https://github.com/demo", "evt-1") is False
+    
+    @pytest.mark.asyncio
+    async def test_concurrent_copies_published_once(self):
+        """Test two copies of an event racing through a slow spool append produce one event"""
+        import asyncio
+        from app.models import CloudEvent
+        from app.services.dedup import EventDeduplicator
+        
+        async def slow_append(event):
+            await asyncio.sleep(0.01)
+        
+        spool = MagicMock()
+        spool.append_wait = AsyncMock(side_effect=slow_append)
+        with patch('app.routes.events.DEDUP_ENABLED', True), patch('app.routes.events.SHED_ENABLED', False), \
+                patch('app.routes.events.SPOOL_ENABLED', True), patch('app.routes.events.event_spool', spool), \
+                patch('app.routes.events.event_deduplicator', EventDeduplicator(capacity=100, lru_size=100)), \
+                patch('app.routes.events.manager', AsyncMock()):
+            from app.routes.events import publish_event
+            copies = [CloudEvent.create(source="github", type="push", subject="api", severity="info", id="evt-1") for _ in range(2)]
+            statuses = await asyncio.gather(*(publish_event(c, wait=True) for c in copies))
+        
+        assert sorted(statuses) == ["duplicate", "success"]
+        assert spool.append_wait.await_count == 1
+    
+    def test_expired_entries_are_not_duplicates(self):
+        """Test ids older than the window are accepted again"""
+        from app.services.dedup import EventDeduplicator
+        
+        dedup = EventDeduplicator(window_seconds=60, capacity=1000, lru_size=1000)
+        with patch('app.services.dedup.time.monotonic', return_value=1000.0):
+            dedup.record("src", "evt-1")
+        with patch('app.services.dedup.time.monotonic', return_value=1100.0):
+            assert dedup.is_duplicate("src", "evt-1") is False
+    
+    def test_bloom_false_positive_rate_bounded(self):
+        """Test the Bloom filter stays near its configured error rate"""
+        from app.services.dedup import RotatingBloomFilter
+        
+        bloom = RotatingBloomFilter(capacity=10_000, error_rate=0.01, rotate_seconds=3600)
+        for i in range(10_000):
+            bloom.add(f"seen-{i}".encode())
+        
+        assert all(bloom.contains(f"seen-{i}".encode()) for i in range(10_000))
+        false_positives = sum(bloom.contains(f"new-{i}".encode()) for i in range(10_000))
+        assert false_positives < 300
+
+
+class TestPartitioning:
+    """Tests for producer message key strategies"""
+    
+    EVENT = {
+        "id": "evt-1",
+        "source": "https://github.com/demo",
+        "subject": "Push to main branch",
+        "correlation_id": "incident-42",
+    }
+    
+    def test_correlated_events_share_a_key(self):
+        """Test the correlation strategy keys by correlation_id and leaves others unkeyed"""
+        from app.services.partitioning import partition_key
+        
+        other = {**self.EVENT, "id": "evt-2", "source": "https://jenkins.com/demo"}
+        assert partition_key(self.EVENT, "correlation") == b"incident-42"
+        assert partition_key(other, "correlation") == b"incident-42"
+        assert partition_key({**self.EVENT, "correlation_id": None}, "correlation") is None
+    
+    def test_source_subject_key_is_stable_digest(self):
+        """Test source+subject keys are fixed-size and ignore the event id"""
+        from app.services.partitioning import partition_key
+        
+        key = partition_key(self.EVENT, "source_subject")
+        assert len(key) == 8
+        assert partition_key({**self.EVENT, "id": "evt-9"}, "source_subject") == key
+        assert partition_key({**self.EVENT, "subject": "PR merged"}, "source_subject") != key
+    
+    def test_unknown_strategy_falls_back_to_id(self):
+        """Test an unknown strategy keys by event id"""
+        from app.services.partitioning import partition_key
+        
+        assert partition_key(self.EVENT, "bogus") == b"evt-1"
+        assert partition_key(self.EVENT, "sticky") is None
+    
+    def test_partition_for_matches_crc32(self):
+        """Test keyed placement is deterministic and unkeyed placement is left to the producer"""
+        import zlib
+        from app.services.partitioning import partition_for
+        
+        assert partition_for(b"incident-42", 6) == zlib.crc32(b"incident-42") % 6
+        assert partition_for(None, 6) is None
+
+
+class TestTimeSeriesStore:
+    """Tests for the ring-array time-series rollups"""
+    
+    NOW = 1_700_000_005.0
+    
+    def _event(self, source="https://github.com/demo", severity="info", offset=0.0, weight=None):
+        from datetime import datetime, timezone
+        event = {
+            "source": source,
+            "severity": severity,
+            "time": datetime.fromtimestamp(self.NOW + offset, tz=timezone.utc).isoformat(),
+        }
+        if weight is not None:
+            event["sample_weight"] = weight
+        return event
+    
+    def test_counts_land_in_their_buckets(self):
+        """Test events are counted per source at every resolution"""
+        from app.services.timeseries import TimeSeriesStore
+        
+        store = TimeSeriesStore({"10s": (10.0, 6), "1m": (60.0, 5)}, max_series=8)
+        store.record(self._event(offset=-25), now=self.NOW)
+        store.record(self._event(offset=-1), now=self.NOW)
+        store.record(self._event(source="https://jenkins.com/demo", severity="error"), now=self.NOW)
+        
+        result = store.query(60, "10s", now=self.NOW)
+        assert result["series"]["https://github.com/demo"][-1] == 1.0
+        assert result["series"]["https://github.com/demo"][-3] == 1.0
+        assert result["total"] == 3.0
+        assert len(result["timestamps"]) == 6
+        
+        by_severity = store.query(300, "1m", by="severity", now=self.NOW)
+        assert sum(by_severity["series"]["info"]) == 2.0
+        assert sum(by_severity["series"]["error"]) == 1.0
+    
+    def test_filters_and_sample_weight(self):
+        """Test source/severity filters and weighted counts"""
+        from app.services.timeseries import TimeSeriesStore
+        
+        store = TimeSeriesStore({"10s": (10.0, 6)}, max_series=8)
+        store.record(self._event(weight=4.0), now=self.NOW)
+        store.record(self._event(severity="critical"), now=self.NOW)
+        store.record(self._event(source="https://jenkins.com/demo"), now=self.NOW)
+        
+        result = store.query(60, source="https://github.com/demo", severity="INFO", now=self.NOW)
+        assert result["series"] == {"https://github.com/demo": [0.0] * 5 + [4.0]}
+    
+    def test_ring_reuses_slots_and_drops_expired_events(self):
+        """Test old buckets are overwritten and events older than the ring are ignored"""
+        from app.services.timeseries import TimeSeriesStore
+        
+        store = TimeSeriesStore({"10s": (10.0, 3)}, max_series=4)
+        store.record(self._event(offset=-30), now=self.NOW - 30)
+        assert store.query(30, now=self.NOW - 30)["total"] == 1.0
+        store.record(self._event(), now=self.NOW)
+        assert store.query(30, now=self.NOW)["total"] == 1.0
+        
+        # 30s ago maps to the slot the current bucket now owns
+        assert store.record(self._event(offset=-30), now=self.NOW) is False
+        assert store.query(30, now=self.NOW)["total"] == 1.0
+    
+    def test_series_cap_and_resolution_choice(self):
+        """Test new series beyond the cap are dropped and the finest covering ring is picked"""
+        from app.services.timeseries import TimeSeriesStore, parse_duration
+        
+        store = TimeSeriesStore({"10s": (10.0, 360), "1m": (60.0, 1440)}, max_series=1)
+        assert store.record(self._event(), now=self.NOW) is True
+        assert store.record(self._event(severity="error"), now=self.NOW) is False
+        assert store.stats()["dropped"] == 1
+        assert store.pick_resolution(parse_duration("1h")) == "10s"
+        assert store.pick_resolution(parse_duration("24h")) == "1m"
+        assert store.pick_resolution(parse_duration("30d")) == "1m"
+        with pytest.raises(ValueError):
+            parse_duration("yesterday")
+
+
+class TestHeavyHitters:
+    """Tests for Space-Saving top-K tracking"""
+    
+    NOW = 1_700_000_040.0
+    
+    def _event(self, subject, severity="error", offset=0.0, source="https://jenkins.com/demo"):
+        return {
+            "subject": subject,
+            "type": "com.jenkins.build.failure",
+            "source": source,
+            "severity": severity,
+            "time": self.NOW + offset,
+        }
+    
+    def test_space_saving_keeps_heavy_items_with_bounded_error(self):
+        """Test frequent items survive a long tail and counts are upper bounds"""
+        import random
+        from app.services.heavy_hitters import SpaceSaving
+        
+        rng = random.Random(7)
+        summary = SpaceSaving(capacity=10)
+        stream = ["db-down"] * 300 + ["disk-full"] * 150 + [f"noise-{i}" for i in range(2000)]
+        rng.shuffle(stream)
+        for item in stream:
+            summary.add(item)
+        
+        top = summary.top(2)
+        assert [entry["value"] for entry in top] == ["db-down", "disk-full"]
+        assert top[0]["min_count"] <= 300 <= top[0]["count"]
+        assert len(summary.counts) == 10
+    
+    def test_merge_preserves_upper_bounds(self):
+        """Test merged summaries never undercount an item"""
+        from app.services.heavy_hitters import SpaceSaving
+        
+        left, right = SpaceSaving(2), SpaceSaving(2)
+        for item in ["a", "a", "a", "b", "c"]:
+            left.add(item)
+        for item in ["b", "b", "b", "a", "d"]:
+            right.add(item)
+        
+        merged = {e["value"]: e for e in SpaceSaving.merge([left, right], 2).top(2)}
+        assert merged["a"]["count"] >= 4 and merged["b"]["count"] >= 4
+        assert merged["a"]["min_count"] <= 4 and merged["b"]["min_count"] <= 4
+    
+    def test_sliding_window_and_severity_filter(self):
+        """Test only error/critical events count and old panes expire"""
+        from app.services.heavy_hitters import SlidingHeavyHitters
+        
+        hitters = SlidingHeavyHitters(capacity=8, pane_seconds=60, retention_seconds=300)
+        hitters.record(self._event("Build #143 failed", offset=-240), now=self.NOW)
+        for _ in range(3):
+            hitters.record(self._event("Database connection failed", severity="critical"), now=self.NOW)
+        hitters.record(self._event("Push to main", severity="info"), now=self.NOW)
+        
+        assert [e["value"] for e in hitters.recent("subject", 5, 60, now=self.NOW)] == ["Database connection failed"]
+        assert len(hitters.recent("subject", 5, 300, now=self.NOW)) == 2
+        assert hitters.recent("source", 1, 300, now=self.NOW)[0]["count"] == 4
+        
+        # Ten minutes later the old panes have been dropped
+        later = self.NOW + 600
+        hitters.record(self._event("Pod crashed", offset=600), now=later)
+        assert [e["value"] for e in hitters.recent("subject", 5, 300, now=later)] == ["Pod crashed"]
+        assert hitters.record(self._event("stale", offset=-600), now=later) is False
+    
+    def test_top_offenders_reach_the_prompt(self):
+        """Test per-window offenders are attached to escalated summaries and rendered"""
+        from app.services.heavy_hitters import SlidingHeavyHitters
+        from app.services.insight_pipeline import InsightPipeline
+        from app.services.ai_service import build_prompt
+        
+        hitters = SlidingHeavyHitters(capacity=8, pane_seconds=60, retention_seconds=600)
+        hitters.record(self._event("Database connection failed"), now=self.NOW)
+        summary = {"window_start": self.NOW - 40, "window_end": self.NOW + 260, "critical_count": 5}
+        
+        pipeline = InsightPipeline(llm=MagicMock(), rules=MagicMock(), hitters=hitters)
+        with patch('app.services.insight_pipeline.HEAVY_HITTERS_PROMPT_K', 3):
+            pipeline._add_top_offenders([summary])
+        
+        assert summary["top_offenders"]["subject"][0]["value"] == "Database connection failed"
+        assert "Subjects: Database connection failed (1)" in build_prompt(summary)
+        assert hitters.for_window(self.NOW - 3600, self.NOW - 3300, 3) is None
+
+
+class TestWindowSketches:
+    """Tests for HyperLogLog, reservoir and per-window sketches"""
+    
+    NOW = 1_700_000_100.0
+    
+    def test_hyperloglog_accuracy_and_merge(self):
+        """Test HLL estimates within a few standard errors and merges losslessly"""
+        from app.services.sketches import HyperLogLog
+        
+        left, right = HyperLogLog(12), HyperLogLog(12)
+        for i in range(20_000):
+            left.add(f"subject-{i}")
+        for i in range(10_000, 30_000):
+            right.add(f"subject-{i}")
+        
+        assert abs(left.count() - 20_000) < 20_000 * 0.05
+        union = HyperLogLog.from_bytes(left.to_bytes()).merge(right)
+        assert abs(union.count() - 30_000) < 30_000 * 0.05
+        assert len(union.registers) == 4096
+        with pytest.raises(ValueError):
+            left.merge(HyperLogLog(10))
+    
+    def test_reservoir_is_bounded_and_merges(self):
+        """Test reservoirs keep at most `size` items and merge in proportion to what they saw"""
+        import random
+        from app.services.sketches import Reservoir
+        
+        rng = random.Random(3)
+        big, small = Reservoir(10, rng), Reservoir(10, rng)
+        for i in range(10_000):
+            big.add(f"big-{i}")
+        for i in range(10):
+            small.add(f"small-{i}")
+        
+        assert len(big.items) == 10 and big.seen == 10_000
+        big.merge(small)
+        assert big.seen == 10_010
+        assert sum(item.startswith("big") for item in big.items) == 10
+    
+    def test_store_summarizes_windows_and_merges_exports(self):
+        """Test per-window summaries, source filtering and merging an exported sketch"""
+        from app.services.sketches import WindowSketchStore
+        
+        store = WindowSketchStore(window_seconds=300, retained_windows=2, precision=10, reservoir_size=5)
+        for i in range(50):
+            store.record({"source": "a", "type": f"t{i % 3}", "subject": f"s{i}", "correlation_id": "inc-1",
+                          "time": self.NOW}, now=self.NOW)
+        store.record({"source": "b", "type": "t9", "subject": "s0", "time": self.NOW}, now=self.NOW)
+        
+        window = store.windows()[0]
+        assert window["events"] == 51
+        assert window["unique_types"] == 4
+        assert 48 <= window["unique_subjects"] <= 52
+        assert window["unique_correlations"] == 1
+        assert len(window["sample_subjects"]) <= 5
+        assert store.windows(source="b")[0]["unique_types"] == 1
+        
+        exported = store.windows(export=True)[0]["sketches"]["b"]
+        other = WindowSketchStore(window_seconds=300, retained_windows=2, precision=10, reservoir_size=5)
+        assert other.merge_in(window["window_start"], "b", exported) is True
+        assert other.windows()[0]["unique_types"] == 1
+        
+        # Two windows later the first one has expired
+        later = self.NOW + 600
+        store.record({"source": "a", "type": "t0", "time": later}, now=later)
+        assert store.record({"source": "a", "type": "t0", "time": self.NOW}, now=later) is False
+        assert store.windows(limit=5, combine=True)[0]["events"] == 1
+
+
+class TestLoadShedder:
+    """Tests for sampling and adaptive load shedding"""
+    
+    def _event(self, severity, event_type="io.k8s.pod.started", time=None):
+        event = {"source": "https://kubernetes.com/demo", "type": event_type, "severity": severity}
+        if time is not None:
+            event["time"] = time
+        return event
+    
+    def test_errors_never_shed_under_pressure(self):
+        """Test critical and error events pass even when heavily overloaded"""
+        import random
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(info_sample_rate=0.1, bucket_rate=0, bucket_burst=0,
+                              queue_depth=lambda: 10**9, rng=random.Random(1))
+        for i in range(100):
+            for severity in ("critical", "error"):
+                decision = shedder.decide(self._event(severity), now=10.0 + i)
+                assert decision.admit and decision.sample_weight == 1.0
+    
+    def test_info_sampling_keeps_weighted_count_unbiased(self):
+        """Test kept info events carry 1/rate so weighted totals match the input"""
+        import random
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(info_sample_rate=0.2, bucket_rate=1e9, bucket_burst=1e9,
+                              queue_depth=lambda: 0, rng=random.Random(7))
+        decisions = [shedder.decide(self._event("info"), now=10.0) for _ in range(20_000)]
+        kept = [d for d in decisions if d.admit]
+        
+        assert all(d.sample_weight == pytest.approx(5.0) for d in kept)
+        assert sum(d.sample_weight for d in kept) == pytest.approx(20_000, rel=0.05)
+        assert shedder.stats()["shed"]["sampled"] == 20_000 - len(kept)
+    
+    def test_rate_limited_weight_carried_forward(self):
+        """Test events refused by a bucket are folded into the next admitted event"""
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(bucket_rate=1, bucket_burst=2, queue_depth_threshold=100,
+                              queue_depth=lambda: 200)
+        at = "2026-01-01T00:01:00Z"
+        decisions = [shedder.decide(self._event("warning", time=at), now=10.0) for _ in range(5)]
+        assert [d.admit for d in decisions] == [True, True, False, False, False]
+        
+        # Refill is halved at pressure 2
+        later = shedder.decide(self._event("warning", time=at), now=12.0)
+        assert later.admit and later.sample_weight == 4.0
+    
+    def test_no_rate_limit_without_pressure(self):
+        """Test warnings are only rate limited while the producer is overloaded"""
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(bucket_rate=1, bucket_burst=2, queue_depth=lambda: 0)
+        decisions = [shedder.decide(self._event("warning"), now=10.0) for _ in range(50)]
+        assert all(d.admit and d.sample_weight == 1.0 for d in decisions)
+        assert shedder.stats()["shed"]["rate_limited"] == 0
+    
+    def test_stranded_weight_flushed_as_record(self):
+        """Test weight nobody picked up is published as a zero-payload record"""
+        from app.models import _parse_time
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(bucket_rate=0, bucket_burst=50, queue_depth_threshold=100,
+                              queue_depth=lambda: 200, carry_flush_seconds=2)
+        at = "2026-01-01T00:01:00Z"
+        admitted = [d.sample_weight for d in
+                    (shedder.decide(self._event("warning", time=at), now=10.0) for _ in range(300)) if d.admit]
+        assert len(admitted) == 50
+        assert shedder.flush_carried(now=11.0) == []
+        
+        records = shedder.flush_carried(now=12.0)
+        assert len(records) == 1
+        record = records[0]
+        assert record.data is None and record.severity == "warning"
+        assert record.epoch == _parse_time(at)
+        assert sum(admitted) + record.sample_weight == 300
+        assert shedder.stats()["carried_weight"] == 0
+    
+    def test_carried_weight_stays_in_its_window(self):
+        """Test weight refused in one window never rides on an event in the next"""
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(bucket_rate=1, bucket_burst=1, queue_depth_threshold=100,
+                              queue_depth=lambda: 200)
+        first, second = "2026-01-01T00:04:59Z", "2026-01-01T00:05:01Z"
+        assert shedder.decide(self._event("warning", time=first), now=10.0).admit
+        assert not shedder.decide(self._event("warning", time=first), now=10.0).admit
+        
+        later = shedder.decide(self._event("warning", time=second), now=12.0)
+        assert later.admit and later.sample_weight == 1.0
+        
+        records = shedder.flush_carried(force=True)
+        assert [r.sample_weight for r in records] == [1.0]
+        assert records[0].time.startswith("2026-01-01T00:04:59")
+    
+    def test_weight_records_reach_local_rollups(self):
+        """Test flushed weight is counted locally as well as published"""
+        from app.services.load_shedding import LoadShedder
+        
+        shedder = LoadShedder(bucket_rate=0, bucket_burst=1, queue_depth_threshold=100, queue_depth=lambda: 200)
+        for _ in range(4):
+            shedder.decide(self._event("warning", time="2026-01-01T00:01:00Z"), now=10.0)
+        record, = shedder.flush_carried(force=True)
+        
+        with patch('app.routes.events.kafka_producer') as producer, \
+                patch('app.routes.events.timeseries_store') as timeseries, \
+                patch('app.routes.events.live_health') as health:
+            from app.routes.events import publish_weight_record
+            publish_weight_record(record)
+        
+        producer.produce_event.assert_called_once_with(record)
+        timeseries.record.assert_called_once_with(record)
+        health.record.assert_called_once_with(record)
+        assert record.sample_weight == 3.0
+    
+    def test_queue_depth_tightens_sampling(self):
+        """Test the info sample rate drops when the producer queue backs up"""
+        from app.services.load_shedding import LoadShedder
+        
+        depth = {"value": 0}
+        shedder = LoadShedder(info_sample_rate=1.0, min_sample_rate=0.05, queue_depth_threshold=100,
+                              queue_depth=lambda: depth["value"])
+        shedder.decide(self._event("info"), now=10.0)
+        assert shedder.effective_sample_rate == 1.0
+        
+        depth["value"] = 400
+        shedder.decide(self._event("info"), now=11.0)
+        assert shedder.pressure == 4.0
+        assert shedder.effective_sample_rate == 0.25
+        
+        depth["value"] = 10**6
+        shedder.decide(self._event("info"), now=12.0)
+        assert shedder.effective_sample_rate == 0.05
+
+
+class TestLoopMonitor:
+    """Tests for the event-loop lag monitor"""
+    
+    @pytest.mark.asyncio
+    async def test_blocking_call_recorded_with_stack(self):
+        """Test a callback that blocks the loop is recorded with the blocking frame"""
+        import asyncio
+        import time
+        from app.services.loop_monitor import LoopMonitor
+        
+        def block_the_loop():
+            time.sleep(0.3)
+        
+        monitor = LoopMonitor(interval=0.02, slow_threshold_ms=100)
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            block_the_loop()
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+        
+        assert monitor.slow_count == 1
+        slow = monitor.slow_callbacks[0]
+        assert slow["duration_ms"] >= 200
+        assert any("block_the_loop" in line for line in slow["stack"])
+        assert monitor.stats()["lag_ms"]["count"] >= 2
+    
+    def test_sample_profile_returns_folded_stacks(self):
+        """Test the sampling profiler sees other threads' frames"""
+        import threading
+        import time
+        from app.services.loop_monitor import sample_profile, format_folded
+        
+        def busy_worker(stop):
+            while not stop.is_set():
+                time.sleep(0.001)
+        
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_worker, args=(stop,), name="busy")
+        worker.start()
+        try:
+            folded = sample_profile(0.1, hz=200)
+        finally:
+            stop.set()
+            worker.join()
+        
+        assert any(stack.startswith("busy;") and "busy_worker" in stack for stack in folded)
+        line = format_folded(folded).splitlines()[0]
+        assert line.rsplit(" ", 1)[1].isdigit()
+
+
+class TestStartupWarmUp:
+    """Tests for the parallel lifespan warm-up"""
+    
+    @pytest.mark.asyncio
+    async def test_steps_run_in_parallel_and_failures_are_contained(self):
+        """Test warm-up steps overlap, failures are skipped and slow steps do not block"""
+        import time
+        from app.services import startup
+        
+        def broken():
+            raise RuntimeError("broker down")
+        
+        steps = [
+            ("a", lambda: time.sleep(0.1)),
+            ("b", lambda: time.sleep(0.1)),
+            ("broken", broken),
+            ("slow", lambda: time.sleep(0.5)),
+        ]
+        with patch.object(startup, 'warmup_steps', return_value=steps):
+            start = time.perf_counter()
+            timings = await startup.warm_up(timeout=0.3)
+            elapsed = time.perf_counter() - start
+        
+        assert set(timings) == {"a", "b"}
+        assert elapsed < 0.45
+    
+    def test_import_does_not_load_heavy_sdks(self):
+        """Test importing the app leaves optional SDKs unloaded until first use"""
+        import subprocess
+        import sys
+        from pathlib import Path
+        
+        code = (
+            "import sys, app; "
+            "print([m for m in ('httpx', 'fastavro', 'confluent_kafka.schema_registry') if m in sys.modules])"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=Path(__file__).parent.parent,
+            capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip().splitlines()[-1] == "[]"
+
+
+class TestKafkaClientPool:
+    """Tests for the lifespan-managed Kafka client pool"""
+    
+    def _producer(self, topics=None, error=None):
+        from app.config import CLOUDEVENTS_TOPIC
+        producer = MagicMock()
+        producer.fatal_error = None
+        producer.queue_depth.return_value = 0
+        producer.close.return_value = 0
+        if error is not None:
+            producer.cluster_topics.side_effect = error
+        else:
+            producer.cluster_topics.return_value = topics or {CLOUDEVENTS_TOPIC}
+        return producer
+    
+    @pytest.mark.asyncio
+    async def test_ready_after_metadata_check(self):
+        """Test readiness follows broker metadata"""
+        from app.services.kafka_pool import KafkaClientPool
+        
+        pool = KafkaClientPool(producer=self._producer(), reader_count=1)
+        assert pool.ready is False
+        assert await pool.check_health() is True
+        assert pool.ready is True
+        
+        missing_topic = KafkaClientPool(producer=self._producer(topics={"other"}), reader_count=1)
+        assert await missing_topic.check_health() is False
+        assert "not found" in missing_topic.last_error
+    
+    @pytest.mark.asyncio
+    async def test_reconnects_after_repeated_failures(self):
+        """Test the producer is rebuilt after max_failures failed checks or a fatal error"""
+        from app.services.kafka_pool import KafkaClientPool
+        
+        producer = self._producer(error=RuntimeError("all brokers down"))
+        pool = KafkaClientPool(producer=producer, reader_count=1, max_failures=3)
+        for _ in range(3):
+            await pool.check_health()
+        assert producer.reconnect.call_count == 1
+        assert pool.reconnects == 1 and pool.ready is False
+        
+        healthy = self._producer()
+        healthy.fatal_error = "sequence lost"
+        pool = KafkaClientPool(producer=healthy, reader_count=1)
+        await pool.check_health()
+        healthy.reconnect.assert_called_once()
+    
+    @pytest.mark.asyncio
+    async def test_reader_lease_waits_and_replaces_broken_readers(self):
+        """Test readers are leased exclusively and a failing reader is replaced"""
+        import asyncio
+        from confluent_kafka import KafkaError, KafkaException
+        from app.services.kafka_pool import KafkaClientPool
+        
+        pool = KafkaClientPool(producer=self._producer(), reader_count=1)
+        
+        async def lease():
+            async with pool.reader() as reader:
+                return reader
+        
+        held = pool.reader()
+        first = await held.__aenter__()
+        waiter = asyncio.create_task(lease())
+        await asyncio.sleep(0.01)
+        assert not waiter.done()
+        await held.__aexit__(None, None, None)
+        assert await waiter is first
+        
+        # A bug in the caller's body does not cost the pooled consumer
+        with pytest.raises(RuntimeError):
+            async with pool.reader():
+                raise RuntimeError("route bug")
+        async with pool.reader() as reader:
+            assert reader is first
+        
+        with pytest.raises(KafkaException):
+            async with pool.reader():
+                raise KafkaException(KafkaError(KafkaError._TRANSPORT))
+        async with pool.reader() as replacement:
+            assert replacement is not first
+    
+    @pytest.mark.asyncio
+    async def test_drain_flushes_and_refuses_new_leases(self):
+        """Test drain flushes the producer with a timeout and stops leasing"""
+        from app.services.kafka_pool import KafkaClientPool, PoolDrainingError
+        
+        producer = self._producer()
+        pool = KafkaClientPool(producer=producer, reader_count=1)
+        await pool.check_health()
+        
+        assert await pool.drain(timeout=3.0) == 0
+        producer.close.assert_called_once_with(3.0)
+        assert pool.ready is False
+        with pytest.raises(PoolDrainingError):
+            async with pool.reader():
+                pass
+    
+    def test_reader_reads_latest_without_group_join(self):
+        """Test read_latest assigns partitions at high - limit and never subscribes"""
+        from app.services.kafka_service import KafkaConsumerService
+        
+        metadata = MagicMock()
+        metadata.topics = {"summaries": MagicMock(error=None, partitions={0: None, 1: None})}
+        consumer = MagicMock()
+        consumer.list_topics.return_value = metadata
+        consumer.get_watermark_offsets.side_effect = lambda tp, timeout: (0, 10) if tp.partition == 0 else (0, 0)
+        
+        def message(offset):
+            msg = MagicMock()
+            msg.error.return_value = None
+            msg.partition.return_value = 0
+            msg.offset.return_value = offset
+            return msg
+        consumer.consume.return_value = [message(7), message(8), message(9)]
+        consumer.position.side_effect = lambda tps: [MagicMock(partition=tp.partition, offset=10) for tp in tps]
+        
+        reader = KafkaConsumerService(subscribe=False)
+        reader._consumer = consumer
+        messages = reader.read_latest("summaries", limit=3, timeout=2.0)
+        
+        assert [m.offset() for m in messages] == [7, 8, 9]
+        (assigned,), _ = consumer.assign.call_args
+        assert [(tp.partition, tp.offset) for tp in assigned] == [(0, 7)]
+        consumer.unassign.assert_called_once()
+        consumer.subscribe.assert_not_called()
+    
+    def test_reader_stops_at_undelivered_transaction_marker(self):
+        """Test read_latest finishes by position when the last offset is a commit marker"""
+        import time
+        from app.services.kafka_service import KafkaConsumerService
+        
+        metadata = MagicMock()
+        metadata.topics = {"summaries": MagicMock(error=None, partitions={0: None})}
+        consumer = MagicMock()
+        consumer.list_topics.return_value = metadata
+        # Offsets 0-8 hold records, 9 the transaction commit marker
+        consumer.get_watermark_offsets.return_value = (0, 10)
+        msg = MagicMock()
+        msg.error.return_value = None
+        msg.partition.return_value = 0
+        msg.offset.return_value = 8
+        consumer.consume.side_effect = [[msg], [], []]
+        consumer.position.side_effect = lambda tps: [MagicMock(partition=tp.partition, offset=10) for tp in tps]
+        
+        reader = KafkaConsumerService(subscribe=False)
+        reader._consumer = consumer
+        started = time.monotonic()
+        assert reader.read_latest("summaries", limit=2, timeout=5.0) == [msg]
+        assert time.monotonic() - started < 1.0
+        assert consumer.consume.call_count == 1
@@ -2,13 +2,13 @@ import { Header, StatsGrid, ScenarioPanel, EventForm, EventStream, AIInsights }
 import useWebSocket from './hooks/useWebSocket';
 
 const EventStreamDemo = () => {
-    const { events, alerts, stats, isConnected, activeScenario } = useWebSocket();
+    const { events, alerts, stats, isConnected, activeScenario, health } = useWebSocket();
 
     return (
         <div className="min-h-screen bg-gradient-to-br from-slate-900 via-slate-800 to-slate-900 text-white p-6">
             {/* Header */}
             <div className="mb-8">
-                <Header isConnected={isConnected} />
+                <Header isConnected={isConnected} health={health} />
                 <StatsGrid stats={stats} />
             </div>
 
@@ -1,6 +1,7 @@
 import { Zap } from 'lucide-react';
+import { getHealthColor } from '../../constants';
 
-const Header = ({ isConnected }) => {
+const Header = ({ isConnected, health }) => {
     return (
         <div className="flex items-center justify-between mb-4">
             <div className="flex items-center gap-3">
@@ -14,11 +15,19 @@ const Header = ({ isConnected }) => {
                     <p className="text-slate-400">Live Demo - Confluent + Vertex AI</p>
                 </div>
             </div>
-            <div className={`flex items-center gap-2 px-4 py-2 rounded-lg ${isConnected ? 'bg-green-500/20 border border-green-500/30' : 'bg-red-500/20 border border-red-500/30'}`}>
-                <div className={`w-2 h-2 rounded-full ${isConnected ? 'bg-green-500 animate-pulse' : 'bg-red-500'}`}></div>
-                <span className={`text-sm font-medium ${isConnected ? 'text-green-400' : 'text-red-400'}`}>
-                    {isConnected ? 'Connected' : 'Disconnected'}
-                </span>
+            <div className="flex items-center gap-3">
+                {health && (
+                    <div className="flex items-center gap-2 px-4 py-2 rounded-lg bg-slate-800/50 border border-slate-700" title={`Last 5 min: ${health.total_events} events, ${health.error_rate_percent}% errors`}>
+                        <span className="text-sm text-slate-400">System</span>
+                        <span className={`text-sm font-bold ${getHealthColor(health.health_status)}`}>{health.health_status}</span>
+                    </div>
+                )}
+                <div className={`flex items-center gap-2 px-4 py-2 rounded-lg ${isConnected ? 'bg-green-500/20 border border-green-500/30' : 'bg-red-500/20 border border-red-500/30'}`}>
+                    <div className={`w-2 h-2 rounded-full ${isConnected ? 'bg-green-500 animate-pulse' : 'bg-red-500'}`}></div>
+                    <span className={`text-sm font-medium ${isConnected ? 'text-green-400' : 'text-red-400'}`}>
+                        {isConnected ? 'Connected' : 'Disconnected'}
+                    </span>
+                </div>
             </div>
         </div>
     );
@@ -1,9 +1,15 @@
 import { useState, useEffect, useRef } from 'react';
-import { WS_URL } from '../constants';
+import { API_URL, WS_URL } from '../constants';
+
+// Base reconnect delay; a random jitter spreads reconnects after a server restart
+const RECONNECT_DELAY_MS = 3000;
+const RECONNECT_JITTER_MS = 2000;
 
 /**
  * Custom hook for WebSocket connection management
- * Handles connection, reconnection, and message processing
+ * Handles connection, reconnection, and message processing.
+ * On reconnect it resumes from the last frame seen (?since=<seq>), so the
+ * server replays missed frames or sends a snapshot when the gap is too old.
  */
 export const useWebSocket = () => {
     const [events, setEvents] = useState([]);
@@ -11,10 +17,90 @@ export const useWebSocket = () => {
     const [stats, setStats] = useState({ total: 0, critical: 0, errors: 0, warnings: 0 });
     const [isConnected, setIsConnected] = useState(false);
     const [activeScenario, setActiveScenario] = useState(null);
+    const [health, setHealth] = useState(null);
     const wsRef = useRef(null);
     const reconnectTimeoutRef = useRef(null);
+    const lastSeqRef = useRef(null);
+    const streamRef = useRef(null);
 
     useEffect(() => {
+        const handleMessage = (data) => {
+            // Frames already applied (e.g. sent live while a replay was in flight)
+            if (data.seq !== undefined) {
+                if (lastSeqRef.current !== null && data.seq <= lastSeqRef.current) {
+                    return;
+                }
+                lastSeqRef.current = data.seq;
+            }
+
+            if (data.type === 'event_sent') {
+                setEvents(prev => [data.event, ...prev].slice(0, 50));
+                setStats(prev => ({
+                    total: prev.total + 1,
+                    critical: prev.critical + (data.event.severity === 'critical' ? 1 : 0),
+                    errors: prev.errors + (data.event.severity === 'error' ? 1 : 0),
+                    warnings: prev.warnings + (data.event.severity === 'warning' ? 1 : 0)
+                }));
+            } else if (data.type === 'events_tailed') {
+                // Coalesced events from other producers: newest sample plus counts of all
+                const counts = data.severity_counts || {};
+                setEvents(prev => [...data.events, ...prev].slice(0, 50));
+                setStats(prev => ({
+                    total: prev.total + data.count,
+                    critical: prev.critical + (counts.critical || 0),
+                    errors: prev.errors + (counts.error || 0),
+                    warnings: prev.warnings + (counts.warning || 0)
+                }));
+            } else if (data.type === 'ai_insight_partial') {
+                // Streamed insight text: show it on a placeholder alert for the window
+                setAlerts(prev => {
+                    const partial = { window_start: data.window_start, window_end: data.window_end, ai_insight: { status: 'streaming', insight: data.text } };
+                    const rest = prev.filter(a => !(a.ai_insight?.status === 'streaming' && a.window_start === data.window_start));
+                    return [partial, ...rest].slice(0, 10);
+                });
+            } else if (data.type === 'ai_alert') {
+                setAlerts(prev => [
+                    data.summary,
+                    ...prev.filter(a => !(a.ai_insight?.status === 'streaming' && a.window_start === data.summary.window_start))
+                ].slice(0, 10));
+            } else if (data.type === 'scenario_started') {
+                setActiveScenario(data.scenario);
+            } else if (data.type === 'scenario_completed') {
+                setActiveScenario(null);
+            } else if (data.type === 'health_changed') {
+                // Live status over the hopping window, pushed on every change
+                setHealth(data.health);
+            }
+        };
+
+        const handleFrame = (data) => {
+            if (data.type === 'hello') {
+                // A new stream id means the server restarted: its seq starts over
+                if (streamRef.current !== data.stream) {
+                    streamRef.current = data.stream;
+                    lastSeqRef.current = data.seq;
+                }
+            } else if (data.type === 'replay') {
+                data.frames.forEach(handleMessage);
+            } else if (data.type === 'snapshot') {
+                // Gap too old to replay: rebuild the lists from recent frames
+                setEvents([]);
+                setAlerts([]);
+                setStats({ total: 0, critical: 0, errors: 0, warnings: 0 });
+                setActiveScenario(null);
+                lastSeqRef.current = null;
+                data.frames.forEach(handleMessage);
+                lastSeqRef.current = data.seq;
+            } else {
+                handleMessage(data);
+            }
+        };
+
+        const scheduleReconnect = () => {
+            const delay = RECONNECT_DELAY_MS + Math.random() * RECONNECT_JITTER_MS;
+            reconnectTimeoutRef.current = setTimeout(connectWebSocket, delay);
+        };
+
         const connectWebSocket = () => {
             // Clear any existing reconnect timeout
             if (reconnectTimeoutRef.current) {
@@ -22,19 +108,20 @@ export const useWebSocket = () => {
             }
 
             try {
-                const ws = new WebSocket(WS_URL);
+                const url = lastSeqRef.current !== null && streamRef.current
+                    ? `${WS_URL}?since=${lastSeqRef.current}&stream=${streamRef.current}`
+                    : WS_URL;
+                const ws = new WebSocket(url);
 
                 ws.onopen = () => {
                     setIsConnected(true);
-                    console.log('WebSocket connected to:', WS_URL);
+                    console.log('WebSocket connected to:', url);
                 };
 
                 ws.onclose = (event) => {
                     setIsConnected(false);
                     console.log('WebSocket disconnected:', event.code, event.reason);
-
-                    // Reconnect after 3 seconds
-                    reconnectTimeoutRef.current = setTimeout(connectWebSocket, 3000);
+                    scheduleReconnect();
                 };
 
                 ws.onerror = (error) => {
@@ -44,23 +131,7 @@ export const useWebSocket = () => {
 
                 ws.onmessage = (event) => {
                     try {
-                        const data = JSON.parse(event.data);
-
-                        if (data.type === 'event_sent') {
-                            setEvents(prev => [data.event, ...prev].slice(0, 50));
-                            setStats(prev => ({
-                                total: prev.total + 1,
-                                critical: prev.critical + (data.event.severity === 'critical' ? 1 : 0),
-                                errors: prev.errors + (data.event.severity === 'error' ? 1 : 0),
-                                warnings: prev.warnings + (data.event.severity === 'warning' ? 1 : 0)
-                            }));
-                        } else if (data.type === 'ai_alert') {
-                            setAlerts(prev => [data.summary, ...prev].slice(0, 10));
-                        } else if (data.type === 'scenario_started') {
-                            setActiveScenario(data.scenario);
-                        } else if (data.type === 'scenario_completed') {
-                            setActiveScenario(null);
-                        }
+                        handleFrame(JSON.parse(event.data));
                     } catch (parseError) {
                         console.error('Error parsing WebSocket message:', parseError);
                     }
@@ -69,10 +140,16 @@ export const useWebSocket = () => {
                 wsRef.current = ws;
             } catch (error) {
                 console.error('Error creating WebSocket:', error);
-                reconnectTimeoutRef.current = setTimeout(connectWebSocket, 3000);
+                scheduleReconnect();
             }
         };
 
+        // Current live status; later changes arrive as health_changed frames
+        fetch(`${API_URL}/api/health/live`)
+            .then(response => (response.ok ? response.json() : null))
+            .then(data => data && setHealth(prev => prev || data.health))
+            .catch(() => {});
+
         connectWebSocket();
 
         return () => {
@@ -80,6 +157,7 @@ export const useWebSocket = () => {
                 clearTimeout(reconnectTimeoutRef.current);
             }
             if (wsRef.current) {
+                wsRef.current.onclose = null;
                 wsRef.current.close();
             }
         };
@@ -92,8 +170,8 @@ export const useWebSocket = () => {
         isConnected,
         activeScenario,
         setActiveScenario,
+        health,
     };
 };
 
 export default useWebSocket;
-